@@ -0,0 +1,303 @@
+import re
+
+import numpy as np
+
+# ======================= ANALÍTICA DE REPORTES DE CALIFICACIONES =======================
+# Se calcula una sola vez por versión de archivo, al subirlo, sobre el dataset columnar ya
+# parseado. Las columnas de texto llegan como diccionario + códigos, así que casi todo se
+# resuelve con arrays de NumPy: convertir los valores distintos una vez y luego indexar.
+# Reproduce los cálculos que hacían top-promedios.js y reportes.js en el navegador.
+FORMATO = "analitica-v1"
+NOTA_APROBACION = 7.0
+TOP_MAX = 10
+
+# Cantidad esperada de materias por nivel y carrera (misma tabla que top-promedios.js)
+CARRERAS_TOP = {
+    "ENTRENAMIENTO DEPORTIVO": {"alias": "ED", "niveles": {1: 7, 2: 7, 3: 7, 4: 6, 5: 5, 6: 5, 7: 5, 8: 5}},
+    "PEDAGOGÍA DE LA ACTIVIDAD FÍSICA Y DEPORTE": {"alias": "PAF", "niveles": {1: 7, 2: 7, 3: 7, 4: 5, 5: 5, 6: 4, 7: 4, 8: 6, 9: 4}},
+}
+
+COLUMNAS_PARCIALES = ("PRIMER_PARCIAL", "SEGUNDO_PARCIAL", "RECUPERACION", "MEJORAMIENTO",
+                      "PROMEDIO_PARCIALES", "PROMEDIO")
+
+
+def a_num(v):
+    """Igual que asNum() del frontend: '9,83' -> 9.83; texto no numérico -> NaN."""
+    if v is None:
+        return np.nan
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return float(v)
+    try:
+        return float(str(v).strip().replace(",", ".", 1))
+    except ValueError:
+        return np.nan
+
+
+def norm(v):
+    return "" if v is None else str(v).strip()
+
+
+def clave_periodo(periodo):
+    """Orden cronológico de "2025 - 2026 CI": (año inicial, término, texto)."""
+    m = re.search(r"(\d{4}).*?(\d{4}).*?(CII|CI)\b", periodo or "", re.IGNORECASE)
+    if not m:
+        return (-1, -1, periodo or "")
+    return (int(m.group(1)), 2 if m.group(3).upper() == "CII" else 1, periodo)
+
+
+class _Tabla:
+    """
+    Acceso vectorizado a las columnas de un dataset columnar. Las columnas ausentes se tratan
+    como vacías y cada conversión se memoriza (se reutiliza en todos los periodos).
+    """
+
+    def __init__(self, dataset):
+        self.filas = dataset["filas"]
+        self._cols = {c["nombre"]: c for c in dataset["columnas"]}
+        self._memo = {}
+
+    def _memorizar(self, clave, calcular):
+        if clave not in self._memo:
+            self._memo[clave] = calcular()
+        return self._memo[clave]
+
+    def tiene(self, *nombres):
+        return all(n in self._cols for n in nombres)
+
+    def _valores_codigos(self, nombre):
+        """(valores distintos normalizados, códigos np.int32 con -1 = vacío)."""
+        col = self._cols[nombre]
+        if col["tipo"] == "dict":
+            return [norm(v) for v in col["valores"]], np.asarray(col["codigos"], dtype=np.int32)
+        indice = {}
+        codigos = np.fromiter(
+            (-1 if v is None else indice.setdefault(norm(v), len(indice)) for v in col["datos"]),
+            dtype=np.int32, count=self.filas)
+        return list(indice), codigos
+
+    def categorica(self, nombre):
+        """
+        Recodifica la columna sobre sus valores normalizados (sin espacios sobrantes), fusionando
+        los que quedan iguales. Devuelve (valores, códigos); '' cuenta como vacío (-1).
+        """
+        return self._memorizar(("cat", nombre), lambda: self._categorica(nombre))
+
+    def _categorica(self, nombre):
+        if nombre not in self._cols:
+            return [], np.full(self.filas, -1, dtype=np.int32)
+        valores, codigos = self._valores_codigos(nombre)
+        unicos = {}
+        mapa = np.empty(len(valores) + 1, dtype=np.int32)
+        for i, v in enumerate(valores):
+            mapa[i] = -1 if v == "" else unicos.setdefault(v, len(unicos))
+        mapa[-1] = -1  # el código -1 indexa la última posición
+        return list(unicos), mapa[codigos]
+
+    def numerica(self, nombre):
+        return self._memorizar(("num", nombre), lambda: self._numerica(nombre))
+
+    def _numerica(self, nombre):
+        if nombre not in self._cols:
+            return np.full(self.filas, np.nan)
+        col = self._cols[nombre]
+        if col["tipo"] == "dict":
+            convertidos = np.array([a_num(v) for v in col["valores"]] + [np.nan], dtype=np.float64)
+            return convertidos[np.asarray(col["codigos"], dtype=np.int32)]
+        return np.array([a_num(v) for v in col["datos"]], dtype=np.float64)
+
+    def contiene(self, nombre, texto):
+        """Máscara booleana: el valor de la celda contiene `texto` (en mayúsculas)."""
+        return self._memorizar(("contiene", nombre, texto), lambda: self._contiene(nombre, texto))
+
+    def _contiene(self, nombre, texto):
+        if nombre not in self._cols:
+            return np.zeros(self.filas, dtype=bool)
+        valores, codigos = self._valores_codigos(nombre)
+        marca = np.array([texto in v.upper() for v in valores] + [False], dtype=bool)
+        return marca[codigos]
+
+
+def _resumen(mascara, ids, estados, materias, vez, promedio):
+    idx = np.flatnonzero(mascara)
+    ids_p = ids[idx]
+    estado_p = estados[idx]
+
+    # vez: 1 = "1", 2 = "2", 3 = cualquier otro valor no vacío, 0 = vacío
+    conteo_vez = np.bincount(vez[idx], minlength=4)
+    conteo_estado = np.bincount(estado_p, minlength=3)
+
+    prom = promedio[idx]
+    prom = prom[~np.isnan(prom)]
+    bins = np.bincount(np.clip(np.floor(prom), 0, 9).astype(np.int64), minlength=10)
+
+    mat_valores, mat_codigos = materias
+    mat_p = mat_codigos[idx]
+    con_materia = mat_p >= 0
+    total_mat = np.bincount(mat_p[con_materia], minlength=len(mat_valores))
+    rep_mat = np.bincount(mat_p[con_materia & (estado_p == 2)], minlength=len(mat_valores))
+    pct = np.divide(rep_mat, total_mat, out=np.zeros(len(mat_valores)), where=total_mat > 0)
+    orden = sorted(np.flatnonzero(total_mat), key=lambda i: (-pct[i], -rep_mat[i]))[:10]
+
+    return {
+        "registros": int(idx.size),
+        "estudiantes": int(np.unique(ids_p[ids_p >= 0]).size),
+        "vez": {"1": int(conteo_vez[1]), "2": int(conteo_vez[2]), "3": int(conteo_vez[3])},
+        "estados": {"APROBADO": int(conteo_estado[1]), "REPROBADO": int(conteo_estado[2]),
+                    "CURSANDO": int(conteo_estado[0])},
+        "histograma": [{"desde": i, "hasta": i + 1, "total": int(n)} for i, n in enumerate(bins)],
+        "materias_reprobacion": [
+            {"materia": mat_valores[i], "reprobados": int(rep_mat[i]), "total": int(total_mat[i]),
+             "pct": round(float(pct[i]), 4)}
+            for i in orden
+        ],
+    }
+
+
+def _top_promedios(t, mascara, identificaciones, promedio):
+    """Top por carrera/nivel con los criterios de top-promedios.js (malla completa, primera vez)."""
+    if not t.tiene("CARRERA", "NIVEL", "NO. VEZ", "APELLIDOS", "NOMBRES"):
+        return []
+    id_valores, ids = identificaciones
+    carreras, carrera_c = t.categorica("CARRERA")
+    niveles, nivel_c = t.categorica("NIVEL")
+    no_vez = t.numerica("NO. VEZ")
+    apellidos, apellidos_c = t.categorica("APELLIDOS")
+    nombres, nombres_c = t.categorica("NOMBRES")
+    grupo_ma = t.contiene("GRUPO/PARALELO", "MA")
+    grupo_ve = t.contiene("GRUPO/PARALELO", "VE")
+    correo_i = t.categorica("CORREO_INSTITUCIONAL")
+    correo_p = t.categorica("CORREO_PERSONAL")
+
+    idx = np.flatnonzero(mascara & (ids >= 0))
+    if idx.size == 0 or not carreras or not niveles:
+        return []
+    # Agrupa por estudiante conservando el orden original dentro de cada grupo (el "primer" registro)
+    idx = idx[np.argsort(ids[idx], kind="stable")]
+    ids_o = ids[idx]
+    inicios = np.flatnonzero(np.r_[True, ids_o[1:] != ids_o[:-1]])
+    cantidad = np.diff(np.r_[inicios, idx.size])
+    primero = idx[inicios]
+
+    nivel_o = nivel_c[idx]
+    mismo_nivel = np.minimum.reduceat(nivel_o, inicios) == np.maximum.reduceat(nivel_o, inicios)
+    prom_o = promedio[idx]
+    sin_nota = np.add.reduceat(np.isnan(prom_o).astype(np.int32), inicios)
+    suma = np.add.reduceat(np.nan_to_num(prom_o), inicios)
+    ma = np.add.reduceat(grupo_ma[idx].astype(np.int32), inicios)
+    ve = np.add.reduceat(grupo_ve[idx].astype(np.int32), inicios)
+
+    # Materias esperadas por (carrera, nivel); 0 = combinación fuera de la tabla
+    esperado = np.zeros((len(carreras), len(niveles)), dtype=np.int32)
+    for ci, carrera in enumerate(carreras):
+        conf = CARRERAS_TOP.get(carrera)
+        for ni, nivel in enumerate(niveles):
+            if conf and nivel.isdigit():
+                esperado[ci, ni] = conf["niveles"].get(int(nivel), 0)
+    c0 = carrera_c[primero]
+    n0 = nivel_c[primero]
+    validos = (c0 >= 0) & (n0 >= 0)
+    esp = np.zeros(inicios.size, dtype=np.int32)
+    esp[validos] = esperado[c0[validos], n0[validos]]
+
+    ok = (esp > 0) & (no_vez[primero] == 1) & mismo_nivel & (cantidad == esp) & (sin_nota == 0)
+
+    def texto(columna, fila):
+        valores, codigos = columna
+        return valores[codigos[fila]] if codigos[fila] >= 0 else ""
+
+    grupos = {}
+    for g in np.flatnonzero(ok):
+        fila = primero[g]
+        total = int(cantidad[g])
+        grupos.setdefault((carreras[c0[g]], niveles[n0[g]]), []).append({
+            "id": id_valores[ids_o[inicios[g]]],
+            "nombre": f"{texto((apellidos, apellidos_c), fila)} {texto((nombres, nombres_c), fila)}",
+            "correos": [c for c in (texto(correo_i, fila), texto(correo_p, fila)) if c],
+            "ma_pct": round(100.0 * ma[g] / total, 2),
+            "ve_pct": round(100.0 * ve[g] / total, 2),
+            "promedio": round(float(suma[g] / total), 2),
+        })
+
+    resultado = []
+    for (carrera, nivel), estudiantes in grupos.items():
+        estudiantes.sort(key=lambda e: -e["promedio"])
+        resultado.append({"carrera": carrera, "alias": CARRERAS_TOP[carrera]["alias"],
+                          "nivel": nivel, "estudiantes": estudiantes[:TOP_MAX]})
+    resultado.sort(key=lambda g: (g["alias"], int(g["nivel"])))
+    return resultado
+
+
+def _parciales(t, mascara, carreras):
+    """Aprobados (>= NOTA_APROBACION), reprobados y sin nota por parcial, total y por carrera."""
+    car_valores, car_codigos = carreras
+    car_p = car_codigos[mascara]
+    resultado = {}
+    for columna in COLUMNAS_PARCIALES:
+        if not t.tiene(columna):
+            continue
+        notas = t.numerica(columna)[mascara]
+        con_nota = ~np.isnan(notas)
+        aprobados = con_nota & (notas >= NOTA_APROBACION)
+        reprobados = con_nota & (notas < NOTA_APROBACION)
+
+        por_carrera = {}
+        if car_valores:
+            validos = car_p >= 0
+            n = len(car_valores)
+            a = np.bincount(car_p[validos & aprobados], minlength=n)
+            r = np.bincount(car_p[validos & reprobados], minlength=n)
+            s = np.bincount(car_p[validos & ~con_nota], minlength=n)
+            por_carrera = {car_valores[i]: {"aprobados": int(a[i]), "reprobados": int(r[i]), "sin_nota": int(s[i])}
+                           for i in range(n) if a[i] or r[i] or s[i]}
+        resultado[columna] = {
+            "aprobados": int(np.count_nonzero(aprobados)),
+            "reprobados": int(np.count_nonzero(reprobados)),
+            "sin_nota": int(np.count_nonzero(~con_nota)),
+            "por_carrera": por_carrera,
+        }
+    return resultado
+
+
+def calcular(dataset):
+    """
+    Analítica completa de un reporte de calificaciones. Devuelve None si el dataset no tiene
+    las columnas PERIODO, IDENTIFICACION y PROMEDIO (no es un reporte de notas).
+    """
+    t = _Tabla(dataset)
+    if t.filas == 0 or not t.tiene("PERIODO", "IDENTIFICACION", "PROMEDIO"):
+        return None
+
+    periodos, periodo_c = t.categorica("PERIODO")
+    identificaciones = t.categorica("IDENTIFICACION")
+    promedio = t.numerica("PROMEDIO")
+    materias = t.categorica("MATERIA")
+    carreras = t.categorica("CARRERA")
+
+    # 1 = aprobado, 2 = reprobado, 0 = cursando/otro (mismo criterio que reportes.js)
+    estados_txt, estados_c = t.categorica("ESTADO")
+    clase_estado = [2 if "REPROB" in e.upper() else 1 if "APROB" in e.upper() else 0 for e in estados_txt]
+    estados = np.array(clase_estado + [0], dtype=np.int64)[estados_c]
+
+    vez_txt, vez_c = t.categorica("NO. VEZ")
+    clase_vez = [1 if v == "1" else 2 if v == "2" else 3 for v in vez_txt]
+    vez = np.array(clase_vez + [0], dtype=np.int64)[vez_c]
+
+    orden = sorted(range(len(periodos)), key=lambda i: clave_periodo(periodos[i]))
+    por_periodo = {}
+    estudiantes_por_periodo = []
+    for i in orden:
+        mascara = periodo_c == i
+        resumen = _resumen(mascara, identificaciones[1], estados, materias, vez, promedio)
+        estudiantes_por_periodo.append({"periodo": periodos[i], "estudiantes": resumen["estudiantes"]})
+        por_periodo[periodos[i]] = {
+            "resumen": resumen,
+            "top_promedios": _top_promedios(t, mascara, identificaciones, promedio),
+            "parciales": _parciales(t, mascara, carreras),
+        }
+
+    return {
+        "formato": FORMATO,
+        "periodos": [periodos[i] for i in reversed(orden)],  # más reciente primero
+        "estudiantes_por_periodo": estudiantes_por_periodo,   # cronológico
+        "por_periodo": por_periodo,
+    }
@@ -1,24 +1,61 @@
 from dotenv import load_dotenv
 import os
-from flask import send_from_directory, Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, Response, g
 from flask_cors import CORS
+from werkzeug.wsgi import wrap_file, ClosingIterator
 from pathlib import Path
-from io import BytesIO
 import secrets, time
+import base64
+import json
+import gzip
+import tempfile
+import unicodedata
+from datetime import timezone
+from urllib.parse import quote
 import requests
 from database import (
     guardar_archivo_excel,
+    guardar_archivo_desde_ruta,
     listar_archivos,
-    obtener_archivo,
+    listar_cambios_archivos,
+    obtener_info_archivo,
+    leer_archivo_por_partes,
+    eliminar_archivo,
+    obtener_dataset,
+    obtener_delta_dataset,
+    obtener_analitica,
+    obtener_vista,
     guardar_plantillas,
     obtener_plantillas,
-    conectar,
     crear_usuario,
+    importar_usuarios,
     actualizar_usuario_por_id,
     obtener_usuario_por_usuario,
-    inicializar_base_datos,
+    obtener_usuario_por_id,
+    listar_revocaciones,
+    listar_usuarios,
+    contar_usuarios,
+    COINCIDENCIAS,
+    obtener_trabajo_correo,
+    metricas_pool,
+    verificar_conexion,
 )
-import msal
+from cache import obtener_cache
+from correo import MotorCorreo
+from ug import ValidadorUG, CircuitoAbiertoError, interpretar_respuesta
+from tokens_graph import GestorTokenGraph
+from http_saliente import obtener_cliente, LimiteHostError
+import plantillas
+import analitica
+import busqueda
+import subidas
+import metricas
+import compresion
+import blobs
+import exportacion
+import carga_usuarios
+import eventos
+import sesiones
 
 # ======================= CARGA .ENV ===========================
 BASE_DIR = Path(__file__).resolve().parent
@@ -27,6 +64,8 @@ load_dotenv(dotenv_path=ENV_PATH, override=True)
 
 # ======================= FLASK APP ===========================
 app = Flask(__name__)
+# Tope para /upload clásico (multipart) y para cada parte de /upload/<id>
+app.config['MAX_CONTENT_LENGTH'] = subidas.UPLOAD_MAX_BYTES + 1024 * 1024
 CORS(app, resources={r"/*": {"origins": "*"}})
 
 # ======================= CONFIG ===========================
@@ -39,18 +78,25 @@ SCOPES          = ["https://graph.microsoft.com/.default"]
 REQUEST_TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", "10"))  # segundos
 
 # ======================= INICIALIZACIÓN BD ===========================
-print("🚀 Iniciando aplicación FACAF...")
-if inicializar_base_datos():
-    print("✅ Sistema listo - Base de datos inicializada correctamente")
-else:
-    print("❌ ADVERTENCIA: Problemas en inicialización de BD. Algunas funciones pueden fallar.")
-
-try:
-    conn = conectar()
-    conn.close()
-    print("✅ Conexión final exitosa con FACAFDB")
-except Exception as e:
-    print(f"❌ Error de conexión final: {e}")
+# Importar la app no toca la BD: el esquema y las migraciones se aplican una vez por despliegue
+# con `python inicializar_bd.py` (servicio migraciones en docker-compose) y el pool se abre
+# con la primera petición. /ready indica cuándo la BD responde.
+
+# ======================= COMPRESIÓN ===========================
+@app.after_request
+def _comprimir_respuesta(resp):
+    """Respuestas JSON en memoria con brotli o gzip según Accept-Encoding (ver compresion.py)."""
+    if not compresion.comprimible(resp):
+        return resp
+    datos = resp.get_data()
+    if len(datos) < compresion.COMPRESION_MIN_BYTES:
+        return resp
+    resp.vary.add('Accept-Encoding')
+    codificacion = compresion.elegir(request.accept_encodings)
+    if codificacion:
+        resp.set_data(compresion.comprimir(datos, codificacion))
+        resp.headers['Content-Encoding'] = codificacion
+    return resp
 
 # ======================= ARCHIVOS ===========================
 @app.post('/upload')
@@ -59,22 +105,77 @@ def subir_archivo():
     if not archivo or archivo.filename.strip() == '':
         return jsonify({'error': 'No se envió archivo o nombre vacío'}), 400
     try:
-        guardar_archivo_excel(archivo)
-        return jsonify({'message': f'Archivo "{archivo.filename}" guardado correctamente'}), 200
+        guardado = guardar_archivo_excel(archivo)
+        if not guardado['cambio']:
+            return jsonify({'message': f'Archivo "{archivo.filename}" sin cambios', 'data': guardado}), 200
+        return jsonify({'message': f'Archivo "{archivo.filename}" guardado correctamente', 'data': guardado}), 200
+    except Exception as e:
+        return jsonify({'error': f'No se pudo guardar: {e}'}), 500
+
+# ----- Subida por partes (reanudable, ver subidas.py) -----
+def _error_subida(e):
+    return jsonify({'error': str(e), **e.extra}), e.status
+
+@app.post('/upload/init')
+def iniciar_subida():
+    data = request.get_json(silent=True) or {}
+    try:
+        tamano = int(data.get('tamano'))
+    except (TypeError, ValueError):
+        tamano = None
+    try:
+        return jsonify(subidas.iniciar(data.get('nombre'), tamano, data.get('tipo'))), 201
+    except subidas.SubidaError as e:
+        return _error_subida(e)
+    except Exception as e:
+        return jsonify({'error': f'No se pudo iniciar la subida: {e}'}), 500
+
+@app.get('/upload/<subida_id>')
+def estado_subida(subida_id):
+    try:
+        return jsonify(subidas.estado(subida_id)), 200
+    except subidas.SubidaError as e:
+        return _error_subida(e)
+
+@app.put('/upload/<subida_id>')
+def agregar_parte(subida_id):
+    """Cuerpo binario con la parte que empieza en ?offset= (lo ya recibido)."""
+    offset = request.args.get('offset', type=int)
+    if offset is None or offset < 0:
+        return jsonify({'error': "Parámetro 'offset' requerido"}), 400
+    try:
+        return jsonify(subidas.agregar(subida_id, offset, request.stream, request.content_length)), 200
+    except subidas.SubidaError as e:
+        return _error_subida(e)
+    except Exception as e:
+        return jsonify({'error': f'No se pudo guardar la parte: {e}'}), 500
+
+@app.post('/upload/<subida_id>/commit')
+def confirmar_subida(subida_id):
+    """Opcional: {"sha256": "..."} para verificar el archivo antes de guardarlo."""
+    data = request.get_json(silent=True) or {}
+    try:
+        guardado = subidas.confirmar(subida_id, guardar_archivo_desde_ruta, data.get('sha256'))
+        if not guardado['cambio']:
+            return jsonify({'message': f'Archivo "{guardado["nombre"]}" sin cambios', 'data': guardado}), 200
+        return jsonify({'message': f'Archivo "{guardado["nombre"]}" guardado correctamente', 'data': guardado}), 200
+    except subidas.SubidaError as e:
+        return _error_subida(e)
     except Exception as e:
         return jsonify({'error': f'No se pudo guardar: {e}'}), 500
 
+@app.delete('/upload/<subida_id>')
+def cancelar_subida(subida_id):
+    try:
+        subidas.cancelar(subida_id)
+        return jsonify({'message': 'Subida cancelada'}), 200
+    except subidas.SubidaError as e:
+        return _error_subida(e)
+
 @app.delete('/delete/by-name/<string:filename>')
 def eliminar_archivo_por_nombre(filename):
     try:
-        conexion = conectar()
-        cursor = conexion.cursor()
-        cursor.execute("DELETE FROM ArchivosExcel WHERE NombreArchivo = ?", (filename,))
-        rows = cursor.rowcount
-        conexion.commit()
-        cursor.close()
-        conexion.close()
-        if rows and rows > 0:
+        if eliminar_archivo(filename):
             return jsonify({'message': 'Archivo eliminado correctamente'}), 200
         return jsonify({'error': 'Archivo no encontrado'}), 404
     except Exception as e:
@@ -88,20 +189,341 @@ def listar():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.get('/files/changes')
+def listar_cambios():
+    """Archivos nuevos/modificados y eliminados desde ?since=<version>, con la versión actual."""
+    try:
+        desde = max(0, int(request.args.get('since', 0)))
+    except ValueError:
+        return jsonify({'error': "Parámetro 'since' inválido"}), 400
+    try:
+        return jsonify(listar_cambios_archivos(desde))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ----- Avisos de cambios por SSE (ver eventos.py) -----
+@app.get('/events')
+def eventos_sse():
+    """
+    Con workers síncronos una conexión abierta ocuparía un worker entero: aquí se envía lo
+    pendiente desde Last-Event-ID (o ?desde=) y se cierra, y EventSource vuelve a conectar tras
+    EVENTOS_SONDEO_MS. Con SERVIDOR=asgi esta ruta la atiende asgi.py con la conexión abierta.
+    """
+    desde = eventos.id_cliente(request.headers.get('Last-Event-ID'), request.args.get('desde'))
+    try:
+        cuerpo, _ = eventos.apertura(desde, eventos.EVENTOS_SONDEO_MS)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return Response(cuerpo, mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+def _content_disposition(nombre):
+    # Igual que send_file: filename ASCII + filename* en UTF-8 cuando hace falta
+    try:
+        nombre.encode('ascii')
+        return {'filename': nombre}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', nombre).encode('ascii', 'ignore').decode('ascii')
+        return {'filename': simple, 'filename*': "UTF-8''" + quote(nombre, safe="!#$&+-.^_`|~")}
+
+def _etag_archivo(archivo_id, fecha, tamano, hash_sha):
+    return hash_sha or f'{archivo_id}-{int(fecha.timestamp() * 1000)}-{tamano}'
+
 @app.get('/download/<int:archivo_id>')
 def descargar(archivo_id):
     try:
-        archivo = obtener_archivo(archivo_id)
-        if not archivo:
+        info = obtener_info_archivo(archivo_id)
+        if not info:
+            return jsonify({'error': 'Archivo no encontrado'}), 404
+        nombre, tipo, fecha, tamano, hash_sha, version = info
+
+        etag = _etag_archivo(archivo_id, fecha, tamano, hash_sha)
+        modificado = fecha.replace(microsecond=0, tzinfo=timezone.utc)
+
+        # Peticiones condicionales: 304 sin tocar el blob
+        if request.if_none_match:
+            no_cambio = request.if_none_match.contains(etag)
+        else:
+            no_cambio = request.if_modified_since is not None and modificado <= request.if_modified_since
+        if no_cambio:
+            resp = Response(status=304)
+            resp.set_etag(etag)
+            resp.last_modified = modificado
+            return resp
+
+        inicio, fin, status = 0, tamano, 200
+        rango = request.range
+        if_range = request.if_range
+        rango_vigente = (
+            (if_range.etag is None and if_range.date is None)
+            or if_range.etag == etag
+            or (if_range.date is not None and if_range.date == modificado)
+        )
+        # Solo se soporta un rango; multipart/byteranges se responde con el archivo completo
+        if rango is not None and rango_vigente and len(rango.ranges) == 1:
+            limites = rango.range_for_length(tamano)
+            if limites is None:
+                resp = Response(status=416)
+                resp.headers['Content-Range'] = f'bytes */{tamano}'
+                return resp
+            inicio, fin = limites
+            status = 206
+
+        # Cache de blobs en disco (ver blobs.py): el archivo completo va por wsgi.file_wrapper
+        # (sendfile en gunicorn) y los rangos por mmap; sin acierto se lee de la BD y, si es la
+        # descarga completa, se deja copiado para las siguientes
+        local = blobs.abrir(archivo_id, etag)
+        if local is not None and status == 200:
+            cuerpo = wrap_file(request.environ, local, blobs.BLOB_CACHE_PARTE)
+        elif local is not None:
+            cuerpo = blobs.partes_rango(local, inicio, fin)
+        elif status == 200:
+            cuerpo = blobs.guardar_mientras(archivo_id, etag, tamano,
+                                            leer_archivo_por_partes(archivo_id, version, inicio, fin))
+        else:
+            cuerpo = leer_archivo_por_partes(archivo_id, version, inicio, fin)
+
+        resp = Response(
+            cuerpo,
+            status=status,
+            mimetype=tipo or 'application/octet-stream',
+            direct_passthrough=True,
+        )
+        resp.content_length = fin - inicio
+        if status == 206:
+            resp.headers['Content-Range'] = f'bytes {inicio}-{fin - 1}/{tamano}'
+        resp.headers['Accept-Ranges'] = 'bytes'
+        resp.headers.set('Content-Disposition', 'attachment', **_content_disposition(nombre))
+        resp.set_etag(etag)
+        resp.last_modified = modificado
+        resp.headers['Cache-Control'] = 'no-cache'
+        return resp
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _respuesta_gzip(datos, etag):
+    """JSON ya comprimido en gzip (como se guarda en la BD): se envía tal cual si el cliente lo acepta."""
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+        resp.set_etag(etag)
+        return resp
+    if request.accept_encodings['gzip']:
+        resp = Response(datos, mimetype='application/json')
+        resp.headers['Content-Encoding'] = 'gzip'
+    else:
+        resp = Response(gzip.decompress(datos), mimetype='application/json')
+    resp.set_etag(etag)
+    resp.vary.add('Accept-Encoding')
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
+
+@app.get('/datasets/<path:nombre>')
+def descargar_dataset(nombre):
+    """Dataset columnar (JSON gzip) de la primera hoja del archivo, ya parseado en el servidor."""
+    try:
+        dataset = obtener_dataset(nombre)
+        if not dataset:
+            return jsonify({'error': 'Dataset no encontrado'}), 404
+        datos, fecha = dataset
+        return _respuesta_gzip(datos, f'{int(fecha.timestamp())}-{len(datos)}')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.get('/datasets/<path:nombre>/delta')
+def descargar_delta_dataset(nombre):
+    """
+    Filas agregadas, cambiadas y eliminadas desde ?desde=<version> hasta la versión actual
+    (ver deltas.py). 404 si no hay delta desde esa versión: el cliente baja el dataset completo.
+    """
+    desde = request.args.get('desde', type=int)
+    if desde is None or desde < 0:
+        return jsonify({'error': "Parámetro 'desde' requerido"}), 400
+    try:
+        resultado = obtener_delta_dataset(nombre, desde)
+        if not resultado:
+            return jsonify({'error': 'No hay delta desde esa versión; descargue el dataset completo'}), 404
+        version, datos = resultado
+        return _respuesta_gzip(datos, f'delta-{desde}-{version}')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ======================= EXPORTACIÓN ===========================
+def _abrir_workbook(archivo_id, version, tamano, etag):
+    """El workbook guardado como archivo en disco: desde la cache de blobs o bajado por partes."""
+    local = blobs.abrir(archivo_id, etag)
+    if local is None:
+        local = tempfile.TemporaryFile()
+        try:
+            for parte in blobs.guardar_mientras(archivo_id, etag, tamano,
+                                                leer_archivo_por_partes(archivo_id, version, 0, tamano)):
+                local.write(parte)
+            local.seek(0)
+        except Exception:
+            local.close()
+            raise
+    return local
+
+def _cerrar_al_final(partes, archivo):
+    try:
+        yield from partes
+    finally:
+        archivo.close()
+
+@app.get('/export/<path:nombre>')
+def exportar(nombre):
+    """
+    Reporte filtrado por periodo, carrera, materia y/o estado en xlsx, csv o pdf, generado y
+    enviado por partes (ver exportacion.py).
+    """
+    formato = (request.args.get('formato') or 'xlsx').lower()
+    if formato not in exportacion.FORMATOS:
+        return jsonify({'error': f"Formato no soportado; use {', '.join(exportacion.FORMATOS)}"}), 400
+    try:
+        archivo = next((a for a in listar_archivos() if a['nombre'] == nombre), None)
+        info = obtener_info_archivo(archivo['id']) if archivo else None
+        if not info:
             return jsonify({'error': 'Archivo no encontrado'}), 404
-        nombre, tipo, contenido = archivo
-        bio = BytesIO(contenido)
-        return send_file(
-            bio,
-            as_attachment=True,
-            download_name=nombre,
-            mimetype=tipo or 'application/octet-stream'
+        _, _, fecha, tamano, hash_sha, version = info
+        filtros = exportacion.leer_filtros(request.args)
+        local = _abrir_workbook(archivo['id'], version, tamano, _etag_archivo(archivo['id'], fecha, tamano, hash_sha))
+        try:
+            hoja, nombres, filas = exportacion.preparar(local, filtros, exportacion.leer_columnas(request.args))
+        except ValueError as e:
+            local.close()
+            return jsonify({'error': str(e)}), 400
+        except Exception:
+            local.close()
+            raise
+
+        titulo = ' | '.join([Path(nombre).stem] + [request.args.get(p) for p in exportacion.FILTROS
+                                                    if request.args.get(p)])
+        resp = Response(
+            _cerrar_al_final(exportacion.generar(formato, hoja, nombres, filas, titulo), local),
+            mimetype=exportacion.FORMATOS[formato],
+            direct_passthrough=True,
         )
+        resp.headers.set('Content-Disposition', 'attachment',
+                         **_content_disposition(f'{Path(nombre).stem}.{formato}'))
+        resp.headers['Cache-Control'] = 'no-store'
+        return resp
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ======================= ANALÍTICA ===========================
+# Agregados precalculados al subir cada reporte de notas (ver analitica.py); el ETag es la
+# versión del archivo, así que el navegador solo vuelve a descargar cuando hubo una subida nueva.
+VISTAS_ANALITICA = {'resumen': 'resumen', 'top-promedios': 'top_promedios', 'parciales': 'parciales'}
+
+def _respuesta_analitica(cuerpo, etag):
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        resp = jsonify(cuerpo)
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
+
+@app.get('/analytics/<path:nombre>')
+def analitica_periodos(nombre):
+    try:
+        resultado = obtener_analitica(nombre)
+        if not resultado:
+            return jsonify({'error': 'No hay analítica para este archivo'}), 404
+        version, datos = resultado
+        return _respuesta_analitica({'archivo': nombre, 'version': version, 'periodos': datos['periodos'],
+                                     'estudiantes_por_periodo': datos['estudiantes_por_periodo']},
+                                    f'{version}')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.get('/analytics/<path:nombre>/<any(resumen, "top-promedios", parciales):vista>')
+def analitica_vista(nombre, vista):
+    """?periodo= (por defecto el más reciente); top-promedios acepta ?n= (máximo analitica.TOP_MAX)."""
+    try:
+        resultado = obtener_analitica(nombre)
+        if not resultado:
+            return jsonify({'error': 'No hay analítica para este archivo'}), 404
+        version, datos = resultado
+        periodo = (request.args.get('periodo') or '').strip() or (datos['periodos'] or [None])[0]
+        if periodo not in datos['por_periodo']:
+            return jsonify({'error': f'Periodo no encontrado: {periodo}', 'periodos': datos['periodos']}), 404
+        valor = datos['por_periodo'][periodo][VISTAS_ANALITICA[vista]]
+        n = None
+        if vista == 'top-promedios':
+            n = max(1, min(analitica.TOP_MAX, request.args.get('n', default=5, type=int) or 5))
+            valor = [dict(g, estudiantes=g['estudiantes'][:n]) for g in valor]
+        return _respuesta_analitica({'archivo': nombre, 'version': version, 'periodo': periodo, vista: valor},
+                                    f'{version}-{vista}-{periodo}-{n}')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ======================= BÚSQUEDA ===========================
+def _buscar(tipo):
+    q = (request.args.get('q') or '').strip()
+    limite = max(1, min(busqueda.LIMITE_MAX, request.args.get('limit', default=10, type=int) or 10))
+    if not q:
+        return jsonify({'error': "Parámetro 'q' requerido"}), 400
+    try:
+        indices = busqueda.obtener_indices()
+        if not indices:
+            return jsonify({'error': f'No hay datos: falta {busqueda.ARCHIVO_NOTAS}'}), 404
+        indice = indices[0] if tipo == 'estudiantes' else indices[1]
+        resultados = [dict(entrada, relevancia=relevancia) for entrada, relevancia in indice.buscar(q, limite)]
+        return jsonify({'q': q, 'resultados': resultados}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.get('/search/estudiantes')
+def buscar_estudiantes():
+    return _buscar('estudiantes')
+
+@app.get('/search/docentes')
+def buscar_docentes():
+    return _buscar('docentes')
+
+# ======================= VISTAS (ESTUDIANTES EN RIESGO) ===========================
+# Cruces precalculados al subir los reportes (ver vistas.py), paginados como /usuarios:
+# ?page= (desde 0), ?limit= (máximo VISTAS_LIMITE_MAX) y ?q= para filtrar por texto.
+VISTAS_LIMITE_MAX = 1000
+
+def _coincide(fila, q):
+    """Mismo filtro de texto que las tablas del frontend (q ya en minúsculas)."""
+    for clave, valor in fila.items():
+        if clave in ('_key', 'Materias'):
+            continue
+        if any(q in str(v).lower() for v in (valor if isinstance(valor, list) else [valor])):
+            return True
+    return False
+
+@app.get('/views/<any("tercera-matricula", nee):vista>')
+def vista_materializada(vista):
+    try:
+        page = max(0, int(request.args.get('page', 0)))
+        limit = max(1, min(VISTAS_LIMITE_MAX, int(request.args.get('limit', 50))))
+    except ValueError:
+        return jsonify({'error': "Parámetros 'page'/'limit' inválidos"}), 400
+    q = (request.args.get('q') or '').strip().lower()
+    try:
+        fuentes, datos = obtener_vista(vista)
+        etag = f'{fuentes}-{page}-{limit}-{q}'
+        if request.if_none_match.contains(etag):
+            resp = Response(status=304)
+        else:
+            filas = [f for f in datos['filas'] if _coincide(f, q)] if q else datos['filas']
+            total = len(filas)
+            resp = jsonify({
+                'vista': vista,
+                'version': fuentes,
+                'periodo': datos.get('periodo'),
+                'periodo_anterior': datos.get('periodo_anterior'),
+                'data': filas[page * limit:(page + 1) * limit],
+                'page': page,
+                'limit': limit,
+                'total': total,
+                'total_pages': (total + limit - 1) // limit,
+            })
+        resp.set_etag(etag)
+        resp.headers['Cache-Control'] = 'no-cache'
+        return resp
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -140,6 +562,35 @@ def api_crear_usuario():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.post("/usuarios/bulk")
+def api_importar_usuarios():
+    """
+    Alta o actualización masiva desde un CSV o JSON (archivo 'file' en multipart o el cuerpo
+    tal cual). Todo o nada: con alguna fila inválida responde 422 con los errores por fila.
+    """
+    archivo = request.files.get("file")
+    try:
+        if archivo:
+            registros = carga_usuarios.leer(archivo.read(carga_usuarios.USUARIOS_BULK_MAX_BYTES + 1),
+                                            archivo.mimetype, archivo.filename)
+        else:
+            registros = carga_usuarios.leer(request.stream.read(carga_usuarios.USUARIOS_BULK_MAX_BYTES + 1),
+                                            request.mimetype)
+    except carga_usuarios.CargaError as e:
+        return jsonify({"error": str(e)}), e.status
+
+    validos, errores = carga_usuarios.validar(registros)
+    if errores:
+        return jsonify({"error": f"{len(errores)} fila(s) con errores; no se guardó ningún usuario",
+                        "errores": errores}), 422
+    try:
+        resultado = importar_usuarios(validos)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    resumen = {accion: sum(1 for r in resultado if r["accion"] == accion)
+               for accion in ("creado", "actualizado", "sin_cambios")}
+    return jsonify({"message": "Usuarios importados", "resumen": resumen, "data": resultado}), 200
+
 @app.put("/usuarios/<int:user_id>")
 def api_actualizar_usuario(user_id: int):
     data = request.get_json(silent=True) or {}
@@ -159,68 +610,171 @@ def api_actualizar_usuario(user_id: int):
         return jsonify({"error": str(e)}), 500
 
 # ======================= CORREO (MS Graph + OAuth2) ===========================
-msal_app = msal.ConfidentialClientApplication(
-    CLIENT_ID,
-    authority=f"https://login.microsoftonline.com/{TENANT_ID}",
-    client_credential=CLIENT_SECRET
-)
+token_graph = GestorTokenGraph(CLIENT_ID, CLIENT_SECRET, TENANT_ID, SCOPES)
 
 def obtener_token_graph():
-    result = msal_app.acquire_token_for_client(scopes=SCOPES)
-    if "access_token" in result:
-        return result["access_token"]
-    else:
-        raise Exception(f"Error obteniendo token: {result.get('error_description', result)}")
+    return token_graph.obtener()
+
+motor_correo = MotorCorreo(obtener_token_graph, USUARIO_OUTLOOK, invalidar_token=token_graph.invalidar)
+BULK_MAX_MENSAJES = int(os.getenv("BULK_MAX_MENSAJES", "2000"))
 
 def enviar_correo_graph(destinatarios, asunto, cuerpo):
-    access_token = obtener_token_graph()
-    graph_endpoint = f"https://graph.microsoft.com/v1.0/users/{USUARIO_OUTLOOK}/sendMail"
-    to_recipients = [{"emailAddress": {"address": email}} for email in destinatarios]
-    payload = {
-        "message": {
-            "subject": asunto,
-            "body": {"contentType": "HTML", "content": cuerpo},
-            "toRecipients": to_recipients
-        },
-        "saveToSentItems": "true"
-    }
-    headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
-    resp = requests.post(graph_endpoint, headers=headers, json=payload)
-    if resp.status_code != 202:
-        raise Exception(f"Error enviando correo: {resp.status_code} - {resp.text}")
+    motor_correo.enviar(destinatarios, asunto, cuerpo)
 
-@app.post('/send-email')
-def send_email():
-    data = request.get_json(silent=True) or {}
+def _parse_destinatarios(to_list):
+    if isinstance(to_list, str):
+        return [email.strip() for email in to_list.split(';') if email.strip()]
+    if isinstance(to_list, list):
+        return [str(x).strip() for x in to_list if str(x).strip()]
+    return None
+
+def leer_envio(data):
+    """Valida el cuerpo de /send-email (compartido con asgi.py): ((to, asunto, cuerpo), None) o (None, error)."""
     to_list = data.get("to")
     subject = data.get("subject", "FACAF Notificación Académica")
     body = data.get("body", "")
     if not to_list or not body:
-        return jsonify({"error": "Faltan destinatarios o contenido"}), 400
-    if isinstance(to_list, str):
-        to_emails = [email.strip() for email in to_list.split(';') if email.strip()]
-    elif isinstance(to_list, list):
-        to_emails = [str(x).strip() for x in to_list if str(x).strip()]
-    else:
-        return jsonify({"error": "Formato incorrecto en campo 'to'"}), 400
+        return None, "Faltan destinatarios o contenido"
+    to_emails = _parse_destinatarios(to_list)
+    if to_emails is None:
+        return None, "Formato incorrecto en campo 'to'"
+    return (to_emails, subject, body), None
+
+@app.post('/send-email')
+def send_email():
+    envio, error = leer_envio(request.get_json(silent=True) or {})
+    if error:
+        return jsonify({"error": error}), 400
     try:
-        enviar_correo_graph(to_emails, subject, body)
+        enviar_correo_graph(*envio)
         return jsonify({"message": "Correo enviado correctamente"}), 200
+    except LimiteHostError:
+        return jsonify({"error": "Servidor ocupado enviando otros correos, intente en unos segundos"}), 503, {"Retry-After": "1"}
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.post('/send-email/bulk')
+def send_email_bulk():
+    """
+    Encola muchos correos en un solo request: {"mensajes": [{"to", "subject", "body"}, ...], "subject": opcional}.
+    Responde 202 con el id del trabajo; el avance se consulta en /jobs/<id>.
+    """
+    data = request.get_json(silent=True) or {}
+    mensajes_in = data.get("mensajes")
+    subject_def = data.get("subject", "FACAF Notificación Académica")
+    if not isinstance(mensajes_in, list) or not mensajes_in:
+        return jsonify({"error": "Campo 'mensajes' debe ser una lista no vacía"}), 400
+    if len(mensajes_in) > BULK_MAX_MENSAJES:
+        return jsonify({"error": f"Máximo {BULK_MAX_MENSAJES} mensajes por envío"}), 413
+
+    mensajes, errores = [], []
+    for i, m in enumerate(mensajes_in):
+        m = m if isinstance(m, dict) else {}
+        to_emails = _parse_destinatarios(m.get("to"))
+        body = m.get("body", "")
+        if not to_emails or not body:
+            errores.append({"indice": i, "error": "Faltan destinatarios o contenido"})
+            continue
+        mensajes.append({"to": to_emails, "subject": m.get("subject") or subject_def, "body": body})
+    if errores:
+        return jsonify({"error": "Mensajes inválidos", "detalle": errores}), 400
+
+    try:
+        trabajo_id = motor_correo.crear_trabajo(mensajes)
+        return jsonify({"message": "Envío encolado", "job_id": trabajo_id, "total": len(mensajes),
+                        "status_url": f"/jobs/{trabajo_id}"}), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.post('/send-email/merge')
+def send_email_merge():
+    """
+    Mail-merge con las plantillas del servidor:
+    {"tipo": "docente", "subject": opcional, "comunes": {...},
+     "destinatarios": [{"to": "a@ug.edu.ec" | [...], "variables": {...}}, ...], "preview": false}
+    Con preview=true devuelve los cuerpos renderizados sin enviar; si no, encola un trabajo como /send-email/bulk.
+    """
+    data = request.get_json(silent=True) or {}
+    tipo = (data.get("tipo") or "").strip().lower()
+    comunes = data.get("comunes") or {}
+    destinatarios_in = data.get("destinatarios")
+    subject = data.get("subject") or "FACAF Notificación Académica"
+    if tipo not in plantillas.TIPOS:
+        return jsonify({"error": f"Tipo inválido. Solo {plantillas.TIPOS}"}), 400
+    if not isinstance(comunes, dict):
+        return jsonify({"error": "Campo 'comunes' debe ser un objeto"}), 400
+    if not isinstance(destinatarios_in, list) or not destinatarios_in:
+        return jsonify({"error": "Campo 'destinatarios' debe ser una lista no vacía"}), 400
+    if len(destinatarios_in) > BULK_MAX_MENSAJES:
+        return jsonify({"error": f"Máximo {BULK_MAX_MENSAJES} mensajes por envío"}), 413
+
+    destinatarios, errores = [], []
+    for i, d in enumerate(destinatarios_in):
+        d = d if isinstance(d, dict) else {}
+        to_emails = _parse_destinatarios(d.get("to"))
+        variables = d.get("variables") or {}
+        if not to_emails or not isinstance(variables, dict):
+            errores.append({"indice": i, "error": "Faltan destinatarios o variables inválidas"})
+            continue
+        destinatarios.append({"to": to_emails, "variables": variables})
+    if errores:
+        return jsonify({"error": "Destinatarios inválidos", "detalle": errores}), 400
+
+    try:
+        mensajes = plantillas.combinar(tipo, comunes, destinatarios)
+        if data.get("preview"):
+            return jsonify({"data": mensajes[:20], "total": len(mensajes)}), 200
+        if not any(m["body"].strip() for m in mensajes):
+            return jsonify({"error": f"La plantilla '{tipo}' está vacía"}), 400
+        for m in mensajes:
+            m["subject"] = subject
+        trabajo_id = motor_correo.crear_trabajo(mensajes)
+        return jsonify({"message": "Envío encolado", "job_id": trabajo_id, "total": len(mensajes),
+                        "status_url": f"/jobs/{trabajo_id}"}), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.get('/jobs/<string:job_id>')
+def estado_trabajo(job_id):
+    try:
+        trabajo = obtener_trabajo_correo(job_id)
+        if not trabajo:
+            return jsonify({"error": "Trabajo no encontrado"}), 404
+        return jsonify(trabajo), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # ======================= AUTENTICACIÓN UG ===========================
-def _parse_ug_result(obj: dict):
-    if not isinstance(obj, dict):
-        return None, None
-    node = obj.get("ug", obj)
-    if not isinstance(node, dict):
-        return None, None
-    raw_id = node.get("id")
-    mensaje = node.get("mensaje")
-    try: id_int = int(str(raw_id).strip())
-    except Exception: id_int = None
-    return id_int, mensaje
+validador_ug = ValidadorUG(UG_AUTH_URL, REQUEST_TIMEOUT)
+
+def respuesta_auth_ug(usuario_in, ug_payload, user_row=None):
+    """
+    (cuerpo, status) de /auth/ug a partir de la respuesta de la UG; user_row solo hace falta
+    cuando la UG aceptó las credenciales (ver debe_buscar_usuario). Compartido con asgi.py.
+    """
+    ug_id, ug_msg = interpretar_respuesta(ug_payload)
+    if ug_id == 0:
+        return {"ok": False, "ug": {"id": 0, "mensaje": ug_msg or "CREDENCIALES ERRADAS"}}, 401
+    if ug_id == 1:
+        if user_row:
+            cuerpo = {"ok": True, "registrado": True, "usuario": {"id": user_row["id"], "usuario": user_row["usuario"], "rol": user_row["rol"], "activo": bool(user_row["activo"])}}
+            if user_row["activo"]:
+                cuerpo["sesion"] = sesiones.emitir(user_row)
+            return cuerpo, 200
+        return {"ok": True, "registrado": False, "usuario": usuario_in, "mensaje": "Usuario válido en UG pero no registrado localmente"}, 200
+    return {"ok": False, "ug": ug_payload, "mensaje": "Respuesta de UG sin 'id' válido"}, 502
+
+def debe_buscar_usuario(ug_payload):
+    return interpretar_respuesta(ug_payload)[0] == 1
+
+def error_auth_ug(e):
+    """(cuerpo, status, headers) cuando no se pudo consultar a la UG."""
+    if isinstance(e, CircuitoAbiertoError):
+        return ({"error": "La API de la UG no está disponible, intente en unos segundos"}, 503,
+                {"Retry-After": str(int(e.reintentar_en) + 1)})
+    if isinstance(e, LimiteHostError):
+        return {"error": "Servidor ocupado validando otros ingresos, intente en unos segundos"}, 503, {"Retry-After": "1"}
+    return {"error": "No se pudo contactar con la API de la UG", "detalle": str(e)}, 502, {}
 
 @app.post("/auth/ug")
 def proxy_auth():
@@ -230,24 +784,61 @@ def proxy_auth():
     if not usuario_in or not clave:
         return jsonify({"id": 0, "mensaje": "Usuario/clave vacíos"}), 400
     try:
-        resp = requests.post(UG_AUTH_URL, data={"usuario": usuario_in, "clave": clave}, headers={"User-Agent": "Mozilla/5.0"}, timeout=REQUEST_TIMEOUT)
-        try: ug_payload = resp.json()
-        except: ug_payload = {"status": resp.status_code, "text": resp.text}
-        ug_id, ug_msg = _parse_ug_result(ug_payload)
-        if ug_id == 0:
-            return jsonify({"ok": False, "ug": {"id": 0, "mensaje": ug_msg or "CREDENCIALES ERRADAS"}}), 401
-        if ug_id == 1:
-            user_row = obtener_usuario_por_usuario(usuario_in)
-            if user_row:
-                return jsonify({"ok": True, "registrado": True, "usuario": {"id": user_row["id"], "usuario": user_row["usuario"], "rol": user_row["rol"], "activo": bool(user_row["activo"])}}), 200
-            return jsonify({"ok": True, "registrado": False, "usuario": usuario_in, "mensaje": "Usuario válido en UG pero no registrado localmente"}), 200
-        return jsonify({"ok": False, "ug": ug_payload, "mensaje": "Respuesta de UG sin 'id' válido"}), 502
-    except requests.RequestException as e:
-        return jsonify({"error": "No se pudo contactar con la API de la UG", "detalle": str(e)}), 502
+        ug_payload = validador_ug.validar(usuario_in, clave)
+    except (CircuitoAbiertoError, LimiteHostError, requests.RequestException) as e:
+        cuerpo, status, headers = error_auth_ug(e)
+        return jsonify(cuerpo), status, headers
+    user_row = obtener_usuario_por_usuario(usuario_in) if debe_buscar_usuario(ug_payload) else None
+    cuerpo, status = respuesta_auth_ug(usuario_in, ug_payload, user_row)
+    return jsonify(cuerpo), status
 
-# ======================= USUARIOS (LISTAR / GET) ===========================
-TABLE_USUARIOS = "[Usuarios]"
+# ======================= SESIONES (tokens firmados, ver sesiones.py) ===========================
+def sesion_actual():
+    """
+    Datos del token Bearer de la petición ({'id', 'rol', 'activo', ...}) o None si no vino.
+    No consulta la BD: la lista de revocaciones está en la cache hasta que cambie.
+    Lanza sesiones.SesionInvalida si el token no sirve.
+    """
+    token = sesiones.token_de(request.headers.get("Authorization"))
+    if token is None:
+        return None
+    return sesiones.verificar(token, listar_revocaciones())
+
+@app.get("/auth/sesion")
+def api_sesion():
+    try:
+        sesion = sesion_actual()
+    except sesiones.SesionInvalida as e:
+        return jsonify({"error": str(e)}), 401
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if sesion is None:
+        return jsonify({"error": "Falta el token de sesión"}), 401
+    return jsonify({"data": sesion}), 200
 
+@app.post("/auth/renovar")
+def api_renovar_sesion():
+    """
+    Token nuevo con el rol y estado actuales del usuario (aquí sí se lee la BD). Acepta tokens
+    revocados o vencidos hace menos de SESION_RENOVACION: así un cambio de rol se aplica sin
+    volver a pedir la clave, y un usuario desactivado recibe 401.
+    """
+    token = sesiones.token_de(request.headers.get("Authorization"))
+    if token is None:
+        return jsonify({"error": "Falta el token de sesión"}), 401
+    try:
+        datos = sesiones.verificar(token, vencido_hasta=sesiones.SESION_RENOVACION)
+        row = obtener_usuario_por_id(datos["id"])
+    except sesiones.SesionInvalida as e:
+        return jsonify({"error": str(e)}), 401
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if not row or not bool(row["activo"]):
+        return jsonify({"error": "Usuario inactivo o no registrado"}), 401
+    usuario = {"id": row["id"], "usuario": row["usuario"], "rol": row["rol"], "activo": bool(row["activo"])}
+    return jsonify({"sesion": sesiones.emitir(row), "usuario": usuario}), 200
+
+# ======================= USUARIOS (LISTAR / GET) ===========================
 def _parse_bool_param(v):
     if v is None: return None
     s = str(v).strip().lower()
@@ -255,9 +846,25 @@ def _parse_bool_param(v):
     if s in ("0","false","f","no","n"): return False
     return None
 
+def _codificar_cursor(cursor):
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode("utf-8")).decode("ascii").rstrip("=")
+
+def _leer_cursor(texto):
+    """(valor, id) del cursor opaco de /usuarios; ValueError si no es válido."""
+    try:
+        valor, ultimo_id = json.loads(base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4)))
+        return valor, int(ultimo_id)
+    except Exception:
+        raise ValueError("cursor inválido")
+
 @app.get("/usuarios")
 def api_listar_usuarios():
-    cur = None; cn = None
+    """
+    ?cursor= (next_cursor de la respuesta anterior) pagina por keyset; ?page= sigue funcionando.
+    ?match=contiene|prefijo|exacto para q. Por defecto contiene, como siempre buscó el panel;
+    prefijo y exacto usan el índice y sirven a quien sabe cómo empieza el usuario.
+    ?total=exacto|aprox|no: el total se cachea hasta el próximo cambio de usuarios.
+    """
     try:
         q = (request.args.get("q") or "").strip()
         rol = (request.args.get("rol") or "").strip().lower()
@@ -266,47 +873,60 @@ def api_listar_usuarios():
         limit = max(1, min(200, int(request.args.get("limit", 20))))
         sort_by  = (request.args.get("sort_by") or "id").strip().lower()
         sort_dir = (request.args.get("sort_dir") or "desc").strip().lower()
-        allowed_sort = {"id":"[Id]","usuario":"[Usuario]","rol":"[Rol]","activo":"[Estado]"}
-        sort_col = allowed_sort.get(sort_by,"[Id]")
-        sort_dir = "ASC" if sort_dir=="asc" else "DESC"
-        where = []; params=[]
-        if q: where.append("[Usuario] LIKE ?"); params.append(f"%{q}%")
-        if rol in ("admin","usuario"): where.append("[Rol]=?"); params.append(rol)
-        if activo_q is not None: where.append("[Estado]=?"); params.append(1 if activo_q else 0)
-        where_sql = ("WHERE " + " AND ".join(where)) if where else ""
-        cn = conectar(); cur = cn.cursor()
-        count_sql = f"SELECT COUNT(*) FROM {TABLE_USUARIOS} {where_sql}"
-        cur.execute(count_sql, params); total=int(cur.fetchone()[0])
-        offset = page*limit
-        list_sql = f"SELECT [Id],[Usuario],[Rol],[Estado] FROM {TABLE_USUARIOS} {where_sql} ORDER BY {sort_col} {sort_dir} OFFSET ? ROWS FETCH NEXT ? ROWS ONLY"
-        cur.execute(list_sql, params+[offset,limit])
-        rows = cur.fetchall()
-        data = [{"id":int(r[0]),"usuario":str(r[1]).strip(),"rol":str(r[2]).strip().lower(),"activo":bool(r[3])} for r in rows]
-        cur.close(); cn.close()
-        total_pages = (total+limit-1)//limit
-        return jsonify({"data":data,"page":page,"limit":limit,"total":total,"total_pages":total_pages,"sort_by":sort_by,"sort_dir":sort_dir}), 200
+        sort_by = sort_by if sort_by in ("id","usuario","rol","activo") else "id"
+        sort_dir = "asc" if sort_dir=="asc" else "desc"
+        match = (request.args.get("match") or "contiene").strip().lower()
+        match = match if match in COINCIDENCIAS else "contiene"
+        modo_total = (request.args.get("total") or "exacto").strip().lower()
+        cursor = _leer_cursor(request.args["cursor"]) if request.args.get("cursor") else None
+    except ValueError as e:
+        return jsonify({"error": f"Parámetros inválidos: {e}"}), 400
+    try:
+        rol = rol if rol in ("admin","usuario") else None
+        data, siguiente = listar_usuarios(q, rol, activo_q, sort_by, sort_dir, limit, cursor, page, match)
+        data = [{"id":u["id"],"usuario":str(u["usuario"]).strip(),"rol":str(u["rol"]).strip().lower(),"activo":u["activo"]} for u in data]
+        cuerpo = {"data":data,"page":page,"limit":limit,"sort_by":sort_by,"sort_dir":sort_dir,
+                  "next_cursor": _codificar_cursor(siguiente) if siguiente else None}
+        if modo_total != "no":
+            total = contar_usuarios(q, rol, activo_q, match, modo_total == "aprox")
+            cuerpo.update({"total": total, "total_pages": (total+limit-1)//limit, "total_aprox": modo_total == "aprox"})
+        return jsonify(cuerpo), 200
     except Exception as e:
-        try: cur.close(); cn.close()
-        except: pass
         return jsonify({"error": f"No se pudo listar usuarios: {e}"}), 500
 
 @app.get("/usuarios/<int:user_id>")
 def api_obtener_usuario(user_id: int):
-    cur=None; cn=None
     try:
-        cn = conectar(); cur=cn.cursor()
-        cur.execute(f"SELECT [Id],[Usuario],[Rol],[Estado] FROM {TABLE_USUARIOS} WHERE [Id]=?", (user_id,))
-        r = cur.fetchone()
-        cur.close(); cn.close()
+        r = obtener_usuario_por_id(user_id)
         if not r: return jsonify({"error":"Usuario no encontrado"}), 404
-        return jsonify({"data":{"id":int(r[0]),"usuario":str(r[1]).strip(),"rol":str(r[2]).strip().lower(),"activo":bool(r[3])}}), 200
+        return jsonify({"data":{"id":r["id"],"usuario":str(r["usuario"]).strip(),"rol":str(r["rol"]).strip().lower(),"activo":r["activo"]}}), 200
     except Exception as e:
-        try: cur.close(); cn.close()
-        except: pass
         return jsonify({"error": f"No se pudo obtener usuario: {e}"}), 500
 
+@app.get("/cache/stats")
+def cache_stats():
+    return jsonify(obtener_cache().estadisticas()), 200
+
+@app.get("/upstreams/stats")
+def upstreams_stats():
+    return jsonify({"http": obtener_cliente().metricas(), "ug": validador_ug.metricas(),
+                    "token_graph": token_graph.metricas()}), 200
+
 @app.post("/admin/link")
 def admin_link():
+    try:
+        sesion = sesion_actual()
+    except sesiones.SesionInvalida as e:
+        return jsonify({"error": str(e)}), 401
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if sesion is not None:
+        # Con token firmado el rol se toma del token, sin consultar la BD
+        if sesion["rol"] != "admin" or not sesion["activo"]:
+            return jsonify({"error":"forbidden"}), 403
+        return jsonify({"url": f"/Modules/panel-admin.html"})
+
+    # Sesiones sin token (iniciadas antes de los tokens): por nombre de usuario, como antes
     data = request.get_json(silent=True) or {}
     username = (data.get("usuario") or "").strip()
     if not username:
@@ -316,8 +936,91 @@ def admin_link():
         return jsonify({"error":"forbidden"}), 403
     return jsonify({"url": f"/Modules/panel-admin.html"})
 
+# ======================= MÉTRICAS Y TRAZAS ===========================
+METRICAS_LENTO = float(os.getenv("METRICAS_LENTO", "2"))   # segundos: se registra en el log
+READY_TIMEOUT = float(os.getenv("READY_TIMEOUT", "2"))
+INICIO_PROCESO = time.time()
+
+def _fuente_upstreams():
+    series = []
+    for servicio, datos in obtener_cliente().metricas().items():
+        series.append(("facaf_upstream_duracion_segundos", {"servicio": servicio}, datos["latencia"]))
+        series.append(("facaf_upstream_errores_total", {"servicio": servicio}, datos["errores"]))
+        series.append(("facaf_upstream_rechazadas_total", {"servicio": servicio}, datos["rechazadas"]))
+        series.append(("facaf_upstream_en_curso", {"servicio": servicio}, datos["en_curso"]))
+    return series
+
+def _fuente_pool():
+    pool = metricas_pool()
+    return [("facaf_bd_pool_conexiones", {"estado": "libres"}, pool["libres"]),
+            ("facaf_bd_pool_conexiones", {"estado": "prestadas"}, pool["prestadas"])]
+
+metricas.registrar_fuente(_fuente_upstreams)
+metricas.registrar_fuente(_fuente_pool)
+
+def terminar_peticion(peticion, metodo, ruta, status, request_id):
+    """Cierra la medición y deja en el log las peticiones lentas (compartido con asgi.py)."""
+    duracion = peticion.terminar(status)
+    if duracion >= METRICAS_LENTO:
+        print(f"🐢 {metodo} {ruta} -> {status} en {duracion:.2f}s (request-id {request_id})")
+
+@app.before_request
+def _iniciar_traza():
+    # La ruta es la plantilla de Flask (/download/<int:archivo_id>), no la URL: cardinalidad acotada
+    ruta = request.url_rule.rule if request.url_rule else "sin_ruta"
+    g.request_id = (request.headers.get("X-Request-Id") or secrets.token_hex(8))[:64]
+    g.peticion = metricas.Peticion(ruta, request.method)
+
+@app.after_request
+def _cerrar_traza(resp):
+    resp.headers["X-Request-Id"] = g.request_id
+    peticion, g.peticion = g.peticion, None
+    ruta, metodo, status, request_id = peticion.ruta, request.method, resp.status_code, g.request_id
+    terminar = lambda: terminar_peticion(peticion, metodo, ruta, status, request_id)
+    if not resp.direct_passthrough:
+        resp.call_on_close(terminar)
+    elif isinstance(resp.response, request.environ.get("wsgi.file_wrapper", ())):
+        # wsgi.file_wrapper (sendfile) debe llegar intacto al servidor: se mide hasta aquí
+        terminar()
+    else:
+        # Con direct_passthrough Flask entrega el iterable tal cual y nunca llama a resp.close():
+        # en las descargas por streaming se mide hasta que el servidor cierra el cuerpo
+        resp.response = ClosingIterator(resp.response, terminar)
+    return resp
+
+@app.teardown_request
+def _traza_con_error(exc):
+    peticion = g.pop("peticion", None)
+    if peticion is not None:  # no pasó por after_request (excepción no manejada)
+        terminar_peticion(peticion, request.method, peticion.ruta, 500, g.get("request_id"))
+
+@app.get("/metrics")
+def metrics():
+    return Response(metricas.registro.exportar(), mimetype="text/plain; version=0.0.4")
+
+@app.get("/health")
+def health():
+    """Vida del proceso, sin tocar la BD (lo consulta panel-admin.js)."""
+    return jsonify({"status": "ok", "pid": os.getpid(), "uptime_seg": round(time.time() - INICIO_PROCESO, 1)}), 200
+
+@app.get("/ready")
+def ready():
+    """Listo para recibir tráfico: la BD responde a un SELECT 1 con una conexión del pool."""
+    inicio = time.perf_counter()
+    try:
+        verificar_conexion(READY_TIMEOUT)
+    except Exception as e:
+        return jsonify({"status": "no_listo", "bd": str(e)}), 503
+    return jsonify({"status": "ok", "bd_ms": round((time.perf_counter() - inicio) * 1000, 1),
+                    "pool": metricas_pool()}), 200
+
 # ======================= MAIN ===========================
 if __name__ == '__main__':
+    # En desarrollo (python app.py) se sigue inicializando la BD al arrancar
+    from database import inicializar_base_datos
+    if not inicializar_base_datos():
+        print("❌ ADVERTENCIA: Problemas en inicialización de BD. Algunas funciones pueden fallar.")
+    motor_correo.iniciar()
     port = int(os.getenv("PORT","5000"))
     debug = os.getenv("FLASK_DEBUG","1")=="1"
     app.run(host='0.0.0.0', port=port, debug=debug)
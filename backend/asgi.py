@@ -0,0 +1,164 @@
+import asyncio
+import functools
+import os
+import secrets
+
+import requests
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+from app import (app as app_flask, validador_ug, motor_correo, obtener_usuario_por_usuario,
+                 respuesta_auth_ug, debe_buscar_usuario, error_auth_ug, leer_envio, terminar_peticion)
+import eventos
+import metricas
+from http_saliente import LimiteHostError
+from ug import CircuitoAbiertoError
+
+# ======================= MODO ASGI =======================
+# /auth/ug y /send-email pasan casi todo su tiempo esperando a la UG o a Graph. Con gunicorn
+# síncrono cada una de esas esperas ocupa un worker entero; aquí se atienden con async (httpx),
+# así un proceso mantiene cientos de logins/envíos en curso a la vez. Las demás rutas siguen
+# siendo las de Flask (app.py), ejecutadas en un pool de hilos. Rutas y JSON son los mismos.
+# /events (SSE) también es nativa: cada navegador conectado es una corrutina esperando su cola.
+#
+#   gunicorn -k uvicorn.workers.UvicornWorker asgi:app --bind 0.0.0.0:5000 --workers=4
+#   (o SERVIDOR=asgi en el contenedor, ver Dockerfile)
+ASGI_HILOS_FLASK = int(os.getenv("ASGI_HILOS_FLASK", "16"))  # hilos para las rutas de Flask
+
+
+def _medido(ruta):
+    """Mismas métricas y X-Request-Id que las rutas de Flask (ver _iniciar_traza en app.py)."""
+    def decorador(endpoint):
+        @functools.wraps(endpoint)
+        async def envoltura(request):
+            request_id = (request.headers.get("x-request-id") or secrets.token_hex(8))[:64]
+            peticion = metricas.Peticion(ruta, request.method)
+            status = 500
+            try:
+                resp = await endpoint(request)
+                resp.headers["X-Request-Id"] = request_id
+                status = resp.status_code
+                return resp
+            finally:
+                terminar_peticion(peticion, request.method, ruta, status, request_id)
+        return envoltura
+    return decorador
+
+
+async def _cuerpo_formulario(request):
+    """(form, json) como request.form / request.get_json(silent=True) de Flask."""
+    tipo = request.headers.get("content-type", "")
+    if tipo.startswith("application/json"):
+        try:
+            datos = await request.json()
+        except ValueError:
+            datos = None
+        return {}, datos if isinstance(datos, dict) else {}
+    if tipo.startswith(("application/x-www-form-urlencoded", "multipart/form-data")):
+        return await request.form(), {}
+    return {}, {}
+
+
+@_medido("/auth/ug")
+async def proxy_auth(request):
+    form, data_json = await _cuerpo_formulario(request)
+    usuario_in = (form.get('usuario') or data_json.get("usuario") or "").strip()
+    clave = (form.get('clave') or data_json.get("clave") or "").strip()
+    if not usuario_in or not clave:
+        return JSONResponse({"id": 0, "mensaje": "Usuario/clave vacíos"}, 400)
+    try:
+        ug_payload = await validador_ug.validar_async(usuario_in, clave)
+    except (CircuitoAbiertoError, LimiteHostError, requests.RequestException) as e:
+        cuerpo, status, headers = error_auth_ug(e)
+        return JSONResponse(cuerpo, status, headers=headers)
+    user_row = None
+    if debe_buscar_usuario(ug_payload):
+        # pyodbc bloquea: la consulta va a un hilo para no detener el event loop
+        user_row = await asyncio.to_thread(obtener_usuario_por_usuario, usuario_in)
+    cuerpo, status = respuesta_auth_ug(usuario_in, ug_payload, user_row)
+    return JSONResponse(cuerpo, status)
+
+
+@_medido("/send-email")
+async def send_email(request):
+    _, data = await _cuerpo_formulario(request)
+    envio, error = leer_envio(data)
+    if error:
+        return JSONResponse({"error": error}, 400)
+    try:
+        await motor_correo.enviar_async(*envio)
+        return JSONResponse({"message": "Correo enviado correctamente"}, 200)
+    except LimiteHostError:
+        return JSONResponse({"error": "Servidor ocupado enviando otros correos, intente en unos segundos"}, 503,
+                            headers={"Retry-After": "1"})
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, 500)
+
+
+# Sin _medido: una conexión dura hasta una hora y distorsionaría la latencia de las rutas
+# (se mide con facaf_eventos_conexiones)
+async def eventos_sse(request):
+    desde = eventos.id_cliente(request.headers.get("last-event-id"), request.query_params.get("desde"))
+    difusor = eventos.difusor()
+    if not difusor.hay_lugar():
+        return JSONResponse({"error": f"Máximo {eventos.EVENTOS_MAX_CONEXIONES} conexiones a /events por worker"},
+                            503, headers={"Retry-After": "60"})
+    loop = asyncio.get_running_loop()
+
+    # La suscripción se hace dentro del generador: si la respuesta nunca llega a enviarse
+    # (cliente que se fue antes, error al arrancar el stream) no queda un suscriptor colgado
+    async def flujo():
+        cola = asyncio.Queue(eventos.EVENTOS_COLA)
+
+        def poner(evento):
+            if cola.full():
+                # No está leyendo: se corta y al reconectar recupera lo perdido con Last-Event-ID
+                while not cola.empty():
+                    cola.get_nowait()
+                cola.put_nowait(None)
+                suscripcion.cerrar()
+            else:
+                cola.put_nowait(evento)
+
+        try:
+            # Primero la suscripción y después el diario: lo que llegue entre ambos se filtra por id
+            suscripcion = difusor.suscribir(lambda evento: loop.call_soon_threadsafe(poner, evento))
+        except eventos.LimiteConexiones:
+            # Se llenó entre la verificación y el primer byte: el navegador reintenta en un minuto
+            yield "retry: 60000\n\n"
+            return
+        try:
+            texto, ultimo = await asyncio.to_thread(eventos.apertura, desde, eventos.EVENTOS_REINTENTO_MS)
+            yield texto
+            fin = loop.time() + eventos.EVENTOS_DURACION_MAX
+            while loop.time() < fin:
+                try:
+                    evento = await asyncio.wait_for(cola.get(), eventos.EVENTOS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"  # mantiene viva la conexión en proxies y balanceadores
+                    continue
+                if evento is None:
+                    break
+                if evento["id"] > ultimo:
+                    ultimo = evento["id"]
+                    yield eventos.formatear(evento)
+        finally:
+            suscripcion.cerrar()
+
+    return StreamingResponse(flujo(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+app = Starlette(
+    routes=[
+        Route("/auth/ug", proxy_auth, methods=["POST"]),
+        Route("/send-email", send_email, methods=["POST"]),
+        Route("/events", eventos_sse, methods=["GET"]),
+        Mount("/", app=WSGIMiddleware(app_flask, workers=ASGI_HILOS_FLASK)),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+)
@@ -0,0 +1,2 @@
+# Benchmark del backend con sustitutos locales (SQLite o SQL Server local, UG y Graph falsos).
+# Uso: cd backend && python -m benchmark --help  (ver benchmark/__main__.py)
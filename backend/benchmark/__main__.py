@@ -0,0 +1,143 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+from benchmark.entorno import Entorno
+from benchmark.escenarios import ESCENARIOS, ejecutar
+
+# ======================= BENCHMARK DEL BACKEND =======================
+#   cd backend && python -m benchmark                      # todos los escenarios, SQLite
+#   python -m benchmark login sync --acciones 200          # solo algunos
+#   python -m benchmark --modo asgi --salida nuevo.json --base anterior.json
+#   python -m benchmark --bd sqlserver                     # DB_* del entorno (docker-compose up db)
+# Sale con código 1 si algún escenario supera benchmark/umbrales.json o empeora más de
+# --tolerancia respecto a --base, así se puede usar como control de regresiones.
+UMBRALES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "umbrales.json")
+
+# (acciones, concurrencia) por escenario; --acciones/--concurrencia los reemplazan
+CARGA = {
+    "login": (600, 60),
+    "sync": (40, 10),
+    "correo": (300, 30),
+    "correo_masivo": (6, 3),
+    "usuarios": (120, 20),
+}
+
+
+def _comparar(nombre, resumen, umbrales, base, tolerancia):
+    """Lista de fallas (texto) del escenario contra los umbrales absolutos y la corrida base."""
+    fallas = []
+    limites = umbrales.get(nombre, {})
+    for clave in ("p95_ms", "p99_ms"):
+        if clave in limites and resumen[clave] > limites[clave]:
+            fallas.append(f"{clave} {resumen[clave]} > {limites[clave]}")
+    if "rps_min" in limites and resumen["rps"] < limites["rps_min"]:
+        fallas.append(f"rps {resumen['rps']} < {limites['rps_min']}")
+    if "rss_mb_max" in limites and resumen["rss_mb"] > limites["rss_mb_max"]:
+        fallas.append(f"rss_mb {resumen['rss_mb']} > {limites['rss_mb_max']}")
+    if resumen["errores"] > limites.get("errores_max", 0):
+        fallas.append(f"errores {resumen['errores']} > {limites.get('errores_max', 0)}")
+
+    anterior = (base or {}).get(nombre)
+    if anterior:
+        for clave in ("p95_ms", "p99_ms", "rss_mb"):
+            if anterior.get(clave) and resumen[clave] > anterior[clave] * (1 + tolerancia):
+                fallas.append(f"{clave} {resumen[clave]} empeoró vs base {anterior[clave]}")
+        if anterior.get("rps") and resumen["rps"] < anterior["rps"] * (1 - tolerancia):
+            fallas.append(f"rps {resumen['rps']} empeoró vs base {anterior['rps']}")
+    return fallas
+
+
+def _imprimir(resultados):
+    columnas = ("peticiones", "errores", "rps", "p50_ms", "p95_ms", "p99_ms", "max_ms", "rss_mb")
+    print()
+    print(f"{'escenario':<15}" + "".join(f"{c:>11}" for c in columnas))
+    for nombre, resumen in resultados.items():
+        print(f"{nombre:<15}" + "".join(f"{resumen[c]:>11}" for c in columnas))
+    print()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmark", description="Benchmark del backend FACAF")
+    parser.add_argument("escenarios", nargs="*", help=f"escenarios a correr: {', '.join(ESCENARIOS)} (por defecto todos)")
+    parser.add_argument("--acciones", type=int, help="acciones por escenario")
+    parser.add_argument("--concurrencia", type=int, help="clientes simultáneos")
+    parser.add_argument("--bd", choices=("sqlite", "sqlserver"), default="sqlite")
+    parser.add_argument("--modo", choices=("wsgi", "asgi"), default="wsgi")
+    parser.add_argument("--servidor", choices=("auto", "gunicorn", "simple"), default="auto")
+    parser.add_argument("--workers", type=int, default=4, help="workers de gunicorn (como el Dockerfile)")
+    parser.add_argument("--usuarios", type=int, default=5000, help="usuarios sembrados")
+    parser.add_argument("--latencia-ug", type=float, default=0.05, help="segundos por respuesta de la UG falsa")
+    parser.add_argument("--latencia-graph", type=float, default=0.08, help="segundos por respuesta de Graph falso")
+    parser.add_argument("--umbrales", default=UMBRALES, help="JSON con límites por escenario ('' para omitir)")
+    parser.add_argument("--base", help="JSON de una corrida anterior (--salida) para detectar regresiones")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="empeoramiento admitido vs --base (0.2 = 20%%)")
+    parser.add_argument("--salida", help="guardar los resultados en este JSON")
+    args = parser.parse_args(argv)
+
+    nombres = args.escenarios or list(ESCENARIOS)
+    desconocidos = [n for n in nombres if n not in ESCENARIOS]
+    if desconocidos:
+        parser.error(f"escenarios desconocidos: {', '.join(desconocidos)}")
+    umbrales = {}
+    if args.umbrales:
+        with open(args.umbrales, "r", encoding="utf-8") as f:
+            umbrales = json.load(f)
+    base = None
+    if args.base:
+        with open(args.base, "r", encoding="utf-8") as f:
+            base = json.load(f).get("escenarios", {})
+
+    resultados = {}
+    with Entorno(bd=args.bd, modo=args.modo, servidor=args.servidor, workers=args.workers,
+                 usuarios=args.usuarios, latencia_ug=args.latencia_ug,
+                 latencia_graph=args.latencia_graph) as entorno:
+        rss_inicial = entorno.rss()
+        print(f"✅ Backend listo en {entorno.base} (RSS {rss_inicial / 1e6:.1f} MB)")
+        for nombre in nombres:
+            acciones, concurrencia = CARGA[nombre]
+            acciones = args.acciones or acciones
+            concurrencia = args.concurrencia or concurrencia
+            print(f"⏱️  {nombre}: {acciones} acciones, {concurrencia} clientes...")
+            resultado = ejecutar(nombre, entorno.base, acciones, concurrencia, args.usuarios, entorno.muestreador())
+            resultados[nombre] = resultado.resumen()
+        servidor = entorno.servidor
+
+    _imprimir(resultados)
+
+    fallas = {}
+    for nombre, resumen in resultados.items():
+        problemas = _comparar(nombre, resumen, umbrales, base, args.tolerancia)
+        if problemas:
+            fallas[nombre] = problemas
+        if resumen["detalle_errores"]:
+            print(f"⚠️ {nombre}: errores {resumen['detalle_errores']}")
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump({
+                "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "config": {"bd": args.bd, "modo": args.modo, "servidor": servidor, "workers": args.workers,
+                           "usuarios": args.usuarios, "latencia_ug": args.latencia_ug,
+                           "latencia_graph": args.latencia_graph, "python": platform.python_version(),
+                           "cpus": os.cpu_count()},
+                "rss_inicial_mb": round(rss_inicial / 1e6, 1),
+                "escenarios": resultados,
+                "fallas": fallas,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"💾 Resultados en {args.salida}")
+
+    if fallas:
+        for nombre, problemas in fallas.items():
+            for problema in problemas:
+                print(f"❌ {nombre}: {problema}")
+        return 1
+    print("✅ Todos los escenarios dentro de los umbrales")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
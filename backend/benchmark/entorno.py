@@ -0,0 +1,262 @@
+import hashlib
+import importlib.util
+import os
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+from benchmark.sqlite_odbc import preparar_esquema
+
+# ======================= ENTORNO DEL BENCHMARK =======================
+# Levanta, en procesos aparte: UG/Graph falsos, la BD sembrada (SQLite o un SQL Server local)
+# y el backend (gunicorn como en el Dockerfile si está instalado; si no, werkzeug/uvicorn).
+# Mide además el RSS del backend sumando el proceso principal y sus workers.
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UPLOADS_DIR = os.path.join(BACKEND_DIR, "uploads")
+TIPO_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+ESPERA_ARRANQUE = 60  # segundos
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def archivos_subidos():
+    return sorted(os.path.join(UPLOADS_DIR, n) for n in os.listdir(UPLOADS_DIR) if not n.startswith("."))
+
+
+def usuario_bench(i):
+    return f"bench{i:05d}@ug.edu.ec"
+
+
+def _usuarios(total):
+    # Un admin cada 500 y un inactivo cada 50, para que los filtros de /usuarios tengan qué filtrar
+    for i in range(total):
+        yield usuario_bench(i), 0 if i % 50 == 49 else 1, "admin" if i % 500 == 0 else "usuario"
+
+
+# ----------------------- SEMBRADO -----------------------
+def sembrar_sqlite(ruta, total_usuarios):
+    preparar_esquema(ruta)
+    con = sqlite3.connect(ruta)
+    try:
+        for version, ruta_archivo in enumerate(archivos_subidos(), start=1):
+            with open(ruta_archivo, "rb") as f:
+                datos = f.read()
+            con.execute("""
+                INSERT INTO ArchivosExcel (NombreArchivo, TipoMime, Datos, FechaSubida, HashSha256, Tamano, Version)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (os.path.basename(ruta_archivo), TIPO_XLSX, datos, datetime.now(),
+                  hashlib.sha256(datos).hexdigest(), len(datos), version))
+        con.executemany("INSERT INTO Usuarios (Usuario, Estado, Rol) VALUES (?, ?, ?)", _usuarios(total_usuarios))
+        con.commit()
+    finally:
+        con.close()
+
+
+def sembrar_sqlserver(total_usuarios):
+    """Con el pyodbc real y DB_* del entorno: crea/migra la BD y carga archivos y usuarios (idempotente)."""
+    import database
+    if not database.inicializar_base_datos():
+        raise RuntimeError("No se pudo inicializar la base de datos SQL Server")
+    for ruta_archivo in archivos_subidos():
+        database.guardar_archivo_desde_ruta(os.path.basename(ruta_archivo), TIPO_XLSX, ruta_archivo)
+    conn = database.conectar()
+    try:
+        cur = conn.cursor()
+        cur.executemany("""
+            IF NOT EXISTS (SELECT 1 FROM Usuarios WHERE UsuarioNorm = LOWER(?))
+            INSERT INTO Usuarios (Usuario, Estado, Rol) VALUES (?, ?, ?)
+        """, [(u, u, e, r) for u, e, r in _usuarios(total_usuarios)])
+        conn.commit()
+    finally:
+        try:
+            cur.close()
+        except:
+            pass
+        conn.close()
+
+
+# ----------------------- RSS -----------------------
+def _hijos(pid):
+    hijos = []
+    for nombre in os.listdir("/proc"):
+        if not nombre.isdigit():
+            continue
+        try:
+            with open(f"/proc/{nombre}/stat", "r") as f:
+                # el 4.º campo (después del nombre entre paréntesis) es el ppid
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        if ppid == pid:
+            hijos.append(int(nombre))
+    return hijos
+
+
+def rss_bytes(pid):
+    """RSS del proceso y todos sus descendientes (gunicorn master + workers)."""
+    total, pendientes = 0, [pid]
+    while pendientes:
+        actual = pendientes.pop()
+        try:
+            with open(f"/proc/{actual}/status", "r") as f:
+                for linea in f:
+                    if linea.startswith("VmRSS:"):
+                        total += int(linea.split()[1]) * 1024
+                        break
+        except OSError:
+            continue
+        pendientes += _hijos(actual)
+    return total
+
+
+class MuestreadorRSS:
+    """Pico de RSS mientras corre un escenario (muestrea cada `intervalo` s en un hilo)."""
+
+    def __init__(self, pid, intervalo=0.2):
+        self.pid = pid
+        self.intervalo = intervalo
+        self.pico = 0
+        self._parar = threading.Event()
+        self._hilo = None
+
+    def __enter__(self):
+        self.pico = rss_bytes(self.pid)
+        self._parar.clear()
+        self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+        self._hilo.start()
+        return self
+
+    def _muestrear(self):
+        while not self._parar.wait(self.intervalo):
+            self.pico = max(self.pico, rss_bytes(self.pid))
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        self._hilo.join()
+        self.pico = max(self.pico, rss_bytes(self.pid))
+
+
+# ----------------------- PROCESOS -----------------------
+class Entorno:
+    """
+    with Entorno(...) as entorno: entorno.base es la URL del backend listo para recibir carga.
+    bd: 'sqlite' (por defecto) o 'sqlserver' (DB_* del entorno, p. ej. docker-compose up db).
+    servidor: 'auto' (gunicorn si está instalado), 'gunicorn' o 'simple' (werkzeug/uvicorn).
+    """
+
+    def __init__(self, bd="sqlite", modo="wsgi", servidor="auto", workers=4, usuarios=5000,
+                 latencia_ug=0.05, latencia_graph=0.08):
+        if servidor == "auto":
+            servidor = "gunicorn" if importlib.util.find_spec("gunicorn") else "simple"
+        self.bd = bd
+        self.modo = modo
+        self.servidor = servidor
+        self.workers = workers
+        self.usuarios = usuarios
+        self.latencia_ug = latencia_ug
+        self.latencia_graph = latencia_graph
+        self.base = None
+        self.proceso = None
+        self._falsos = None
+        self._dir = None
+        self._log = None
+
+    def __enter__(self):
+        self._dir = tempfile.mkdtemp(prefix="facaf-bench-")
+        try:
+            self._iniciar()
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def _iniciar(self):
+        puerto_ug, puerto_graph, puerto = _puerto_libre(), _puerto_libre(), _puerto_libre()
+        self._falsos = subprocess.Popen(
+            [sys.executable, "-m", "benchmark.falsos", "--ug", str(puerto_ug), "--graph", str(puerto_graph),
+             "--latencia-ug", str(self.latencia_ug), "--latencia-graph", str(self.latencia_graph)],
+            cwd=BACKEND_DIR, stdout=subprocess.PIPE, text=True,
+        )
+        if self._falsos.stdout.readline().strip() != "listo":
+            raise RuntimeError("No arrancaron los servidores UG/Graph falsos")
+
+        env = dict(os.environ)
+        env.update({
+            "BENCH_BD": self.bd,
+            "BENCH_UG_URL": f"http://127.0.0.1:{puerto_ug}/ug",
+            "BENCH_GRAPH_URL": f"http://127.0.0.1:{puerto_graph}",
+            "METRICAS_DIR": os.path.join(self._dir, "metricas"),
+            "UPLOAD_TMP_DIR": os.path.join(self._dir, "subidas"),
+            "PYTHONUNBUFFERED": "1",
+        })
+        print(f"🌱 Sembrando BD {self.bd} ({len(archivos_subidos())} archivos, {self.usuarios} usuarios)...")
+        if self.bd == "sqlite":
+            env["BENCH_SQLITE_DB"] = os.path.join(self._dir, "bench.db")
+            sembrar_sqlite(env["BENCH_SQLITE_DB"], self.usuarios)
+        else:
+            sembrar_sqlserver(self.usuarios)
+
+        if self.servidor == "gunicorn":
+            objetivo = "benchmark.servidor:asgi_app" if self.modo == "asgi" else "benchmark.servidor:app"
+            comando = [sys.executable, "-m", "gunicorn", objetivo, "--bind", f"127.0.0.1:{puerto}",
+                       f"--workers={self.workers}"]
+            if self.modo == "asgi":
+                comando[3:3] = ["-k", "uvicorn.workers.UvicornWorker"]
+        else:
+            comando = [sys.executable, "-m", "benchmark.servidor", "--puerto", str(puerto), "--modo", self.modo]
+        self._log = open(os.path.join(self._dir, "servidor.log"), "w")
+        self.proceso = subprocess.Popen(comando, cwd=BACKEND_DIR, env=env, stdout=self._log, stderr=subprocess.STDOUT)
+        self.base = f"http://127.0.0.1:{puerto}"
+        print(f"🚀 Backend: {' '.join(comando[1:])}")
+        self._esperar_listo()
+
+    def _esperar_listo(self):
+        limite = time.monotonic() + ESPERA_ARRANQUE
+        while time.monotonic() < limite:
+            if self.proceso.poll() is not None:
+                break
+            try:
+                if requests.get(f"{self.base}/health", timeout=1).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        self._log.flush()
+        with open(self._log.name, "r", errors="replace") as f:
+            salida = f.read()[-4000:]
+        raise RuntimeError(f"El backend no respondió /health en {ESPERA_ARRANQUE}s:\n{salida}")
+
+    def rss(self):
+        return rss_bytes(self.proceso.pid)
+
+    def muestreador(self):
+        return MuestreadorRSS(self.proceso.pid)
+
+    def __exit__(self, *exc):
+        for proceso in (self.proceso, self._falsos):
+            if proceso is None or proceso.poll() is not None:
+                continue
+            proceso.terminate()
+            try:
+                proceso.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proceso.kill()
+                proceso.wait()
+        if self._falsos is not None and self._falsos.stdout:
+            self._falsos.stdout.close()
+        if self._log is not None:
+            self._log.close()
+        shutil.rmtree(self._dir, ignore_errors=True)
+
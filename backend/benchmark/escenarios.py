@@ -0,0 +1,190 @@
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmark.entorno import usuario_bench
+from benchmark.falsos import CLAVE_VALIDA
+
+# ======================= ESCENARIOS DE CARGA =======================
+# Cada escenario es una función (cliente, i, total_usuarios) que representa la acción i de un usuario real y
+# puede hacer varias peticiones; cada petición se mide por separado (latencia, status esperado,
+# bytes). ejecutar() lanza `acciones` acciones con `concurrencia` clientes a la vez.
+TIMEOUT = 60  # segundos por petición
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not valores:
+        return 0.0
+    return valores[max(0, math.ceil(p / 100 * len(valores)) - 1)]
+
+
+class Resultado:
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.latencias = []
+        self.errores = 0
+        self.bytes = 0
+        self.duracion = 0.0
+        self.rss_pico = 0
+        self.detalle_errores = {}
+        self._lock = threading.Lock()
+
+    def anotar(self, latencia, ok, tamano=0, motivo=None):
+        with self._lock:
+            self.latencias.append(latencia)
+            self.bytes += tamano
+            if not ok:
+                self.errores += 1
+                self.detalle_errores[motivo] = self.detalle_errores.get(motivo, 0) + 1
+
+    def fallo(self, motivo):
+        """Error que no corresponde a una petición medida (p. ej. respuesta incompleta)."""
+        with self._lock:
+            self.errores += 1
+            self.detalle_errores[motivo] = self.detalle_errores.get(motivo, 0) + 1
+
+    def resumen(self):
+        ordenadas = sorted(self.latencias)
+        ms = lambda s: round(s * 1000, 1)
+        return {
+            "peticiones": len(ordenadas),
+            "errores": self.errores,
+            "duracion_s": round(self.duracion, 2),
+            "rps": round(len(ordenadas) / self.duracion, 1) if self.duracion else 0.0,
+            "mb_s": round(self.bytes / self.duracion / 1e6, 2) if self.duracion else 0.0,
+            "p50_ms": ms(percentil(ordenadas, 50)),
+            "p95_ms": ms(percentil(ordenadas, 95)),
+            "p99_ms": ms(percentil(ordenadas, 99)),
+            "max_ms": ms(ordenadas[-1]) if ordenadas else 0.0,
+            "rss_mb": round(self.rss_pico / 1e6, 1),
+            "detalle_errores": {str(k): v for k, v in self.detalle_errores.items()},
+        }
+
+
+class Cliente:
+    """Una sesión HTTP (keep-alive, como un navegador) que anota cada petición en el resultado."""
+
+    def __init__(self, base, resultado):
+        self.base = base
+        self.resultado = resultado
+        self.sesion = requests.Session()
+
+    def pedir(self, metodo, ruta, esperado=(200,), **kwargs):
+        inicio = time.perf_counter()
+        try:
+            resp = self.sesion.request(metodo, self.base + ruta, timeout=TIMEOUT, **kwargs)
+            cuerpo = resp.content  # la descarga completa cuenta en la latencia
+        except requests.RequestException as e:
+            self.resultado.anotar(time.perf_counter() - inicio, False, motivo=type(e).__name__)
+            return None
+        ok = resp.status_code in esperado
+        self.resultado.anotar(time.perf_counter() - inicio, ok, len(cuerpo), None if ok else resp.status_code)
+        return resp if ok else None
+
+
+# ----------------------- ESCENARIOS -----------------------
+def login(cliente, i, total_usuarios):
+    """Ráfaga de inicio de sesión: usuarios distintos, 1 de cada 5 con clave errada."""
+    valida = i % 5 != 4
+    cliente.pedir("POST", "/auth/ug", esperado=(200,) if valida else (401,), data={
+        "usuario": usuario_bench(i % total_usuarios),
+        "clave": CLAVE_VALIDA if valida else "errada",
+    })
+
+
+def sync(cliente, i, total_usuarios):
+    """Sincronización de un cliente nuevo: /files y la descarga de cada reporte."""
+    resp = cliente.pedir("GET", "/files")
+    if resp is None:
+        return
+    for archivo in resp.json():
+        descarga = cliente.pedir("GET", f"/download/{archivo['id']}")
+        if descarga is not None and len(descarga.content) != archivo["tamano"]:
+            cliente.resultado.fallo("tamano_distinto")
+
+
+def correo(cliente, i, total_usuarios):
+    """Notificaciones individuales por /send-email (cada una espera a Graph)."""
+    cliente.pedir("POST", "/send-email", json={
+        "to": [usuario_bench(i % total_usuarios), usuario_bench((i + 1) % total_usuarios)],
+        "subject": "FACAF benchmark",
+        "body": f"<p>Mensaje de prueba {i}</p>",
+    })
+
+
+def correo_masivo(cliente, i, total_usuarios, mensajes=100):
+    """
+    Envío masivo por /send-email/bulk: se mide desde el POST hasta que /jobs/<id> termina
+    (una muestra por trabajo; las consultas de avance no cuentan como peticiones).
+    """
+    inicio = time.perf_counter()
+    resp = cliente.sesion.post(cliente.base + "/send-email/bulk", timeout=TIMEOUT, json={
+        "subject": "FACAF benchmark",
+        "mensajes": [{"to": usuario_bench((i * mensajes + k) % total_usuarios), "body": f"<p>Aviso {k}</p>"}
+                     for k in range(mensajes)],
+    })
+    if resp.status_code != 202:
+        cliente.resultado.anotar(time.perf_counter() - inicio, False, motivo=resp.status_code)
+        return
+    estado_url = cliente.base + resp.json()["status_url"]
+    while time.perf_counter() - inicio < TIMEOUT:
+        time.sleep(0.1)
+        trabajo = cliente.sesion.get(estado_url, timeout=TIMEOUT).json()
+        if trabajo.get("estado") not in ("pendiente", "en_proceso"):
+            ok = trabajo.get("estado") == "completado"
+            cliente.resultado.anotar(time.perf_counter() - inicio, ok, motivo=None if ok else trabajo.get("estado"))
+            return
+    cliente.resultado.fallo("trabajo_sin_terminar")
+
+
+def usuarios(cliente, i, total_usuarios, paginas=10, limite=50):
+    """Panel de administración: recorre `paginas` páginas por cursor con orden y filtros variados."""
+    parametros = [
+        {"sort_by": "id", "sort_dir": "desc"},
+        {"sort_by": "usuario", "sort_dir": "asc"},
+        {"sort_by": "usuario", "sort_dir": "desc", "q": "bench0"},
+        {"sort_by": "id", "sort_dir": "asc", "activo": "true", "rol": "usuario"},
+    ][i % 4]
+    params = {"limit": limite, "total": "aprox", **parametros}
+    for _ in range(paginas):
+        resp = cliente.pedir("GET", "/usuarios", params=params)
+        siguiente = resp.json().get("next_cursor") if resp is not None else None
+        if not siguiente:
+            return
+        params = {"limit": limite, "total": "no", "cursor": siguiente, **parametros}
+
+
+ESCENARIOS = {
+    "login": login,
+    "sync": sync,
+    "correo": correo,
+    "correo_masivo": correo_masivo,
+    "usuarios": usuarios,
+}
+
+
+def ejecutar(nombre, base, acciones, concurrencia, total_usuarios, muestreador):
+    """Corre `acciones` acciones del escenario con `concurrencia` clientes; devuelve el Resultado."""
+    escenario = ESCENARIOS[nombre]
+    resultado = Resultado(nombre)
+    locales = threading.local()
+
+    def accion(i):
+        if not hasattr(locales, "cliente"):
+            locales.cliente = Cliente(base, resultado)
+        try:
+            escenario(locales.cliente, i, total_usuarios)
+        except Exception as e:
+            resultado.fallo(type(e).__name__)
+
+    with muestreador as rss:
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrencia) as ejecutor:
+            list(ejecutor.map(accion, range(acciones)))
+        resultado.duracion = time.perf_counter() - inicio
+    resultado.rss_pico = rss.pico
+    return resultado
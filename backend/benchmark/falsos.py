@@ -0,0 +1,80 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+# ======================= APIS EXTERNAS FALSAS (UG Y GRAPH) =======================
+# Servidores locales con latencia configurable para que los benchmarks no dependan de la red
+# ni de cuentas reales:
+#   UG:    POST /ug   -> {"id": 1} si la clave es CLAVE_VALIDA, si no {"id": 0}
+#   Graph: POST /users/<remitente>/sendMail -> 202; POST /$batch -> 200 con 202 por mensaje
+# Se ejecuta en un proceso aparte (python -m benchmark.falsos) para no competir por el GIL
+# con el generador de carga.
+CLAVE_VALIDA = "clave-bench"
+
+
+class _Servidor(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def _manejador(latencia, responder):
+    class Manejador(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, como los servicios reales
+
+        def do_POST(self):
+            cuerpo = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            time.sleep(latencia)
+            status, datos = responder(self.path, cuerpo)
+            salida = json.dumps(datos).encode("utf-8") if datos is not None else b""
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(salida)))
+            self.end_headers()
+            self.wfile.write(salida)
+
+        def log_message(self, *args):
+            pass
+
+    return Manejador
+
+
+def responder_ug(ruta, cuerpo):
+    form = parse_qs(cuerpo.decode("utf-8"))
+    valido = form.get("clave", [""])[0] == CLAVE_VALIDA
+    return 200, {"id": 1 if valido else 0, "mensaje": "OK" if valido else "CREDENCIALES ERRADAS"}
+
+
+def responder_graph(ruta, cuerpo):
+    if ruta.endswith("/sendMail"):
+        return 202, None
+    if ruta.endswith("/$batch"):
+        pedidos = json.loads(cuerpo or b"{}").get("requests", [])
+        return 200, {"responses": [{"id": p["id"], "status": 202} for p in pedidos]}
+    return 404, {"error": {"message": "ruta desconocida"}}
+
+
+def iniciar(puerto, latencia, responder):
+    servidor = _Servidor(("127.0.0.1", puerto), _manejador(latencia, responder))
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UG y Graph falsos para benchmarks")
+    parser.add_argument("--ug", type=int, required=True)
+    parser.add_argument("--graph", type=int, required=True)
+    parser.add_argument("--latencia-ug", type=float, default=0.05)
+    parser.add_argument("--latencia-graph", type=float, default=0.08)
+    args = parser.parse_args()
+    iniciar(args.ug, args.latencia_ug, responder_ug)
+    iniciar(args.graph, args.latencia_graph, responder_graph)
+    print("listo", flush=True)
+    while True:
+        time.sleep(3600)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import argparse
+import os
+import sys
+import time
+
+# ======================= APP PARA BENCHMARKS =======================
+# Importa app.py apuntando a los sustitutos locales (ver benchmark/entorno.py):
+#   BENCH_BD=sqlite      pyodbc se reemplaza por benchmark/sqlite_odbc.py (BENCH_SQLITE_DB)
+#   BENCH_BD=sqlserver   pyodbc real con DB_* del entorno (p. ej. el servicio db de docker-compose)
+#   BENCH_UG_URL / BENCH_GRAPH_URL   servidores falsos de benchmark/falsos.py
+# Sirve tanto para gunicorn (benchmark.servidor:app / benchmark.servidor:asgi_app) como para
+# ejecutarse solo cuando gunicorn no está instalado (python -m benchmark.servidor).
+if os.getenv("BENCH_BD", "sqlite") == "sqlite":
+    from benchmark import sqlite_odbc
+    sys.modules["pyodbc"] = sqlite_odbc
+    for var in ("DB_SERVER", "DB_DRIVER", "DB_USER", "DB_PASSWORD", "DB_NAME"):
+        os.environ.setdefault(var, "bench")
+
+import app as modulo_app
+
+# Después del import: app.py carga archivos/.env con override=True
+modulo_app.validador_ug.url = os.environ["BENCH_UG_URL"]
+modulo_app.motor_correo.base_url = os.environ["BENCH_GRAPH_URL"].rstrip("/")
+modulo_app.motor_correo.remitente = "bench@ug.edu.ec"
+modulo_app.token_graph._token = "bench"
+modulo_app.token_graph._expira = time.time() + 7 * 86400
+
+app = modulo_app.app
+
+
+def __getattr__(nombre):
+    # asgi.py solo se importa si se pide (starlette/a2wsgi son opcionales en modo wsgi)
+    if nombre == "asgi_app":
+        import asgi
+        return asgi.app
+    raise AttributeError(nombre)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend FACAF sin gunicorn, para benchmarks")
+    parser.add_argument("--puerto", type=int, required=True)
+    parser.add_argument("--modo", choices=("wsgi", "asgi"), default="wsgi")
+    args = parser.parse_args()
+    if args.modo == "asgi":
+        import uvicorn
+        uvicorn.run(__getattr__("asgi_app"), host="127.0.0.1", port=args.puerto, log_level="warning")
+    else:
+        import logging
+        from werkzeug.serving import run_simple
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)  # sin una línea por petición
+        run_simple("127.0.0.1", args.puerto, app, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+# ======================= ADAPTADOR SQLITE CON INTERFAZ DE PYODBC =======================
+# Sustituye a pyodbc (sys.modules["pyodbc"]) para correr el backend sin SQL Server en los
+# benchmarks. Traduce solo el T-SQL de las rutas que se miden (listados, descargas por partes,
+# usuarios, trabajos de correo). El esquema lo crea preparar_esquema(), no las migraciones.
+Error = sqlite3.Error
+DatabaseError = sqlite3.DatabaseError
+ProgrammingError = sqlite3.ProgrammingError
+IntegrityError = sqlite3.IntegrityError
+OperationalError = sqlite3.OperationalError
+
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(" "))
+sqlite3.register_converter("TIMESTAMP", lambda v: datetime.fromisoformat(v.decode()))
+
+_PAGINA = re.compile(r"OFFSET\s+\?\s+ROWS\s+FETCH\s+NEXT\s+\?\s+ROWS\s+ONLY", re.I)
+_PAGINA_FIJA = re.compile(r"OFFSET\s+(\d+)\s+ROWS\s+FETCH\s+NEXT\s+\?\s+ROWS\s+ONLY", re.I)
+_FUNCIONES = [
+    (re.compile(r"\bISNULL\(", re.I), "IFNULL("),
+    (re.compile(r"\bDATALENGTH\(", re.I), "LENGTH("),
+    (re.compile(r"\bSUBSTRING\(", re.I), "SUBSTR("),
+    (re.compile(r"\bGETDATE\(\)", re.I), "CURRENT_TIMESTAMP"),
+    (re.compile(r"\bN'"), "'"),  # literales Unicode N'...'
+]
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS ArchivosExcel (
+    Id INTEGER PRIMARY KEY AUTOINCREMENT,
+    NombreArchivo TEXT UNIQUE NOT NULL,
+    TipoMime TEXT NOT NULL,
+    Datos BLOB NOT NULL,
+    FechaSubida TIMESTAMP,
+    HashSha256 TEXT,
+    Tamano INTEGER,
+    Version INTEGER
+);
+CREATE TABLE IF NOT EXISTS ArchivosEliminados (
+    NombreArchivo TEXT PRIMARY KEY,
+    Version INTEGER NOT NULL,
+    FechaEliminacion TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS Usuarios (
+    Id INTEGER PRIMARY KEY AUTOINCREMENT,
+    Usuario TEXT NOT NULL UNIQUE,
+    Estado INTEGER NOT NULL DEFAULT 1,
+    Rol TEXT NOT NULL DEFAULT 'usuario',
+    UsuarioNorm TEXT GENERATED ALWAYS AS (LOWER(TRIM(Usuario))) STORED
+);
+CREATE TABLE IF NOT EXISTS TrabajosCorreo (
+    Id TEXT PRIMARY KEY,
+    Estado TEXT NOT NULL,
+    Total INTEGER NOT NULL,
+    Enviados INTEGER NOT NULL DEFAULT 0,
+    Fallidos INTEGER NOT NULL DEFAULT 0,
+    Errores TEXT,
+    FechaCreacion TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FechaActualizacion TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FechaFin TIMESTAMP
+);
+CREATE UNIQUE INDEX IF NOT EXISTS IX_Usuarios_UsuarioNorm ON Usuarios(UsuarioNorm);
+CREATE INDEX IF NOT EXISTS IX_Usuarios_Rol ON Usuarios(Rol, Id);
+CREATE INDEX IF NOT EXISTS IX_Usuarios_Estado ON Usuarios(Estado, Id);
+"""
+
+
+def traducir(sql, params):
+    """(sql, params) de T-SQL a SQLite para el subconjunto que usan las rutas medidas."""
+    params = list(params)
+    if _PAGINA.search(sql):
+        # OFFSET ? ... FETCH NEXT ? -> LIMIT ? OFFSET ?: los dos últimos parámetros se invierten
+        sql = _PAGINA.sub("LIMIT ? OFFSET ?", sql)
+        params[-2], params[-1] = params[-1], params[-2]
+    sql = _PAGINA_FIJA.sub(lambda m: f"LIMIT ? OFFSET {m.group(1)}", sql)
+    for patron, reemplazo in _FUNCIONES:
+        sql = patron.sub(reemplazo, sql)
+    return sql, params
+
+
+def _ruta():
+    return os.environ["BENCH_SQLITE_DB"]
+
+
+def preparar_esquema(ruta):
+    con = sqlite3.connect(ruta)
+    try:
+        con.execute("PRAGMA journal_mode=WAL")
+        con.executescript(ESQUEMA)
+        con.commit()
+    finally:
+        con.close()
+
+
+class Cursor:
+    def __init__(self, raw):
+        self._raw = raw
+        self.fast_executemany = False
+
+    @property
+    def description(self):
+        return self._raw.description
+
+    @property
+    def rowcount(self):
+        return self._raw.rowcount
+
+    def execute(self, sql, *params):
+        if len(params) == 1 and isinstance(params[0], (list, tuple)):
+            params = params[0]
+        self._raw.execute(*traducir(sql, params))
+        return self
+
+    def executemany(self, sql, filas):
+        filas = list(filas)
+        if filas:
+            consulta, _ = traducir(sql, filas[0])
+            self._raw.executemany(consulta, [traducir(sql, f)[1] for f in filas])
+        return self
+
+    def fetchone(self):
+        return self._raw.fetchone()
+
+    def fetchall(self):
+        return self._raw.fetchall()
+
+    def fetchmany(self, n=1):
+        return self._raw.fetchmany(n)
+
+    def close(self):
+        self._raw.close()
+
+
+class Conexion:
+    def __init__(self, autocommit=False):
+        self._raw = sqlite3.connect(_ruta(), timeout=30, check_same_thread=False,
+                                    detect_types=sqlite3.PARSE_DECLTYPES,
+                                    isolation_level=None if autocommit else "DEFERRED")
+        self.autocommit = autocommit
+
+    def cursor(self):
+        return Cursor(self._raw.cursor())
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def close(self):
+        self._raw.close()
+
+
+def connect(cadena=None, autocommit=False, **kwargs):
+    return Conexion(autocommit=autocommit)
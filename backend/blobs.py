@@ -0,0 +1,179 @@
+import mmap
+import os
+import re
+import shutil
+import tempfile
+import time
+
+from metricas import incrementar
+
+# ======================= CACHE DE BLOBS EN DISCO =======================
+# Copia local de ArchivosExcel.Datos para /download: entre subidas se descargan una y otra vez
+# los mismos cuatro o cinco reportes, y cada descarga traía el blob completo desde SQL Server.
+#   BLOB_CACHE_DIR/<id>-<hash sha256>      (o <id>-<ms de subida>-<tamaño> si no hay hash)
+# El nombre es el ETag de la descarga, así que una versión nueva nunca se confunde con la vieja
+# aunque otro nodo no haya visto la invalidación. El directorio se comparte entre los workers
+# del host: se escribe en un temporal y se publica con os.replace, y el mtime es la marca de
+# último uso para el LRU (se descartan los menos usados al pasar BLOB_CACHE_MAX_BYTES).
+BLOB_CACHE_DIR = os.getenv("BLOB_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "facaf-blobs")
+BLOB_CACHE_MAX_BYTES = int(os.getenv("BLOB_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))  # 0 desactiva
+BLOB_CACHE_PARTE = int(os.getenv("BLOB_CACHE_PARTE", str(256 * 1024)))  # bytes por parte al servir rangos
+
+_ETAG = re.compile(r"^[0-9A-Za-z-]{1,80}$")
+_TEMPORAL_TTL = 3600  # temporales de un worker que murió a mitad de la copia
+_TOQUE_MIN = 60       # segundos entre actualizaciones del mtime de un mismo archivo
+
+
+def _ruta(archivo_id, etag):
+    if BLOB_CACHE_MAX_BYTES <= 0 or not _ETAG.match(etag or ""):
+        return None
+    return os.path.join(BLOB_CACHE_DIR, f"{int(archivo_id)}-{etag}")
+
+
+def abrir(archivo_id, etag):
+    """Archivo en cache abierto en binario (y marcado como recién usado), o None si no está."""
+    ruta = _ruta(archivo_id, etag)
+    if ruta is None:
+        return None
+    try:
+        f = open(ruta, "rb")
+    except FileNotFoundError:
+        incrementar("facaf_blob_cache_total", resultado="fallo")
+        return None
+    try:
+        ahora = time.time()
+        if ahora - os.fstat(f.fileno()).st_mtime > _TOQUE_MIN:
+            os.utime(ruta, (ahora, ahora))
+    except OSError:
+        pass  # otro worker lo descartó: el descriptor abierto sigue sirviendo
+    incrementar("facaf_blob_cache_total", resultado="acierto")
+    return f
+
+
+def partes_rango(f, inicio, fin):
+    """Bytes [inicio, fin) del archivo en cache vía mmap, por partes y sin copiarlo a memoria."""
+    try:
+        if fin <= inicio:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+            for pos in range(inicio, fin, BLOB_CACHE_PARTE):
+                yield mapa[pos:min(pos + BLOB_CACHE_PARTE, fin)]
+    finally:
+        f.close()
+
+
+def guardar_mientras(archivo_id, etag, tamano, partes):
+    """
+    Reenvía `partes` (el stream desde la BD) y a la vez las escribe en la cache. Solo se publica
+    si llegó el archivo completo: un cliente que corta la descarga no deja un archivo truncado.
+    """
+    ruta = _ruta(archivo_id, etag)
+    if ruta is None or tamano > BLOB_CACHE_MAX_BYTES:
+        yield from partes
+        return
+    try:
+        os.makedirs(BLOB_CACHE_DIR, mode=0o700, exist_ok=True)
+        fd, temporal = tempfile.mkstemp(prefix=".tmp-", dir=BLOB_CACHE_DIR)
+        destino = os.fdopen(fd, "wb")
+    except OSError as e:
+        print(f"⚠️ Cache de blobs no disponible: {e}")
+        yield from partes
+        return
+
+    escrito = 0
+    try:
+        for parte in partes:
+            if destino is not None:
+                try:
+                    destino.write(parte)
+                    escrito += len(parte)
+                except OSError as e:
+                    print(f"⚠️ No se pudo escribir en la cache de blobs: {e}")
+                    destino.close()
+                    destino = None
+            yield parte
+        if destino is not None:
+            destino.close()
+            destino = None
+            if escrito == tamano:
+                os.replace(temporal, ruta)
+                _recortar()
+    finally:
+        if destino is not None:
+            destino.close()
+        try:
+            os.remove(temporal)
+        except OSError:
+            pass
+
+
+def guardar_desde_ruta(archivo_id, etag, origen):
+    """Copia a la cache un archivo recién subido: la primera descarga ya no va a la BD."""
+    ruta = _ruta(archivo_id, etag)
+    if ruta is None or os.path.getsize(origen) > BLOB_CACHE_MAX_BYTES:
+        return
+    temporal = None
+    try:
+        os.makedirs(BLOB_CACHE_DIR, mode=0o700, exist_ok=True)
+        fd, temporal = tempfile.mkstemp(prefix=".tmp-", dir=BLOB_CACHE_DIR)
+        os.close(fd)
+        shutil.copyfile(origen, temporal)
+        os.replace(temporal, ruta)
+        temporal = None
+        _recortar()
+    except OSError as e:
+        print(f"⚠️ No se pudo copiar a la cache de blobs: {e}")
+    finally:
+        if temporal is not None:
+            try:
+                os.remove(temporal)
+            except OSError:
+                pass
+
+
+def descartar(archivo_id):
+    """Borra todas las versiones en cache de un archivo (al reemplazarlo o eliminarlo)."""
+    prefijo = f"{int(archivo_id)}-"
+    try:
+        nombres = os.listdir(BLOB_CACHE_DIR)
+    except FileNotFoundError:
+        return
+    for nombre in nombres:
+        if nombre.startswith(prefijo):
+            try:
+                os.remove(os.path.join(BLOB_CACHE_DIR, nombre))
+            except OSError:
+                pass
+
+
+def _recortar():
+    """LRU por mtime: borra los menos usados hasta quedar bajo BLOB_CACHE_MAX_BYTES."""
+    entradas = []
+    total = 0
+    limite_temporal = time.time() - _TEMPORAL_TTL
+    try:
+        nombres = os.listdir(BLOB_CACHE_DIR)
+    except FileNotFoundError:
+        return
+    for nombre in nombres:
+        ruta = os.path.join(BLOB_CACHE_DIR, nombre)
+        try:
+            st = os.stat(ruta)
+            if nombre.startswith(".tmp-"):
+                if st.st_mtime < limite_temporal:
+                    os.remove(ruta)
+                continue
+        except OSError:
+            continue
+        entradas.append((st.st_mtime, st.st_size, ruta))
+        total += st.st_size
+
+    entradas.sort()
+    for _, tamano, ruta in entradas:
+        if total <= BLOB_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(ruta)
+            total -= tamano
+        except OSError:
+            pass
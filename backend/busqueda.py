@@ -0,0 +1,153 @@
+import re
+
+from cache import cacheado
+from database import CACHE_TTL, obtener_dataset
+from datasets import ARCHIVO_NOTAS, DOCENTE, canon, descomprimir, filas
+
+# ======================= BÚSQUEDA DE ESTUDIANTES Y DOCENTES =======================
+# Por cada versión del reporte de notas se construyen, una vez por worker:
+#   - un índice hash por IDENTIFICACION (búsqueda exacta),
+#   - un índice de n-gramas (bigramas y trigramas) sobre el nombre sin tildes y sobre la
+#     identificación, para búsquedas "contiene" sin recorrer todo el dataset.
+# Una consulta solo toca las listas de los n-gramas que contiene; el costo no depende del
+# tamaño del reporte sino de cuántas personas coinciden.
+LIMITE_MAX = 50
+
+# Mismos filtros base que consulta-estudiante.js / consulta-docente.js
+ESTADOS_PERMITIDOS = {"APROBADA", "REPROBADA"}
+_MATERIA_EXCLUIDA_ESTUDIANTE = re.compile(r"^INGLES\s+(I|II|III|IV)\b$")
+_MATERIA_EXCLUIDA_DOCENTE = re.compile(r"^INGLES\s+(I|II|III|IV)\b")
+
+# Orden de relevancia (menor es mejor)
+_ID_EXACTO, _NOMBRE_EXACTO, _ID_PREFIJO, _NOMBRE_PREFIJO, _PALABRA_PREFIJO, _CONTIENE = range(6)
+
+
+def _ngramas(texto, n):
+    return {texto[i:i + n] for i in range(len(texto) - n + 1)}
+
+
+class IndiceBusqueda:
+    """Índice en memoria sobre entradas {'id', 'nombre', ...}; inmutable una vez construido."""
+
+    def __init__(self, entradas):
+        self.entradas = entradas
+        self._ids = [canon(e["id"]) for e in entradas]
+        self._nombres = [canon(e["nombre"]) for e in entradas]
+        self._por_id = {}
+        self._gramas = {}  # n-grama -> lista de posiciones (sin repetir, en orden)
+        # Prefijos cortos (2-3 caracteres) ya ordenados por nombre: las consultas de 2-3 letras
+        # coinciden con cientos de personas y así no hay que puntuarlas todas
+        self._prefijos_id = {}
+        self._prefijos_nombre = {}
+        for pos, (id_c, nombre_c) in enumerate(zip(self._ids, self._nombres)):
+            self._por_id.setdefault(id_c, pos)
+            for texto in (id_c, nombre_c):
+                for g in _ngramas(texto, 2) | _ngramas(texto, 3):
+                    lista = self._gramas.setdefault(g, [])
+                    if not lista or lista[-1] != pos:
+                        lista.append(pos)
+        for pos in sorted(range(len(entradas)), key=lambda p: self._nombres[p]):
+            for n in (2, 3):
+                if len(self._ids[pos]) >= n:
+                    self._prefijos_id.setdefault(self._ids[pos][:n], []).append(pos)
+                if len(self._nombres[pos]) >= n:
+                    self._prefijos_nombre.setdefault(self._nombres[pos][:n], []).append(pos)
+
+    def __len__(self):
+        return len(self.entradas)
+
+    def _candidatos(self, q):
+        n = 3 if len(q) >= 3 else 2
+        listas = [self._gramas.get(g) for g in _ngramas(q, n)]
+        if not listas or any(lista is None for lista in listas):
+            return set()
+        listas.sort(key=len)
+        candidatos = set(listas[0])
+        for lista in listas[1:]:
+            candidatos.intersection_update(lista)
+            if not candidatos:
+                break
+        return candidatos
+
+    def _relevancia(self, pos, q):
+        id_c, nombre_c = self._ids[pos], self._nombres[pos]
+        if id_c == q:
+            return _ID_EXACTO
+        if nombre_c == q:
+            return _NOMBRE_EXACTO
+        if id_c.startswith(q):
+            return _ID_PREFIJO
+        if nombre_c.startswith(q):
+            return _NOMBRE_PREFIJO
+        if (" " + q) in nombre_c:
+            return _PALABRA_PREFIJO
+        if q in nombre_c or q in id_c:
+            return _CONTIENE
+        return None  # falso positivo de los n-gramas
+
+    def buscar(self, consulta, limite=10):
+        """Devuelve [(entrada, relevancia)] ordenado por relevancia y nombre."""
+        q = canon(consulta)
+        if not q:
+            return []
+        if q in self._por_id:
+            return [(self.entradas[self._por_id[q]], _ID_EXACTO)]
+        if len(q) == 1:
+            return []
+        if len(q) <= 3:
+            por_prefijo = [(self.entradas[pos], _ID_PREFIJO) for pos in self._prefijos_id.get(q, ())[:limite]]
+            por_prefijo += [(self.entradas[pos], _NOMBRE_PREFIJO)
+                            for pos in self._prefijos_nombre.get(q, ())[:limite - len(por_prefijo)]]
+            if len(por_prefijo) >= limite:
+                return por_prefijo
+
+        resultados = []
+        for pos in self._candidatos(q):
+            r = self._relevancia(pos, q)
+            if r is not None:
+                resultados.append((r, self._nombres[pos], pos))
+        resultados.sort()
+        return [(self.entradas[pos], r) for r, _, pos in resultados[:limite]]
+
+
+def construir_indices(dataset):
+    """(índice de estudiantes, índice de docentes) a partir del reporte de notas."""
+    estudiantes = {}
+    docentes = {}
+    for fila in filas(dataset):
+        if canon(fila.get("ESTADO")) not in ESTADOS_PERMITIDOS:
+            continue
+        docente_txt = str(fila.get("DOCENTE") or "").strip()
+        if canon(docente_txt) == "MOVILIDAD":
+            continue
+        materia = canon(fila.get("MATERIA"))
+
+        id_est = str(fila.get("IDENTIFICACION") or "").strip()
+        nombre = f"{fila.get('APELLIDOS') or ''} {fila.get('NOMBRES') or ''}".strip()
+        if id_est and nombre and id_est not in estudiantes and not _MATERIA_EXCLUIDA_ESTUDIANTE.match(materia):
+            estudiantes[id_est] = {
+                "id": id_est,
+                "nombre": nombre,
+                "correo": fila.get("CORREO_INSTITUCIONAL") or fila.get("CORREO_PERSONAL") or "",
+                "carrera": fila.get("CARRERA") or "",
+            }
+
+        m = DOCENTE.match(docente_txt)
+        if not m or not materia or _MATERIA_EXCLUIDA_DOCENTE.match(materia):
+            continue
+        nombre_doc = m.group(2).strip()
+        clave = f"{m.group(1)}-{nombre_doc}"
+        if clave not in docentes and canon(nombre_doc) != "MOVILIDAD" and str(fila.get("PERIODO") or "").strip():
+            docentes[clave] = {"id": m.group(1), "nombre": nombre_doc, "full": docente_txt}
+
+    lista_docentes = sorted(docentes.values(), key=lambda d: d["nombre"])
+    return IndiceBusqueda(list(estudiantes.values())), IndiceBusqueda(lista_docentes)
+
+
+@cacheado('datasets', CACHE_TTL, clave=lambda: ('indices', ARCHIVO_NOTAS))
+def obtener_indices():
+    """Índices del reporte de notas vigente; se reconstruyen cuando una subida invalida 'datasets'."""
+    dataset = obtener_dataset(ARCHIVO_NOTAS)
+    if not dataset:
+        return None
+    return construir_indices(descomprimir(dataset[0]))
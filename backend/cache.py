@@ -0,0 +1,212 @@
+import functools
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin flock, se usa el contador en memoria del proceso
+    fcntl = None
+
+# ======================= CACHE DE LECTURAS =======================
+# Los valores viven en memoria de cada proceso (LRU + TTL). Lo que se comparte entre workers es
+# solo un contador de "generación" por espacio: cada escritura lo incrementa y las entradas
+# guardadas con una generación anterior dejan de ser válidas en todos los workers a la vez.
+#   - CACHE_REDIS_URL definido -> contadores en Redis (varios nodos).
+#   - si no -> contadores en un archivo mmap compartido por los workers del mismo host.
+# El orden fija la posición de cada contador en el archivo mmap: agregar siempre al final
+ESPACIOS = ("archivos", "datasets", "plantillas", "usuarios", "sesiones")
+
+# La configuración (CACHE_ACTIVO, CACHE_MAX_ENTRADAS, CACHE_REDIS_URL, CACHE_GEN_FILE) se lee al
+# primer uso y no al importar: database.py carga el .env después de importar este módulo.
+_SLOTS = 64
+
+
+class _GeneracionesLocales:
+    """Contadores solo del proceso actual (servidor de desarrollo o sin flock)."""
+
+    nombre = "local"
+
+    def __init__(self):
+        self._gen = {}
+        self._lock = threading.Lock()
+
+    def actual(self, espacio):
+        return self._gen.get(espacio, 0)
+
+    def incrementar(self, espacio):
+        with self._lock:
+            self._gen[espacio] = self._gen.get(espacio, 0) + 1
+
+
+class _GeneracionesArchivo:
+    """Contadores en un archivo mmap: leer una generación es una lectura de memoria."""
+
+    nombre = "mmap"
+
+    def __init__(self, ruta):
+        self._fd = os.open(ruta, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < _SLOTS * 8:
+            os.ftruncate(self._fd, _SLOTS * 8)
+        self._mm = mmap.mmap(self._fd, _SLOTS * 8)
+
+    @staticmethod
+    def _slot(espacio):
+        return ESPACIOS.index(espacio) * 8
+
+    def actual(self, espacio):
+        return struct.unpack_from("<Q", self._mm, self._slot(espacio))[0]
+
+    def incrementar(self, espacio):
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            pos = self._slot(espacio)
+            struct.pack_into("<Q", self._mm, pos, struct.unpack_from("<Q", self._mm, pos)[0] + 1)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+class _GeneracionesRedis:
+    nombre = "redis"
+
+    def __init__(self, url):
+        import redis
+        self._r = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+    def actual(self, espacio):
+        return int(self._r.get(f"facaf:cache:gen:{espacio}") or 0)
+
+    def incrementar(self, espacio):
+        self._r.incr(f"facaf:cache:gen:{espacio}")
+
+
+class CacheLectura:
+    """LRU con TTL por entrada y validación por generación del espacio."""
+
+    def __init__(self, generaciones, max_entradas=2000):
+        self.generaciones = generaciones
+        self.max_entradas = max_entradas
+        self._datos = OrderedDict()  # (espacio, clave) -> (expira, generacion, valor)
+        self._lock = threading.Lock()
+        self._stats = {e: {"hits": 0, "misses": 0, "expirados": 0, "desalojos": 0, "invalidaciones": 0}
+                       for e in ESPACIOS}
+
+    def obtener(self, espacio, clave):
+        """Devuelve (True, valor) si hay una entrada vigente; si no (False, generacion_actual)."""
+        gen = self.generaciones.actual(espacio)
+        k = (espacio, clave)
+        with self._lock:
+            entrada = self._datos.get(k)
+            if entrada is not None:
+                expira, gen_entrada, valor = entrada
+                if gen_entrada == gen and time.monotonic() < expira:
+                    self._datos.move_to_end(k)
+                    self._stats[espacio]["hits"] += 1
+                    return True, valor
+                del self._datos[k]
+                self._stats[espacio]["expirados"] += 1
+            self._stats[espacio]["misses"] += 1
+        return False, gen
+
+    def guardar(self, espacio, clave, valor, ttl, generacion):
+        with self._lock:
+            self._datos[(espacio, clave)] = (time.monotonic() + ttl, generacion, valor)
+            self._datos.move_to_end((espacio, clave))
+            while len(self._datos) > self.max_entradas:
+                (esp, _), _ = self._datos.popitem(last=False)
+                self._stats[esp]["desalojos"] += 1
+
+    def invalidar(self, espacio):
+        self.generaciones.incrementar(espacio)
+        with self._lock:
+            for k in [k for k in self._datos if k[0] == espacio]:
+                del self._datos[k]
+            self._stats[espacio]["invalidaciones"] += 1
+
+    def estadisticas(self):
+        with self._lock:
+            por_espacio = {e: dict(s) for e, s in self._stats.items()}
+            entradas = len(self._datos)
+        return {"backend": self.generaciones.nombre, "entradas": entradas,
+                "max_entradas": self.max_entradas, "espacios": por_espacio}
+
+
+_cache = None
+_activo = None
+_cache_lock = threading.Lock()
+
+
+def _crear_generaciones():
+    redis_url = os.getenv("CACHE_REDIS_URL")
+    ruta = os.getenv("CACHE_GEN_FILE") or os.path.join(tempfile.gettempdir(), "facaf-cache-gen.bin")
+    if redis_url:
+        try:
+            return _GeneracionesRedis(redis_url)
+        except Exception as e:
+            print(f"⚠️ Cache: no se pudo usar Redis ({e}); se usa mmap local")
+    if fcntl is not None:
+        try:
+            return _GeneracionesArchivo(ruta)
+        except OSError as e:
+            print(f"⚠️ Cache: no se pudo abrir {ruta} ({e}); invalidación solo por proceso")
+    return _GeneracionesLocales()
+
+
+def obtener_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = CacheLectura(_crear_generaciones(), int(os.getenv("CACHE_MAX_ENTRADAS", "2000")))
+    return _cache
+
+
+def cache_activo():
+    global _activo
+    if _activo is None:
+        _activo = os.getenv("CACHE_ACTIVO", "1") == "1"
+    return _activo
+
+
+def invalidar(*espacios):
+    """Invalida los espacios en todos los workers. Nunca propaga errores al flujo de escritura."""
+    if not cache_activo():
+        return
+    for espacio in espacios:
+        try:
+            obtener_cache().invalidar(espacio)
+        except Exception as e:
+            print(f"⚠️ Cache: no se pudo invalidar '{espacio}': {e}")
+
+
+def cacheado(espacio, ttl, clave=None):
+    """
+    Decorador para funciones de lectura. clave(*args, **kwargs) construye la clave (por defecto
+    los argumentos). También se guardan resultados None. Los valores se comparten entre requests:
+    quien los reciba no debe modificarlos.
+    """
+    def decorador(fn):
+        @functools.wraps(fn)
+        def envoltura(*args, **kwargs):
+            if not cache_activo():
+                return fn(*args, **kwargs)
+            k = clave(*args, **kwargs) if clave else (fn.__name__, args, tuple(sorted(kwargs.items())))
+            try:
+                c = obtener_cache()
+                hit, resultado = c.obtener(espacio, k)
+            except Exception as e:
+                # Si el backend compartido falla se lee directo de la BD
+                print(f"⚠️ Cache: lectura omitida en '{espacio}': {e}")
+                return fn(*args, **kwargs)
+            if hit:
+                return resultado
+            valor = fn(*args, **kwargs)
+            c.guardar(espacio, k, valor, ttl, resultado)
+            return valor
+        envoltura.sin_cache = fn
+        return envoltura
+    return decorador
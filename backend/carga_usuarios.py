@@ -0,0 +1,124 @@
+import csv
+import io
+import json
+import os
+
+from database import VALID_ROLES
+
+# ======================= CARGA MASIVA DE USUARIOS =======================
+# POST /usuarios/bulk recibe la lista de una facultad completa como CSV o JSON:
+#   usuario,rol,activo                      [{"usuario": "...", "rol": "admin", "activo": false}, ...]
+#   ana.perez@ug.edu.ec,usuario,si          (o {"usuarios": [...]})
+# Aquí solo se lee y valida fila por fila; el guardado es un MERGE por lotes en una sola
+# transacción (database.importar_usuarios). Si alguna fila es inválida no se guarda ninguna y
+# se devuelven todos los errores con su número de fila, para corregir el archivo de una vez.
+USUARIOS_BULK_MAX = int(os.getenv("USUARIOS_BULK_MAX", "5000"))     # filas por carga
+USUARIOS_BULK_MAX_BYTES = 2 * 1024 * 1024
+USUARIO_MAX = 150  # Usuarios.Usuario NVARCHAR(150)
+
+_ACTIVO = {
+    "1": True, "true": True, "si": True, "sí": True, "s": True, "activo": True, "yes": True,
+    "0": False, "false": False, "no": False, "n": False, "inactivo": False,
+}
+# Encabezados aceptados en el CSV -> campo
+_COLUMNAS = {"usuario": "usuario", "correo": "usuario", "email": "usuario",
+             "rol": "rol", "activo": "activo", "estado": "activo"}
+
+
+class CargaError(Exception):
+    """Archivo que no se puede leer (formato, tamaño); el status HTTP va en .status."""
+
+    def __init__(self, mensaje, status=400):
+        super().__init__(mensaje)
+        self.status = status
+
+
+def leer(contenido: bytes, tipo=None, nombre=None):
+    """Lista de (fila, dict) desde un CSV o JSON; la fila es la línea del CSV o la posición en el JSON."""
+    if len(contenido) > USUARIOS_BULK_MAX_BYTES:
+        raise CargaError(f"El archivo supera {USUARIOS_BULK_MAX_BYTES // (1024 * 1024)} MB", 413)
+    try:
+        texto = contenido.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        texto = contenido.decode("latin-1")  # CSV guardado desde Excel en Windows
+
+    es_json = (tipo or "").endswith("json") or (nombre or "").lower().endswith(".json") \
+        or texto.lstrip()[:1] in ("[", "{")
+    registros = _leer_json(texto) if es_json else _leer_csv(texto)
+    if not registros:
+        raise CargaError("El archivo no tiene usuarios")
+    if len(registros) > USUARIOS_BULK_MAX:
+        raise CargaError(f"Máximo {USUARIOS_BULK_MAX} usuarios por carga", 413)
+    return registros
+
+
+def _leer_json(texto):
+    try:
+        datos = json.loads(texto)
+    except ValueError as e:
+        raise CargaError(f"JSON inválido: {e}")
+    if isinstance(datos, dict):
+        datos = datos.get("usuarios")
+    if not isinstance(datos, list):
+        raise CargaError("Se esperaba una lista de usuarios o {\"usuarios\": [...]}")
+    return [(i, d if isinstance(d, dict) else {"usuario": d}) for i, d in enumerate(datos, start=1)]
+
+
+def _leer_csv(texto):
+    try:
+        dialecto = csv.Sniffer().sniff(texto[:4096], delimiters=",;\t")
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.reader(io.StringIO(texto), dialecto)
+    filas = [(n, f) for n, f in enumerate(lector, start=1) if any(c.strip() for c in f)]
+    if not filas:
+        return []
+
+    primera = [c.strip().lower() for c in filas[0][1]]
+    if any(c in _COLUMNAS for c in primera):
+        campos = [_COLUMNAS.get(c) for c in primera]
+        if "usuario" not in campos:
+            raise CargaError("El CSV no tiene la columna 'usuario'")
+        filas = filas[1:]
+    else:
+        campos = ["usuario", "rol", "activo"]  # sin encabezado: usuario[,rol[,activo]]
+    return [(n, {c: v for c, v in zip(campos, f) if c}) for n, f in filas]
+
+
+def validar(registros):
+    """
+    (validos, errores): validos = [{'fila', 'usuario', 'rol', 'activo'}], errores =
+    [{'fila', 'usuario', 'error'}]. Mismas reglas que POST /usuarios, más duplicados en el archivo.
+    """
+    validos, errores = [], []
+    vistos = {}  # usuario normalizado -> fila donde apareció
+    for fila, datos in registros:
+        usuario = str(datos.get("usuario") or "").strip()
+        rol = str(datos.get("rol") or "usuario").strip().lower()
+        activo = datos.get("activo")
+        activo = True if activo is None or str(activo).strip() == "" else activo
+
+        def error(mensaje):
+            errores.append({"fila": fila, "usuario": usuario, "error": mensaje})
+
+        if not usuario:
+            error("Campo 'usuario' es obligatorio")
+            continue
+        if len(usuario) > USUARIO_MAX:
+            error(f"El usuario supera {USUARIO_MAX} caracteres")
+            continue
+        if rol not in VALID_ROLES:
+            error(f"Rol inválido '{rol}'. Solo {', '.join(VALID_ROLES)}")
+            continue
+        if not isinstance(activo, bool):
+            activo = _ACTIVO.get(str(activo).strip().lower())
+            if activo is None:
+                error(f"Valor de 'activo' inválido '{datos.get('activo')}'")
+                continue
+        norm = usuario.lower()
+        if norm in vistos:
+            error(f"Usuario repetido en el archivo (fila {vistos[norm]})")
+            continue
+        vistos[norm] = fila
+        validos.append({"fila": fila, "usuario": usuario, "rol": rol, "activo": activo})
+    return validos, errores
@@ -0,0 +1,39 @@
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# ======================= COMPRESIÓN DE RESPUESTAS =======================
+# Las respuestas JSON de la API (listados, deltas de datasets, vistas) se comprimen con brotli
+# si el navegador lo acepta y el paquete está instalado, si no con gzip. Los datasets completos
+# ya se guardan en gzip y se envían tal cual (ver _respuesta_gzip en app.py).
+COMPRESION_MIN_BYTES = int(os.getenv("COMPRESION_MIN_BYTES", "1024"))   # por debajo no compensa
+COMPRESION_NIVEL_GZIP = int(os.getenv("COMPRESION_NIVEL_GZIP", "6"))
+COMPRESION_NIVEL_BROTLI = int(os.getenv("COMPRESION_NIVEL_BROTLI", "5"))  # 0-11; 5 ~ gzip 6 en CPU
+TIPOS_COMPRIMIBLES = ("application/json", "text/plain", "text/csv")
+CODIFICACIONES = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def elegir(accept_encodings):
+    """'br', 'gzip' o None según request.accept_encodings (respeta q=0)."""
+    return accept_encodings.best_match(CODIFICACIONES)
+
+
+def comprimir(datos, codificacion):
+    if codificacion == "br":
+        return brotli.compress(datos, quality=COMPRESION_NIVEL_BROTLI)
+    return gzip.compress(datos, compresslevel=COMPRESION_NIVEL_GZIP)
+
+
+def comprimible(resp):
+    """Respuesta completa en memoria, sin codificar aún y de un tipo que vale la pena comprimir."""
+    return (
+        resp.status_code == 200
+        and not resp.direct_passthrough
+        and not resp.is_streamed
+        and "Content-Encoding" not in resp.headers
+        and resp.mimetype in TIPOS_COMPRIMIBLES
+    )
@@ -0,0 +1,337 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+from database import crear_trabajo_correo, tomar_trabajo_correo, actualizar_trabajo_correo
+from http_saliente import LimiteHostError, obtener_cliente, obtener_cliente_async
+
+# Estados de un trabajo de envío masivo
+PENDIENTE = "pendiente"
+EN_PROCESO = "en_proceso"
+COMPLETADO = "completado"
+COMPLETADO_CON_ERRORES = "completado_con_errores"
+FALLIDO = "fallido"
+
+GRAPH_LOTE_MAX = 20          # límite de Graph para $batch
+_STATUS_REINTENTABLES = (429, 500, 502, 503, 504)
+_MAX_ERRORES_GUARDADOS = 100
+
+# Progreso de un trabajo (TrabajosCorreo.Progreso): un carácter por mensaje. "?" marca el lote que
+# se está enviando: si el worker muere antes de guardar la respuesta de Graph no se sabe si salió,
+# y al retomarlo se da por fallido en vez de arriesgar un correo duplicado.
+_P_PENDIENTE, _P_EN_VUELO, _P_ENVIADO, _P_FALLIDO = ".", "?", "e", "f"
+
+CORREO_SONDEO = float(os.getenv("CORREO_SONDEO", "30"))               # segundos entre búsquedas de trabajos
+CORREO_TRABAJO_VENCIDO = float(os.getenv("CORREO_TRABAJO_VENCIDO", "300"))  # sin avance: otro worker lo retoma
+
+
+class ErrorCorreo(Exception):
+    """Graph rechazó el envío o no respondió a tiempo."""
+
+
+class TrabajoReclamado(Exception):
+    """Otro worker retomó el trabajo (este pasó CORREO_TRABAJO_VENCIDO sin avanzar): se deja de enviar."""
+
+
+def _no_salio(error):
+    """True si la petición seguro no llegó a Graph: reintentarla no puede duplicar correos."""
+    if isinstance(error, (LimiteHostError, requests.ConnectTimeout)):
+        return True
+    if isinstance(error, requests.ConnectionError):
+        causa = error.args[0] if error.args else None
+        return isinstance(getattr(causa, "reason", causa), NewConnectionError)
+    return False
+
+
+def _retry_after(headers, por_defecto):
+    valor = (headers or {}).get("Retry-After") or (headers or {}).get("retry-after")
+    try:
+        return max(0.0, float(valor))
+    except (TypeError, ValueError):
+        return por_defecto
+
+
+class LimitadorTasa:
+    """
+    Espaciado mínimo entre peticiones a Graph más una pausa global que se activa cuando Graph
+    responde 429/503 con Retry-After (el throttling es por buzón, no por petición).
+    """
+
+    def __init__(self, por_segundo):
+        self._intervalo = 1.0 / por_segundo if por_segundo > 0 else 0.0
+        self._siguiente = 0.0
+        self._lock = threading.Lock()
+
+    def pausar(self, segundos):
+        with self._lock:
+            self._siguiente = max(self._siguiente, time.monotonic() + segundos)
+
+    def esperar(self):
+        with self._lock:
+            ahora = time.monotonic()
+            turno = max(ahora, self._siguiente)
+            self._siguiente = turno + self._intervalo
+        if turno > ahora:
+            time.sleep(turno - ahora)
+
+
+class MotorCorreo:
+    """
+    Envío de correos por Microsoft Graph.
+    - enviar(): un correo, síncrono (usado por /send-email).
+    - enviar_async(): lo mismo para el modo ASGI (asgi.py), sin ocupar un hilo mientras Graph responde.
+    - crear_trabajo(): guarda muchos correos en TrabajosCorreo; el hilo de envíos de algún worker
+      lo toma y los envía con $batch (20 por petición), respetando Retry-After y reintentando con
+      backoff solo lo que seguro no salió. Mensajes y avance quedan en la fila: si el worker se
+      recicla a mitad, otro retoma el trabajo donde quedó (ver tomar_trabajo_correo).
+    """
+
+    def __init__(self, obtener_token, remitente, base_url=None, cliente=None, invalidar_token=None):
+        self._obtener_token = obtener_token
+        self._invalidar_token = invalidar_token  # invalidar_token(token) tras un 401: el reintento pide otro
+        self.remitente = remitente
+        self.base_url = (base_url or os.getenv("GRAPH_BASE_URL", "https://graph.microsoft.com/v1.0")).rstrip("/")
+        self.timeout = (
+            float(os.getenv("GRAPH_CONNECT_TIMEOUT", "5")),
+            float(os.getenv("GRAPH_READ_TIMEOUT", "30")),
+        )
+        self.tamano_lote = max(1, min(GRAPH_LOTE_MAX, int(os.getenv("GRAPH_BATCH_SIZE", str(GRAPH_LOTE_MAX)))))
+        self.max_intentos = int(os.getenv("GRAPH_MAX_REINTENTOS", "5"))
+        self.backoff_base = float(os.getenv("GRAPH_BACKOFF_BASE", "1"))
+        self.backoff_max = float(os.getenv("GRAPH_BACKOFF_MAX", "60"))
+        self.limitador = LimitadorTasa(float(os.getenv("GRAPH_LOTES_POR_SEGUNDO", "2")))
+
+        self._cliente = cliente
+
+        self._aviso = False
+        self._cond = threading.Condition()
+        self._hilo = None
+        self._hilo_pid = None
+
+    @property
+    def cliente(self):
+        # Por defecto el cliente HTTP compartido del proceso (pool de conexiones y métricas comunes)
+        return self._cliente or obtener_cliente()
+
+    # ----------------------- ENVÍO INDIVIDUAL -----------------------
+    @staticmethod
+    def _mensaje(destinatarios, asunto, cuerpo):
+        return {
+            "message": {
+                "subject": asunto,
+                "body": {"contentType": "HTML", "content": cuerpo},
+                "toRecipients": [{"emailAddress": {"address": email}} for email in destinatarios],
+            },
+            "saveToSentItems": "true",
+        }
+
+    def _headers(self):
+        return {"Authorization": f"Bearer {self._obtener_token()}", "Content-Type": "application/json"}
+
+    def enviar(self, destinatarios, asunto, cuerpo):
+        url = f"{self.base_url}/users/{self.remitente}/sendMail"
+        try:
+            resp = self.cliente.post(url, servicio="graph", headers=self._headers(),
+                                     json=self._mensaje(destinatarios, asunto, cuerpo), timeout=self.timeout)
+        except requests.RequestException as e:
+            raise ErrorCorreo(f"No se pudo contactar con Graph: {e}")
+        if resp.status_code != 202:
+            raise ErrorCorreo(f"Error enviando correo: {resp.status_code} - {resp.text}")
+
+    async def enviar_async(self, destinatarios, asunto, cuerpo):
+        url = f"{self.base_url}/users/{self.remitente}/sendMail"
+        # El token casi siempre está en memoria; si hay que pedirlo, msal bloquea y va a un hilo
+        headers = await asyncio.to_thread(self._headers)
+        try:
+            resp = await obtener_cliente_async().post(url, servicio="graph", headers=headers,
+                                                      json=self._mensaje(destinatarios, asunto, cuerpo),
+                                                      timeout=self.timeout)
+        except requests.RequestException as e:
+            raise ErrorCorreo(f"No se pudo contactar con Graph: {e}")
+        if resp.status_code != 202:
+            raise ErrorCorreo(f"Error enviando correo: {resp.status_code} - {resp.text}")
+
+    # ----------------------- TRABAJOS MASIVOS -----------------------
+    def crear_trabajo(self, mensajes):
+        """mensajes: lista de dicts {'to': [emails], 'subject': str, 'body': str}. Devuelve el id del trabajo."""
+        trabajo_id = uuid.uuid4().hex
+        crear_trabajo_correo(trabajo_id, mensajes, _P_PENDIENTE * len(mensajes))
+        self._asegurar_hilo()
+        with self._cond:
+            self._aviso = True  # lo más probable es que lo tome este mismo worker, sin esperar el sondeo
+            self._cond.notify()
+        return trabajo_id
+
+    def iniciar(self):
+        """Arranca el hilo de envíos del proceso (post_worker_init de gunicorn) para retomar trabajos huérfanos."""
+        self._asegurar_hilo()
+
+    def _asegurar_hilo(self):
+        # Un hilo por proceso; tras un fork de gunicorn el hilo del padre no existe en el hijo
+        pid = os.getpid()
+        with self._cond:
+            if self._hilo is not None and self._hilo_pid == pid and self._hilo.is_alive():
+                return
+            self._hilo = threading.Thread(target=self._bucle, name="motor-correo", daemon=True)
+            self._hilo_pid = pid
+            self._hilo.start()
+
+    def _bucle(self):
+        while True:
+            with self._cond:
+                if not self._aviso:
+                    self._cond.wait(CORREO_SONDEO)
+                self._aviso = False
+            while True:
+                toma = uuid.uuid4().hex
+                try:
+                    trabajo = tomar_trabajo_correo(toma, CORREO_TRABAJO_VENCIDO)
+                except Exception as e:
+                    print(f"⚠️ Correo: no se pudo buscar trabajos pendientes: {e}")
+                    break
+                if trabajo is None:
+                    break
+                self._ejecutar(trabajo, toma)
+
+    def _ejecutar(self, trabajo, toma):
+        try:
+            self._procesar(trabajo, toma)
+        except TrabajoReclamado:
+            print(f"⚠️ Trabajo de correo {trabajo['id']} retomado por otro worker")
+        except Exception as e:
+            print(f"❌ Trabajo de correo {trabajo['id']} abortado: {e}")
+            try:
+                # Lo que no se envió queda fallido; si la BD tampoco responde, otro worker lo retomará
+                progreso = "".join(m if m == _P_ENVIADO else _P_FALLIDO for m in trabajo["progreso"])
+                enviados = progreso.count(_P_ENVIADO)
+                actualizar_trabajo_correo(trabajo["id"], toma, FALLIDO, enviados, len(progreso) - enviados,
+                                          [{"error": str(e)}], progreso, finalizado=True)
+            except Exception:
+                pass
+
+    def _backoff(self, intentos):
+        espera = min(self.backoff_max, self.backoff_base * (2 ** max(0, intentos - 1)))
+        return espera * (0.5 + random.random() / 2)
+
+    def _guardar(self, trabajo_id, toma, estado, progreso, errores, finalizado=False):
+        texto = "".join(progreso)
+        enviados = texto.count(_P_ENVIADO)
+        if not actualizar_trabajo_correo(trabajo_id, toma, estado, enviados, texto.count(_P_FALLIDO),
+                                         errores[-_MAX_ERRORES_GUARDADOS:], texto, finalizado):
+            raise TrabajoReclamado(trabajo_id)
+        return enviados
+
+    def _procesar(self, trabajo, toma):
+        trabajo_id, mensajes = trabajo["id"], trabajo["mensajes"]
+        progreso = trabajo["progreso"] = list(trabajo["progreso"])  # se actualiza en el lugar
+        errores = trabajo["errores"]
+        for indice, marca in enumerate(progreso):
+            if marca == _P_EN_VUELO:
+                progreso[indice] = _P_FALLIDO
+                errores.append({"indice": indice, "to": mensajes[indice]["to"],
+                                "error": "Envío interrumpido sin respuesta de Graph; no se reintenta para no duplicarlo"})
+        pendientes = deque((i, mensajes[i], 0) for i, marca in enumerate(progreso) if marca == _P_PENDIENTE)
+
+        while pendientes:
+            lote = [pendientes.popleft() for _ in range(min(self.tamano_lote, len(pendientes)))]
+            self.limitador.esperar()
+            for indice, _, _ in lote:
+                progreso[indice] = _P_EN_VUELO
+            self._guardar(trabajo_id, toma, EN_PROCESO, progreso, errores)
+            resultados = self._enviar_lote(lote)
+
+            reintentar = []
+            pausa = 0.0
+            for (indice, mensaje, intentos), (ok, reintentable, retry_after, error) in zip(lote, resultados):
+                if ok:
+                    progreso[indice] = _P_ENVIADO
+                elif reintentable and intentos + 1 < self.max_intentos:
+                    progreso[indice] = _P_PENDIENTE
+                    reintentar.append((indice, mensaje, intentos + 1))
+                    pausa = max(pausa, retry_after if retry_after is not None else self._backoff(intentos + 1))
+                else:
+                    progreso[indice] = _P_FALLIDO
+                    errores.append({"indice": indice, "to": mensaje["to"], "error": error})
+
+            if reintentar:
+                self.limitador.pausar(pausa)
+                pendientes.extendleft(reversed(reintentar))
+
+            self._guardar(trabajo_id, toma, EN_PROCESO, progreso, errores)
+
+        enviados = progreso.count(_P_ENVIADO)
+        estado = COMPLETADO if not errores else (FALLIDO if enviados == 0 else COMPLETADO_CON_ERRORES)
+        self._guardar(trabajo_id, toma, estado, progreso, errores, finalizado=True)
+
+    def _enviar_lote(self, lote):
+        """
+        Envía un lote con POST /$batch. Devuelve por cada mensaje (ok, reintentable, retry_after, error).
+        Solo es reintentable lo que seguro no se envió: sin conexión, 401 (con invalidar_token, para que
+        el reintento use otro token) o 429/503 del lote entero, o 429/5xx en la respuesta del mensaje.
+        Un timeout de lectura, un 500/502/504 del $batch o una respuesta ilegible pueden haber enviado
+        el correo y quedan como fallo definitivo.
+        """
+        cuerpo = {
+            "requests": [
+                {
+                    "id": str(n),
+                    "method": "POST",
+                    "url": f"/users/{self.remitente}/sendMail",
+                    "headers": {"Content-Type": "application/json"},
+                    "body": self._mensaje(m["to"], m["subject"], m["body"]),
+                }
+                for n, (_, m, _) in enumerate(lote)
+            ]
+        }
+        try:
+            headers = self._headers()
+        except Exception as e:
+            return [(False, True, None, f"No se pudo obtener el token de Graph: {e}")] * len(lote)
+        try:
+            resp = self.cliente.post(f"{self.base_url}/$batch", servicio="graph", headers=headers,
+                                     json=cuerpo, timeout=self.timeout)
+        except Exception as e:
+            if _no_salio(e):
+                return [(False, True, None, f"No se pudo conectar con Graph: {e}")] * len(lote)
+            return [(False, False, None, f"Sin respuesta de Graph (puede haberse enviado): {e}")] * len(lote)
+
+        if resp.status_code in (429, 503):
+            retry = _retry_after(resp.headers, None)
+            return [(False, True, retry, f"Graph {resp.status_code}")] * len(lote)
+        if resp.status_code == 401 and self._invalidar_token is not None:
+            # El token cacheado fue rechazado: se descarta y el reintento pide uno nuevo
+            self._invalidar_token(headers["Authorization"].partition(" ")[2])
+            return [(False, True, None, f"Graph 401 - {resp.text[:300]}")] * len(lote)
+        if resp.status_code != 200:
+            return [(False, False, None, f"Graph {resp.status_code} - {resp.text[:300]}")] * len(lote)
+
+        try:
+            respuestas = {r.get("id"): r for r in resp.json().get("responses", [])}
+        except (ValueError, AttributeError):
+            return [(False, False, None, "Respuesta $batch inválida (puede haberse enviado)")] * len(lote)
+
+        resultados = []
+        for n in range(len(lote)):
+            r = respuestas.get(str(n))
+            if r is None:
+                resultados.append((False, False, None, "Sin respuesta para el mensaje en $batch"))
+                continue
+            status = int(r.get("status", 0))
+            if status == 202:
+                resultados.append((True, False, None, None))
+            elif status in _STATUS_REINTENTABLES:
+                resultados.append((False, True, _retry_after(r.get("headers"), None), f"Graph {status}"))
+            else:
+                body = r.get("body")
+                error = body.get("error") if isinstance(body, dict) else None
+                detalle = error.get("message") if isinstance(error, dict) else json.dumps(body)[:300]
+                resultados.append((False, False, None, f"Graph {status} - {detalle}"))
+        return resultados
@@ -1,8 +1,24 @@
+import hashlib
+import json
 import os
+import shutil
+import tempfile
+import threading
 import pyodbc
 from dotenv import load_dotenv
 from pathlib import Path
 
+from cache import cacheado, invalidar
+from metricas import medir_bd, incrementar
+from datasets import construir_dataset, construir_analitica, comprimir, descomprimir
+from pool import PoolConexiones
+import normalizado
+import vistas
+import deltas
+import blobs
+import eventos
+import sesiones
+
 # ======================= CARGA .ENV (carpeta "archivos") =======================
 BASE_DIR = Path(__file__).resolve().parent
 ENV_PATH = BASE_DIR / "archivos" / ".env"
@@ -10,39 +26,104 @@ load_dotenv(dotenv_path=ENV_PATH, override=True)
 
 VALID_ROLES = (u'usuario', u'admin')
 
+# Pool por worker de gunicorn: el total contra SQL Server es DB_POOL_SIZE * workers
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))                # segundos esperando una conexión libre
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))             # segundos inactiva antes de descartarla
+DB_POOL_RECYCLE = float(os.getenv("DB_POOL_RECYCLE", "1800"))              # vida máxima de una conexión
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+DB_POOL_PING_INTERVAL = float(os.getenv("DB_POOL_PING_INTERVAL", "30"))    # sin ping si se usó hace menos
 
-def conectar():
+# TTL de respaldo del cache de lecturas; la invalidación normal es explícita en cada escritura
+CACHE_TTL = float(os.getenv("CACHE_TTL", "300"))
+CACHE_TTL_USUARIOS = float(os.getenv("CACHE_TTL_USUARIOS", "60"))
+
+BLOB_CHUNK_SIZE = int(os.getenv("BLOB_CHUNK_SIZE", str(256 * 1024)))      # bytes por lectura al descargar
+BLOB_WRITE_CHUNK_SIZE = int(os.getenv("BLOB_WRITE_CHUNK_SIZE", str(4 * 1024 * 1024)))  # bytes por .WRITE al guardar
+NORMALIZADO_LOTE = int(os.getenv("NORMALIZADO_LOTE", "2000"))             # filas por executemany
+DATASET_DELTAS_MAX = int(os.getenv("DATASET_DELTAS_MAX", "20"))           # deltas guardados por archivo
+USUARIOS_LOTE = int(os.getenv("USUARIOS_LOTE", "1000"))                   # filas por executemany en /usuarios/bulk
+
+
+def _cadena_conexion(database):
     server = os.getenv("DB_SERVER")
     port = os.getenv("DB_PORT")
     if port:
         server = f"{server},{port}"
 
-    return pyodbc.connect(
+    return (
         'DRIVER={' + os.getenv("DB_DRIVER") + '};'
-                                              'SERVER=' + server + ';'
-                                                                   'DATABASE=' + os.getenv("DB_NAME") + ';'
-                                                                                                        'UID=' + os.getenv(
-            "DB_USER") + ';'
-                         'PWD=' + os.getenv("DB_PASSWORD") + ';'
+        'SERVER=' + server + ';'
+        'DATABASE=' + database + ';'
+        'UID=' + os.getenv("DB_USER") + ';'
+        'PWD=' + os.getenv("DB_PASSWORD") + ';'
     )
 
 
+def _crear_conexion():
+    """Abre una conexión nueva (sin pool) contra la base de la aplicación"""
+    return pyodbc.connect(_cadena_conexion(os.getenv("DB_NAME")))
+
+
+# ======================= POOL DE CONEXIONES =======================
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def obtener_pool():
+    """
+    Devuelve el pool del proceso actual. Se crea perezosamente y se rehace tras un fork,
+    así cada worker de gunicorn tiene su propio pool y nunca comparte sockets con el padre.
+    """
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = PoolConexiones(
+                    _crear_conexion,
+                    tamano=DB_POOL_SIZE,
+                    timeout=DB_POOL_TIMEOUT,
+                    max_inactividad=DB_POOL_MAX_IDLE,
+                    reciclar=DB_POOL_RECYCLE,
+                    pre_ping=DB_POOL_PRE_PING,
+                    intervalo_ping=DB_POOL_PING_INTERVAL,
+                )
+                _pool_pid = pid
+    return _pool
+
+
+def conectar():
+    """
+    Presta una conexión del pool. close() la devuelve al pool (con rollback de lo no confirmado),
+    por lo que el código existente que hace conn.close() sigue funcionando igual.
+    """
+    return obtener_pool().obtener()
+
+
+def metricas_pool():
+    return obtener_pool().metricas()
+
+
+def verificar_conexion(timeout=2.0):
+    """SELECT 1 con una conexión del pool (esperando a lo sumo `timeout` s por una libre) para /ready."""
+    conn = obtener_pool().obtener(timeout=timeout)
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.fetchone()
+    finally:
+        try:
+            cur.close()
+        except:
+            pass
+        conn.close()
+
+
 def conectar_master():
     """Conecta a la base de datos master para operaciones administrativas"""
-    server = os.getenv("DB_SERVER")
-    port = os.getenv("DB_PORT")
-    if port:
-        server = f"{server},{port}"
-
-    return pyodbc.connect(
-        'DRIVER={' + os.getenv("DB_DRIVER") + '};'
-                                              'SERVER=' + server + ';'
-                                                                   'DATABASE=master;'
-                                                                   'UID=' + os.getenv("DB_USER") + ';'
-                                                                                                   'PWD=' + os.getenv(
-            "DB_PASSWORD") + ';',
-        autocommit=True
-    )
+    return pyodbc.connect(_cadena_conexion("master"), autocommit=True)
 
 
 def existe_base_datos():
@@ -167,12 +248,244 @@ def crear_base_datos():
         return False
 
 
+# ======================= MIGRACIONES =======================
+# Scripts idempotentes que se aplican en cada arranque sobre bases ya existentes.
+# Agregar siempre al final; nunca modificar uno ya publicado.
+MIGRACIONES = [
+    ("001_datasets_excel", """
+        IF OBJECT_ID(N'dbo.DatasetsExcel', N'U') IS NULL
+        CREATE TABLE DatasetsExcel (
+            ArchivoId    INT PRIMARY KEY
+                CONSTRAINT FK_DatasetsExcel_Archivo REFERENCES ArchivosExcel(Id) ON DELETE CASCADE,
+            Filas        INT NOT NULL,
+            Columnas     INT NOT NULL,
+            Datos        VARBINARY(MAX) NOT NULL,
+            FechaProceso DATETIME NOT NULL DEFAULT GETDATE()
+        )
+    """),
+    ("002_archivos_hash_version", """
+        IF COL_LENGTH(N'dbo.ArchivosExcel', N'HashSha256') IS NULL
+        ALTER TABLE ArchivosExcel ADD
+            HashSha256 CHAR(64) NULL,
+            Tamano     BIGINT NULL,
+            Version    BIGINT NULL
+    """),
+    ("003_seq_version_archivos", """
+        IF NOT EXISTS (SELECT 1 FROM sys.sequences WHERE name = N'SeqVersionArchivos')
+        CREATE SEQUENCE SeqVersionArchivos AS BIGINT START WITH 1 INCREMENT BY 1
+    """),
+    ("004_archivos_backfill_hash", """
+        UPDATE ArchivosExcel
+        SET HashSha256 = LOWER(CONVERT(CHAR(64), HASHBYTES('SHA2_256', Datos), 2)),
+            Tamano     = DATALENGTH(Datos),
+            Version    = NEXT VALUE FOR SeqVersionArchivos
+        WHERE HashSha256 IS NULL
+    """),
+    ("005_archivos_eliminados", """
+        IF OBJECT_ID(N'dbo.ArchivosEliminados', N'U') IS NULL
+        CREATE TABLE ArchivosEliminados (
+            NombreArchivo    NVARCHAR(255) PRIMARY KEY,
+            Version          BIGINT NOT NULL,
+            FechaEliminacion DATETIME NOT NULL DEFAULT GETDATE()
+        )
+    """),
+    ("006_ix_archivos_version", """
+        IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = N'IX_ArchivosExcel_Version')
+        CREATE INDEX IX_ArchivosExcel_Version ON ArchivosExcel(Version)
+    """),
+    ("007_trabajos_correo", """
+        IF OBJECT_ID(N'dbo.TrabajosCorreo', N'U') IS NULL
+        CREATE TABLE TrabajosCorreo (
+            Id                 CHAR(32) PRIMARY KEY,
+            Estado             NVARCHAR(30) NOT NULL,
+            Total              INT NOT NULL,
+            Enviados           INT NOT NULL DEFAULT 0,
+            Fallidos           INT NOT NULL DEFAULT 0,
+            Errores            NVARCHAR(MAX) NULL,
+            FechaCreacion      DATETIME NOT NULL DEFAULT GETDATE(),
+            FechaActualizacion DATETIME NOT NULL DEFAULT GETDATE(),
+            FechaFin           DATETIME NULL
+        )
+    """),
+    ("008_datasets_analitica", """
+        IF COL_LENGTH(N'dbo.DatasetsExcel', N'Analitica') IS NULL
+        ALTER TABLE DatasetsExcel ADD Analitica VARBINARY(MAX) NULL
+    """),
+    ("009_vistas_materializadas", """
+        IF OBJECT_ID(N'dbo.VistasMaterializadas', N'U') IS NULL
+        CREATE TABLE VistasMaterializadas (
+            Nombre       NVARCHAR(50) PRIMARY KEY,
+            Fuentes      NVARCHAR(200) NOT NULL,
+            Filas        INT NOT NULL,
+            Datos        VARBINARY(MAX) NOT NULL,
+            FechaProceso DATETIME NOT NULL DEFAULT GETDATE()
+        )
+    """),
+    ("010_calificaciones", """
+        IF OBJECT_ID(N'dbo.Calificaciones', N'U') IS NULL
+        BEGIN
+        CREATE TABLE Calificaciones (
+            ArchivoId                INT NOT NULL
+                CONSTRAINT FK_Calificaciones_Archivo REFERENCES ArchivosExcel(Id) ON DELETE CASCADE,
+            Version                  BIGINT NOT NULL,
+            Identificacion           NVARCHAR(20) NOT NULL,
+            Periodo                  NVARCHAR(50) NOT NULL,
+            Materia                  NVARCHAR(200) NOT NULL,
+            CodMateria               NVARCHAR(30) NULL,
+            CodCarrera               NVARCHAR(20) NULL,
+            Carrera                  NVARCHAR(150) NULL,
+            Nivel                    NVARCHAR(10) NULL,
+            Paralelo                 NVARCHAR(50) NULL,
+            Apellidos                NVARCHAR(150) NULL,
+            Nombres                  NVARCHAR(150) NULL,
+            AsistenciaPrimerParcial  DECIMAL(6,2) NULL,
+            PrimerParcial            DECIMAL(6,2) NULL,
+            AsistenciaSegundoParcial DECIMAL(6,2) NULL,
+            SegundoParcial           DECIMAL(6,2) NULL,
+            Recuperacion             DECIMAL(6,2) NULL,
+            Mejoramiento             DECIMAL(6,2) NULL,
+            PromedioParciales        DECIMAL(6,2) NULL,
+            Promedio                 DECIMAL(6,2) NULL,
+            NoVez                    SMALLINT NULL,
+            Estado                   NVARCHAR(30) NULL,
+            DocenteId                NVARCHAR(20) NULL,
+            Docente                  NVARCHAR(200) NULL,
+            CorreoInstitucional      NVARCHAR(150) NULL,
+            CorreoPersonal           NVARCHAR(150) NULL
+        );
+        CREATE INDEX IX_Calificaciones_Archivo ON Calificaciones(ArchivoId, Version);
+        CREATE INDEX IX_Calificaciones_Estudiante ON Calificaciones(Identificacion, Periodo, Materia);
+        CREATE INDEX IX_Calificaciones_Materia ON Calificaciones(Periodo, Materia);
+        CREATE INDEX IX_Calificaciones_Docente ON Calificaciones(DocenteId, Periodo);
+        END
+    """),
+    ("011_matriculas", """
+        IF OBJECT_ID(N'dbo.Matriculas', N'U') IS NULL
+        BEGIN
+        CREATE TABLE Matriculas (
+            ArchivoId               INT NOT NULL
+                CONSTRAINT FK_Matriculas_Archivo REFERENCES ArchivosExcel(Id) ON DELETE CASCADE,
+            Version                 BIGINT NOT NULL,
+            Identificacion          NVARCHAR(20) NOT NULL,
+            Periodo                 NVARCHAR(50) NOT NULL,
+            CodCarrera              NVARCHAR(20) NULL,
+            Carrera                 NVARCHAR(150) NULL,
+            Nivel                   NVARCHAR(10) NULL,
+            Apellidos               NVARCHAR(150) NULL,
+            Nombres                 NVARCHAR(150) NULL,
+            Sexo                    NVARCHAR(20) NULL,
+            Discapacidad            NVARCHAR(100) NULL,
+            PorcentajeDiscapacidad  DECIMAL(6,2) NULL,
+            Vez                     SMALLINT NULL,
+            Estado                  NVARCHAR(30) NULL,
+            FechaMatricula          DATETIME NULL,
+            FechaLegalizacion       DATETIME NULL,
+            CorreoInstitucional     NVARCHAR(150) NULL,
+            CorreoPersonal          NVARCHAR(150) NULL
+        );
+        CREATE INDEX IX_Matriculas_Archivo ON Matriculas(ArchivoId, Version);
+        CREATE INDEX IX_Matriculas_Estudiante ON Matriculas(Identificacion, Periodo);
+        END
+    """),
+    ("012_docentes", """
+        IF OBJECT_ID(N'dbo.Docentes', N'U') IS NULL
+        BEGIN
+        CREATE TABLE Docentes (
+            ArchivoId            INT NOT NULL
+                CONSTRAINT FK_Docentes_Archivo REFERENCES ArchivosExcel(Id) ON DELETE CASCADE,
+            Version              BIGINT NOT NULL,
+            Identificacion       NVARCHAR(20) NOT NULL,
+            Periodo              NVARCHAR(50) NOT NULL,
+            Carrera              NVARCHAR(150) NULL,
+            Nombres              NVARCHAR(200) NULL,
+            Dedicacion           NVARCHAR(10) NULL,
+            Cargo                NVARCHAR(150) NULL,
+            TipoContrato         NVARCHAR(50) NULL,
+            HorasContrato        SMALLINT NULL,
+            CorreoInstitucional  NVARCHAR(150) NULL,
+            CorreoPersonal       NVARCHAR(150) NULL
+        );
+        CREATE INDEX IX_Docentes_Archivo ON Docentes(ArchivoId, Version);
+        CREATE INDEX IX_Docentes_Docente ON Docentes(Identificacion, Periodo);
+        END
+    """),
+    ("013_usuarios_normalizado", """
+        IF COL_LENGTH(N'dbo.Usuarios', N'UsuarioNorm') IS NULL
+        ALTER TABLE Usuarios ADD UsuarioNorm AS CAST(LOWER(LTRIM(RTRIM(Usuario))) AS NVARCHAR(150)) PERSISTED
+    """),
+    ("014_ix_usuarios", """
+        -- Único salvo que ya existan usuarios que solo difieren en mayúsculas/espacios
+        IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = N'IX_Usuarios_UsuarioNorm')
+        BEGIN
+            IF EXISTS (SELECT UsuarioNorm FROM Usuarios GROUP BY UsuarioNorm HAVING COUNT(*) > 1)
+                CREATE INDEX IX_Usuarios_UsuarioNorm ON Usuarios(UsuarioNorm) INCLUDE (Usuario, Estado, Rol);
+            ELSE
+                CREATE UNIQUE INDEX IX_Usuarios_UsuarioNorm ON Usuarios(UsuarioNorm) INCLUDE (Usuario, Estado, Rol);
+        END
+        IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = N'IX_Usuarios_Rol')
+        CREATE INDEX IX_Usuarios_Rol ON Usuarios(Rol, Id) INCLUDE (Usuario, Estado, UsuarioNorm);
+        IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = N'IX_Usuarios_Estado')
+        CREATE INDEX IX_Usuarios_Estado ON Usuarios(Estado, Id) INCLUDE (Usuario, Rol, UsuarioNorm);
+    """),
+    ("015_deltas_dataset", """
+        IF OBJECT_ID(N'dbo.DeltasDataset', N'U') IS NULL
+        CREATE TABLE DeltasDataset (
+            ArchivoId    INT NOT NULL
+                CONSTRAINT FK_DeltasDataset_Archivo REFERENCES ArchivosExcel(Id) ON DELETE CASCADE,
+            VersionDesde BIGINT NOT NULL,
+            VersionHasta BIGINT NOT NULL,
+            Datos        VARBINARY(MAX) NOT NULL,
+            FechaProceso DATETIME NOT NULL DEFAULT GETDATE(),
+            CONSTRAINT PK_DeltasDataset PRIMARY KEY (ArchivoId, VersionHasta)
+        )
+    """),
+    ("016_sesiones_revocadas", """
+        -- RevocadoDesde en ms epoch, igual que el iat de los tokens (ver sesiones.py)
+        IF OBJECT_ID(N'dbo.SesionesRevocadas', N'U') IS NULL
+        CREATE TABLE SesionesRevocadas (
+            UsuarioId     INT NOT NULL CONSTRAINT PK_SesionesRevocadas PRIMARY KEY,
+            RevocadoDesde BIGINT NOT NULL
+        )
+    """),
+    ("017_trabajos_correo_cola", """
+        -- Los mensajes y el avance de cada trabajo viven en la fila: cualquier worker lo retoma
+        IF COL_LENGTH(N'dbo.TrabajosCorreo', N'Mensajes') IS NULL
+        ALTER TABLE TrabajosCorreo ADD
+            Mensajes VARBINARY(MAX) NULL,  -- JSON gzip con los mensajes
+            Progreso VARCHAR(MAX) NULL,    -- un carácter por mensaje (ver correo.py)
+            Toma     CHAR(32) NULL;        -- worker que lo está enviando (cambia en cada toma)
+        IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = N'IX_TrabajosCorreo_Estado')
+        CREATE INDEX IX_TrabajosCorreo_Estado ON TrabajosCorreo(Estado, FechaActualizacion)
+    """),
+]
+
+
+def aplicar_migraciones():
+    conn = conectar()
+    try:
+        cur = conn.cursor()
+        for nombre, sql in MIGRACIONES:
+            cur.execute(sql)
+            conn.commit()
+            print(f"✅ Migración {nombre} verificada")
+        return True
+    except Exception as e:
+        print(f"❌ Error aplicando migraciones: {e}")
+        return False
+    finally:
+        try:
+            cur.close()
+        except:
+            pass
+        conn.close()
+
+
 def inicializar_base_datos():
     """
-    Función principal de inicialización - ahora simplificada
+    Función principal de inicialización: crea la BD si no existe y aplica migraciones pendientes
     """
     try:
-        return crear_base_datos()
+        return crear_base_datos() and aplicar_migraciones()
     except Exception as e:
         print(f"💥 Error crítico en inicialización: {e}")
         return False
@@ -190,31 +503,130 @@ def _row_to_user_dict(row):
 
 
 # ======================= ARCHIVOS =======================
+def _bloquear_versionado(cur):
+    """
+    Serializa las escrituras de ArchivosExcel hasta el commit: así una versión mayor nunca se
+    confirma antes que una menor y /files/changes no se salta cambios.
+    """
+    cur.execute("""
+        EXEC sp_getapplock @Resource = N'ArchivosExcel.Version', @LockMode = N'Exclusive',
+                           @LockOwner = N'Transaction', @LockTimeout = 30000
+    """)
+
+
 def guardar_archivo_excel(archivo):
-    nombre = archivo.filename
-    tipo = archivo.mimetype
-    contenido = archivo.read()
+    """
+    Guarda el archivo recibido en /upload (FileStorage). Se vuelca por bloques a un temporal y
+    se guarda igual que una subida por partes, sin tener el workbook entero en memoria.
+    """
+    fd, ruta = tempfile.mkstemp(prefix="facaf-upload-")
+    try:
+        with os.fdopen(fd, "wb") as destino:
+            shutil.copyfileobj(archivo.stream, destino, 1024 * 1024)
+        return guardar_archivo_desde_ruta(archivo.filename, archivo.mimetype, ruta)
+    finally:
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+
+def _hash_archivo(ruta):
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for parte in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(parte)
+    return h.hexdigest()
 
+
+@medir_bd
+def _hash_guardado(nombre):
+    """(HashSha256, Id, Version) del archivo guardado con ese nombre, o None."""
     conn = conectar()
     try:
         cur = conn.cursor()
-        # Verifica si ya existe el archivo por nombre
-        cur.execute("SELECT Id FROM ArchivosExcel WHERE NombreArchivo = ?", (nombre,))
-        existe = cur.fetchone()
+        cur.execute("SELECT HashSha256, Id, Version FROM ArchivosExcel WHERE NombreArchivo = ?", (nombre,))
+        row = cur.fetchone()
+        return (row[0], row[1], row[2]) if row else None
+    finally:
+        try:
+            cur.close()
+        except:
+            pass
+        conn.close()
 
-        if existe:
-            cur.execute("""
-                UPDATE ArchivosExcel
-                SET TipoMime = ?, Datos = ?, FechaSubida = GETDATE()
-                WHERE NombreArchivo = ?
-            """, (tipo, contenido, nombre))
-        else:
-            cur.execute("""
-                INSERT INTO ArchivosExcel (NombreArchivo, TipoMime, Datos)
-                VALUES (?, ?, ?)
-            """, (nombre, tipo, contenido))
 
+def _escribir_blob(cur, archivo_id, ruta):
+    """Copia el archivo al blob (ya vacío) por partes con .WRITE: en memoria solo hay una parte."""
+    with open(ruta, "rb") as f:
+        for parte in iter(lambda: f.read(BLOB_WRITE_CHUNK_SIZE), b""):
+            cur.execute("UPDATE ArchivosExcel SET Datos.WRITE(?, NULL, NULL) WHERE Id = ?", (parte, archivo_id))
+            incrementar("facaf_blob_bytes_total", len(parte), direccion="escritura")
+
+
+@medir_bd
+def guardar_archivo_desde_ruta(nombre, tipo, ruta, hash_sha=None):
+    """
+    Guarda o reemplaza un archivo por nombre a partir de un archivo en disco. Si el contenido es
+    idéntico (mismo SHA-256) no se reescribe el blob ni cambia la versión.
+    Devuelve {'id', 'nombre', 'hash', 'tamano', 'version', 'cambio'}.
+    """
+    tamano = os.path.getsize(ruta)
+    hash_sha = hash_sha or _hash_archivo(ruta)
+
+    # Contenido idéntico al de la BD: se evita parsear el workbook. Se consulta la fila y no el
+    # listado en cache, que puede estar atrasado (otro host, o solo TTL sin contador compartido)
+    previo = _hash_guardado(nombre)
+    if previo and previo[0] == hash_sha:
+        return {'id': previo[1], 'nombre': nombre, 'hash': hash_sha, 'tamano': tamano,
+                'version': previo[2], 'cambio': False}
+
+    # Se parsea sin conexión tomada para no retenerla mientras se usa CPU
+    dataset = construir_dataset(ruta)
+    nuevo = descomprimir(dataset[2]) if dataset else None
+    extraido = normalizado.extraer(nuevo) if nuevo else None
+    delta = _calcular_delta(nombre, nuevo) if nuevo else None
+
+    conn = conectar()
+    try:
+        cur = conn.cursor()
+        _bloquear_versionado(cur)
+        # NEXT VALUE FOR no se permite dentro de un MERGE: se toma antes en una variable
+        cur.execute("""
+            SET NOCOUNT ON;
+            DECLARE @version BIGINT = NEXT VALUE FOR SeqVersionArchivos;
+            MERGE ArchivosExcel AS t
+            USING (SELECT ? AS NombreArchivo, ? AS TipoMime, ? AS HashSha256, ? AS Tamano) AS s
+                ON t.NombreArchivo = s.NombreArchivo
+            WHEN MATCHED AND (t.HashSha256 IS NULL OR t.HashSha256 <> s.HashSha256) THEN
+                UPDATE SET TipoMime = s.TipoMime, Datos = 0x, HashSha256 = s.HashSha256,
+                           Tamano = s.Tamano, Version = @version, FechaSubida = GETDATE()
+            WHEN NOT MATCHED THEN
+                INSERT (NombreArchivo, TipoMime, Datos, HashSha256, Tamano, Version)
+                VALUES (s.NombreArchivo, s.TipoMime, 0x, s.HashSha256, s.Tamano, @version)
+            OUTPUT $action, INSERTED.Id, INSERTED.Version, DELETED.Version;
+        """, (nombre, tipo, hash_sha, tamano))
+        row = cur.fetchone()
+        if row is None:
+            # Otra subida guardó el mismo contenido entre la comparación y el bloqueo
+            conn.rollback()
+            cur.execute("SELECT Id, Version FROM ArchivosExcel WHERE NombreArchivo = ?", (nombre,))
+            existe = cur.fetchone()
+            return {'id': existe[0], 'nombre': nombre, 'hash': hash_sha, 'tamano': tamano,
+                    'version': existe[1], 'cambio': False}
+        accion, archivo_id, version, version_previa = row[0], row[1], row[2], row[3]
+        if accion == 'INSERT':
+            cur.execute("DELETE FROM ArchivosEliminados WHERE NombreArchivo = ?", (nombre,))
+
+        _escribir_blob(cur, archivo_id, ruta)
+        _guardar_dataset(cur, archivo_id, dataset)
+        _guardar_delta(cur, archivo_id, version, version_previa, delta, dataset)
+        _cargar_normalizado(cur, archivo_id, version, extraido)
         conn.commit()
+        invalidar('archivos', 'datasets')
+        eventos.publicar('dataset', accion='subido', nombre=nombre, version=version)
+        blobs.descartar(archivo_id)
+        blobs.guardar_desde_ruta(archivo_id, hash_sha, ruta)
     finally:
         try:
             cur.close()
@@ -222,17 +634,173 @@ def guardar_archivo_excel(archivo):
             pass
         conn.close()
 
+    _actualizar_vistas(nombre)
+    return {'id': archivo_id, 'nombre': nombre, 'hash': hash_sha, 'tamano': tamano,
+            'version': version, 'cambio': True}
+
+
+def _guardar_dataset(cur, archivo_id, dataset):
+    cur.execute("DELETE FROM DatasetsExcel WHERE ArchivoId = ?", (archivo_id,))
+    if dataset is None:
+        return
+    filas, columnas, datos, analitica = dataset
+    cur.execute("""
+        INSERT INTO DatasetsExcel (ArchivoId, Filas, Columnas, Datos, Analitica)
+        VALUES (?, ?, ?, ?, ?)
+    """, (archivo_id, filas, columnas, datos, analitica))
+
+
+def _calcular_delta(nombre, nuevo):
+    """
+    Delta desde el dataset guardado hoy (antes de la subida) hasta `nuevo`, sin la versión de
+    destino (se conoce al guardar). None si no hay versión previa o no se puede expresar por clave.
+    """
+    conn = conectar()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT a.Version, d.Datos
+            FROM ArchivosExcel a
+            JOIN DatasetsExcel d ON d.ArchivoId = a.Id
+            WHERE a.NombreArchivo = ?
+        """, (nombre,))
+        row = cur.fetchone()
+    finally:
+        try:
+            cur.close()
+        except:
+            pass
+        conn.close()
+    if not row or row[0] is None:
+        return None
+    try:
+        return deltas.calcular(descomprimir(row[1]), nuevo, int(row[0]), None)
+    except Exception as e:
+        # El delta es un derivado: si falla, los clientes descargan el dataset completo
+        print(f"⚠️ No se generó delta de {nombre}: {e}")
+        return None
 
+
+def _guardar_delta(cur, archivo_id, version, version_previa, delta, dataset):
+    """
+    Guarda el delta solo si parte de la versión que quedó reemplazada (otra subida pudo ganar la
+    carrera entre el cálculo y el bloqueo) y si pesa menos que el dataset completo. Si no, se
+    borran los anteriores: la cadena quedó cortada y los clientes deben bajar el dataset completo.
+    """
+    if (delta is None or dataset is None or version_previa is None
+            or int(version_previa) != delta["desde"]):
+        cur.execute("DELETE FROM DeltasDataset WHERE ArchivoId = ?", (archivo_id,))
+        return
+    delta["version"] = int(version)
+    datos = comprimir(delta)
+    if len(datos) >= len(dataset[2]):
+        cur.execute("DELETE FROM DeltasDataset WHERE ArchivoId = ?", (archivo_id,))
+        return
+    cur.execute("""
+        INSERT INTO DeltasDataset (ArchivoId, VersionDesde, VersionHasta, Datos)
+        VALUES (?, ?, ?, ?)
+    """, (archivo_id, delta["desde"], delta["version"], datos))
+    cur.execute("""
+        DELETE FROM DeltasDataset
+        WHERE ArchivoId = ? AND VersionHasta NOT IN (
+            SELECT TOP (?) VersionHasta FROM DeltasDataset WHERE ArchivoId = ? ORDER BY VersionHasta DESC
+        )
+    """, (archivo_id, DATASET_DELTAS_MAX, archivo_id))
+
+
+def _cargar_normalizado(cur, archivo_id, version, extraido):
+    """
+    Inserta las filas tipadas de la versión nueva por lotes (fast_executemany) y borra las de
+    versiones anteriores. Va dentro de la transacción de guardar_archivo_excel: el cambio de
+    versión es atómico y, si algo falla, queda la versión anterior completa.
+    """
+    if extraido is not None:
+        tabla, columnas, filas = extraido
+        marcadores = ", ".join("?" for _ in range(len(columnas) + 2))
+        sql = f"INSERT INTO {tabla} (ArchivoId, Version, {', '.join(columnas)}) VALUES ({marcadores})"
+        cur.fast_executemany = True
+        try:
+            for lote in normalizado.lotes(filas, NORMALIZADO_LOTE):
+                cur.executemany(sql, [(archivo_id, version) + fila for fila in lote])
+        finally:
+            cur.fast_executemany = False
+    # En todas las tablas: el archivo pudo cambiar de tipo entre versiones
+    for tabla in normalizado.TABLAS:
+        cur.execute(f"DELETE FROM {tabla} WHERE ArchivoId = ? AND Version <> ?", (archivo_id, version))
+
+
+def _row_to_archivo_dict(row):
+    # row: (Id, NombreArchivo, FechaSubida, Tamano, HashSha256, Version)
+    return {
+        'id': row[0],
+        'nombre': row[1],
+        'fecha': row[2].strftime('%Y-%m-%d %H:%M:%S'),
+        'tamano': int(row[3]) if row[3] is not None else None,
+        'hash': row[4],
+        'version': int(row[5]) if row[5] is not None else None,
+    }
+
+
+@cacheado('archivos', CACHE_TTL)
+@medir_bd
 def listar_archivos():
     conn = conectar()
     try:
         cur = conn.cursor()
-        cur.execute("SELECT Id, NombreArchivo, FechaSubida FROM ArchivosExcel ORDER BY FechaSubida DESC")
+        cur.execute("""
+            SELECT Id, NombreArchivo, FechaSubida, Tamano, HashSha256, Version
+            FROM ArchivosExcel ORDER BY FechaSubida DESC
+        """)
         rows = cur.fetchall()
-        return [
-            {'id': row[0], 'nombre': row[1], 'fecha': row[2].strftime('%Y-%m-%d %H:%M:%S')}
-            for row in rows
-        ]
+        return [_row_to_archivo_dict(row) for row in rows]
+    finally:
+        try:
+            cur.close()
+        except:
+            pass
+        conn.close()
+
+
+@cacheado('archivos', CACHE_TTL)
+@medir_bd
+def listar_cambios_archivos(desde_version: int):
+    """
+    Cambios posteriores a desde_version: {'version', 'archivos': [...], 'eliminados': [...], 'completo'}.
+    Si el cliente trae una versión mayor a la actual (p. ej. la BD se recreó) se devuelve todo
+    con completo=True para que descarte su copia local.
+    """
+    conn = conectar()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT ISNULL(MAX(v), 0) FROM (
+                SELECT MAX(Version) AS v FROM ArchivosExcel
+                UNION ALL
+                SELECT MAX(Version) FROM ArchivosEliminados
+            ) t
+        """)
+        version = int(cur.fetchone()[0])
+
+        completo = desde_version <= 0 or desde_version > version
+        desde = 0 if completo else desde_version
+
+        cur.execute("""
+            SELECT Id, NombreArchivo, FechaSubida, Tamano, HashSha256, Version
+            FROM ArchivosExcel WHERE Version > ? OR (? = 0 AND Version IS NULL)
+            ORDER BY Version
+        """, (desde, desde))
+        archivos = [_row_to_archivo_dict(row) for row in cur.fetchall()]
+
+        eliminados = []
+        if not completo:
+            cur.execute("""
+                SELECT NombreArchivo, Version FROM ArchivosEliminados
+                WHERE Version > ? ORDER BY Version
+            """, (desde,))
+            eliminados = [{'nombre': row[0], 'version': int(row[1])} for row in cur.fetchall()]
+
+        return {'version': version, 'desde': desde_version, 'completo': completo,
+                'archivos': archivos, 'eliminados': eliminados}
     finally:
         try:
             cur.close()
@@ -241,6 +809,7 @@ def listar_archivos():
         conn.close()
 
 
+@medir_bd
 def obtener_archivo(archivo_id):
     conn = conectar()
     try:
@@ -257,7 +826,333 @@ def obtener_archivo(archivo_id):
         conn.close()
 
 
+@cacheado('archivos', CACHE_TTL)
+@medir_bd
+def obtener_info_archivo(archivo_id):
+    """
+    Metadatos de un archivo sin leer el blob: (nombre, tipo, fecha_subida, tamano, hash, version) o None.
+    fecha_subida va en UTC: FechaSubida se guarda con GETDATE() (hora local del servidor) y se
+    corre con el desfase actual del servidor para que Last-Modified sea correcto.
+    """
+    conn = conectar()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT NombreArchivo, TipoMime,
+                   DATEADD(minute, -DATEPART(TZOFFSET, SYSDATETIMEOFFSET()), FechaSubida),
+                   ISNULL(Tamano, DATALENGTH(Datos)), HashSha256, Version
+            FROM ArchivosExcel WHERE Id = ?
+        """, (archivo_id,))
+        row = cur.fetchone()
+        return (row[0], row[1], row[2], int(row[3] or 0), row[4], row[5]) if row else None
+    finally:
+        try:
+            cur.close()
+        except:
+            pass
+        conn.close()
+
+
+@medir_bd
+def leer_archivo_por_partes(archivo_id, version, inicio=0, fin=None, tamano_parte=BLOB_CHUNK_SIZE):
+    """
+    Generador que lee Datos[inicio:fin] en partes con SUBSTRING, sin cargar el blob completo en memoria.
+    Cada parte usa una conexión prestada del pool y la devuelve enseguida, así un cliente lento
+    no retiene conexiones. Si el archivo se reemplaza a mitad de la descarga (cambia Version)
+    se corta el stream en vez de mezclar dos versiones. Se compara Version (BIGINT) y no
+    FechaSubida: un DATETIME contra un parámetro datetime2 puede no ser igual aunque no cambió.
+    """
+    pos = inicio
+    while fin is None or pos < fin:
+        largo = tamano_parte if fin is None else min(tamano_parte, fin - pos)
+        conn = conectar()
+        try:
+            cur = conn.cursor()
+            # SUBSTRING sobre VARBINARY es 1-based
+            cur.execute("""
+                SELECT SUBSTRING(Datos, ?, ?) FROM ArchivosExcel
+                WHERE Id = ? AND Version = ?
+            """, (pos + 1, largo, archivo_id, version))
+            row = cur.fetchone()
+        finally:
+            try:
+                cur.close()
+            except:
+                pass
+            conn.close()
+
+        if row is None:
+            raise RuntimeError(f"El archivo {archivo_id} cambió o se eliminó durante la descarga")
+        parte = row[0] or b""
+        if not parte:
+            return
+        incrementar("facaf_blob_bytes_total", len(parte), direccion="lectura")
+        yield bytes(parte)
+        pos += len(parte)
+
+
+@medir_bd
+def eliminar_archivo(nombre):
+    """Elimina un archivo por nombre dejando una marca versionada para /files/changes. Devuelve True si existía."""
+    conn = conectar()
+    try:
+        cur = conn.cursor()
+        _bloquear_versionado(cur)
+        cur.execute("DELETE FROM ArchivosExcel OUTPUT DELETED.Id WHERE NombreArchivo = ?", (nombre,))
+        ids = [row[0] for row in cur.fetchall()]
+        rows = len(ids)
+        version = None
+        if rows and rows > 0:
+            # NEXT VALUE FOR no se permite dentro de un MERGE: se toma antes en una variable
+            cur.execute("""
+                SET NOCOUNT ON;
+                DECLARE @version BIGINT = NEXT VALUE FOR SeqVersionArchivos;
+                MERGE ArchivosEliminados AS t
+                USING (SELECT ? AS NombreArchivo) AS s ON t.NombreArchivo = s.NombreArchivo
+                WHEN MATCHED THEN
+                    UPDATE SET Version = @version, FechaEliminacion = GETDATE()
+                WHEN NOT MATCHED THEN
+                    INSERT (NombreArchivo, Version) VALUES (s.NombreArchivo, @version)
+                OUTPUT INSERTED.Version;
+            """, (nombre,))
+            version = cur.fetchone()[0]
+        conn.commit()
+        if rows and rows > 0:
+            invalidar('archivos', 'datasets')
+            eventos.publicar('dataset', accion='eliminado', nombre=nombre, version=version)
+            for archivo_id in ids:
+                blobs.descartar(archivo_id)
+    finally:
+        try:
+            cur.close()
+        except:
+            pass
+        conn.close()
+
+    if rows and rows > 0:
+        _actualizar_vistas(nombre)
+    return bool(rows and rows > 0)
+
+
+@cacheado('datasets', CACHE_TTL)
+@medir_bd
+def obtener_dataset(nombre):
+    """
+    Devuelve (datos_gzip, fecha_proceso) del dataset columnar de un archivo, o None si no existe.
+    Los archivos subidos antes de que existiera DatasetsExcel se procesan aquí la primera vez.
+    """
+    conn = conectar()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT a.Id, d.Datos, d.FechaProceso
+            FROM ArchivosExcel a
+            LEFT JOIN DatasetsExcel d ON d.ArchivoId = a.Id
+            WHERE a.NombreArchivo = ?
+        """, (nombre,))
+        row = cur.fetchone()
+        if not row:
+            return None
+        if row[1] is not None:
+            return row[1], row[2]
+
+        cur.execute("SELECT Datos FROM ArchivosExcel WHERE Id = ?", (row[0],))
+        dataset = construir_dataset(cur.fetchone()[0])
+        if dataset is None:
+            return None
+        _guardar_dataset(cur, row[0], dataset)
+        conn.commit()
+        cur.execute("SELECT Datos, FechaProceso FROM DatasetsExcel WHERE ArchivoId = ?", (row[0],))
+        return tuple(cur.fetchone())
+    finally:
+        try:
+            cur.close()
+        except:
+            pass
+        conn.close()
+
+
+@cacheado('datasets', CACHE_TTL)
+@medir_bd
+def obtener_delta_dataset(nombre, desde: int):
+    """
+    Devuelve (version, datos_gzip) con el delta desde la versión `desde` hasta la actual (ver
+    deltas.py), encadenando los deltas guardados, o None si la cadena no está completa o si
+    bajar el dataset completo cuesta menos.
+    """
+    conn = conectar()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT a.Id, a.Version, DATALENGTH(d.Datos)
+            FROM ArchivosExcel a
+            JOIN DatasetsExcel d ON d.ArchivoId = a.Id
+            WHERE a.NombreArchivo = ?
+        """, (nombre,))
+        row = cur.fetchone()
+        if not row or row[1] is None or desde > int(row[1]):
+            return None
+        archivo_id, version, tamano_completo = row[0], int(row[1]), int(row[2])
+        if desde == version:
+            return version, comprimir(deltas.vacio(version))
+        cur.execute("""
+            SELECT VersionDesde, VersionHasta, Datos FROM DeltasDataset
+            WHERE ArchivoId = ? AND VersionHasta > ?
+            ORDER BY VersionHasta
+        """, (archivo_id, desde))
+        tramos = cur.fetchall()
+    finally:
+        try:
+            cur.close()
+        except:
+            pass
+        conn.close()
+
+    esperado = desde
+    for tramo in tramos:
+        if int(tramo[0]) != esperado:
+            return None
+        esperado = int(tramo[1])
+    if not tramos or esperado != version:
+        return None
+    if len(tramos) == 1:
+        return version, bytes(tramos[0][2])
+    if sum(len(t[2]) for t in tramos) >= tamano_completo:
+        return None
+    combinado = deltas.encadenar([descomprimir(t[2]) for t in tramos])
+    return (version, comprimir(combinado)) if combinado else None
+
+
+@cacheado('datasets', CACHE_TTL)
+@medir_bd
+def obtener_analitica(nombre):
+    """
+    Devuelve (version, analitica) del archivo, con la analítica ya descomprimida, o None si el
+    archivo no existe o no es un reporte de calificaciones. El valor en cache se comparte: no modificar.
+    """
+    conn = conectar()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT a.Id, a.Version, d.Datos, d.Analitica
+            FROM ArchivosExcel a
+            JOIN DatasetsExcel d ON d.ArchivoId = a.Id
+            WHERE a.NombreArchivo = ?
+        """, (nombre,))
+        row = cur.fetchone()
+        if not row:
+            return None
+        archivo_id, version, datos, datos_analitica = row
+        if datos_analitica is None:
+            # Datasets procesados antes de existir la analítica: se calcula una vez y se guarda
+            datos_analitica = construir_analitica(descomprimir(datos))
+            if datos_analitica is None:
+                return None
+            cur.execute("UPDATE DatasetsExcel SET Analitica = ? WHERE ArchivoId = ?", (datos_analitica, archivo_id))
+            conn.commit()
+        return version, descomprimir(datos_analitica)
+    finally:
+        try:
+            cur.close()
+        except:
+            pass
+        conn.close()
+
+
+# ======================= VISTAS MATERIALIZADAS =======================
+# Resultados de vistas.py guardados junto con las versiones de sus archivos fuente ("12,0,9").
+# Se recalculan al subir/eliminar una fuente; si la clave guardada no coincide con las versiones
+# actuales (otra subida en paralelo, o datos previos a la tabla) se recalculan al leerlas.
+def _versiones_fuentes(cur, nombres):
+    marcadores = ", ".join("?" for _ in nombres)
+    cur.execute(f"SELECT NombreArchivo, Version FROM ArchivosExcel WHERE NombreArchivo IN ({marcadores})",
+                tuple(nombres))
+    versiones = {r[0]: r[1] for r in cur.fetchall()}
+    return ",".join(str(versiones.get(n) or 0) for n in nombres)
+
+
+@medir_bd
+def materializar_vista(vista):
+    """Recalcula una vista desde los datasets de sus fuentes y la guarda. Devuelve (fuentes, resultado)."""
+    nombres = vistas.FUENTES[vista]
+    conn = conectar()
+    try:
+        cur = conn.cursor()
+        fuentes = _versiones_fuentes(cur, nombres)
+    finally:
+        try:
+            cur.close()
+        except:
+            pass
+        conn.close()
+
+    # Cálculo sin conexión tomada
+    datasets = {}
+    for n in nombres:
+        dataset = obtener_dataset(n)
+        datasets[n] = descomprimir(dataset[0]) if dataset else None
+    resultado = vistas.calcular(vista, datasets)
+    datos = comprimir(resultado)
+
+    conn = conectar()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            MERGE VistasMaterializadas AS t
+            USING (SELECT ? AS Nombre) AS s ON t.Nombre = s.Nombre
+            WHEN MATCHED THEN
+                UPDATE SET Fuentes = ?, Filas = ?, Datos = ?, FechaProceso = GETDATE()
+            WHEN NOT MATCHED THEN
+                INSERT (Nombre, Fuentes, Filas, Datos) VALUES (s.Nombre, ?, ?, ?);
+        """, (vista, fuentes, len(resultado["filas"]), datos, fuentes, len(resultado["filas"]), datos))
+        conn.commit()
+        return fuentes, resultado
+    finally:
+        try:
+            cur.close()
+        except:
+            pass
+        conn.close()
+
+
+def _actualizar_vistas(nombre_archivo):
+    for vista in vistas.vistas_de(nombre_archivo):
+        try:
+            materializar_vista(vista)
+            print(f"✅ Vista {vista} actualizada por {nombre_archivo}")
+        except Exception as e:
+            # La vista es un derivado: la subida ya quedó guardada y se recalcula al leerla
+            print(f"⚠️ No se actualizó la vista {vista}: {e}")
+
+
+@cacheado('datasets', CACHE_TTL)
+@medir_bd
+def obtener_vista(vista):
+    """
+    Devuelve (fuentes, resultado) de la vista vigente, recalculándola si sus fuentes cambiaron.
+    El valor en cache se comparte: no modificar.
+    """
+    conn = conectar()
+    try:
+        cur = conn.cursor()
+        fuentes = _versiones_fuentes(cur, vistas.FUENTES[vista])
+        cur.execute("SELECT Fuentes, Datos FROM VistasMaterializadas WHERE Nombre = ?", (vista,))
+        row = cur.fetchone()
+    finally:
+        try:
+            cur.close()
+        except:
+            pass
+        conn.close()
+
+    if row and row[0] == fuentes:
+        return fuentes, descomprimir(row[1])
+    return materializar_vista(vista)
+
+
 # ======================= PLANTILLAS =======================
+@cacheado('plantillas', CACHE_TTL)
+@medir_bd
 def obtener_plantillas():
     conn = conectar()
     try:
@@ -277,6 +1172,7 @@ def obtener_plantillas():
         conn.close()
 
 
+@medir_bd
 def guardar_plantillas(data):
     conn = conectar()
     try:
@@ -287,6 +1183,8 @@ def guardar_plantillas(data):
             WHERE Id = 1
         """, (data.get('autoridad', ''), data.get('docente', ''), data.get('estudiante', '')))
         conn.commit()
+        invalidar('plantillas')
+        eventos.publicar('plantillas')
     finally:
         try:
             cur.close()
@@ -296,6 +1194,7 @@ def guardar_plantillas(data):
 
 
 # ======================= USUARIOS =======================
+@medir_bd
 def crear_usuario(usuario: str, rol: str = 'usuario', activo: bool = True):
     if rol not in VALID_ROLES:
         raise ValueError(f"Rol inválido. Solo {VALID_ROLES}")
@@ -308,12 +1207,13 @@ def crear_usuario(usuario: str, rol: str = 'usuario', activo: bool = True):
             VALUES (?, ?, ?)
         """, (usuario, 1 if activo else 0, rol))
         conn.commit()
+        invalidar('usuarios')
 
         # Devolver lo creado
         cur.execute("""
             SELECT Id, Usuario, Estado, Rol
             FROM Usuarios
-            WHERE UPPER(Usuario) = UPPER(?)
+            WHERE UsuarioNorm = LOWER(LTRIM(RTRIM(?)))
         """, (usuario,))
         row = cur.fetchone()
         return _row_to_user_dict(row) if row else None
@@ -325,6 +1225,77 @@ def crear_usuario(usuario: str, rol: str = 'usuario', activo: bool = True):
         conn.close()
 
 
+@medir_bd
+def importar_usuarios(usuarios):
+    """
+    Crea o actualiza (por UsuarioNorm) todos los usuarios en una sola transacción: se cargan por
+    lotes en una tabla temporal con fast_executemany y un solo MERGE los aplica. usuarios:
+    [{'fila', 'usuario', 'rol', 'activo'}] ya validados (ver carga_usuarios.py), sin repetidos.
+    Devuelve [{'fila', 'accion': 'creado'|'actualizado'|'sin_cambios', 'id', 'usuario', 'rol', 'activo'}].
+    """
+    conn = conectar()
+    try:
+        cur = conn.cursor()
+        # COLLATE DATABASE_DEFAULT: tempdb puede tener otra intercalación que la BD
+        cur.execute("""
+            CREATE TABLE #UsuariosCarga (
+                Fila        INT NOT NULL,
+                Usuario     NVARCHAR(150) COLLATE DATABASE_DEFAULT NOT NULL,
+                Estado      BIT NOT NULL,
+                Rol         NVARCHAR(10) COLLATE DATABASE_DEFAULT NOT NULL,
+                UsuarioNorm AS CAST(LOWER(LTRIM(RTRIM(Usuario))) AS NVARCHAR(150))
+            )
+        """)
+        cur.fast_executemany = True
+        try:
+            for lote in normalizado.lotes(usuarios, USUARIOS_LOTE):
+                cur.executemany(
+                    "INSERT INTO #UsuariosCarga (Fila, Usuario, Estado, Rol) VALUES (?, ?, ?, ?)",
+                    [(u['fila'], u['usuario'], 1 if u['activo'] else 0, u['rol']) for u in lote],
+                )
+        finally:
+            cur.fast_executemany = False
+
+        # HOLDLOCK: sin él dos cargas simultáneas podrían insertar el mismo usuario
+        cur.execute("""
+            SET NOCOUNT ON;
+            MERGE Usuarios WITH (HOLDLOCK) AS t
+            USING #UsuariosCarga AS s ON t.UsuarioNorm = s.UsuarioNorm
+            WHEN MATCHED THEN
+                UPDATE SET Estado = s.Estado, Rol = s.Rol
+            WHEN NOT MATCHED THEN
+                INSERT (Usuario, Estado, Rol) VALUES (s.Usuario, s.Estado, s.Rol)
+            OUTPUT s.Fila, $action, INSERTED.Id, INSERTED.Usuario, INSERTED.Estado, INSERTED.Rol,
+                   DELETED.Estado, DELETED.Rol;
+        """)
+        rows = cur.fetchall()
+        cur.execute("DROP TABLE #UsuariosCarga")
+        revocados = [r[2] for r in rows if r[1] == 'UPDATE' and _cambio_de_acceso(r[6], r[7], r[4], r[5])]
+        _revocar_sesiones(cur, revocados)
+        conn.commit()
+        invalidar('usuarios')
+        if revocados:
+            invalidar('sesiones')
+    finally:
+        try:
+            cur.close()
+        except:
+            pass
+        conn.close()
+
+    resultado = []
+    for fila, accion, user_id, usuario, estado, rol, estado_previo, rol_previo in sorted(rows, key=lambda r: r[0]):
+        if accion == 'INSERT':
+            accion = 'creado'
+        elif bool(estado) == bool(estado_previo) and rol == rol_previo:
+            accion = 'sin_cambios'
+        else:
+            accion = 'actualizado'
+        resultado.append({'fila': fila, 'accion': accion, **_row_to_user_dict((user_id, usuario, estado, rol))})
+    return resultado
+
+
+@medir_bd
 def actualizar_usuario_por_id(user_id: int, usuario: str = None, rol: str = None, activo: bool = None):
     sets = []
     params = []
@@ -351,8 +1322,19 @@ def actualizar_usuario_por_id(user_id: int, usuario: str = None, rol: str = None
     conn = conectar()
     try:
         cur = conn.cursor()
-        cur.execute(f"UPDATE Usuarios SET {', '.join(sets)} WHERE Id = ?", params)
+        cur.execute(f"""
+            UPDATE Usuarios SET {', '.join(sets)}
+            OUTPUT DELETED.Estado, DELETED.Rol, INSERTED.Estado, INSERTED.Rol
+            WHERE Id = ?
+        """, params)
+        cambio = cur.fetchone()
+        revocar = bool(cambio) and _cambio_de_acceso(*cambio)
+        if revocar:
+            _revocar_sesiones(cur, [user_id])
         conn.commit()
+        invalidar('usuarios')
+        if revocar:
+            invalidar('sesiones')
 
         cur.execute("SELECT Id, Usuario, Estado, Rol FROM Usuarios WHERE Id = ?", (user_id,))
         row = cur.fetchone()
@@ -365,15 +1347,62 @@ def actualizar_usuario_por_id(user_id: int, usuario: str = None, rol: str = None
         conn.close()
 
 
+def _cambio_de_acceso(estado_previo, rol_previo, estado, rol):
+    """True si el usuario quedó desactivado o cambió de rol: sus tokens de sesión ya no sirven."""
+    return (bool(estado_previo) and not estado) or rol != rol_previo
+
+
+def _revocar_sesiones(cur, user_ids):
+    """Marca (en la transacción de cur) que los tokens emitidos hasta ahora a estos usuarios no valen."""
+    if not user_ids:
+        return
+    desde = sesiones.marca_revocacion()
+    # Pasado SESION_TTL los tokens anteriores ya vencieron solos: la marca no hace falta
+    cur.execute("DELETE FROM SesionesRevocadas WHERE RevocadoDesde < ?", (desde - sesiones.SESION_TTL * 1000,))
+    for lote in normalizado.lotes(list(user_ids), 500):  # un parámetro por id (máximo 2100)
+        valores = ", ".join("(?)" for _ in lote)
+        cur.execute(f"""
+            MERGE SesionesRevocadas AS t
+            USING (VALUES {valores}) AS s(UsuarioId) ON t.UsuarioId = s.UsuarioId
+            WHEN MATCHED THEN
+                UPDATE SET RevocadoDesde = ?
+            WHEN NOT MATCHED THEN
+                INSERT (UsuarioId, RevocadoDesde) VALUES (s.UsuarioId, ?);
+        """, (*lote, desde, desde))
+
+
+@cacheado('sesiones', CACHE_TTL_USUARIOS, clave=lambda: 'revocaciones')
+@medir_bd
+def listar_revocaciones():
+    """
+    {usuario_id: revocado_desde} con las revocaciones que aún pueden afectar a un token vigente.
+    Se lee una vez por worker y queda en memoria hasta la próxima revocación (invalidar('sesiones')).
+    """
+    conn = conectar()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT UsuarioId, RevocadoDesde FROM SesionesRevocadas WHERE RevocadoDesde > ?",
+                    (sesiones.marca_revocacion() - sesiones.SESION_TTL * 1000,))
+        return {int(row[0]): int(row[1]) for row in cur.fetchall()}
+    finally:
+        try:
+            cur.close()
+        except:
+            pass
+        conn.close()
+
+
+@cacheado('usuarios', CACHE_TTL_USUARIOS, clave=lambda usuario: ('usuario', usuario.strip().lower()))
+@medir_bd
 def obtener_usuario_por_usuario(usuario: str):
     conn = conectar()
     try:
         cur = conn.cursor()
-        # Case-insensitive por seguridad
+        # Case-insensitive sobre la columna normalizada (usa IX_Usuarios_UsuarioNorm)
         cur.execute("""
             SELECT Id, Usuario, Estado, Rol
             FROM Usuarios
-            WHERE UPPER(Usuario) = UPPER(?)
+            WHERE UsuarioNorm = LOWER(LTRIM(RTRIM(?)))
         """, (usuario,))
         row = cur.fetchone()
         return _row_to_user_dict(row) if row else None
@@ -382,4 +1411,259 @@ def obtener_usuario_por_usuario(usuario: str):
             cur.close()
         except:
             pass
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+
+@cacheado('usuarios', CACHE_TTL_USUARIOS, clave=lambda user_id: ('id', int(user_id)))
+@medir_bd
+def obtener_usuario_por_id(user_id: int):
+    conn = conectar()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT Id, Usuario, Estado, Rol FROM Usuarios WHERE Id = ?", (user_id,))
+        row = cur.fetchone()
+        return _row_to_user_dict(row) if row else None
+    finally:
+        try:
+            cur.close()
+        except:
+            pass
+        conn.close()
+
+
+
+# ----------------------- LISTADO (KEYSET) -----------------------
+# Columnas por las que se puede ordenar /usuarios; siempre se desempata por Id
+ORDEN_USUARIOS = {"id": "Id", "usuario": "UsuarioNorm", "rol": "Rol", "activo": "Estado"}
+COINCIDENCIAS = ("contiene", "prefijo", "exacto")
+
+
+def _escapar_like(texto):
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_").replace("[", "\\[")
+
+
+def _filtros_usuarios(q, rol, activo, coincidencia):
+    """
+    WHERE para los filtros de /usuarios. q se compara con UsuarioNorm: 'exacto' y 'prefijo' usan
+    el índice; 'contiene' (LIKE '%q%') recorre IX_Usuarios_UsuarioNorm completo.
+    """
+    where, params = [], []
+    q = (q or "").strip().lower()
+    if q:
+        if coincidencia == "exacto":
+            where.append("UsuarioNorm = ?"); params.append(q)
+        elif coincidencia == "prefijo":
+            where.append("UsuarioNorm LIKE ? ESCAPE '\\'"); params.append(f"{_escapar_like(q)}%")
+        else:
+            where.append("UsuarioNorm LIKE ? ESCAPE '\\'"); params.append(f"%{_escapar_like(q)}%")
+    if rol in VALID_ROLES:
+        where.append("Rol = ?"); params.append(rol)
+    if activo is not None:
+        where.append("Estado = ?"); params.append(1 if activo else 0)
+    return where, params
+
+
+@medir_bd
+def listar_usuarios(q="", rol=None, activo=None, sort_by="id", sort_dir="desc", limit=20,
+                    cursor=None, page=0, coincidencia="contiene"):
+    """
+    Una página de usuarios y el cursor de la siguiente (None si no hay más).
+    Con `cursor` (valor de la columna de orden, Id) se pagina por keyset: la página 100 cuesta
+    lo mismo que la primera. Sin cursor se usa OFFSET `page` para los clientes que aún lo envían.
+    """
+    col = ORDEN_USUARIOS.get(sort_by, "Id")
+    desc = sort_dir == "desc"
+    where, params = _filtros_usuarios(q, rol, activo, coincidencia)
+    if cursor is not None:
+        valor, ultimo_id = cursor
+        op = "<" if desc else ">"
+        if col == "Id":
+            where.append(f"Id {op} ?"); params.append(ultimo_id)
+        else:
+            where.append(f"({col} {op} ? OR ({col} = ? AND Id {op} ?))"); params += [valor, valor, ultimo_id]
+    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+    direccion = "DESC" if desc else "ASC"
+    orden = f"ORDER BY {col} {direccion}" + ("" if col == "Id" else f", Id {direccion}")
+
+    # Se pide una fila de más para saber si hay página siguiente sin contar
+    sql = f"SELECT Id, Usuario, Estado, Rol, UsuarioNorm FROM Usuarios {where_sql} {orden}"
+    if cursor is not None:
+        sql += " OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY"
+        params.append(limit + 1)
+    else:
+        sql += " OFFSET ? ROWS FETCH NEXT ? ROWS ONLY"
+        params += [page * limit, limit + 1]
+
+    conn = conectar()
+    try:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        filas = cur.fetchall()
+    finally:
+        try:
+            cur.close()
+        except:
+            pass
+        conn.close()
+
+    siguiente = None
+    if len(filas) > limit:
+        filas = filas[:limit]
+        ultima = filas[-1]
+        valores = {"Id": int(ultima[0]), "UsuarioNorm": ultima[4], "Rol": ultima[3], "Estado": int(bool(ultima[2]))}
+        siguiente = (valores[col], int(ultima[0]))
+    return [_row_to_user_dict(r) for r in filas], siguiente
+
+
+@cacheado('usuarios', CACHE_TTL_USUARIOS,
+          clave=lambda q="", rol=None, activo=None, coincidencia="contiene", aproximado=False:
+          ('conteo', (q or "").strip().lower(), rol, activo, coincidencia, aproximado))
+@medir_bd
+def contar_usuarios(q="", rol=None, activo=None, coincidencia="contiene", aproximado=False):
+    """
+    Total para los filtros dados; queda en cache hasta el próximo cambio de usuarios.
+    aproximado=True sin filtros lee el conteo de filas de sys.dm_db_partition_stats (no recorre
+    la tabla); si no hay permiso para esa vista se cuenta normalmente.
+    """
+    where, params = _filtros_usuarios(q, rol, activo, coincidencia)
+    conn = conectar()
+    try:
+        cur = conn.cursor()
+        if aproximado and not where:
+            try:
+                cur.execute("""
+                    SELECT SUM(row_count) FROM sys.dm_db_partition_stats
+                    WHERE object_id = OBJECT_ID(N'dbo.Usuarios') AND index_id IN (0, 1)
+                """)
+                fila = cur.fetchone()
+                if fila and fila[0] is not None:
+                    return int(fila[0])
+            except pyodbc.Error:
+                pass
+        where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+        cur.execute(f"SELECT COUNT(*) FROM Usuarios {where_sql}", params)
+        return int(cur.fetchone()[0])
+    finally:
+        try:
+            cur.close()
+        except:
+            pass
+        conn.close()
+
+# ======================= TRABAJOS DE CORREO =======================
+@medir_bd
+def crear_trabajo_correo(trabajo_id: str, mensajes: list, progreso: str):
+    """Guarda el trabajo pendiente con sus mensajes; lo envía el worker que lo tome (tomar_trabajo_correo)."""
+    conn = conectar()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO TrabajosCorreo (Id, Estado, Total, Mensajes, Progreso)
+            VALUES (?, N'pendiente', ?, ?, ?)
+        """, (trabajo_id, len(mensajes), pyodbc.Binary(comprimir(mensajes)), progreso))
+        conn.commit()
+    finally:
+        try:
+            cur.close()
+        except:
+            pass
+        conn.close()
+
+
+@medir_bd
+def tomar_trabajo_correo(toma: str, vencido: float):
+    """
+    Reclama el trabajo más antiguo pendiente, o en proceso pero sin avance hace más de `vencido`
+    segundos (su worker murió o se recicló). READPAST: dos workers nunca toman el mismo.
+    Devuelve {'id', 'mensajes', 'progreso', 'errores'} o None.
+    """
+    conn = conectar()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            WITH t AS (
+                SELECT TOP (1) * FROM TrabajosCorreo WITH (ROWLOCK, UPDLOCK, READPAST)
+                WHERE Mensajes IS NOT NULL
+                  AND (Estado = N'pendiente'
+                       OR (Estado = N'en_proceso' AND FechaActualizacion < DATEADD(second, -?, GETDATE())))
+                ORDER BY FechaCreacion
+            )
+            UPDATE t SET Estado = N'en_proceso', Toma = ?, FechaActualizacion = GETDATE()
+            OUTPUT INSERTED.Id, INSERTED.Mensajes, INSERTED.Progreso, INSERTED.Errores
+        """, (int(vencido), toma))
+        row = cur.fetchone()
+        conn.commit()
+        if not row:
+            return None
+        return {"id": row[0], "mensajes": descomprimir(row[1]), "progreso": row[2],
+                "errores": json.loads(row[3]) if row[3] else []}
+    finally:
+        try:
+            cur.close()
+        except:
+            pass
+        conn.close()
+
+
+@medir_bd
+def actualizar_trabajo_correo(trabajo_id: str, toma: str, estado: str, enviados: int, fallidos: int,
+                              errores: list, progreso: str, finalizado: bool = False):
+    """Guarda el avance si el trabajo sigue tomado por `toma`. False si otro worker lo reclamó."""
+    conn = conectar()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            UPDATE TrabajosCorreo
+            SET Estado = ?,
+                Enviados = ?,
+                Fallidos = ?,
+                Errores = ?,
+                Progreso = ?,
+                FechaActualizacion = GETDATE(),
+                FechaFin = CASE WHEN ? = 1 THEN GETDATE() ELSE FechaFin END,
+                Mensajes = CASE WHEN ? = 1 THEN NULL ELSE Mensajes END
+            WHERE Id = ? AND Toma = ?
+        """, (estado, enviados, fallidos, json.dumps(errores, ensure_ascii=False), progreso,
+              1 if finalizado else 0, 1 if finalizado else 0, trabajo_id, toma))
+        actualizado = cur.rowcount > 0
+        conn.commit()
+        return actualizado
+    finally:
+        try:
+            cur.close()
+        except:
+            pass
+        conn.close()
+
+
+@medir_bd
+def obtener_trabajo_correo(trabajo_id: str):
+    conn = conectar()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT Id, Estado, Total, Enviados, Fallidos, Errores, FechaCreacion, FechaActualizacion, FechaFin
+            FROM TrabajosCorreo WHERE Id = ?
+        """, (trabajo_id,))
+        row = cur.fetchone()
+        if not row:
+            return None
+        fmt = lambda f: f.strftime('%Y-%m-%d %H:%M:%S') if f else None
+        return {
+            "id": row[0],
+            "estado": row[1],
+            "total": int(row[2]),
+            "enviados": int(row[3]),
+            "fallidos": int(row[4]),
+            "pendientes": max(0, int(row[2]) - int(row[3]) - int(row[4])),
+            "errores": json.loads(row[5]) if row[5] else [],
+            "creado": fmt(row[6]),
+            "actualizado": fmt(row[7]),
+            "finalizado": fmt(row[8]),
+        }
+    finally:
+        try:
+            cur.close()
+        except:
+            pass
+        conn.close()
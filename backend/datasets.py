@@ -0,0 +1,174 @@
+import gzip
+import json
+import re
+import unicodedata
+from datetime import date, datetime, time as dtime
+from io import BytesIO
+
+from openpyxl import load_workbook
+
+import analitica
+
+# ======================= FORMATO COLUMNAR =======================
+# Cada workbook se parsea una sola vez al subirlo y se guarda como JSON columnar comprimido:
+#   {"formato": "columnar-v1", "hoja": "...", "filas": N,
+#    "columnas": [{"nombre": "PERIODO", "tipo": "dict", "valores": [...], "codigos": [0, 0, 1, -1, ...]},
+#                 {"nombre": "PROMEDIO", "tipo": "num", "datos": [8.5, null, ...]}, ...]}
+# Las columnas de texto van codificadas con diccionario (código -1 = celda vacía), así valores
+# repetidos como CARRERA o PERIODO se envían una sola vez. El navegador reconstruye las filas
+# con el mismo formato que XLSX.utils.sheet_to_json (primera hoja, encabezado en la primera fila).
+FORMATO = "columnar-v1"
+ARCHIVO_NOTAS = "REPORTE_RECORD_CALIFICACIONES_POR_PARCIAL_TOTAL.xlsx"
+EPOCH_EXCEL = datetime(1899, 12, 30)  # día 0 de los seriales de fecha de Excel (con el error de 1900)
+# Columna DOCENTE de los reportes: '0912345678 - APELLIDOS NOMBRES' (búsqueda, vistas y tablas normalizadas)
+DOCENTE = re.compile(r"^\s*(\d+)\s*-\s*(.+?)\s*$")
+
+
+def canon(s):
+    """Igual que canon() del frontend: sin tildes, espacios colapsados y en mayúsculas."""
+    s = unicodedata.normalize("NFD", "" if s is None else str(s))
+    s = "".join(c for c in s if not unicodedata.combining(c))
+    return " ".join(s.split()).upper()
+
+
+def _valor_celda(v):
+    """Convierte un valor de openpyxl al mismo valor que entrega SheetJS (fechas como serial de Excel)."""
+    if isinstance(v, datetime):
+        return (v - EPOCH_EXCEL).total_seconds() / 86400
+    if isinstance(v, date):
+        return float((v - EPOCH_EXCEL.date()).days)
+    if isinstance(v, dtime):
+        return (v.hour * 3600 + v.minute * 60 + v.second + v.microsecond / 1e6) / 86400
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    return v
+
+
+def encabezados(fila):
+    """Nombres de columna con las mismas reglas que sheet_to_json (__EMPTY, duplicados con _1, _2...)."""
+    vistos = {}
+    nombres = []
+    for celda in fila:
+        base = "__EMPTY" if celda is None or str(celda) == "" else str(celda)
+        nombre = base
+        if base in vistos:
+            vistos[base] += 1
+            nombre = f"{base}_{vistos[base]}"
+        else:
+            vistos[base] = 0
+        nombres.append(nombre)
+    return nombres
+
+
+def _columna(nombre, valores):
+    no_nulos = [v for v in valores if v is not None]
+    if no_nulos and all(isinstance(v, str) for v in no_nulos):
+        indice = {}
+        codigos = []
+        for v in valores:
+            if v is None:
+                codigos.append(-1)
+            else:
+                codigos.append(indice.setdefault(v, len(indice)))
+        return {"nombre": nombre, "tipo": "dict", "valores": list(indice), "codigos": codigos}
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in no_nulos):
+        return {"nombre": nombre, "tipo": "num", "datos": valores}
+    return {"nombre": nombre, "tipo": "mixto", "datos": valores}
+
+
+def parsear_excel(origen):
+    """
+    Lee la primera hoja del workbook en modo streaming (read_only) y devuelve el dataset columnar.
+    origen: bytes del archivo o ruta en disco. Lanza ValueError si no es un workbook válido.
+    """
+    if isinstance(origen, (bytes, bytearray)):
+        origen = BytesIO(origen)
+    try:
+        wb = load_workbook(origen, read_only=True, data_only=True)
+    except Exception as e:
+        raise ValueError(f"No es un archivo Excel válido: {e}")
+
+    try:
+        ws = wb.worksheets[0]
+        nombres = None
+        columnas = []
+        filas = 0
+        for fila in ws.iter_rows(values_only=True):
+            if nombres is None:
+                if all(c is None or c == "" for c in fila):
+                    continue
+                nombres = encabezados(fila)
+                columnas = [[] for _ in nombres]
+                continue
+            valores = [_valor_celda(c) for c in fila[:len(nombres)]]
+            if all(v is None or v == "" for v in valores):
+                continue  # sheet_to_json omite filas en blanco
+            valores.extend([None] * (len(nombres) - len(valores)))
+            for i, v in enumerate(valores):
+                columnas[i].append(None if v == "" else v)
+            filas += 1
+
+        return {
+            "formato": FORMATO,
+            "hoja": ws.title,
+            "filas": filas,
+            "columnas": [_columna(n, vals) for n, vals in zip(nombres or [], columnas)],
+        }
+    finally:
+        wb.close()
+
+
+def comprimir(dataset) -> bytes:
+    raw = json.dumps(dataset, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return gzip.compress(raw, compresslevel=6)
+
+
+def descomprimir(datos: bytes):
+    return json.loads(gzip.decompress(datos).decode("utf-8"))
+
+
+def filas(dataset):
+    """Reconstruye la lista de dicts (útil para procesos del lado del servidor)."""
+    resultado = [{} for _ in range(dataset["filas"])]
+    for col in dataset["columnas"]:
+        nombre = col["nombre"]
+        if col["tipo"] == "dict":
+            valores = col["valores"]
+            for fila, codigo in zip(resultado, col["codigos"]):
+                if codigo >= 0:
+                    fila[nombre] = valores[codigo]
+        else:
+            for fila, v in zip(resultado, col["datos"]):
+                if v is not None:
+                    fila[nombre] = v
+    return resultado
+
+
+def columnar(nombres, filas_dict):
+    """Inverso de filas(): dataset columnar con las columnas `nombres` a partir de dicts."""
+    columnas = [_columna(n, [f.get(n) for f in filas_dict]) for n in nombres]
+    return {"formato": FORMATO, "filas": len(filas_dict), "columnas": columnas}
+
+
+def construir_analitica(dataset):
+    """Analítica comprimida del dataset, o None si no es un reporte de calificaciones."""
+    try:
+        resultado = analitica.calcular(dataset)
+    except Exception as e:
+        # La analítica es un derivado: si falla, el archivo y su dataset se guardan igual
+        print(f"⚠️ No se generó analítica: {e}")
+        return None
+    return comprimir(resultado) if resultado is not None else None
+
+
+def construir_dataset(origen):
+    """
+    Parsea y comprime un workbook (bytes o ruta). Devuelve (filas, columnas, datos_gzip, analitica_gzip)
+    o None si el archivo no se puede leer como Excel (se guarda igual, pero sin dataset).
+    """
+    try:
+        dataset = parsear_excel(origen)
+    except ValueError as e:
+        print(f"⚠️ No se generó dataset: {e}")
+        return None
+    return dataset["filas"], len(dataset["columnas"]), comprimir(dataset), construir_analitica(dataset)
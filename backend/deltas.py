@@ -0,0 +1,118 @@
+import json
+
+import datasets
+
+# ======================= DELTAS ENTRE VERSIONES DE UN DATASET =======================
+# Al subir una versión nueva de un reporte se guarda qué filas cambiaron respecto a la anterior,
+# así el navegador actualiza su copia en IndexedDB con kilobytes en vez de volver a bajar el
+# dataset completo:
+#   {"formato": "delta-v1", "desde": 41, "version": 57, "clave": ["IDENTIFICACION", "PERIODO", "MATERIA"],
+#    "eliminadas": [["0912345678", "2024 - 2025 CI", "CALCULO I"], ...],
+#    "filas": {<dataset columnar, ver datasets.py, con las filas nuevas o cambiadas>},
+#    "agregadas": 3, "cambiadas": 120}
+# Las filas se agrupan por la clave (un estudiante puede repetir materia en el mismo periodo):
+# cada grupo nuevo o cambiado viaja completo y reemplaza al grupo del cliente, así aplicar el
+# delta no depende del orden de las filas. Las claves que desaparecen van en "eliminadas".
+FORMATO = "delta-v1"
+CLAVE = ("IDENTIFICACION", "PERIODO", "MATERIA")
+
+
+def _nombres(dataset):
+    return [c["nombre"] for c in dataset["columnas"]]
+
+
+def columnas_clave(dataset):
+    """Columnas de CLAVE presentes en el dataset; sin IDENTIFICACION no se calculan deltas."""
+    nombres = {c["nombre"] for c in dataset["columnas"]}
+    if "IDENTIFICACION" not in nombres:
+        return None
+    return [c for c in CLAVE if c in nombres]
+
+
+def _grupos(dataset, clave):
+    """{clave (tupla): [fila, ...]} con las filas como dicts, en el orden del dataset."""
+    grupos = {}
+    for fila in datasets.filas(dataset):
+        grupos.setdefault(tuple(fila.get(c) for c in clave), []).append(fila)
+    return grupos
+
+
+def _firma(filas):
+    # Independiente del orden de las columnas y de las filas dentro del grupo
+    return sorted(json.dumps(f, sort_keys=True, ensure_ascii=False) for f in filas)
+
+
+def calcular(anterior, nuevo, desde, version):
+    """
+    Delta de `anterior` a `nuevo` (datasets columnares descomprimidos), o None si no se puede
+    expresar por clave (sin IDENTIFICACION) o si cambiaron las columnas entre versiones.
+    """
+    clave = columnas_clave(nuevo)
+    if not clave or _nombres(anterior) != _nombres(nuevo):
+        return None
+    previos = _grupos(anterior, clave)
+    actuales = _grupos(nuevo, clave)
+
+    eliminadas = [list(k) for k in previos if k not in actuales]
+    filas, agregadas, cambiadas = [], 0, 0
+    for k, grupo in actuales.items():
+        previo = previos.get(k)
+        if previo is None:
+            agregadas += len(grupo)
+        elif _firma(previo) != _firma(grupo):
+            cambiadas += len(grupo)
+        else:
+            continue
+        filas.extend(grupo)
+
+    return {
+        "formato": FORMATO,
+        "desde": desde,
+        "version": version,
+        "clave": clave,
+        "eliminadas": eliminadas,
+        "filas": datasets.columnar(_nombres(nuevo), filas),
+        "agregadas": agregadas,
+        "cambiadas": cambiadas,
+    }
+
+
+def vacio(version):
+    """Delta sin cambios (el cliente ya tiene la versión actual)."""
+    return {"formato": FORMATO, "desde": version, "version": version, "clave": [], "eliminadas": [],
+            "filas": {"formato": datasets.FORMATO, "filas": 0, "columnas": []}, "agregadas": 0, "cambiadas": 0}
+
+
+def encadenar(deltas):
+    """
+    Un solo delta equivalente a aplicar `deltas` (consecutivos, del más antiguo al más nuevo).
+    Como cada grupo viaja completo, el estado final de una clave es el del último delta que la toca.
+    """
+    if len(deltas) == 1:
+        return deltas[0]
+    clave = deltas[-1]["clave"]
+    estado = {}  # clave -> [filas] o None si quedó eliminada
+    nombres = _nombres(deltas[-1]["filas"]) or _nombres(deltas[0]["filas"])
+    agregadas = cambiadas = 0
+    for delta in deltas:
+        if delta["clave"] != clave:
+            return None
+        for k in delta["eliminadas"]:
+            estado[tuple(k)] = None
+        for k, grupo in _grupos(delta["filas"], clave).items():
+            estado[k] = grupo
+        agregadas += delta["agregadas"]
+        cambiadas += delta["cambiadas"]
+
+    filas = [f for grupo in estado.values() if grupo for f in grupo]
+    return {
+        "formato": FORMATO,
+        "desde": deltas[0]["desde"],
+        "version": deltas[-1]["version"],
+        "clave": clave,
+        "eliminadas": [list(k) for k, grupo in estado.items() if grupo is None],
+        "filas": datasets.columnar(nombres, filas),
+        # Sumas de cada tramo: una fila cambiada en dos subidas cuenta dos veces
+        "agregadas": agregadas,
+        "cambiadas": cambiadas,
+    }
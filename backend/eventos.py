@@ -0,0 +1,269 @@
+import contextlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin flock, el diario solo se ordena dentro del proceso
+    fcntl = None
+
+from metricas import incrementar, registrar_fuente
+
+# ======================= EVENTOS DE CAMBIOS (SSE) =======================
+# GET /events avisa a los navegadores cuando cambia algo que guardan en IndexedDB:
+#   id: 1760000000042
+#   event: dataset
+#   data: {"id": 1760000000042, "tipo": "dataset", "accion": "subido", "nombre": "REPORTE.xlsx", "version": 57}
+# Con eso index.js deja de consultar /files/changes en cada carga del menú: solo cuando llegó algo.
+# Los eventos se agregan a un diario compartido por los workers del host (EVENTOS_ARCHIVO, una
+# línea JSON por evento, numerados bajo flock). Cada proceso tiene un único hilo que revisa el
+# diario con un stat cada EVENTOS_INTERVALO y reparte lo nuevo a sus suscriptores en memoria, así
+# un navegador conectado sin novedades cuesta una cola vacía y un heartbeat cada EVENTOS_HEARTBEAT.
+# Los ids son correlativos y un diario nuevo empieza en la hora actual en ms: quien reconecta con
+# Last-Event-ID recibe lo que se perdió, o un "reinicio" si ese id ya no está en el diario (rotado
+# o recreado tras reiniciar el host) y entonces vuelve a consultar /files/changes.
+EVENTOS_ARCHIVO = os.getenv("EVENTOS_ARCHIVO") or os.path.join(tempfile.gettempdir(), "facaf-eventos.jsonl")
+EVENTOS_MAX_CONEXIONES = int(os.getenv("EVENTOS_MAX_CONEXIONES", "2000"))  # por worker (modo ASGI)
+EVENTOS_HEARTBEAT = float(os.getenv("EVENTOS_HEARTBEAT", "25"))     # segundos entre ": ping" (proxies)
+EVENTOS_INTERVALO = float(os.getenv("EVENTOS_INTERVALO", "1"))      # segundos entre revisiones del diario
+EVENTOS_DURACION_MAX = float(os.getenv("EVENTOS_DURACION_MAX", "3600"))  # luego se cierra y el navegador reconecta
+EVENTOS_REINTENTO_MS = int(os.getenv("EVENTOS_REINTENTO_MS", "5000"))    # reconexión tras un corte
+EVENTOS_SONDEO_MS = int(os.getenv("EVENTOS_SONDEO_MS", "60000"))         # modo WSGI: espera entre consultas
+EVENTOS_COLA = 64                # eventos pendientes por conexión antes de cortarla (cliente que no lee)
+EVENTOS_MAX_BYTES = 512 * 1024   # al pasar este tamaño el diario se rota...
+EVENTOS_CONSERVAR = 500          # ...dejando los últimos eventos
+
+_lock_local = threading.Lock()
+
+
+class LimiteConexiones(Exception):
+    """El worker ya tiene EVENTOS_MAX_CONEXIONES navegadores conectados."""
+
+
+@contextlib.contextmanager
+def _exclusivo():
+    """Bloqueo del diario entre hilos y, con flock, entre los workers del host."""
+    with _lock_local:
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(f"{EVENTOS_ARCHIVO}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # cerrar libera el flock
+
+
+def _parsear(datos):
+    """Eventos de las líneas completas de `datos`; una línea cortada o corrupta se ignora."""
+    eventos = []
+    for linea in datos.split(b"\n"):
+        try:
+            evento = json.loads(linea)
+        except ValueError:
+            continue
+        if isinstance(evento, dict) and isinstance(evento.get("id"), int):
+            eventos.append(evento)
+    return eventos
+
+
+def _ultimo_id(f):
+    f.seek(0, os.SEEK_END)
+    fin = f.tell()
+    f.seek(max(0, fin - 4096))
+    eventos = _parsear(f.read())
+    return eventos[-1]["id"] if eventos else None
+
+
+def publicar(tipo, **datos):
+    """Agrega un evento al diario. Como invalidar(), nunca propaga errores al flujo de escritura."""
+    try:
+        with _exclusivo():
+            with open(EVENTOS_ARCHIVO, "ab+") as f:
+                ultimo = _ultimo_id(f)
+                evento = {"id": int(time.time() * 1000) if ultimo is None else ultimo + 1,
+                          "tipo": tipo, **datos}
+                f.write(json.dumps(evento, ensure_ascii=False).encode("utf-8") + b"\n")
+                tamano = f.tell()
+            if tamano > EVENTOS_MAX_BYTES:
+                _rotar()
+        incrementar("facaf_eventos_publicados_total", tipo=tipo)
+    except Exception as e:
+        print(f"⚠️ Eventos: no se pudo publicar '{tipo}': {e}")
+
+
+def _rotar():
+    """Reescribe el diario con los últimos EVENTOS_CONSERVAR eventos (con el bloqueo tomado)."""
+    with open(EVENTOS_ARCHIVO, "rb") as f:
+        eventos = _parsear(f.read())[-EVENTOS_CONSERVAR:]
+    fd, temporal = tempfile.mkstemp(prefix=".eventos-", dir=os.path.dirname(EVENTOS_ARCHIVO) or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for evento in eventos:
+                f.write(json.dumps(evento, ensure_ascii=False).encode("utf-8") + b"\n")
+        os.replace(temporal, EVENTOS_ARCHIVO)
+    except BaseException:
+        os.remove(temporal)
+        raise
+
+
+def _leer_diario():
+    try:
+        with open(EVENTOS_ARCHIVO, "rb") as f:
+            return _parsear(f.read()), os.fstat(f.fileno())
+    except FileNotFoundError:
+        return [], None
+
+
+def pendientes(desde):
+    """
+    (eventos posteriores a `desde`, último id, reinicio). reinicio=True si el diario ya no tiene
+    lo que sigue a `desde` y el cliente debe revisar todo de nuevo. desde=None: conexión inicial.
+    """
+    eventos, _ = _leer_diario()
+    ultimo = eventos[-1]["id"] if eventos else 0
+    if desde is None:
+        return [], ultimo, False
+    if desde > ultimo or (eventos and desde < eventos[0]["id"] - 1):
+        return [], ultimo, True
+    return [e for e in eventos if e["id"] > desde], ultimo, False
+
+
+def id_cliente(last_event_id, desde):
+    """Último id que tiene el navegador: Last-Event-ID (reconexión) y si no ?desde= (primera conexión)."""
+    for valor in (last_event_id, desde):
+        try:
+            return int(valor)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def formatear(evento):
+    return (f"id: {evento['id']}\nevent: {evento['tipo']}\n"
+            f"data: {json.dumps(evento, ensure_ascii=False)}\n\n")
+
+
+def apertura(desde, reintento_ms):
+    """
+    (texto, último id) con lo que se envía al conectar: el retry, los eventos perdidos desde
+    `desde` y al final un evento "estado" {"ultimo", "reinicio"} que marca el fin de la reposición.
+    """
+    eventos, ultimo, reinicio = pendientes(desde)
+    partes = [f"retry: {int(reintento_ms)}\n\n"]
+    partes += [formatear(e) for e in eventos]
+    estado = {"ultimo": ultimo, "reinicio": reinicio}
+    partes.append(f"id: {ultimo}\nevent: estado\ndata: {json.dumps(estado)}\n\n")
+    return "".join(partes), ultimo
+
+
+class Suscripcion:
+    def __init__(self, difusor, entregar):
+        self._difusor = difusor
+        self.entregar = entregar
+
+    def cerrar(self):
+        self._difusor._quitar(self)
+
+
+class Difusor:
+    """Sigue el diario desde un hilo del proceso y reparte cada evento nuevo a los suscriptores."""
+
+    def __init__(self):
+        self._suscriptores = set()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._ultimo = 0
+        self._posicion = (None, 0)  # (inodo, bytes leídos) del diario
+
+    def suscribir(self, entregar):
+        """entregar(evento) se llama desde el hilo del difusor: no debe bloquear."""
+        with self._lock:
+            if len(self._suscriptores) >= EVENTOS_MAX_CONEXIONES:
+                incrementar("facaf_eventos_rechazados_total")
+                raise LimiteConexiones(f"Máximo {EVENTOS_MAX_CONEXIONES} conexiones a /events por worker")
+            suscripcion = Suscripcion(self, entregar)
+            self._suscriptores.add(suscripcion)
+            if self._pid != os.getpid():
+                self._arrancar()
+        return suscripcion
+
+    def hay_lugar(self):
+        """Verificación previa, sin reservar, para responder 503 antes de abrir el stream."""
+        if len(self._suscriptores) < EVENTOS_MAX_CONEXIONES:
+            return True
+        incrementar("facaf_eventos_rechazados_total")
+        return False
+
+    def _quitar(self, suscripcion):
+        with self._lock:
+            self._suscriptores.discard(suscripcion)
+
+    def conexiones(self):
+        return len(self._suscriptores)
+
+    def _arrancar(self):
+        # Tras un fork el hilo del padre no existe en el hijo: se arranca uno por proceso
+        self._pid = os.getpid()
+        eventos, st = _leer_diario()
+        self._ultimo = eventos[-1]["id"] if eventos else 0
+        self._posicion = (st.st_ino, st.st_size) if st else (None, 0)
+        threading.Thread(target=self._seguir, name="eventos-difusor", daemon=True).start()
+
+    def _seguir(self):
+        while True:
+            time.sleep(EVENTOS_INTERVALO)
+            if not self._suscriptores:
+                continue
+            try:
+                nuevos = self._leer_nuevos()
+            except Exception as e:
+                print(f"⚠️ Eventos: no se pudo leer el diario: {e}")
+                continue
+            with self._lock:
+                suscriptores = list(self._suscriptores)
+            for suscripcion in suscriptores:
+                try:
+                    for evento in nuevos:
+                        suscripcion.entregar(evento)
+                except Exception:
+                    suscripcion.cerrar()
+
+    def _leer_nuevos(self):
+        try:
+            st = os.stat(EVENTOS_ARCHIVO)
+        except FileNotFoundError:
+            return []
+        inodo, leidos = self._posicion
+        if st.st_ino == inodo and st.st_size == leidos:
+            return []  # el caso de casi siempre: un stat y nada más
+        with open(EVENTOS_ARCHIVO, "rb") as f:
+            st = os.fstat(f.fileno())
+            if st.st_ino != inodo or st.st_size < leidos:
+                leidos = 0  # rotado o recreado: se relee entero y se filtra por id
+            f.seek(leidos)
+            datos = f.read()
+        completos = datos[:datos.rfind(b"\n") + 1]  # una línea a medio escribir se lee en la próxima vuelta
+        self._posicion = (st.st_ino, leidos + len(completos))
+        nuevos = [e for e in _parsear(completos) if e["id"] > self._ultimo]
+        if nuevos:
+            self._ultimo = nuevos[-1]["id"]
+        return nuevos
+
+
+_difusor = Difusor()
+
+
+def difusor():
+    return _difusor
+
+
+def _fuente_eventos():
+    return [("facaf_eventos_conexiones", {}, _difusor.conexiones())]
+
+
+registrar_fuente(_fuente_eventos)
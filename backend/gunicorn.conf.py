@@ -0,0 +1,37 @@
+import gc
+import os
+import sys
+import time
+
+# ======================= GUNICORN =======================
+# gunicorn lee este archivo solo (está en el directorio de trabajo del contenedor).
+# Con preload la app se importa una vez en el master y los workers nacen por fork ya listos:
+# reiniciar o agregar un worker cuesta milisegundos y el código importado se comparte entre
+# procesos (copy-on-write). Es seguro porque importar app.py no abre conexiones: el pool de BD,
+# el cliente HTTP y MSAL se crean en cada worker con su primer uso (y se rehacen tras un fork).
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("GUNICORN_WORKERS", "4"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+# Un worker sync no avisa que está vivo mientras atiende: las exportaciones grandes y las
+# descargas lentas se envían por partes durante más de los 30 s por defecto
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "300"))
+
+
+def when_ready(server):
+    # Lo importado en el master pasa a la generación permanente: el GC de los workers no lo
+    # recorre y no ensucia esas páginas (que dejarían de compartirse)
+    if preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    app = sys.modules.get("app")
+    if app is not None:
+        app.INICIO_PROCESO = time.time()  # /health informa el uptime del worker, no del master
+
+
+def post_worker_init(worker):
+    # Cada worker busca trabajos de correo pendientes, incluidos los que dejó uno reciclado
+    app = sys.modules.get("app")
+    if app is not None:
+        app.motor_correo.iniciar()
@@ -0,0 +1,227 @@
+import asyncio
+import os
+import threading
+import time
+from bisect import bisect_left
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# ======================= CLIENTE HTTP SALIENTE =======================
+# Un solo cliente por proceso para todas las llamadas externas (Graph, login de Microsoft, UG):
+#   - conexiones keep-alive reutilizadas (HTTPAdapter con pool por host),
+#   - timeout por defecto (conexión, lectura) en todas las peticiones,
+#   - límite de peticiones simultáneas por host para no acaparar los hilos del worker
+#     cuando un servicio externo se pone lento,
+#   - histograma de latencia por servicio ("graph", "ug", "login"...).
+# En modo ASGI (asgi.py) las rutas de la UG y de Graph usan ClienteHTTPAsync (httpx): la espera
+# a la API externa no ocupa un hilo y las métricas van al mismo ClienteHTTP del proceso.
+
+# Límites de los buckets en segundos (formato acumulativo estilo Prometheus)
+BUCKETS_LATENCIA = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class LimiteHostError(Exception):
+    """
+    Demasiadas peticiones simultáneas al mismo host; se corta sin llegar a conectar. Es presión
+    local, no un fallo del servicio externo: a propósito no es una requests.RequestException, así
+    no abre circuitos ni cuenta como error del upstream. Quien llama responde 503 (ocupado).
+    """
+
+
+class Histograma:
+    def __init__(self, limites=BUCKETS_LATENCIA):
+        self.limites = tuple(limites)
+        self.conteos = [0] * (len(self.limites) + 1)  # el último es +Inf
+        self.suma = 0.0
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def observar(self, valor):
+        with self._lock:
+            self.conteos[bisect_left(self.limites, valor)] += 1
+            self.suma += valor
+            self.total += 1
+
+    def resumen(self):
+        with self._lock:
+            acumulado = 0
+            buckets = {}
+            for limite, n in zip(self.limites + (float("inf"),), self.conteos):
+                acumulado += n
+                buckets["+Inf" if limite == float("inf") else str(limite)] = acumulado
+            return {"buckets": buckets, "suma": round(self.suma, 6), "total": self.total}
+
+
+class ClienteHTTP:
+    def __init__(self, timeout=None, max_por_host=None, pool_por_host=None):
+        self.timeout = timeout or (
+            float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+            float(os.getenv("HTTP_READ_TIMEOUT", "30")),
+        )
+        self.max_por_host = max_por_host or int(os.getenv("HTTP_MAX_POR_HOST", "16"))
+        pool = pool_por_host or self.max_por_host
+
+        self.sesion = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=8, pool_maxsize=pool)
+        self.sesion.mount("https://", adaptador)
+        self.sesion.mount("http://", adaptador)
+
+        self._semaforos = {}
+        self._histogramas = {}
+        self._errores = {}
+        self._rechazadas = {}
+        self._en_curso = {}
+        self._lock = threading.Lock()
+
+    def _semaforo(self, host):
+        with self._lock:
+            sem = self._semaforos.get(host)
+            if sem is None:
+                sem = self._semaforos[host] = threading.BoundedSemaphore(self.max_por_host)
+            return sem
+
+    def _histograma(self, servicio):
+        with self._lock:
+            h = self._histogramas.get(servicio)
+            if h is None:
+                h = self._histogramas[servicio] = Histograma()
+            return h
+
+    def _contar(self, tabla, servicio, delta):
+        with self._lock:
+            tabla[servicio] = tabla.get(servicio, 0) + delta
+
+    def request(self, metodo, url, servicio=None, **kwargs):
+        """
+        Igual que requests.Session.request, con timeout por defecto y límite por host.
+        servicio: nombre con el que se agrupa la latencia (por defecto el host).
+        """
+        host = urlsplit(url).netloc
+        servicio = servicio or host
+        kwargs.setdefault("timeout", self.timeout)
+        sem = self._semaforo(host)
+        espera = kwargs["timeout"][0] if isinstance(kwargs["timeout"], tuple) else kwargs["timeout"]
+        if not sem.acquire(timeout=espera):
+            self._contar(self._rechazadas, servicio, 1)
+            raise LimiteHostError(f"Demasiadas peticiones simultáneas a {host}")
+        self._contar(self._en_curso, servicio, 1)
+        inicio = time.perf_counter()
+        try:
+            return self.sesion.request(metodo, url, **kwargs)
+        except requests.RequestException:
+            self._contar(self._errores, servicio, 1)
+            raise
+        finally:
+            self._histograma(servicio).observar(time.perf_counter() - inicio)
+            self._contar(self._en_curso, servicio, -1)
+            sem.release()
+
+    def observar(self, servicio, segundos):
+        """Registra la latencia de una llamada hecha por fuera del cliente (p. ej. msal)."""
+        self._histograma(servicio).observar(segundos)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def metricas(self):
+        with self._lock:
+            servicios = list(self._histogramas)
+            errores = dict(self._errores)
+            rechazadas = dict(self._rechazadas)
+            en_curso = dict(self._en_curso)
+        return {
+            s: {"latencia": self._histograma(s).resumen(), "errores": errores.get(s, 0),
+                "rechazadas": rechazadas.get(s, 0), "en_curso": en_curso.get(s, 0)}
+            for s in servicios
+        }
+
+
+class ClienteHTTPAsync:
+    """
+    Variante asyncio de ClienteHTTP para asgi.py: mismos timeouts por defecto y límite por host
+    (HTTP_MAX_POR_HOST_ASYNC, mucho más alto porque una petición en espera no cuesta un hilo).
+    Los errores de httpx se traducen a los de requests para que quien llama los maneje igual
+    que en modo síncrono.
+    """
+
+    def __init__(self, timeout=None, max_por_host=None):
+        import httpx
+        self._httpx = httpx
+        self.metricas = obtener_cliente()
+        self.timeout = timeout or self.metricas.timeout
+        self.max_por_host = max_por_host or int(os.getenv("HTTP_MAX_POR_HOST_ASYNC", "256"))
+        self.sesion = httpx.AsyncClient(limits=httpx.Limits(max_connections=None,
+                                                            max_keepalive_connections=self.max_por_host))
+        self._semaforos = {}
+
+    async def request(self, metodo, url, servicio=None, **kwargs):
+        host = urlsplit(url).netloc
+        servicio = servicio or host
+        timeout = kwargs.pop("timeout", None) or self.timeout
+        conexion, lectura = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        sem = self._semaforos.get(host)
+        if sem is None:
+            sem = self._semaforos[host] = asyncio.Semaphore(self.max_por_host)
+        try:
+            await asyncio.wait_for(sem.acquire(), conexion)
+        except asyncio.TimeoutError:
+            self.metricas._contar(self.metricas._rechazadas, servicio, 1)
+            raise LimiteHostError(f"Demasiadas peticiones simultáneas a {host}")
+        self.metricas._contar(self.metricas._en_curso, servicio, 1)
+        inicio = time.perf_counter()
+        try:
+            return await self.sesion.request(metodo, url, timeout=self._httpx.Timeout(lectura, connect=conexion),
+                                             **kwargs)
+        except self._httpx.TimeoutException as e:
+            self.metricas._contar(self.metricas._errores, servicio, 1)
+            raise requests.Timeout(str(e) or "Tiempo de espera agotado") from e
+        except self._httpx.HTTPError as e:
+            self.metricas._contar(self.metricas._errores, servicio, 1)
+            raise requests.ConnectionError(str(e) or type(e).__name__) from e
+        finally:
+            self.metricas.observar(servicio, time.perf_counter() - inicio)
+            self.metricas._contar(self.metricas._en_curso, servicio, -1)
+            sem.release()
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+
+_cliente = None
+_cliente_pid = None
+_cliente_lock = threading.Lock()
+
+
+def obtener_cliente():
+    """Cliente compartido del proceso (se recrea tras un fork para no heredar sockets del padre)."""
+    global _cliente, _cliente_pid
+    pid = os.getpid()
+    if _cliente is None or _cliente_pid != pid:
+        with _cliente_lock:
+            if _cliente is None or _cliente_pid != pid:
+                _cliente = ClienteHTTP()
+                _cliente_pid = pid
+    return _cliente
+
+
+
+_clientes_async = {}
+
+
+def obtener_cliente_async():
+    """Cliente async del event loop actual (httpx.AsyncClient no se puede compartir entre loops)."""
+    loop = asyncio.get_running_loop()
+    cliente = _clientes_async.get(loop)
+    if cliente is None:
+        for viejo in [l for l in _clientes_async if l.is_closed()]:
+            del _clientes_async[viejo]
+        cliente = _clientes_async[loop] = ClienteHTTPAsync()
+    return cliente
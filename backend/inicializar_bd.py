@@ -0,0 +1,40 @@
+import argparse
+import sys
+import time
+
+from database import inicializar_base_datos, verificar_conexion
+
+# ======================= INICIALIZACIÓN DE BD (UNA VEZ POR DESPLIEGUE) =======================
+# Crea la base si no existe y aplica las migraciones pendientes (todas son idempotentes).
+# Se ejecuta antes de levantar gunicorn, no al importar app.py, así los workers arrancan sin
+# tocar la BD y una BD lenta no impide que el servicio levante:
+#   python inicializar_bd.py --esperar 120     (servicio migraciones en docker-compose)
+REINTENTO = 5  # segundos entre intentos mientras la BD termina de arrancar
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Crea la BD de FACAF y aplica las migraciones")
+    parser.add_argument("--esperar", type=float, default=0,
+                        help="segundos que se reintenta si la BD aún no acepta conexiones")
+    args = parser.parse_args(argv)
+
+    limite = time.monotonic() + args.esperar
+    intento = 1
+    while True:
+        print(f"🚀 Inicializando base de datos (intento {intento})...")
+        if inicializar_base_datos():
+            try:
+                verificar_conexion()
+                print("✅ Base de datos lista")
+                return 0
+            except Exception as e:
+                print(f"❌ La BD no responde después de migrar: {e}")
+        if time.monotonic() + REINTENTO > limite:
+            print("💥 No se pudo inicializar la base de datos")
+            return 1
+        time.sleep(REINTENTO)
+        intento += 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+import functools
+import glob
+import inspect
+import json
+import os
+import tempfile
+import threading
+import time
+
+from http_saliente import Histograma
+
+# ======================= MÉTRICAS (PROMETHEUS) =======================
+# Registro en memoria de cada worker:
+#   - latencia por ruta y peticiones en curso (hooks de Flask en app.py y _medido en asgi.py),
+#   - tiempo de BD por función de database.py (@medir_bd),
+#   - bytes de blob leídos/escritos,
+#   - fuentes externas que se leen al exportar (cliente HTTP: UG/Graph, pool de conexiones).
+# Con varios workers de gunicorn cada uno deja una foto de sus métricas en METRICAS_DIR y
+# /metrics suma las de todos los workers vivos, así el scrape no depende del worker que atiende.
+BUCKETS_PETICION = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+DESCRIPCIONES = {
+    "facaf_http_peticion_duracion_segundos": ("histogram", "Latencia de las peticiones por ruta"),
+    "facaf_http_peticiones_en_curso": ("gauge", "Peticiones atendiéndose en este momento"),
+    "facaf_bd_duracion_segundos": ("histogram", "Tiempo en la BD por función de database.py"),
+    "facaf_bd_errores_total": ("counter", "Excepciones por función de database.py"),
+    "facaf_blob_bytes_total": ("counter", "Bytes de ArchivosExcel.Datos leídos o escritos"),
+    "facaf_blob_cache_total": ("counter", "Descargas servidas desde la cache de blobs en disco o no"),
+    "facaf_upstream_duracion_segundos": ("histogram", "Latencia de las APIs externas (UG, Graph, login)"),
+    "facaf_upstream_errores_total": ("counter", "Errores de red o timeouts con APIs externas"),
+    "facaf_upstream_rechazadas_total": ("counter", "Peticiones a APIs externas cortadas por el límite por host (HTTP_MAX_POR_HOST)"),
+    "facaf_upstream_en_curso": ("gauge", "Peticiones a APIs externas en curso"),
+    "facaf_bd_pool_conexiones": ("gauge", "Conexiones del pool por estado"),
+    "facaf_eventos_conexiones": ("gauge", "Navegadores conectados a /events"),
+    "facaf_eventos_publicados_total": ("counter", "Eventos de cambios publicados por tipo"),
+    "facaf_eventos_rechazados_total": ("counter", "Conexiones a /events rechazadas por el límite del worker"),
+}
+
+
+def _directorio():
+    return os.getenv("METRICAS_DIR") or os.path.join(tempfile.gettempdir(), "facaf-metricas")
+
+
+def _intervalo():
+    return float(os.getenv("METRICAS_INTERVALO", "2"))  # segundos entre fotos de cada worker
+
+
+def _etiquetas(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Registro:
+    def __init__(self):
+        self._histogramas = {}
+        self._valores = {}  # contadores y gauges: (nombre, etiquetas) -> número
+        self._fuentes = []
+        self._lock = threading.Lock()
+        self._ultima_foto = 0.0
+
+    def observar(self, nombre, valor, limites=BUCKETS_PETICION, **labels):
+        k = (nombre, _etiquetas(labels))
+        h = self._histogramas.get(k)
+        if h is None:
+            with self._lock:
+                h = self._histogramas.setdefault(k, Histograma(limites))
+        h.observar(valor)
+
+    def incrementar(self, nombre, valor=1, **labels):
+        k = (nombre, _etiquetas(labels))
+        with self._lock:
+            self._valores[k] = self._valores.get(k, 0) + valor
+
+    def registrar_fuente(self, fuente):
+        """fuente() -> [(nombre, etiquetas dict, valor)], valor numérico o resumen de Histograma."""
+        self._fuentes.append(fuente)
+
+    def series(self):
+        with self._lock:
+            histogramas = list(self._histogramas.items())
+            valores = list(self._valores.items())
+        series = [[n, dict(e), h.resumen()] for (n, e), h in histogramas]
+        series += [[n, dict(e), v] for (n, e), v in valores]
+        for fuente in self._fuentes:
+            try:
+                series += [[n, {k: str(v) for k, v in e.items()}, valor] for n, e, valor in fuente()]
+            except Exception as e:
+                print(f"⚠️ Métricas: fuente omitida: {e}")
+        return series
+
+    # ----------------------- FOTOS POR WORKER -----------------------
+    def guardar_foto(self, forzar=False):
+        ahora = time.monotonic()
+        if not forzar and ahora - self._ultima_foto < _intervalo():
+            return
+        self._ultima_foto = ahora
+        directorio = _directorio()
+        try:
+            os.makedirs(directorio, mode=0o700, exist_ok=True)
+            ruta = os.path.join(directorio, f"{os.getpid()}.json")
+            temporal = f"{ruta}.tmp"
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump({"pid": os.getpid(), "series": self.series()}, f)
+            os.replace(temporal, ruta)
+        except OSError as e:
+            print(f"⚠️ Métricas: no se pudo guardar la foto del worker: {e}")
+
+    def _fotos(self):
+        """Series de todos los workers vivos (las de procesos terminados se descartan)."""
+        self.guardar_foto(forzar=True)
+        todas = []
+        for ruta in glob.glob(os.path.join(_directorio(), "*.json")):
+            try:
+                with open(ruta, "r", encoding="utf-8") as f:
+                    foto = json.load(f)
+                vivo = foto["pid"] == os.getpid() or _proceso_vivo(foto["pid"])
+            except (OSError, ValueError, KeyError):
+                continue
+            if not vivo:
+                try:
+                    os.remove(ruta)
+                except OSError:
+                    pass
+                continue
+            todas += foto["series"]
+        return todas
+
+    def exportar(self):
+        """Texto en formato de exposición de Prometheus con la suma de todos los workers."""
+        suma = {}
+        for nombre, etiquetas, valor in self._fotos():
+            k = (nombre, _etiquetas(etiquetas))
+            if isinstance(valor, dict):
+                actual = suma.setdefault(k, {"buckets": {}, "suma": 0.0, "total": 0})
+                for le, n in valor["buckets"].items():
+                    actual["buckets"][le] = actual["buckets"].get(le, 0) + n
+                actual["suma"] += valor["suma"]
+                actual["total"] += valor["total"]
+            else:
+                suma[k] = suma.get(k, 0) + valor
+
+        lineas = []
+        for nombre in sorted({n for n, _ in suma}):
+            tipo, ayuda = DESCRIPCIONES.get(nombre, ("untyped", nombre))
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+            for (n, etiquetas), valor in sorted(suma.items(), key=lambda x: x[0]):
+                if n != nombre:
+                    continue
+                if isinstance(valor, dict):
+                    for le, cantidad in sorted(valor["buckets"].items(), key=lambda b: float(b[0])):
+                        lineas.append(f"{nombre}_bucket{_formato(etiquetas + (('le', le),))} {cantidad}")
+                    lineas.append(f"{nombre}_sum{_formato(etiquetas)} {valor['suma']}")
+                    lineas.append(f"{nombre}_count{_formato(etiquetas)} {valor['total']}")
+                else:
+                    lineas.append(f"{nombre}{_formato(etiquetas)} {valor}")
+        return "\n".join(lineas) + "\n"
+
+
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # existe, pero es de otro usuario
+    return True
+
+
+def _formato(etiquetas):
+    if not etiquetas:
+        return ""
+    escapar = lambda v: v.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escapar(v)}"' for k, v in etiquetas) + "}"
+
+
+registro = Registro()
+observar = registro.observar
+incrementar = registro.incrementar
+registrar_fuente = registro.registrar_fuente
+
+
+def medir_bd(fn):
+    """
+    Registra el tiempo de cada llamada (y sus errores) con la etiqueta funcion=<nombre>.
+    Va debajo de @cacheado para que solo cuente lo que realmente llega a la BD. En los
+    generadores se mide el tiempo dentro del generador, no el que tarda quien lo consume.
+    """
+    nombre = fn.__name__
+
+    if inspect.isgeneratorfunction(fn):
+        @functools.wraps(fn)
+        def envoltura_gen(*args, **kwargs):
+            gen = fn(*args, **kwargs)
+            transcurrido = 0.0
+            try:
+                while True:
+                    inicio = time.perf_counter()
+                    try:
+                        valor = next(gen)
+                    except StopIteration:
+                        return
+                    finally:
+                        transcurrido += time.perf_counter() - inicio
+                    yield valor
+            except GeneratorExit:
+                gen.close()
+                raise
+            except Exception:
+                incrementar("facaf_bd_errores_total", funcion=nombre)
+                raise
+            finally:
+                observar("facaf_bd_duracion_segundos", transcurrido, funcion=nombre)
+        return envoltura_gen
+
+    @functools.wraps(fn)
+    def envoltura(*args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            incrementar("facaf_bd_errores_total", funcion=nombre)
+            raise
+        finally:
+            observar("facaf_bd_duracion_segundos", time.perf_counter() - inicio, funcion=nombre)
+    return envoltura
+
+
+class Peticion:
+    """Mide una petición: en curso mientras vive y al cerrar observa la latencia por ruta."""
+
+    def __init__(self, ruta, metodo):
+        self.ruta = ruta
+        self.metodo = metodo
+        self.inicio = time.perf_counter()
+        incrementar("facaf_http_peticiones_en_curso", 1)
+
+    def terminar(self, status):
+        duracion = time.perf_counter() - self.inicio
+        incrementar("facaf_http_peticiones_en_curso", -1)
+        observar("facaf_http_peticion_duracion_segundos", duracion,
+                 ruta=self.ruta, metodo=self.metodo, status=status)
+        registro.guardar_foto()
+        return duracion
@@ -0,0 +1,178 @@
+import math
+from datetime import datetime, timedelta
+
+from datasets import DOCENTE, EPOCH_EXCEL
+
+# ======================= TABLAS NORMALIZADAS =======================
+# Además del archivo original (ArchivosExcel.Datos, para descargarlo tal cual) y del dataset
+# columnar, los reportes conocidos se cargan en tablas tipadas e indexadas para poder
+# consultarlos con SQL sin volver a leer el workbook:
+#   Calificaciones  <- reportes de notas (REPORTE_RECORD_CALIFICACIONES_POR_PARCIAL[_TOTAL])
+#   Matriculas      <- nómina de estudiantes matriculados/legalizados
+#   Docentes        <- REPORTE_DETALLADO_DOCENTES
+# El tipo se reconoce por las columnas, no por el nombre del archivo. Cada fila lleva ArchivoId y
+# Version del archivo: la versión nueva se inserta y la anterior se borra en la misma transacción
+# que reemplaza el blob (ver database.guardar_archivo_excel).
+_FORMATOS_FECHA = ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d")
+# Rangos de las columnas SQL: un valor fuera haría fallar el INSERT de todo el archivo
+_DECIMAL_MAX = 10000                    # DECIMAL(6,2): hasta 9999.99
+_FECHA_MIN = datetime(1753, 1, 1)       # DATETIME de SQL Server
+_FECHA_MAX = datetime(9999, 12, 31, 23, 59, 59)
+
+
+def _texto(largo):
+    def convertir(v):
+        s = "" if v is None else str(v).strip()
+        return s[:largo] or None
+    return convertir
+
+
+def _decimal(v):
+    """'7,76' -> 7.76; vacío, no numérico o fuera de DECIMAL(6,2) -> None (igual que asNum del frontend)."""
+    if v is None or isinstance(v, bool):
+        return None
+    try:
+        n = round(float(v if isinstance(v, (int, float)) else str(v).strip().replace(",", ".", 1)), 2)
+    except (ValueError, OverflowError):
+        return None
+    return n if math.isfinite(n) and abs(n) < _DECIMAL_MAX else None
+
+
+def _entero(v):
+    n = _decimal(v)
+    return int(n) if n is not None and 0 <= n < 32768 else None
+
+
+def _fecha(v):
+    """
+    Serial de Excel (como lo deja datasets._valor_celda) o texto dd/mm/aaaa [hh:mm:ss].
+    None si no se reconoce o cae fuera del rango de DATETIME (1753-9999).
+    """
+    if v is None or isinstance(v, bool):
+        return None
+    if isinstance(v, (int, float)):
+        try:
+            fecha = EPOCH_EXCEL + timedelta(days=float(v))
+        except (ValueError, OverflowError):  # nan, inf o fuera del rango de datetime
+            return None
+    else:
+        s = str(v).strip()
+        for formato in _FORMATOS_FECHA:
+            try:
+                fecha = datetime.strptime(s, formato)
+                break
+            except ValueError:
+                pass
+        else:
+            return None
+    return fecha if _FECHA_MIN <= fecha <= _FECHA_MAX else None
+
+
+def _docente_id(v):
+    m = DOCENTE.match("" if v is None else str(v))
+    return m.group(1)[:20] if m else None
+
+
+# (columna SQL, columna del Excel, conversión); el orden es el del INSERT
+CALIFICACIONES = (
+    ("Identificacion", "IDENTIFICACION", _texto(20)),
+    ("Periodo", "PERIODO", _texto(50)),
+    ("Materia", "MATERIA", _texto(200)),
+    ("CodMateria", "COD_MATERIA", _texto(30)),
+    ("CodCarrera", "COD_CARRERA", _texto(20)),
+    ("Carrera", "CARRERA", _texto(150)),
+    ("Nivel", "NIVEL", _texto(10)),
+    ("Paralelo", "GRUPO/PARALELO", _texto(50)),
+    ("Apellidos", "APELLIDOS", _texto(150)),
+    ("Nombres", "NOMBRES", _texto(150)),
+    ("AsistenciaPrimerParcial", "ASISTENCIA_PRIMER_PARCIAL", _decimal),
+    ("PrimerParcial", "PRIMER_PARCIAL", _decimal),
+    ("AsistenciaSegundoParcial", "ASISTENCIA_SEGUNDO_PARCIAL", _decimal),
+    ("SegundoParcial", "SEGUNDO_PARCIAL", _decimal),
+    ("Recuperacion", "RECUPERACION", _decimal),
+    ("Mejoramiento", "MEJORAMIENTO", _decimal),
+    ("PromedioParciales", "PROMEDIO_PARCIALES", _decimal),
+    ("Promedio", "PROMEDIO", _decimal),
+    ("NoVez", "NO. VEZ", _entero),
+    ("Estado", "ESTADO", _texto(30)),
+    ("DocenteId", "DOCENTE", _docente_id),
+    ("Docente", "DOCENTE", _texto(200)),
+    ("CorreoInstitucional", "CORREO_INSTITUCIONAL", _texto(150)),
+    ("CorreoPersonal", "CORREO_PERSONAL", _texto(150)),
+)
+
+MATRICULAS = (
+    ("Identificacion", "IDENTIFICACION", _texto(20)),
+    ("Periodo", "PERIODO", _texto(50)),
+    ("CodCarrera", "COD_CARRERA", _texto(20)),
+    ("Carrera", "CARRERA", _texto(150)),
+    ("Nivel", "NIVEL", _texto(10)),
+    ("Apellidos", "APELLIDOS", _texto(150)),
+    ("Nombres", "NOMBRES", _texto(150)),
+    ("Sexo", "SEXO", _texto(20)),
+    ("Discapacidad", "DISCAPACIDAD", _texto(100)),
+    ("PorcentajeDiscapacidad", "PORCENTAJE DISCAPACIDAD", _decimal),
+    ("Vez", "VEZ", _entero),
+    ("Estado", "ESTADO", _texto(30)),
+    ("FechaMatricula", "FECHA_MATRICULA", _fecha),
+    ("FechaLegalizacion", "FECHA_LEGALIZACION", _fecha),
+    ("CorreoInstitucional", "CORREO_INSTITUCIONAL", _texto(150)),
+    ("CorreoPersonal", "CORREO_PERSONAL", _texto(150)),
+)
+
+DOCENTES = (
+    ("Identificacion", "IDENTIFICACION", _texto(20)),
+    ("Periodo", "PERIODO", _texto(50)),
+    ("Carrera", "CARRERA", _texto(150)),
+    ("Nombres", "NOMBRES", _texto(200)),
+    ("Dedicacion", "DEDICACION", _texto(10)),
+    ("Cargo", "CARGO", _texto(150)),
+    ("TipoContrato", "TIPO_CONTRATO", _texto(50)),
+    ("HorasContrato", "HORAS_CONTRATO", _entero),
+    ("CorreoInstitucional", "CORREO_SIUG", _texto(150)),
+    ("CorreoPersonal", "CORREO_RRHH2", _texto(150)),
+)
+
+# tabla -> (columnas que identifican el reporte, esquema); se prueba en este orden
+TABLAS = {
+    "Calificaciones": (("IDENTIFICACION", "PERIODO", "MATERIA", "NO. VEZ"), CALIFICACIONES),
+    "Matriculas": (("IDENTIFICACION", "PERIODO", "CARRERA", "FECHA_LEGALIZACION"), MATRICULAS),
+    "Docentes": (("IDENTIFICACION", "NOMBRES", "DEDICACION"), DOCENTES),
+}
+
+
+def extraer(dataset):
+    """
+    (tabla, columnas SQL, filas como tuplas) del dataset columnar, o None si no es un reporte conocido.
+    Se omiten las filas a las que les falta IDENTIFICACION o PERIODO (o MATERIA en Calificaciones).
+    """
+    if not dataset:
+        return None
+    cols = {c["nombre"]: c for c in dataset["columnas"]}
+    for tabla, (requeridas, esquema) in TABLAS.items():
+        if all(r in cols for r in requeridas):
+            break
+    else:
+        return None
+
+    # Conversión por columna (las de diccionario solo se convierten una vez por valor distinto)
+    convertidas = []
+    for _, origen, convertir in esquema:
+        col = cols.get(origen)
+        if col is None:
+            convertidas.append([convertir(None)] * dataset["filas"])
+        elif col["tipo"] == "dict":
+            distintos = [convertir(v) for v in col["valores"]]
+            vacio = convertir(None)
+            convertidas.append([distintos[c] if c >= 0 else vacio for c in col["codigos"]])
+        else:
+            convertidas.append([convertir(v) for v in col["datos"]])
+
+    obligatorias = 3 if tabla == "Calificaciones" else 2
+    filas = [f for f in zip(*convertidas) if all(f[:obligatorias])]
+    return tabla, [c for c, _, _ in esquema], filas
+
+
+def lotes(filas, tamano):
+    for i in range(0, len(filas), tamano):
+        yield filas[i:i + tamano]
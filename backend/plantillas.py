@@ -0,0 +1,70 @@
+import re
+
+from cache import cacheado
+from database import CACHE_TTL, obtener_plantillas
+
+TIPOS = ("autoridad", "docente", "estudiante")
+
+# Mismo patrón que replaceKeywords en emailModule.js: {clave}, sin cruzar saltos de línea
+_PATRON = re.compile(r"\{(.*?)\}")
+
+
+def _a_texto(v):
+    """Equivalente a String(v) de JavaScript para los tipos que llegan en JSON."""
+    if v is True:
+        return "true"
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    if isinstance(v, list):
+        return ",".join("" if x is None else _a_texto(x) for x in v)
+    return str(v)
+
+
+class PlantillaCompilada:
+    """Plantilla partida una sola vez en literales y claves; render() solo concatena."""
+
+    def __init__(self, texto):
+        self.texto = texto or ""
+        self.partes = []  # (literal, clave | None)
+        pos = 0
+        for m in _PATRON.finditer(self.texto):
+            self.partes.append((self.texto[pos:m.start()], m.group(1)))
+            pos = m.end()
+        self.partes.append((self.texto[pos:], None))
+        self.claves = sorted({clave for _, clave in self.partes if clave is not None})
+
+    def render(self, variables):
+        salida = []
+        for literal, clave in self.partes:
+            salida.append(literal)
+            if clave is None:
+                continue
+            v = variables.get(clave)
+            # replaceKeywords deja {clave} intacta si el valor es falsy en JS (el 0 sí se reemplaza)
+            if v is None or v is False or (isinstance(v, str) and not v):
+                salida.append("{" + clave + "}")
+            else:
+                salida.append(_a_texto(v))
+        return "".join(salida)
+
+
+@cacheado('plantillas', CACHE_TTL, clave=lambda: 'compiladas')
+def obtener_compiladas():
+    """Plantillas compiladas; se recompilan cuando guardar_plantillas invalida el espacio 'plantillas'."""
+    datos = obtener_plantillas()
+    return {tipo: PlantillaCompilada(datos.get(tipo, "")) for tipo in TIPOS}
+
+
+def combinar(tipo, comunes, destinatarios):
+    """
+    Mail-merge: renderiza la plantilla `tipo` para cada destinatario.
+    comunes: variables compartidas; cada destinatario es {'to': [...], 'variables': {...}} y sus
+    variables tienen prioridad sobre las comunes. Devuelve [{'to', 'body'}].
+    """
+    plantilla = obtener_compiladas()[tipo]
+    resultado = []
+    for d in destinatarios:
+        variables = dict(comunes)
+        variables.update(d.get("variables") or {})
+        resultado.append({"to": d["to"], "body": plantilla.render(variables)})
+    return resultado
@@ -0,0 +1,203 @@
+import threading
+import time
+from collections import deque
+
+import pyodbc
+
+
+class PoolAgotadoError(Exception):
+    """No se obtuvo una conexión libre dentro del timeout del pool."""
+
+
+class _Conexion:
+    """Conexión pyodbc real que guarda el pool, con sus tiempos de creación y último uso."""
+    __slots__ = ("raw", "creada", "ultimo_uso")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.creada = time.monotonic()
+        self.ultimo_uso = self.creada
+
+
+class ConexionPool:
+    """
+    Envoltura de una conexión pyodbc prestada por el pool; cada préstamo entrega una nueva.
+    Se usa igual que la conexión original; close() la devuelve al pool en lugar de cerrarla.
+    Después de close() la envoltura queda inservible: una referencia vieja no puede usar ni
+    devolver de nuevo la conexión que ya tiene otro.
+    """
+
+    def __init__(self, pool, conexion):
+        self._pool = pool
+        self._conexion = conexion
+        self._invalida = False
+
+    def invalidar(self):
+        """Marca la conexión para descartarla al devolverla (p. ej. tras un error de red)."""
+        self._invalida = True
+
+    def close(self):
+        conexion, self._conexion = self._conexion, None
+        if conexion is not None:
+            self._pool._devolver(conexion, self._invalida)
+
+    def __getattr__(self, nombre):
+        conexion = self.__dict__.get("_conexion")
+        if conexion is None:
+            raise pyodbc.ProgrammingError("Conexión ya devuelta al pool")
+        return getattr(conexion.raw, nombre)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and issubclass(exc_type, pyodbc.OperationalError):
+            self.invalidar()
+        self.close()
+        return False
+
+
+class PoolConexiones:
+    """Pool acotado y thread-safe de conexiones pyodbc con pre-ping y expiración por inactividad."""
+
+    def __init__(self, fabrica, tamano=5, timeout=10.0, max_inactividad=300.0,
+                 reciclar=1800.0, pre_ping=True, intervalo_ping=30.0):
+        self._fabrica = fabrica
+        self.tamano = max(1, int(tamano))
+        self.timeout = timeout
+        self.max_inactividad = max_inactividad
+        self.reciclar = reciclar
+        self.pre_ping = pre_ping
+        self.intervalo_ping = intervalo_ping
+
+        self._libres = deque()
+        self._cond = threading.Condition(threading.Lock())
+        self._total = 0  # conexiones vivas (libres + prestadas)
+        self._stats = {
+            "creadas": 0,
+            "descartadas": 0,
+            "prestamos": 0,
+            "esperas": 0,
+            "timeouts": 0,
+            "ping_fallidos": 0,
+        }
+
+    # ----------------------- PRÉSTAMO -----------------------
+    def obtener(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        limite = time.monotonic() + timeout
+        con = None
+        with self._cond:
+            esperando = False
+            while True:
+                while self._libres:
+                    candidata = self._libres.pop()  # LIFO: reutiliza la más reciente
+                    if self._expirada(candidata):
+                        self._descartar_locked(candidata)
+                        continue
+                    con = candidata
+                    break
+                if con is not None:
+                    break
+                if self._total < self.tamano:
+                    self._total += 1  # reserva el hueco; la conexión se crea fuera del lock
+                    break
+
+                if not esperando:
+                    esperando = True
+                    self._stats["esperas"] += 1
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolAgotadoError(
+                        f"Sin conexiones libres tras {timeout}s (pool de {self.tamano})"
+                    )
+                self._cond.wait(restante)
+            self._stats["prestamos"] += 1
+
+        if con is not None and not self._ping(con):
+            with self._cond:
+                self._stats["ping_fallidos"] += 1
+                self._descartar_locked(con)
+                self._total += 1  # el hueco se reutiliza con una conexión nueva
+            con = None
+
+        if con is None:
+            con = self._crear()
+        return ConexionPool(self, con)
+
+    def _crear(self):
+        try:
+            raw = self._fabrica()
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats["creadas"] += 1
+        return _Conexion(raw)
+
+    def _expirada(self, con):
+        ahora = time.monotonic()
+        if self.max_inactividad and ahora - con.ultimo_uso > self.max_inactividad:
+            return True
+        if self.reciclar and ahora - con.creada > self.reciclar:
+            return True
+        return False
+
+    def _ping(self, con):
+        if not self.pre_ping or time.monotonic() - con.ultimo_uso < self.intervalo_ping:
+            return True
+        try:
+            cur = con.raw.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+            cur.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    # ----------------------- DEVOLUCIÓN -----------------------
+    def _devolver(self, con, invalida=False):
+        if not invalida:
+            try:
+                # Nunca dejar una transacción abierta para el siguiente que la use
+                con.raw.rollback()
+            except pyodbc.Error:
+                invalida = True
+
+        with self._cond:
+            if invalida:
+                self._descartar_locked(con)
+            else:
+                con.ultimo_uso = time.monotonic()
+                self._libres.append(con)
+            self._cond.notify()
+
+    def _descartar_locked(self, con):
+        self._total -= 1
+        self._stats["descartadas"] += 1
+        try:
+            con.raw.close()
+        except Exception:
+            pass
+
+    def cerrar_todo(self):
+        with self._cond:
+            while self._libres:
+                self._descartar_locked(self._libres.pop())
+            self._cond.notify_all()
+
+    # ----------------------- MÉTRICAS -----------------------
+    def metricas(self):
+        with self._cond:
+            libres = len(self._libres)
+            return {
+                "tamano": self.tamano,
+                "abiertas": self._total,
+                "libres": libres,
+                "prestadas": self._total - libres,
+                **self._stats,
+            }
+
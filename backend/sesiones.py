@@ -0,0 +1,144 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import tempfile
+import threading
+import time
+
+# ======================= TOKENS DE SESIÓN =======================
+# /auth/ug entrega un token firmado (HMAC-SHA256) con lo que necesitan las verificaciones de rol:
+#   <kid>.<base64url {"id": 7, "rol": "admin", "act": 1, "iat": ..., "exp": ...}>.<base64url firma>
+# Verificarlo es un HMAC y un json.loads, sin I/O: /admin/link y la entrada al panel dejan de
+# consultar Usuarios en cada visita. Dura poco (SESION_TTL) y se renueva en /auth/renovar, que sí
+# vuelve a leer el usuario. Al desactivar a alguien o cambiarle el rol se guarda una marca en
+# SesionesRevocadas y sus tokens anteriores dejan de valer en todos los workers (la lista vive en
+# el espacio 'sesiones' de la cache, ver database.listar_revocaciones).
+# iat va en milisegundos (exp en segundos, como lo usa el navegador) y la marca de revocación también:
+# un token emitido después de la revocación vale aunque caiga en el mismo segundo (p. ej. el que
+# recibe el propio usuario al volver a entrar tras un cambio de rol).
+# Claves: SESION_CLAVES="2:secreto-nuevo,1:secreto-anterior" firma con la primera y acepta todas,
+# así rotar la clave no cierra las sesiones abiertas. Sin SESION_CLAVES se usa una clave aleatoria
+# guardada en SESION_CLAVE_ARCHIVO, compartida por los workers del host (no entre nodos).
+SESION_TTL = int(os.getenv("SESION_TTL", "900"))                 # segundos de validez de cada token
+SESION_RENOVACION = int(os.getenv("SESION_RENOVACION", "1800"))  # segundos tras vencer en que aún se renueva
+SESION_CLAVE_ARCHIVO = os.getenv("SESION_CLAVE_ARCHIVO") or os.path.join(tempfile.gettempdir(), "facaf-sesion.key")
+
+_claves = None
+_claves_lock = threading.Lock()
+
+
+class SesionInvalida(Exception):
+    """Token mal formado, con firma o clave desconocida, vencido o revocado (HTTP 401)."""
+
+
+def _b64(datos):
+    return base64.urlsafe_b64encode(datos).rstrip(b"=").decode("ascii")
+
+
+def _de_b64(texto):
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+
+def _firma(clave, cuerpo):
+    return hmac.new(clave, cuerpo.encode("utf-8"), hashlib.sha256).digest()
+
+
+def _clave_archivo():
+    """Clave aleatoria del host: el primer worker la crea y los demás leen la misma."""
+    try:
+        with open(SESION_CLAVE_ARCHIVO, "rb") as f:
+            clave = f.read()
+        if clave:
+            return clave
+    except FileNotFoundError:
+        pass
+    directorio = os.path.dirname(SESION_CLAVE_ARCHIVO) or "."
+    fd, temporal = tempfile.mkstemp(prefix=".sesion-", dir=directorio)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(secrets.token_bytes(32))
+        os.link(temporal, SESION_CLAVE_ARCHIVO)  # falla si otro worker la publicó primero
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(temporal)
+    with open(SESION_CLAVE_ARCHIVO, "rb") as f:
+        return f.read()
+
+
+def _leer_claves():
+    texto = os.getenv("SESION_CLAVES", "").strip()
+    if not texto:
+        print(f"⚠️ Sesiones: SESION_CLAVES no definido; se usa la clave local {SESION_CLAVE_ARCHIVO}")
+        return [("local", _clave_archivo())]
+    claves = []
+    for parte in texto.split(","):
+        kid, _, secreto = parte.strip().partition(":")
+        if not kid or not secreto or "." in kid:
+            raise ValueError("SESION_CLAVES: se esperaba 'id:secreto,id:secreto' (id sin puntos)")
+        claves.append((kid, secreto.encode("utf-8")))
+    return claves
+
+
+def claves():
+    """[(kid, clave)]: la primera firma, todas verifican."""
+    global _claves
+    if _claves is None:
+        with _claves_lock:
+            if _claves is None:
+                _claves = _leer_claves()
+    return _claves
+
+
+def emitir(usuario, ahora=None):
+    """{'token', 'expira'} (epoch en segundos) para un usuario de la BD {'id', 'rol', 'activo'}."""
+    ahora = time.time() if ahora is None else ahora
+    kid, clave = claves()[0]
+    datos = {"id": int(usuario["id"]), "rol": str(usuario["rol"]).strip().lower(),
+             "act": 1 if usuario["activo"] else 0, "iat": int(ahora * 1000), "exp": int(ahora) + SESION_TTL}
+    cuerpo = f"{kid}.{_b64(json.dumps(datos, separators=(',', ':')).encode('utf-8'))}"
+    return {"token": f"{cuerpo}.{_b64(_firma(clave, cuerpo))}", "expira": datos["exp"]}
+
+
+def verificar(token, revocaciones=None, vencido_hasta=0, ahora=None):
+    """
+    {'id', 'rol', 'activo', 'iat', 'exp'} si la firma es válida, no venció (o venció hace menos
+    de vencido_hasta segundos) y no fue emitido hasta una revocación del usuario (iat <= marca).
+    revocaciones: {usuario_id: desde} de database.listar_revocaciones(). Lanza SesionInvalida.
+    """
+    try:
+        kid, carga, firma = token.split(".")
+        firma = _de_b64(firma)
+    except (AttributeError, ValueError, binascii.Error):
+        raise SesionInvalida("Token de sesión mal formado")
+    clave = dict(claves()).get(kid)
+    if clave is None:
+        raise SesionInvalida("Token firmado con una clave que ya no se acepta")
+    if not hmac.compare_digest(_firma(clave, f"{kid}.{carga}"), firma):
+        raise SesionInvalida("Firma del token inválida")
+    datos = json.loads(_de_b64(carga))  # firmado por nosotros: el formato es conocido
+
+    ahora = time.time() if ahora is None else ahora
+    if datos["exp"] + vencido_hasta < ahora:
+        raise SesionInvalida("Sesión vencida")
+    if revocaciones and datos["iat"] <= revocaciones.get(datos["id"], -1):
+        raise SesionInvalida("Sesión revocada")
+    return {"id": datos["id"], "rol": datos["rol"], "activo": bool(datos["act"]),
+            "iat": datos["iat"], "exp": datos["exp"]}
+
+
+def marca_revocacion(ahora=None):
+    """Epoch en ms: los tokens con iat hasta esta marca quedan revocados, los posteriores valen."""
+    return int((time.time() if ahora is None else ahora) * 1000)
+
+
+def token_de(cabecera):
+    """Token de 'Authorization: Bearer <token>', o None si no vino."""
+    tipo, _, token = (cabecera or "").partition(" ")
+    if tipo.lower() != "bearer":
+        return None
+    return token.strip() or None
@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import re
+import secrets
+import tempfile
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ======================= SUBIDAS POR PARTES =======================
+# Protocolo reanudable para reportes grandes:
+#   POST   /upload/init          {nombre, tamano, tipo}  -> {id, recibido: 0, tamano_parte}
+#   PUT    /upload/<id>?offset=N  cuerpo binario (una parte), se agrega al final del temporal
+#   GET    /upload/<id>           -> {recibido}: desde dónde reanudar tras un corte de red
+#   POST   /upload/<id>/commit    guarda el archivo (ver database.guardar_archivo_desde_ruta)
+#   DELETE /upload/<id>           descarta la subida
+# Las partes van a un archivo temporal en disco (nunca se arma el archivo en memoria) y el
+# estado vive junto a él, así cualquier worker del host puede atender cualquier parte.
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))     # tamaño máximo del archivo
+UPLOAD_MAX_PARTE = int(os.getenv("UPLOAD_MAX_PARTE", str(8 * 1024 * 1024)))      # tamaño máximo por PUT
+UPLOAD_PARTE_SUGERIDA = min(UPLOAD_MAX_PARTE, 2 * 1024 * 1024)
+UPLOAD_TTL = float(os.getenv("UPLOAD_TTL", "86400"))                             # segundos sin actividad
+UPLOAD_DIR = os.getenv("UPLOAD_TMP_DIR") or os.path.join(tempfile.gettempdir(), "facaf-subidas")
+
+_ID = re.compile(r"^[0-9a-f]{32}$")
+_LECTURA = 64 * 1024
+
+
+class SubidaError(Exception):
+    """Error del protocolo con el status HTTP a devolver y datos extra para el cuerpo JSON."""
+
+    def __init__(self, mensaje, status=400, **extra):
+        super().__init__(mensaje)
+        self.status = status
+        self.extra = extra
+
+
+def _rutas(subida_id):
+    if not _ID.match(subida_id or ""):
+        raise SubidaError("Subida no encontrada", 404)
+    base = os.path.join(UPLOAD_DIR, subida_id)
+    return base + ".json", base + ".part"
+
+
+def _leer_meta(subida_id):
+    ruta_meta, _ = _rutas(subida_id)
+    try:
+        with open(ruta_meta, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        raise SubidaError("Subida no encontrada o vencida", 404)
+
+
+def _guardar_meta(meta):
+    ruta_meta, _ = _rutas(meta["id"])
+    temporal = f"{ruta_meta}.{os.getpid()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(temporal, ruta_meta)
+
+
+@contextmanager
+def _bloqueo(subida_id):
+    """Serializa las operaciones sobre una subida entre hilos y workers (flock sobre el .part)."""
+    _, ruta_part = _rutas(subida_id)
+    try:
+        fd = os.open(ruta_part, os.O_RDWR)
+    except FileNotFoundError:
+        fd = None
+    try:
+        if fd is not None and fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        if fd is not None:
+            os.close(fd)  # cerrar libera el flock
+
+
+def _publica(meta):
+    datos = {k: meta[k] for k in ("id", "nombre", "tamano", "recibido")}
+    datos["tamano_parte"] = UPLOAD_PARTE_SUGERIDA
+    if "resultado" in meta:
+        datos["resultado"] = meta["resultado"]
+    return datos
+
+
+def limpiar_vencidas():
+    """Borra las subidas sin actividad en UPLOAD_TTL segundos."""
+    limite = time.time() - UPLOAD_TTL
+    try:
+        nombres = os.listdir(UPLOAD_DIR)
+    except FileNotFoundError:
+        return
+    for nombre in nombres:
+        ruta = os.path.join(UPLOAD_DIR, nombre)
+        try:
+            if os.path.getmtime(ruta) < limite:
+                os.remove(ruta)
+        except OSError:
+            pass
+
+
+def iniciar(nombre, tamano, tipo=None):
+    nombre = os.path.basename((nombre or "").strip())
+    if not nombre:
+        raise SubidaError("Nombre de archivo requerido")
+    if not isinstance(tamano, int) or tamano <= 0:
+        raise SubidaError("Tamaño inválido")
+    if tamano > UPLOAD_MAX_BYTES:
+        raise SubidaError(f"El archivo supera el máximo de {UPLOAD_MAX_BYTES} bytes", 413,
+                          maximo=UPLOAD_MAX_BYTES)
+
+    os.makedirs(UPLOAD_DIR, mode=0o700, exist_ok=True)
+    limpiar_vencidas()
+    subida_id = secrets.token_hex(16)
+    _, ruta_part = _rutas(subida_id)
+    os.close(os.open(ruta_part, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600))
+    meta = {"id": subida_id, "nombre": nombre, "tipo": tipo or "application/octet-stream",
+            "tamano": tamano, "recibido": 0, "creado": time.time()}
+    _guardar_meta(meta)
+    return _publica(meta)
+
+
+def estado(subida_id):
+    meta = _leer_meta(subida_id)
+    _, ruta_part = _rutas(subida_id)
+    if "resultado" not in meta:
+        # Lo escrito en disco manda: una parte pudo quedar a medias si el worker murió
+        meta["recibido"] = os.path.getsize(ruta_part)
+    return _publica(meta)
+
+
+def agregar(subida_id, offset, flujo, largo=None):
+    """
+    Agrega una parte leyendo `flujo` en bloques. `offset` debe ser lo ya recibido; si no coincide
+    se responde 409 con `recibido` para que el cliente reanude desde ahí.
+    """
+    _leer_meta(subida_id)
+    if largo is not None and largo > UPLOAD_MAX_PARTE:
+        raise SubidaError(f"La parte supera el máximo de {UPLOAD_MAX_PARTE} bytes", 413,
+                          maximo=UPLOAD_MAX_PARTE)
+    _, ruta_part = _rutas(subida_id)
+    with _bloqueo(subida_id):
+        meta = _leer_meta(subida_id)
+        if "resultado" in meta:
+            raise SubidaError("La subida ya fue confirmada", 409, recibido=meta["tamano"])
+        recibido = os.path.getsize(ruta_part)
+        if offset != recibido:
+            raise SubidaError("Offset distinto a lo recibido", 409, recibido=recibido)
+
+        escritos = 0
+        with open(ruta_part, "r+b") as f:
+            f.seek(recibido)
+            try:
+                while True:
+                    bloque = flujo.read(_LECTURA)
+                    if not bloque:
+                        break
+                    escritos += len(bloque)
+                    if escritos > UPLOAD_MAX_PARTE or recibido + escritos > meta["tamano"]:
+                        raise SubidaError("La parte supera el tamaño permitido o el declarado", 413,
+                                          recibido=recibido)
+                    f.write(bloque)
+            except Exception:
+                # Parte incompleta: se descarta para que el reintento empiece en un límite limpio
+                f.truncate(recibido)
+                raise
+
+        meta["recibido"] = recibido + escritos
+        _guardar_meta(meta)
+        return _publica(meta)
+
+
+def confirmar(subida_id, guardar, sha256=None):
+    """
+    Llama a guardar(nombre, tipo, ruta, hash_sha) con el archivo completo y deja el resultado en
+    el estado, así un commit reintentado (p. ej. se cortó la respuesta) devuelve lo mismo sin
+    volver a guardar. Con `sha256` se verifica la integridad antes de guardar.
+    """
+    _leer_meta(subida_id)
+    _, ruta_part = _rutas(subida_id)
+    with _bloqueo(subida_id):
+        meta = _leer_meta(subida_id)
+        if "resultado" in meta:
+            return meta["resultado"]
+        recibido = os.path.getsize(ruta_part)
+        if recibido != meta["tamano"]:
+            raise SubidaError("Faltan partes por recibir", 409, recibido=recibido)
+        h = hashlib.sha256()
+        with open(ruta_part, "rb") as f:
+            for bloque in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(bloque)
+        if sha256 and h.hexdigest() != sha256.strip().lower():
+            raise SubidaError("El SHA-256 no coincide con el archivo recibido", 422, hash=h.hexdigest())
+        resultado = guardar(meta["nombre"], meta["tipo"], ruta_part, h.hexdigest())
+        meta["resultado"] = resultado
+        meta["recibido"] = recibido
+        _guardar_meta(meta)
+        # El temporal queda vacío (se conserva el archivo para el flock); se limpia al vencer
+        os.truncate(ruta_part, 0)
+        return resultado
+
+
+def cancelar(subida_id):
+    ruta_meta, ruta_part = _rutas(subida_id)
+    with _bloqueo(subida_id):
+        existia = False
+        for ruta in (ruta_meta, ruta_part):
+            try:
+                os.remove(ruta)
+                existia = True
+            except FileNotFoundError:
+                pass
+    if not existia:
+        raise SubidaError("Subida no encontrada", 404)
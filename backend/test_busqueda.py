@@ -0,0 +1,111 @@
+import pytest
+
+from busqueda import IndiceBusqueda, canon, construir_indices
+from datasets import columnar
+
+PERSONAS = [
+    {"id": "0912345678", "nombre": "PÉREZ LÓPEZ ANA"},
+    {"id": "0923456789", "nombre": "ANA MARÍA TORRES"},
+    {"id": "1712345678", "nombre": "MARTÍNEZ  JUAN"},
+    {"id": "0998765432", "nombre": "ZAMBRANO ANABEL"},
+    {"id": "1234", "nombre": "ABA BAB"},
+]
+
+
+@pytest.fixture(scope="module")
+def indice():
+    return IndiceBusqueda(PERSONAS)
+
+
+def _ids(resultados):
+    return [e["id"] for e, _ in resultados]
+
+
+# ======================= CANON =======================
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("  Pérez   López ", "PEREZ LOPEZ"),
+    ("Núñez\tÜrsula", "NUNEZ URSULA"),
+    (None, ""),
+    (1712, "1712"),
+])
+def test_canon(texto, esperado):
+    assert canon(texto) == esperado
+
+
+# ======================= BÚSQUEDA =======================
+
+def test_identificacion_exacta(indice):
+    assert indice.buscar(" 0912345678 ") == [(PERSONAS[0], 0)]
+
+
+def test_orden_por_relevancia(indice):
+    resultados = indice.buscar("ana")
+    # Nombre que empieza con ANA, luego palabra que empieza con ANA (por nombre), luego contiene
+    assert _ids(resultados) == ["0923456789", "0912345678", "0998765432"]
+    assert [r for _, r in resultados] == [3, 4, 4]
+
+
+def test_sin_tildes_ni_mayusculas(indice):
+    assert _ids(indice.buscar("martinez juan")) == ["1712345678"]
+    assert _ids(indice.buscar("maria")) == ["0923456789"]
+
+
+def test_prefijo_de_identificacion(indice):
+    resultados = indice.buscar("09123")
+    assert resultados == [(PERSONAS[0], 2)]
+
+
+def test_contiene_en_identificacion(indice):
+    assert _ids(indice.buscar("87654")) == ["0998765432"]
+
+
+def test_consultas_cortas(indice):
+    assert indice.buscar("a") == []
+    assert indice.buscar("   ") == []
+    # Prefijo de 2-3 caracteres: sale de la lista precalculada, ordenada por nombre
+    assert _ids(indice.buscar("09", limite=2)) == ["0923456789", "0912345678"]
+    assert indice.buscar("xyz") == []
+
+
+def test_descarta_falsos_positivos_de_ngramas(indice):
+    # ABA y BAB están en "ABA BAB", pero no seguidos
+    assert indice.buscar("abab") == []
+
+
+def test_limite(indice):
+    assert len(indice.buscar("an", limite=1)) == 1
+
+
+# ======================= ÍNDICES DEL REPORTE =======================
+
+COLUMNAS = ["IDENTIFICACION", "APELLIDOS", "NOMBRES", "MATERIA", "ESTADO", "DOCENTE", "PERIODO",
+            "CORREO_INSTITUCIONAL", "CARRERA"]
+
+
+def _reporte(*registros):
+    return columnar(COLUMNAS, [dict(zip(COLUMNAS, r)) for r in registros])
+
+
+def test_construir_indices():
+    reporte = _reporte(
+        ("01", "PÉREZ", "ANA", "CALCULO", "APROBADA", "0912345678 - GÓMEZ RUIZ LUIS", "2025 CI", "ana@uni", "ED"),
+        ("01", "PÉREZ", "ANA", "FISICA", "REPROBADA", "123 - DOCENTE (E) 2", "2025 CI", "ana@uni", "ED"),
+        ("02", "TORRES", "JUAN", "CALCULO", "RETIRADA", "0912345678 - GÓMEZ RUIZ LUIS", "2025 CI", "", "ED"),
+        ("03", "MORA", "LUIS", "INGLES II", "APROBADA", "555 - PROFE INGLES", "2025 CI", "", "ED"),
+        ("04", "VERA", "EVA", "CALCULO", "APROBADA", "MOVILIDAD", "2025 CI", "", "ED"),
+    )
+    estudiantes, docentes = construir_indices(reporte)
+
+    assert _ids(estudiantes.buscar("perez")) == ["01"]
+    assert estudiantes.buscar("01")[0][0] == {"id": "01", "nombre": "PÉREZ ANA", "correo": "ana@uni", "carrera": "ED"}
+    assert estudiantes.buscar("torres") == []   # solo APROBADA / REPROBADA
+    assert estudiantes.buscar("mora") == []     # INGLES I-IV no cuenta para estudiantes
+    assert estudiantes.buscar("vera") == []     # MOVILIDAD se omite
+
+    # Código corto y nombre con otros caracteres: igual que en vistas y tablas normalizadas
+    assert _ids(docentes.buscar("123")) == ["123"]
+    assert docentes.buscar("123")[0][0]["nombre"] == "DOCENTE (E) 2"
+    assert _ids(docentes.buscar("gomez")) == ["0912345678"]
+    assert docentes.buscar("profe ingles") == []
+    assert len(docentes) == 2
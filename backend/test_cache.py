@@ -0,0 +1,157 @@
+import pytest
+
+import cache
+from cache import CacheLectura, _GeneracionesArchivo, _GeneracionesLocales
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(cache.time, "monotonic", reloj)
+    return reloj
+
+
+@pytest.fixture
+def local(monkeypatch):
+    """Cache del proceso con contadores locales, activa sin depender del entorno."""
+    c = CacheLectura(_GeneracionesLocales())
+    monkeypatch.setattr(cache, "_cache", c)
+    monkeypatch.setattr(cache, "_activo", True)
+    return c
+
+
+def _leer(c, espacio, clave, valor, ttl=60):
+    """Lo que hace cacheado(): obtener y, si falla, guardar con la generación leída."""
+    hit, resultado = c.obtener(espacio, clave)
+    if hit:
+        return resultado
+    c.guardar(espacio, clave, valor, ttl, resultado)
+    return valor
+
+
+# ======================= GENERACIONES =======================
+
+def test_hit_y_miss():
+    c = CacheLectura(_GeneracionesLocales())
+    assert c.obtener("archivos", "lista") == (False, 0)
+    c.guardar("archivos", "lista", [1], 60, 0)
+    assert c.obtener("archivos", "lista") == (True, [1])
+    stats = c.estadisticas()["espacios"]["archivos"]
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_invalidar_solo_afecta_al_espacio():
+    c = CacheLectura(_GeneracionesLocales())
+    _leer(c, "archivos", "lista", "a")
+    _leer(c, "usuarios", "u", "b")
+    c.invalidar("archivos")
+    assert c.obtener("archivos", "lista") == (False, 1)
+    assert c.obtener("usuarios", "u") == (True, "b")
+
+
+def test_valor_calculado_antes_de_invalidar_no_se_sirve():
+    # Un worker lee la BD con la generación 0; mientras tanto otro escribe e invalida
+    c = CacheLectura(_GeneracionesLocales())
+    hit, generacion = c.obtener("datasets", "x")
+    assert not hit
+    c.invalidar("datasets")
+    c.guardar("datasets", "x", "viejo", 60, generacion)
+    assert c.obtener("datasets", "x") == (False, 1)
+    assert c.estadisticas()["espacios"]["datasets"]["expirados"] == 1
+
+
+@pytest.mark.skipif(cache.fcntl is None, reason="el contador mmap necesita flock")
+def test_generaciones_compartidas_entre_workers(tmp_path):
+    ruta = str(tmp_path / "gen.bin")
+    worker_a = CacheLectura(_GeneracionesArchivo(ruta))
+    worker_b = CacheLectura(_GeneracionesArchivo(ruta))
+    assert _leer(worker_a, "plantillas", "p", "v1") == "v1"
+    assert _leer(worker_b, "plantillas", "p", "v1") == "v1"
+
+    worker_b.invalidar("plantillas")
+    assert worker_a.generaciones.actual("plantillas") == 1
+    assert _leer(worker_a, "plantillas", "p", "v2") == "v2"
+    assert worker_a.obtener("plantillas", "p") == (True, "v2")
+
+
+# ======================= TTL Y LRU =======================
+
+def test_ttl(reloj):
+    c = CacheLectura(_GeneracionesLocales())
+    c.guardar("usuarios", "u", "valor", 30, 0)
+    reloj.ahora += 29
+    assert c.obtener("usuarios", "u") == (True, "valor")
+    reloj.ahora += 2
+    assert c.obtener("usuarios", "u") == (False, 0)
+
+
+def test_desaloja_la_entrada_menos_usada():
+    c = CacheLectura(_GeneracionesLocales(), max_entradas=2)
+    c.guardar("archivos", "a", 1, 60, 0)
+    c.guardar("archivos", "b", 2, 60, 0)
+    assert c.obtener("archivos", "a")[0]  # "a" pasa a ser la más reciente
+    c.guardar("archivos", "c", 3, 60, 0)
+    assert c.obtener("archivos", "b") == (False, 0)
+    assert c.obtener("archivos", "a") == (True, 1)
+    assert c.estadisticas()["espacios"]["archivos"]["desalojos"] == 1
+
+
+# ======================= DECORADOR =======================
+
+def test_cacheado_e_invalidar(local):
+    llamadas = []
+
+    @cache.cacheado("usuarios", 60, clave=lambda usuario: usuario.lower())
+    def buscar(usuario):
+        llamadas.append(usuario)
+        return None  # también se guarda
+
+    assert buscar("Ana") is None and buscar("ANA") is None
+    assert llamadas == ["Ana"]
+    cache.invalidar("usuarios")
+    buscar("ana")
+    assert llamadas == ["Ana", "ana"]
+    buscar.sin_cache("ana")
+    assert len(llamadas) == 3
+
+
+def test_cacheado_inactivo_no_guarda(local, monkeypatch):
+    monkeypatch.setattr(cache, "_activo", False)
+    llamadas = []
+
+    @cache.cacheado("archivos", 60)
+    def listar():
+        llamadas.append(1)
+        return []
+
+    listar()
+    listar()
+    assert len(llamadas) == 2 and local.estadisticas()["entradas"] == 0
+
+
+def test_falla_del_backend_lee_directo(local):
+    class Caido:
+        nombre = "redis"
+
+        def actual(self, espacio):
+            raise ConnectionError("redis no responde")
+
+        def incrementar(self, espacio):
+            raise ConnectionError("redis no responde")
+
+    local.generaciones = Caido()
+
+    @cache.cacheado("datasets", 60)
+    def obtener(n):
+        return n * 2
+
+    assert obtener(2) == 4
+    cache.invalidar("datasets")  # no propaga el error al flujo de escritura
@@ -0,0 +1,114 @@
+import deltas
+from datasets import columnar, filas
+
+COLUMNAS = ["IDENTIFICACION", "PERIODO", "MATERIA", "PROMEDIO", "ESTADO"]
+
+
+def _dataset(*registros, columnas=COLUMNAS):
+    return columnar(columnas, [dict(zip(columnas, r)) for r in registros])
+
+
+def _aplicar(dataset, delta):
+    """Lo que hace el navegador con un delta: reemplaza los grupos por clave y borra los eliminados."""
+    clave = delta["clave"]
+    grupos = {}
+    for fila in filas(dataset):
+        grupos.setdefault(tuple(fila.get(c) for c in clave), []).append(fila)
+    for k in delta["eliminadas"]:
+        grupos.pop(tuple(k), None)
+    nuevos = {}
+    for fila in filas(delta["filas"]):
+        nuevos.setdefault(tuple(fila.get(c) for c in clave), []).append(fila)
+    grupos.update(nuevos)
+    return grupos
+
+
+def _grupos(dataset):
+    return _aplicar(dataset, {"clave": list(deltas.CLAVE), "eliminadas": [], "filas": _dataset()})
+
+
+V1 = _dataset(
+    ("01", "2025 CI", "CALCULO", 8.5, "APROBADA"),
+    ("02", "2025 CI", "CALCULO", 5.0, "REPROBADA"),
+    ("03", "2025 CI", "FISICA", 9.0, "APROBADA"),
+)
+V2 = _dataset(
+    ("01", "2025 CI", "CALCULO", 8.5, "APROBADA"),   # igual
+    ("02", "2025 CI", "CALCULO", 7.5, "APROBADA"),   # cambiada
+    ("04", "2025 CI", "FISICA", 6.0, "REPROBADA"),   # agregada; 03 eliminada
+)
+V3 = _dataset(
+    ("01", "2025 CI", "CALCULO", 8.5, "APROBADA"),
+    ("02", "2025 CI", "CALCULO", 7.5, "APROBADA"),
+    ("03", "2025 CI", "FISICA", 9.5, "APROBADA"),    # vuelve
+    ("04", "2025 CI", "FISICA", 6.0, "REPROBADA"),
+    ("04", "2025 CI", "FISICA", 7.0, "APROBADA"),    # misma clave dos veces: viaja el grupo entero
+)
+
+
+# ======================= CALCULAR =======================
+
+def test_calcular():
+    delta = deltas.calcular(V1, V2, 41, 57)
+    assert (delta["formato"], delta["desde"], delta["version"]) == ("delta-v1", 41, 57)
+    assert delta["clave"] == ["IDENTIFICACION", "PERIODO", "MATERIA"]
+    assert delta["eliminadas"] == [["03", "2025 CI", "FISICA"]]
+    assert sorted(f["IDENTIFICACION"] for f in filas(delta["filas"])) == ["02", "04"]
+    assert (delta["agregadas"], delta["cambiadas"]) == (1, 1)
+    assert _aplicar(V1, delta) == _grupos(V2)
+
+
+def test_sin_cambios():
+    reordenado = _dataset(*reversed([tuple(f[c] for c in COLUMNAS) for f in filas(V1)]))
+    delta = deltas.calcular(V1, reordenado, 1, 2)
+    assert delta["eliminadas"] == [] and delta["filas"]["filas"] == 0
+    assert (delta["agregadas"], delta["cambiadas"]) == (0, 0)
+
+
+def test_grupo_con_filas_repetidas():
+    delta = deltas.calcular(V2, V3, 57, 60)
+    grupo = [f["PROMEDIO"] for f in filas(delta["filas"]) if f["IDENTIFICACION"] == "04"]
+    assert sorted(grupo) == [6.0, 7.0]
+    assert _aplicar(V2, delta) == _grupos(V3)
+
+
+def test_sin_identificacion_o_con_otras_columnas():
+    sin_id = _dataset(("2025 CI", "CALCULO"), columnas=["PERIODO", "MATERIA"])
+    assert deltas.calcular(sin_id, sin_id, 1, 2) is None
+    otras = _dataset(("01", "2025 CI", "CALCULO", 8.5), columnas=COLUMNAS[:4])
+    assert deltas.calcular(V1, otras, 1, 2) is None
+
+
+def test_clave_con_las_columnas_presentes():
+    solo_id = _dataset(("01", 8.5), ("02", 6.0), columnas=["IDENTIFICACION", "PROMEDIO"])
+    nuevo = _dataset(("01", 9.0), columnas=["IDENTIFICACION", "PROMEDIO"])
+    delta = deltas.calcular(solo_id, nuevo, 1, 2)
+    assert delta["clave"] == ["IDENTIFICACION"]
+    assert delta["eliminadas"] == [["02"]] and delta["cambiadas"] == 1
+
+
+# ======================= ENCADENAR =======================
+
+def test_encadenar_equivale_a_aplicar_en_orden():
+    d1 = deltas.calcular(V1, V2, 41, 57)
+    d2 = deltas.calcular(V2, V3, 57, 60)
+    total = deltas.encadenar([d1, d2])
+    assert (total["desde"], total["version"]) == (41, 60)
+    assert _aplicar(V1, total) == _grupos(V3)
+    assert ["03", "2025 CI", "FISICA"] not in total["eliminadas"]  # se eliminó y volvió
+
+
+def test_encadenar_agregada_y_luego_eliminada():
+    d1 = deltas.calcular(V1, V2, 41, 57)
+    d2 = deltas.calcular(V2, V1, 57, 58)
+    total = deltas.encadenar([d1, d2])
+    assert ["04", "2025 CI", "FISICA"] in total["eliminadas"]
+    assert _aplicar(V1, total) == _grupos(V1)
+
+
+def test_encadenar_un_solo_delta_y_vacio():
+    d1 = deltas.calcular(V1, V2, 41, 57)
+    assert deltas.encadenar([d1]) is d1
+    vacio = deltas.vacio(57)
+    assert (vacio["desde"], vacio["version"], vacio["eliminadas"]) == (57, 57, [])
+    assert vacio["filas"]["filas"] == 0 and (vacio["agregadas"], vacio["cambiadas"]) == (0, 0)
@@ -0,0 +1,187 @@
+import pyodbc
+import pytest
+
+import pool
+from pool import PoolAgotadoError, PoolConexiones
+
+
+class Cursor:
+    def __init__(self, conexion):
+        self.conexion = conexion
+
+    def execute(self, *args):
+        if self.conexion.caida:
+            raise pyodbc.OperationalError("08S01", "Conexión perdida")
+        return self
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+class Conexion:
+    def __init__(self):
+        self.caida = False
+        self.cerrada = False
+        self.rollbacks = 0
+
+    def cursor(self):
+        return Cursor(self)
+
+    def rollback(self):
+        if self.caida:
+            raise pyodbc.OperationalError("08S01", "Conexión perdida")
+        self.rollbacks += 1
+
+    def close(self):
+        self.cerrada = True
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(pool.time, "monotonic", reloj)
+    return reloj
+
+
+def _pool(**opciones):
+    creadas = []
+
+    def fabrica():
+        creadas.append(Conexion())
+        return creadas[-1]
+
+    return PoolConexiones(fabrica, **opciones), creadas
+
+
+# ======================= PRÉSTAMO Y DEVOLUCIÓN =======================
+
+def test_reutiliza_la_conexion_devuelta_con_rollback():
+    p, creadas = _pool(tamano=2)
+    conn = p.obtener()
+    conn.close()
+    assert creadas[0].rollbacks == 1
+
+    otra = p.obtener()
+    assert otra.cursor().conexion is creadas[0]
+    otra.close()
+    assert len(creadas) == 1
+    assert p.metricas()["creadas"] == 1 and p.metricas()["prestamos"] == 2
+
+
+def test_cada_prestamo_entrega_una_envoltura_nueva():
+    p, creadas = _pool(tamano=1)
+    vieja = p.obtener()
+    vieja.close()
+    nueva = p.obtener()
+    assert nueva is not vieja
+
+    with pytest.raises(pyodbc.ProgrammingError):
+        vieja.cursor()
+    vieja.close()  # devolverla otra vez no le quita la conexión a quien la tiene ahora
+    assert p.metricas()["prestadas"] == 1 and p.metricas()["libres"] == 0
+    assert nueva.cursor().conexion is creadas[0]
+    nueva.close()
+
+
+def test_rollback_fallido_descarta_la_conexion():
+    p, creadas = _pool(tamano=1)
+    conn = p.obtener()
+    creadas[0].caida = True
+    conn.close()
+    assert creadas[0].cerrada
+    assert p.metricas()["abiertas"] == 0 and p.metricas()["descartadas"] == 1
+
+    p.obtener().close()
+    assert len(creadas) == 2
+
+
+def test_error_operacional_en_with_descarta_la_conexion():
+    p, creadas = _pool(tamano=1)
+    with pytest.raises(pyodbc.OperationalError):
+        with p.obtener():
+            raise pyodbc.OperationalError("08S01", "Conexión perdida")
+    assert creadas[0].cerrada and creadas[0].rollbacks == 0
+    assert p.metricas()["abiertas"] == 0
+
+
+def test_otro_error_en_with_devuelve_la_conexion():
+    p, creadas = _pool(tamano=1)
+    with pytest.raises(ValueError):
+        with p.obtener():
+            raise ValueError("de la aplicación")
+    assert not creadas[0].cerrada and creadas[0].rollbacks == 1
+    assert p.metricas()["libres"] == 1
+
+
+# ======================= LÍMITES =======================
+
+def test_pool_agotado():
+    p, _ = _pool(tamano=1, timeout=0.01)
+    conn = p.obtener()
+    with pytest.raises(PoolAgotadoError):
+        p.obtener()
+    assert p.metricas()["timeouts"] == 1 and p.metricas()["esperas"] == 1
+    conn.close()
+    p.obtener().close()
+
+
+def test_fabrica_fallida_libera_el_hueco():
+    intentos = []
+
+    def fabrica():
+        intentos.append(1)
+        if len(intentos) == 1:
+            raise pyodbc.OperationalError("08001", "Servidor no disponible")
+        return Conexion()
+
+    p = PoolConexiones(fabrica, tamano=1, timeout=0.01)
+    with pytest.raises(pyodbc.OperationalError):
+        p.obtener()
+    assert p.metricas()["abiertas"] == 0
+    p.obtener().close()
+    assert p.metricas()["abiertas"] == 1
+
+
+# ======================= EXPIRACIÓN Y PRE-PING =======================
+
+def test_descarta_la_conexion_inactiva(reloj):
+    p, creadas = _pool(max_inactividad=300, reciclar=0)
+    p.obtener().close()
+    reloj.ahora += 301
+    p.obtener().close()
+    assert creadas[0].cerrada and len(creadas) == 2
+
+
+def test_recicla_la_conexion_vieja(reloj):
+    p, creadas = _pool(max_inactividad=0, reciclar=1800, pre_ping=False)
+    for _ in range(10):
+        p.obtener().close()
+        reloj.ahora += 250
+    assert len(creadas) == 2 and creadas[0].cerrada
+
+
+def test_ping_fallido_reemplaza_la_conexion(reloj):
+    p, creadas = _pool(tamano=1, intervalo_ping=30, max_inactividad=0, reciclar=0)
+    p.obtener().close()
+    creadas[0].caida = True
+    reloj.ahora += 10
+    assert p.obtener().cursor().conexion is creadas[0]  # dentro del intervalo no se hace ping
+
+    p, creadas = _pool(tamano=1, intervalo_ping=30, max_inactividad=0, reciclar=0)
+    p.obtener().close()
+    creadas[0].caida = True
+    reloj.ahora += 31
+    conn = p.obtener()
+    assert conn.cursor().conexion is creadas[1] and creadas[0].cerrada
+    assert p.metricas()["ping_fallidos"] == 1 and p.metricas()["abiertas"] == 1
@@ -0,0 +1,124 @@
+import base64
+import json
+
+import pytest
+
+import sesiones
+
+USUARIO = {"id": 7, "rol": " Admin ", "activo": True}
+AHORA = 1760000000.25
+
+
+@pytest.fixture(autouse=True)
+def claves(monkeypatch):
+    monkeypatch.setenv("SESION_CLAVES", "2:secreto-nuevo,1:secreto-anterior")
+    monkeypatch.setattr(sesiones, "_claves", None)
+    yield
+    sesiones._claves = None
+
+
+def _partes(token):
+    kid, carga, firma = token.split(".")
+    return kid, json.loads(sesiones._de_b64(carga)), firma
+
+
+# ======================= FIRMA =======================
+
+def test_emitir_y_verificar():
+    sesion = sesiones.emitir(USUARIO, ahora=AHORA)
+    kid, datos, _ = _partes(sesion["token"])
+    assert kid == "2"
+    assert sesion["expira"] == int(AHORA) + sesiones.SESION_TTL
+    assert datos["iat"] == 1760000000250
+
+    verificado = sesiones.verificar(sesion["token"], ahora=AHORA + 1)
+    assert verificado == {"id": 7, "rol": "admin", "activo": True,
+                          "iat": 1760000000250, "exp": sesion["expira"]}
+
+
+def test_acepta_token_de_la_clave_anterior(monkeypatch):
+    monkeypatch.setenv("SESION_CLAVES", "1:secreto-anterior")
+    token = sesiones.emitir(USUARIO, ahora=AHORA)["token"]
+    monkeypatch.setenv("SESION_CLAVES", "2:secreto-nuevo,1:secreto-anterior")
+    sesiones._claves = None
+    assert sesiones.verificar(token, ahora=AHORA)["id"] == 7
+
+
+def test_rechaza_clave_desconocida(monkeypatch):
+    monkeypatch.setenv("SESION_CLAVES", "9:otro")
+    token = sesiones.emitir(USUARIO, ahora=AHORA)["token"]
+    monkeypatch.setenv("SESION_CLAVES", "2:secreto-nuevo,1:secreto-anterior")
+    sesiones._claves = None
+    with pytest.raises(sesiones.SesionInvalida, match="clave"):
+        sesiones.verificar(token, ahora=AHORA)
+
+
+def test_rechaza_carga_alterada():
+    kid, datos, firma = _partes(sesiones.emitir(USUARIO, ahora=AHORA)["token"])
+    datos["rol"] = "superadmin"
+    carga = base64.urlsafe_b64encode(json.dumps(datos).encode()).rstrip(b"=").decode()
+    with pytest.raises(sesiones.SesionInvalida, match="Firma"):
+        sesiones.verificar(f"{kid}.{carga}.{firma}", ahora=AHORA)
+
+
+def test_rechaza_firma_alterada():
+    token = sesiones.emitir(USUARIO, ahora=AHORA)["token"]
+    cuerpo, _, firma = token.rpartition(".")
+    otra = "A" + firma[1:] if firma[0] != "A" else "B" + firma[1:]
+    with pytest.raises(sesiones.SesionInvalida, match="Firma"):
+        sesiones.verificar(f"{cuerpo}.{otra}", ahora=AHORA)
+
+
+@pytest.mark.parametrize("token", [None, "", "a.b", "a.b.c.d", "2.e30.%%%"])
+def test_rechaza_mal_formado(token):
+    with pytest.raises(sesiones.SesionInvalida):
+        sesiones.verificar(token, ahora=AHORA)
+
+
+# ======================= VENCIMIENTO =======================
+
+def test_vencido():
+    sesion = sesiones.emitir(USUARIO, ahora=AHORA)
+    assert sesiones.verificar(sesion["token"], ahora=sesion["expira"])["id"] == 7
+    with pytest.raises(sesiones.SesionInvalida, match="vencida"):
+        sesiones.verificar(sesion["token"], ahora=sesion["expira"] + 1)
+
+
+def test_vencido_dentro_del_margen_de_renovacion():
+    sesion = sesiones.emitir(USUARIO, ahora=AHORA)
+    ahora = sesion["expira"] + 60
+    assert sesiones.verificar(sesion["token"], vencido_hasta=60, ahora=ahora)["id"] == 7
+    with pytest.raises(sesiones.SesionInvalida, match="vencida"):
+        sesiones.verificar(sesion["token"], vencido_hasta=59, ahora=ahora)
+
+
+# ======================= REVOCACIÓN =======================
+
+def test_revocado_el_token_anterior():
+    token = sesiones.emitir(USUARIO, ahora=AHORA)["token"]
+    revocaciones = {7: sesiones.marca_revocacion(ahora=AHORA + 0.5)}
+    with pytest.raises(sesiones.SesionInvalida, match="revocada"):
+        sesiones.verificar(token, revocaciones, ahora=AHORA + 1)
+
+
+def test_revocado_el_token_del_mismo_instante():
+    token = sesiones.emitir(USUARIO, ahora=AHORA)["token"]
+    revocaciones = {7: sesiones.marca_revocacion(ahora=AHORA)}
+    with pytest.raises(sesiones.SesionInvalida, match="revocada"):
+        sesiones.verificar(token, revocaciones, ahora=AHORA)
+
+
+def test_vale_el_token_emitido_en_el_mismo_segundo_tras_revocar():
+    revocaciones = {7: sesiones.marca_revocacion(ahora=AHORA)}
+    token = sesiones.emitir(USUARIO, ahora=AHORA + 0.002)["token"]
+    assert sesiones.verificar(token, revocaciones, ahora=AHORA + 0.002)["id"] == 7
+
+
+def test_revocacion_de_otro_usuario_no_afecta():
+    token = sesiones.emitir(USUARIO, ahora=AHORA)["token"]
+    revocaciones = {8: sesiones.marca_revocacion(ahora=AHORA + 1)}
+    assert sesiones.verificar(token, revocaciones, ahora=AHORA + 1)["id"] == 7
+
+
+def test_marca_revocacion_en_ms():
+    assert sesiones.marca_revocacion(ahora=AHORA) == 1760000000250
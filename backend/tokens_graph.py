@@ -0,0 +1,188 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from http_saliente import obtener_cliente
+
+# ======================= TOKEN DE MICROSOFT GRAPH =======================
+# El token (client credentials) dura ~1 hora. GestorTokenGraph lo guarda en memoria y lo renueva
+# en segundo plano cuando le quedan menos de GRAPH_TOKEN_MARGEN segundos, así ningún envío espera
+# a login.microsoftonline.com salvo el primero (o si el token llegó a expirar).
+# Con GRAPH_TOKEN_COMPARTIDO=1 los workers del host comparten el token en un archivo 0600
+# (o en Redis si CACHE_REDIS_URL está definido) y solo uno de ellos lo pide.
+# Si Graph rechaza el token (401), invalidar(token) lo descarta para que el próximo obtener() pida
+# uno nuevo en vez de repetir el mismo hasta que venza.
+GRAPH_TOKEN_MARGEN = float(os.getenv("GRAPH_TOKEN_MARGEN", "600"))
+GRAPH_TOKEN_REINTENTO = 30.0  # segundos mínimos entre renovaciones anticipadas fallidas
+
+
+class ErrorTokenGraph(Exception):
+    pass
+
+
+class _AlmacenArchivo:
+    def __init__(self, ruta):
+        self.ruta = ruta
+
+    def leer(self):
+        try:
+            with open(self.ruta, "r", encoding="utf-8") as f:
+                datos = json.load(f)
+            return datos["token"], float(datos["expira"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def guardar(self, token, expira):
+        fd = os.open(self.ruta, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            os.ftruncate(fd, 0)
+            os.write(fd, json.dumps({"token": token, "expira": expira}).encode("utf-8"))
+        finally:
+            os.close(fd)  # cerrar libera el flock
+
+
+class _AlmacenRedis:
+    _CLAVE = "facaf:graph:token"
+
+    def __init__(self, url):
+        import redis
+        self._r = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+    def leer(self):
+        valor = self._r.get(self._CLAVE)
+        if not valor:
+            return None
+        datos = json.loads(valor)
+        return datos["token"], float(datos["expira"])
+
+    def guardar(self, token, expira):
+        ttl = max(1, int(expira - time.time()))
+        self._r.set(self._CLAVE, json.dumps({"token": token, "expira": expira}), ex=ttl)
+
+
+def _crear_almacen():
+    if os.getenv("GRAPH_TOKEN_COMPARTIDO", "0") != "1":
+        return None
+    redis_url = os.getenv("CACHE_REDIS_URL")
+    if redis_url:
+        try:
+            return _AlmacenRedis(redis_url)
+        except Exception as e:
+            print(f"⚠️ Token Graph: no se pudo usar Redis ({e}); se usa archivo local")
+    return _AlmacenArchivo(os.getenv("GRAPH_TOKEN_FILE") or os.path.join(tempfile.gettempdir(), "facaf-graph-token.json"))
+
+
+class GestorTokenGraph:
+    def __init__(self, client_id, client_secret, tenant_id, scopes, margen=GRAPH_TOKEN_MARGEN):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.authority = f"https://login.microsoftonline.com/{tenant_id}"
+        self.scopes = scopes
+        self.margen = margen
+        self._msal = None
+        self._msal_pid = None
+        self._token = None
+        self._expira = 0.0  # epoch (time.time) para poder compartirlo entre procesos
+        self._renovando = False
+        self._ultimo_intento = 0.0
+        self._rechazado = None  # último token invalidado: no se vuelve a tomar del almacén compartido
+        self._almacen = _crear_almacen()
+        self._lock = threading.Lock()         # serializa las peticiones de token
+        self._lock_estado = threading.Lock()  # solo protege la marca de renovación en curso
+        self.estadisticas = {"adquiridos": 0, "renovaciones_anticipadas": 0, "errores": 0, "invalidados": 0}
+
+    def _app(self):
+        # msal se crea al primer uso (su construcción consulta la metadata del tenant por red) y
+        # se recrea tras un fork para usar la sesión HTTP del proceso hijo
+        if self._msal is None or self._msal_pid != os.getpid():
+            import msal
+            self._msal = msal.ConfidentialClientApplication(
+                self.client_id, authority=self.authority, client_credential=self.client_secret,
+                http_client=obtener_cliente().sesion,
+            )
+            self._msal_pid = os.getpid()
+        return self._msal
+
+    def _adquirir(self):
+        """Pide un token nuevo (o el del almacén compartido si sigue vigente) y lo deja en memoria."""
+        if self._almacen is not None:
+            try:
+                compartido = self._almacen.leer()
+            except Exception as e:
+                compartido = None
+                print(f"⚠️ Token Graph: no se pudo leer el almacén compartido: {e}")
+            if compartido and compartido[0] != self._rechazado and compartido[1] - time.time() > self.margen:
+                self._token, self._expira = compartido
+                return self._token
+
+        inicio = time.perf_counter()
+        result = self._app().acquire_token_for_client(scopes=self.scopes)
+        obtener_cliente().observar("login", time.perf_counter() - inicio)
+        if "access_token" not in result:
+            self.estadisticas["errores"] += 1
+            raise ErrorTokenGraph(f"Error obteniendo token: {result.get('error_description', result)}")
+
+        self.estadisticas["adquiridos"] += 1
+        self._token = result["access_token"]
+        self._expira = time.time() + float(result.get("expires_in", 3599))
+        if self._almacen is not None:
+            try:
+                self._almacen.guardar(self._token, self._expira)
+            except Exception as e:
+                print(f"⚠️ Token Graph: no se pudo compartir el token: {e}")
+        return self._token
+
+    def _renovar_en_segundo_plano(self):
+        try:
+            with self._lock:
+                self._adquirir()
+                self.estadisticas["renovaciones_anticipadas"] += 1
+        except Exception as e:
+            print(f"⚠️ Token Graph: renovación anticipada fallida: {e}")
+        finally:
+            self._renovando = False
+
+    def obtener(self):
+        restante = self._expira - time.time()
+        if self._token and restante > self.margen:
+            return self._token
+
+        if self._token and restante > 60:
+            # Sigue vigente: se usa mientras un solo hilo lo renueva
+            ahora = time.monotonic()
+            with self._lock_estado:
+                lanzar = not self._renovando and ahora - self._ultimo_intento > GRAPH_TOKEN_REINTENTO
+                if lanzar:
+                    self._renovando = True
+                    self._ultimo_intento = ahora
+            if lanzar:
+                threading.Thread(target=self._renovar_en_segundo_plano, name="token-graph", daemon=True).start()
+            return self._token
+
+        with self._lock:
+            if self._token and self._expira - time.time() > 60:
+                return self._token
+            return self._adquirir()
+
+    def invalidar(self, token):
+        """Descarta `token` (rechazado por Graph) si sigue siendo el vigente."""
+        with self._lock:
+            self._rechazado = token
+            if self._token == token:
+                self._token = None
+                self._expira = 0.0
+                self._msal = None  # msal guarda su propia copia del token y la devolvería igual
+                self.estadisticas["invalidados"] += 1
+
+    def metricas(self):
+        return {"vigente_seg": max(0, int(self._expira - time.time())) if self._token else 0,
+                "compartido": self._almacen is not None, **self.estadisticas}
@@ -0,0 +1,273 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+from http_saliente import LimiteHostError, obtener_cliente, obtener_cliente_async
+
+# ======================= VALIDACIÓN CONTRA LA API DE LA UG =======================
+# En picos de matrícula la API de la UG es la parte más lenta del login. ValidadorUG:
+#   - reutiliza conexiones keep-alive (cliente HTTP compartido, sin TCP/TLS nuevo en cada login),
+#   - agrupa logins idénticos concurrentes en una sola petición (single-flight),
+#   - recuerda por poco tiempo las validaciones exitosas (solo un HMAC salado de usuario+clave),
+#   - corta rápido cuando la UG está caída (circuit breaker) en vez de ocupar un worker
+#     REQUEST_TIMEOUT segundos por cada intento.
+# validar() es para Flask (un hilo por petición); validar_async() es la misma lógica para asgi.py,
+# con el mismo cache, circuito y estadísticas.
+UG_CACHE_TTL = min(float(os.getenv("UG_CACHE_TTL", "120")), 600.0)  # segundos, acotado
+UG_CACHE_MAX = int(os.getenv("UG_CACHE_MAX", "5000"))
+UG_CB_FALLOS = int(os.getenv("UG_CB_FALLOS", "5"))      # fallos seguidos para abrir el circuito
+UG_CB_ESPERA = float(os.getenv("UG_CB_ESPERA", "30"))   # segundos abierto antes de probar de nuevo
+
+_CERRADO = "cerrado"
+_ABIERTO = "abierto"
+_SEMIABIERTO = "semiabierto"
+
+
+class CircuitoAbiertoError(Exception):
+    """La UG falló varias veces seguidas; no se intenta hasta que pase UG_CB_ESPERA."""
+
+    def __init__(self, reintentar_en):
+        super().__init__("La API de la UG no está disponible temporalmente")
+        self.reintentar_en = reintentar_en
+
+
+def interpretar_respuesta(obj):
+    """Extrae (id, mensaje) de la respuesta de la UG; id None si no es válida."""
+    if not isinstance(obj, dict):
+        return None, None
+    node = obj.get("ug", obj)
+    if not isinstance(node, dict):
+        return None, None
+    raw_id = node.get("id")
+    mensaje = node.get("mensaje")
+    try: id_int = int(str(raw_id).strip())
+    except Exception: id_int = None
+    return id_int, mensaje
+
+
+class Circuito:
+    def __init__(self, max_fallos=UG_CB_FALLOS, espera=UG_CB_ESPERA):
+        self.max_fallos = max_fallos
+        self.espera = espera
+        self.estado = _CERRADO
+        self.fallos = 0
+        self._abierto_desde = 0.0
+        self._prueba_en_curso = False
+        self._lock = threading.Lock()
+
+    def permitir(self):
+        """Lanza CircuitoAbiertoError si no se debe llamar a la UG. En semiabierto pasa una sola prueba."""
+        with self._lock:
+            if self.estado == _CERRADO:
+                return
+            restante = self._abierto_desde + self.espera - time.monotonic()
+            if self.estado == _ABIERTO and restante > 0:
+                raise CircuitoAbiertoError(restante)
+            if self._prueba_en_curso:
+                raise CircuitoAbiertoError(max(restante, 1.0))
+            self.estado = _SEMIABIERTO
+            self._prueba_en_curso = True
+
+    def exito(self):
+        with self._lock:
+            if self.estado != _CERRADO:
+                print("✅ UG respondió de nuevo: circuito cerrado")
+            self.estado = _CERRADO
+            self.fallos = 0
+            self._prueba_en_curso = False
+
+    def fallo(self):
+        with self._lock:
+            self.fallos += 1
+            self._prueba_en_curso = False
+            if self.estado == _SEMIABIERTO or self.fallos >= self.max_fallos:
+                if self.estado != _ABIERTO:
+                    print(f"⚠️ UG no responde ({self.fallos} fallos): circuito abierto {self.espera:.0f}s")
+                self.estado = _ABIERTO
+                self._abierto_desde = time.monotonic()
+
+    def liberar(self):
+        """Suelta la prueba de semiabierto sin contarla (consulta cancelada): la próxima vuelve a probar."""
+        with self._lock:
+            self._prueba_en_curso = False
+
+
+class _Vuelo:
+    """Petición en curso a la UG que comparten los logins idénticos que llegan mientras tanto."""
+
+    def __init__(self):
+        self.listo = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class ValidadorUG:
+    def __init__(self, url, timeout, cliente=None, cliente_async=None):
+        self.url = url
+        self.timeout = timeout
+        self._cliente = cliente
+        self._cliente_async = cliente_async
+        self.circuito = Circuito()
+        # La sal es por proceso y nunca sale de memoria: los hashes no sirven fuera de este worker
+        self._sal = secrets.token_bytes(32)
+        self._aciertos = OrderedDict()  # hmac -> (expira, payload)
+        self._vuelos = {}
+        self._vuelos_async = {}  # hmac -> asyncio.Future (un solo event loop por worker)
+        self._lock = threading.Lock()
+        self.estadisticas = {"llamadas": 0, "cache": 0, "agrupadas": 0, "rechazadas_circuito": 0}
+
+    @property
+    def cliente(self):
+        return self._cliente or obtener_cliente()
+
+    def _clave(self, usuario, clave):
+        return hmac.new(self._sal, f"{usuario.lower()}\0{clave}".encode("utf-8"), hashlib.sha256).digest()
+
+    def _registrar(self, resp):
+        # Se lee todo antes de avisar al circuito: después de exito()/fallo() ya no puede fallar nada
+        try: payload = resp.json()
+        except ValueError: payload = {"status": resp.status_code, "text": resp.text}
+        if resp.status_code >= 500:
+            self.circuito.fallo()
+        else:
+            self.circuito.exito()
+        return payload
+
+    def _sin_respuesta(self, error):
+        """
+        La consulta terminó sin pasar por _registrar: cuenta como fallo de la UG, salvo que se haya
+        cancelado o la haya cortado el límite local por host (la UG ni se enteró), y en todos los
+        casos suelta la prueba de semiabierto (si no, quedaría tomada para siempre).
+        """
+        if isinstance(error, Exception) and not isinstance(error, LimiteHostError):
+            self.circuito.fallo()
+        else:  # LimiteHostError, CancelledError, KeyboardInterrupt...
+            self.circuito.liberar()
+
+    def _consultar(self, usuario, clave):
+        self.circuito.permitir()
+        self.estadisticas["llamadas"] += 1
+        try:
+            resp = self.cliente.post(self.url, servicio="ug", data={"usuario": usuario, "clave": clave},
+                                     headers={"User-Agent": "Mozilla/5.0"}, timeout=self.timeout)
+            return self._registrar(resp)
+        except BaseException as e:
+            self._sin_respuesta(e)
+            raise
+
+    async def _consultar_async(self, usuario, clave):
+        self.circuito.permitir()
+        self.estadisticas["llamadas"] += 1
+        try:
+            cliente = self._cliente_async or obtener_cliente_async()
+            resp = await cliente.post(self.url, servicio="ug", data={"usuario": usuario, "clave": clave},
+                                      headers={"User-Agent": "Mozilla/5.0"}, timeout=self.timeout)
+            return self._registrar(resp)
+        except BaseException as e:
+            self._sin_respuesta(e)
+            raise
+
+    def _en_cache(self, k):
+        """Payload recordado para k o None. Se llama con self._lock tomado."""
+        entrada = self._aciertos.get(k)
+        if entrada is not None:
+            if time.monotonic() < entrada[0]:
+                self.estadisticas["cache"] += 1
+                return entrada[1]
+            del self._aciertos[k]
+        return None
+
+    def _recordar(self, k, payload):
+        if interpretar_respuesta(payload)[0] == 1 and UG_CACHE_TTL > 0:
+            with self._lock:
+                self._aciertos[k] = (time.monotonic() + UG_CACHE_TTL, payload)
+                while len(self._aciertos) > UG_CACHE_MAX:
+                    self._aciertos.popitem(last=False)
+
+    def validar(self, usuario, clave):
+        """
+        Devuelve el payload de la UG. Puede lanzar requests.RequestException, CircuitoAbiertoError
+        o LimiteHostError (demasiados logins en curso en este worker).
+        Solo se guardan en cache las validaciones exitosas (id == 1).
+        """
+        k = self._clave(usuario, clave)
+        with self._lock:
+            payload = self._en_cache(k)
+            if payload is not None:
+                return payload
+            vuelo = self._vuelos.get(k)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._vuelos[k] = _Vuelo()
+            else:
+                self.estadisticas["agrupadas"] += 1
+
+        if not lider:
+            if not vuelo.listo.wait(self.timeout + 1):
+                raise requests.Timeout("Tiempo de espera agotado aguardando a la UG")
+            if vuelo.error is not None:
+                raise vuelo.error
+            return vuelo.resultado
+
+        try:
+            payload = self._consultar(usuario, clave)
+            vuelo.resultado = payload
+            self._recordar(k, payload)
+            return payload
+        except CircuitoAbiertoError as e:
+            self.estadisticas["rechazadas_circuito"] += 1
+            vuelo.error = e
+            raise
+        except Exception as e:
+            vuelo.error = e
+            raise
+        finally:
+            with self._lock:
+                self._vuelos.pop(k, None)
+            vuelo.listo.set()
+
+    async def validar_async(self, usuario, clave):
+        """Igual que validar(), pero espera a la UG sin bloquear el event loop."""
+        k = self._clave(usuario, clave)
+        with self._lock:
+            payload = self._en_cache(k)
+        if payload is not None:
+            return payload
+        vuelo = self._vuelos_async.get(k)
+        if vuelo is not None:
+            self.estadisticas["agrupadas"] += 1
+            # shield: si este cliente se desconecta no se cancela la consulta de los demás
+            try:
+                return await asyncio.wait_for(asyncio.shield(vuelo), self.timeout + 1)
+            except asyncio.TimeoutError:
+                raise requests.Timeout("Tiempo de espera agotado aguardando a la UG")
+
+        vuelo = self._vuelos_async[k] = asyncio.get_running_loop().create_future()
+        try:
+            payload = await self._consultar_async(usuario, clave)
+            self._recordar(k, payload)
+            vuelo.set_result(payload)
+            return payload
+        except BaseException as e:
+            if isinstance(e, CircuitoAbiertoError):
+                self.estadisticas["rechazadas_circuito"] += 1
+            # También si se canceló el líder: los que esperaban reciben un error en vez de colgarse
+            vuelo.set_exception(e if isinstance(e, Exception) else requests.ConnectionError("Consulta a la UG cancelada"))
+            vuelo.exception()  # marcada como leída aunque nadie más esperara
+            raise
+        finally:
+            self._vuelos_async.pop(k, None)
+
+    def metricas(self):
+        with self._lock:
+            en_cache = len(self._aciertos)
+            en_vuelo = len(self._vuelos) + len(self._vuelos_async)
+        return {"circuito": self.circuito.estado, "fallos": self.circuito.fallos,
+                "en_cache": en_cache, "en_vuelo": en_vuelo, **self.estadisticas}
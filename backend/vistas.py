@@ -0,0 +1,203 @@
+import math
+import re
+
+from analitica import a_num, clave_periodo, norm
+from datasets import ARCHIVO_NOTAS, DOCENTE, canon, filas
+
+# ======================= VISTAS MATERIALIZADAS (ESTUDIANTES EN RIESGO) =======================
+# tercera-matricula.js y nee-control.js cruzaban en el navegador, en cada carga, el reporte de
+# notas con la nómina de legalizados. Aquí se calcula el mismo resultado en el servidor y se
+# guarda en VistasMaterializadas; solo se recalcula cuando cambia alguno de sus archivos fuente.
+# REPORTE_POR_SEMESTRE no es un archivo subido: index.js lo deriva del reporte de notas (TOTAL
+# o, si no existe, PARCIAL) quedándose con las filas del periodo más reciente; aquí igual.
+FORMATO = "vistas-v1"
+ARCHIVO_NOTAS_PARCIAL = "REPORTE_RECORD_CALIFICACIONES_POR_PARCIAL.xlsx"
+ARCHIVO_LEGALIZADOS = "REPORTE_NOMINA_ESTUDIANTES_MATRICULADOS_LEGALIZADOS.xlsx"
+NOTA_APROBACION = 7.0
+
+# Archivos de los que depende cada vista (el orden forma la clave de versión guardada)
+FUENTES = {
+    "tercera-matricula": (ARCHIVO_NOTAS, ARCHIVO_NOTAS_PARCIAL),
+    "nee": (ARCHIVO_NOTAS, ARCHIVO_NOTAS_PARCIAL, ARCHIVO_LEGALIZADOS),
+}
+
+_PERIODO = re.compile(r"(\d{4})\s*-\s*(\d{4})\s+(CI{1,2})")
+
+
+def vistas_de(nombre_archivo):
+    """Vistas que hay que recalcular cuando se sube o elimina `nombre_archivo`."""
+    return [vista for vista, fuentes in FUENTES.items() if nombre_archivo in fuentes]
+
+
+def _docente(raw):
+    """'0912345678 - APELLIDOS NOMBRES' -> ('0912345678', 'APELLIDOS NOMBRES'); sin id -> ('', nombre)."""
+    texto = norm(raw)
+    m = DOCENTE.match(texto)
+    if m:
+        return m.group(1), m.group(2)
+    partes = texto.split(" - ")  # docenteFrom() de tercera-matricula.js
+    return "", (partes[1].strip() if len(partes) == 2 else texto)
+
+
+def periodo_anterior(periodo):
+    """Mismo cálculo que getPeriodoAnterior(): CII -> CI del mismo año; CI -> CII del año anterior."""
+    m = _PERIODO.search(periodo or "")
+    if not m:
+        return None
+    y1, y2, ciclo = int(m.group(1)), int(m.group(2)), m.group(3)
+    return f"{y1} - {y2} CI" if ciclo == "CII" else f"{y1 - 1} - {y2 - 1} CII"
+
+
+def _estudiante(fila):
+    return " ".join(f"{norm(fila.get('APELLIDOS'))} {norm(fila.get('NOMBRES'))}".split())
+
+
+def _correos(fila):
+    return "; ".join(c for c in (norm(fila.get("CORREO_INSTITUCIONAL")), norm(fila.get("CORREO_PERSONAL"))) if c)
+
+
+def _semestre(datasets):
+    """(periodo actual, filas del periodo) tal como index.js arma REPORTE_POR_SEMESTRE."""
+    for nombre in (ARCHIVO_NOTAS, ARCHIVO_NOTAS_PARCIAL):
+        dataset = datasets.get(nombre)
+        if not dataset or not dataset["filas"]:
+            continue
+        registros = filas(dataset)
+        periodos = {norm(f.get("PERIODO")) for f in registros} - {""}
+        if periodos:
+            actual = max(periodos, key=clave_periodo)
+            return actual, [f for f in registros if norm(f.get("PERIODO")) == actual]
+    return "", []
+
+
+def tercera_matricula(datasets):
+    """
+    Estudiantes que reprobaron una materia en segunda vez el periodo anterior y no están
+    registrados en tercera vez en el periodo actual (misma regla que tercera-matricula.js).
+    """
+    actual, _ = _semestre(datasets)
+    anterior = periodo_anterior(actual)
+    resultado = {"periodo": actual, "periodo_anterior": anterior, "filas": []}
+    notas = datasets.get(ARCHIVO_NOTAS)
+    if not notas or not anterior:
+        return resultado
+
+    anteriores = {}
+    actuales = set()
+    for fila in filas(notas):
+        id_est, materia, periodo = norm(fila.get("IDENTIFICACION")), norm(fila.get("MATERIA")), norm(fila.get("PERIODO"))
+        vez = a_num(fila.get("NO. VEZ"))
+        if not id_est or not materia or not periodo or math.isnan(vez):
+            continue
+        clave = f"{id_est}||{materia}"
+        if periodo == anterior and vez == 2:
+            promedio = a_num(fila.get("PROMEDIO"))
+            if math.isnan(promedio) or promedio < NOTA_APROBACION:
+                anteriores[clave] = fila
+        if periodo == actual and vez == 3:
+            actuales.add(clave)
+
+    for clave, fila in anteriores.items():
+        if clave in actuales:
+            continue
+        materia = norm(fila.get("MATERIA"))
+        docente_id, docente = _docente(fila.get("DOCENTE"))
+        resultado["filas"].append({
+            "_key": clave,
+            "Identificacion": norm(fila.get("IDENTIFICACION")),
+            "Estudiante": _estudiante(fila),
+            "Correo": _correos(fila),
+            "Nivel": norm(fila.get("NIVEL")),
+            "Materia": materia,
+            "Docente": docente,
+            "DocenteId": docente_id,
+            "[Vez] Materia (Docente)": f"[2] {materia} ({docente})",
+        })
+    # canon() como localeCompare('es', {sensitivity: 'base'}): sin tildes ni mayúsculas
+    resultado["filas"].sort(key=lambda r: canon(r["Estudiante"]))
+    return resultado
+
+
+def nee(datasets):
+    """
+    Estudiantes con discapacidad registrada (DISCAPACIDAD y PORCENTAJE DISCAPACIDAD en la nómina de
+    legalizados) y sus materias del periodo actual con número de vez y docente (como nee-control.js).
+    """
+    actual, semestre = _semestre(datasets)
+    resultado = {"periodo": actual, "filas": []}
+    legalizados = datasets.get(ARCHIVO_LEGALIZADOS)
+    if not legalizados or not actual:
+        return resultado
+
+    mapa_nee = {}
+    for est in filas(legalizados):
+        id_est = norm(est.get("IDENTIFICACION"))
+        discapacidad = norm(est.get("DISCAPACIDAD"))
+        porcentaje = norm(est.get("PORCENTAJE DISCAPACIDAD"))
+        if id_est and discapacidad and porcentaje:
+            mapa_nee[id_est] = (f"{discapacidad} ({porcentaje}%)", norm(est.get("NIVEL")))
+
+    estudiantes = {}
+
+    def agregar_materia(est, fila):
+        vez = norm(fila.get("NO. VEZ")) or "?"
+        materia = norm(fila.get("MATERIA"))
+        docente_txt = norm(fila.get("DOCENTE"))
+        paralelo = norm(fila.get("GRUPO/PARALELO"))
+        if not materia and not docente_txt:
+            return
+        texto = f"[{vez}] {materia} ({docente_txt}: {paralelo})"
+        if texto in est["_vistas"]:
+            return
+        est["_vistas"].add(texto)
+        docente_id, docente = _docente(docente_txt)
+        est["[Vez] Materia (Docente)"].append(texto)
+        est["Materias"].append({"vez": vez, "materia": materia, "docente_id": docente_id,
+                                "docente": docente, "paralelo": paralelo})
+
+    # Base: filas del periodo actual, solo estudiantes con NEE
+    for fila in semestre:
+        id_est = norm(fila.get("IDENTIFICACION"))
+        if id_est not in mapa_nee:
+            continue
+        est = estudiantes.get(id_est)
+        if est is None:
+            texto_nee, nivel_legalizados = mapa_nee[id_est]
+            est = estudiantes[id_est] = {
+                "Identificación": id_est,
+                "Estudiante": _estudiante(fila),
+                "Correo": _correos(fila),
+                "NEE": texto_nee,
+                "Nivel": norm(fila.get("NIVEL")) or nivel_legalizados,
+                "[Vez] Materia (Docente)": [],
+                "Materias": [],
+                "_vistas": set(),
+            }
+        agregar_materia(est, fila)
+
+    # Enriquecer con el reporte TOTAL del mismo periodo (solo estudiantes ya presentes)
+    notas = datasets.get(ARCHIVO_NOTAS)
+    if notas:
+        for fila in filas(notas):
+            if norm(fila.get("PERIODO")) != actual:
+                continue
+            est = estudiantes.get(norm(fila.get("IDENTIFICACION")))
+            if est is not None:
+                agregar_materia(est, fila)
+
+    for est in estudiantes.values():
+        del est["_vistas"]
+    resultado["filas"] = sorted((e for e in estudiantes.values() if e["Materias"]),
+                                key=lambda e: canon(e["Estudiante"]))
+    return resultado
+
+
+_CALCULOS = {"tercera-matricula": tercera_matricula, "nee": nee}
+
+
+def calcular(vista, datasets):
+    """datasets: {nombre de archivo: dataset columnar o None} con al menos FUENTES[vista]."""
+    resultado = _CALCULOS[vista](datasets)
+    resultado["formato"] = FORMATO
+    resultado["vista"] = vista
+    return resultado
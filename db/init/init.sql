@@ -9,9 +9,129 @@ CREATE TABLE ArchivosExcel (
     NombreArchivo NVARCHAR(255) UNIQUE NOT NULL,
     TipoMime NVARCHAR(100) NOT NULL,
     Datos VARBINARY(MAX) NOT NULL,
-    FechaSubida DATETIME DEFAULT GETDATE()
+    FechaSubida DATETIME DEFAULT GETDATE(),
+    HashSha256 CHAR(64) NULL,                           -- SHA-256 del contenido (hex)
+    Tamano BIGINT NULL,
+    Version BIGINT NULL                                 -- valor de SeqVersionArchivos en el último cambio
 );
 
+CREATE SEQUENCE SeqVersionArchivos AS BIGINT START WITH 1 INCREMENT BY 1;
+
+CREATE INDEX IX_ArchivosExcel_Version ON ArchivosExcel(Version);
+
+-- Marcas de borrado para /files/changes
+CREATE TABLE ArchivosEliminados (
+    NombreArchivo    NVARCHAR(255) PRIMARY KEY,
+    Version          BIGINT NOT NULL,
+    FechaEliminacion DATETIME NOT NULL DEFAULT GETDATE()
+);
+
+CREATE TABLE DatasetsExcel (
+    ArchivoId    INT PRIMARY KEY
+        CONSTRAINT FK_DatasetsExcel_Archivo REFERENCES ArchivosExcel(Id) ON DELETE CASCADE,
+    Filas        INT NOT NULL,
+    Columnas     INT NOT NULL,
+    Datos        VARBINARY(MAX) NOT NULL,               -- JSON columnar comprimido (gzip)
+    Analitica    VARBINARY(MAX) NULL,                   -- agregados de reportes de notas (gzip)
+    FechaProceso DATETIME NOT NULL DEFAULT GETDATE()
+);
+
+-- Filas cambiadas entre versiones consecutivas de un dataset (ver backend/deltas.py)
+CREATE TABLE DeltasDataset (
+    ArchivoId    INT NOT NULL
+        CONSTRAINT FK_DeltasDataset_Archivo REFERENCES ArchivosExcel(Id) ON DELETE CASCADE,
+    VersionDesde BIGINT NOT NULL,
+    VersionHasta BIGINT NOT NULL,
+    Datos        VARBINARY(MAX) NOT NULL,               -- delta-v1 comprimido (gzip)
+    FechaProceso DATETIME NOT NULL DEFAULT GETDATE(),
+    CONSTRAINT PK_DeltasDataset PRIMARY KEY (ArchivoId, VersionHasta)
+);
+
+CREATE TABLE VistasMaterializadas (
+    Nombre       NVARCHAR(50) PRIMARY KEY,              -- 'tercera-matricula', 'nee'
+    Fuentes      NVARCHAR(200) NOT NULL,                -- versiones de los archivos fuente
+    Filas        INT NOT NULL,
+    Datos        VARBINARY(MAX) NOT NULL,               -- JSON comprimido (gzip)
+    FechaProceso DATETIME NOT NULL DEFAULT GETDATE()
+);
+
+-- Reportes normalizados (una versión vigente por archivo; ver backend/normalizado.py)
+CREATE TABLE Calificaciones (
+    ArchivoId                INT NOT NULL
+        CONSTRAINT FK_Calificaciones_Archivo REFERENCES ArchivosExcel(Id) ON DELETE CASCADE,
+    Version                  BIGINT NOT NULL,
+    Identificacion           NVARCHAR(20) NOT NULL,
+    Periodo                  NVARCHAR(50) NOT NULL,
+    Materia                  NVARCHAR(200) NOT NULL,
+    CodMateria               NVARCHAR(30) NULL,
+    CodCarrera               NVARCHAR(20) NULL,
+    Carrera                  NVARCHAR(150) NULL,
+    Nivel                    NVARCHAR(10) NULL,
+    Paralelo                 NVARCHAR(50) NULL,
+    Apellidos                NVARCHAR(150) NULL,
+    Nombres                  NVARCHAR(150) NULL,
+    AsistenciaPrimerParcial  DECIMAL(6,2) NULL,
+    PrimerParcial            DECIMAL(6,2) NULL,
+    AsistenciaSegundoParcial DECIMAL(6,2) NULL,
+    SegundoParcial           DECIMAL(6,2) NULL,
+    Recuperacion             DECIMAL(6,2) NULL,
+    Mejoramiento             DECIMAL(6,2) NULL,
+    PromedioParciales        DECIMAL(6,2) NULL,
+    Promedio                 DECIMAL(6,2) NULL,
+    NoVez                    SMALLINT NULL,
+    Estado                   NVARCHAR(30) NULL,
+    DocenteId                NVARCHAR(20) NULL,
+    Docente                  NVARCHAR(200) NULL,
+    CorreoInstitucional      NVARCHAR(150) NULL,
+    CorreoPersonal           NVARCHAR(150) NULL
+);
+CREATE INDEX IX_Calificaciones_Archivo ON Calificaciones(ArchivoId, Version);
+CREATE INDEX IX_Calificaciones_Estudiante ON Calificaciones(Identificacion, Periodo, Materia);
+CREATE INDEX IX_Calificaciones_Materia ON Calificaciones(Periodo, Materia);
+CREATE INDEX IX_Calificaciones_Docente ON Calificaciones(DocenteId, Periodo);
+
+CREATE TABLE Matriculas (
+    ArchivoId               INT NOT NULL
+        CONSTRAINT FK_Matriculas_Archivo REFERENCES ArchivosExcel(Id) ON DELETE CASCADE,
+    Version                 BIGINT NOT NULL,
+    Identificacion          NVARCHAR(20) NOT NULL,
+    Periodo                 NVARCHAR(50) NOT NULL,
+    CodCarrera              NVARCHAR(20) NULL,
+    Carrera                 NVARCHAR(150) NULL,
+    Nivel                   NVARCHAR(10) NULL,
+    Apellidos               NVARCHAR(150) NULL,
+    Nombres                 NVARCHAR(150) NULL,
+    Sexo                    NVARCHAR(20) NULL,
+    Discapacidad            NVARCHAR(100) NULL,
+    PorcentajeDiscapacidad  DECIMAL(6,2) NULL,
+    Vez                     SMALLINT NULL,
+    Estado                  NVARCHAR(30) NULL,
+    FechaMatricula          DATETIME NULL,
+    FechaLegalizacion       DATETIME NULL,
+    CorreoInstitucional     NVARCHAR(150) NULL,
+    CorreoPersonal          NVARCHAR(150) NULL
+);
+CREATE INDEX IX_Matriculas_Archivo ON Matriculas(ArchivoId, Version);
+CREATE INDEX IX_Matriculas_Estudiante ON Matriculas(Identificacion, Periodo);
+
+CREATE TABLE Docentes (
+    ArchivoId            INT NOT NULL
+        CONSTRAINT FK_Docentes_Archivo REFERENCES ArchivosExcel(Id) ON DELETE CASCADE,
+    Version              BIGINT NOT NULL,
+    Identificacion       NVARCHAR(20) NOT NULL,
+    Periodo              NVARCHAR(50) NOT NULL,
+    Carrera              NVARCHAR(150) NULL,
+    Nombres              NVARCHAR(200) NULL,
+    Dedicacion           NVARCHAR(10) NULL,
+    Cargo                NVARCHAR(150) NULL,
+    TipoContrato         NVARCHAR(50) NULL,
+    HorasContrato        SMALLINT NULL,
+    CorreoInstitucional  NVARCHAR(150) NULL,
+    CorreoPersonal       NVARCHAR(150) NULL
+);
+CREATE INDEX IX_Docentes_Archivo ON Docentes(ArchivoId, Version);
+CREATE INDEX IX_Docentes_Docente ON Docentes(Identificacion, Periodo);
+
 CREATE TABLE PlantillasCorreo (
     Id INT PRIMARY KEY IDENTITY(1,1),
     Autoridad TEXT,
@@ -19,14 +139,42 @@ CREATE TABLE PlantillasCorreo (
     Estudiante TEXT
 );
 
+-- Envíos masivos de correo (/send-email/bulk)
+CREATE TABLE TrabajosCorreo (
+    Id                 CHAR(32) PRIMARY KEY,
+    Estado             NVARCHAR(30) NOT NULL,
+    Total              INT NOT NULL,
+    Enviados           INT NOT NULL DEFAULT 0,
+    Fallidos           INT NOT NULL DEFAULT 0,
+    Errores            NVARCHAR(MAX) NULL,                -- JSON con los últimos errores
+    FechaCreacion      DATETIME NOT NULL DEFAULT GETDATE(),
+    FechaActualizacion DATETIME NOT NULL DEFAULT GETDATE(),
+    FechaFin           DATETIME NULL,
+    Mensajes           VARBINARY(MAX) NULL,               -- JSON gzip de los mensajes (se borra al terminar)
+    Progreso           VARCHAR(MAX) NULL,                 -- un carácter por mensaje (ver correo.py)
+    Toma               CHAR(32) NULL                      -- worker que lo está enviando
+);
+CREATE INDEX IX_TrabajosCorreo_Estado ON TrabajosCorreo(Estado, FechaActualizacion);
+
 CREATE TABLE Usuarios (
     Id       INT IDENTITY(1,1) PRIMARY KEY,
     Usuario  NVARCHAR(150) NOT NULL UNIQUE,
     Estado   BIT NOT NULL DEFAULT 1,                  -- 1 = Activo, 0 = Inactivo
     Rol      NVARCHAR(10) NOT NULL 
         CONSTRAINT DF_Usuarios_Rol DEFAULT N'usuario',
+    -- Login y búsqueda sin distinguir mayúsculas/espacios, con índice (ver /usuarios)
+    UsuarioNorm AS CAST(LOWER(LTRIM(RTRIM(Usuario))) AS NVARCHAR(150)) PERSISTED,
     CONSTRAINT CK_Usuarios_Rol CHECK (Rol IN (N'usuario', N'admin'))
 );
+CREATE UNIQUE INDEX IX_Usuarios_UsuarioNorm ON Usuarios(UsuarioNorm) INCLUDE (Usuario, Estado, Rol);
+CREATE INDEX IX_Usuarios_Rol ON Usuarios(Rol, Id) INCLUDE (Usuario, Estado, UsuarioNorm);
+CREATE INDEX IX_Usuarios_Estado ON Usuarios(Estado, Id) INCLUDE (Usuario, Rol, UsuarioNorm);
+
+-- Tokens de sesión emitidos antes de RevocadoDesde (epoch en ms) ya no valen (ver sesiones.py)
+CREATE TABLE SesionesRevocadas (
+    UsuarioId     INT NOT NULL CONSTRAINT PK_SesionesRevocadas PRIMARY KEY,
+    RevocadoDesde BIGINT NOT NULL
+);
 
 
 INSERT INTO PlantillasCorreo (Autoridad, Docente, Estudiante)
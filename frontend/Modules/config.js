@@ -1,5 +1,8 @@
 // config.js
 import { saveData, loadData } from '../indexeddb-storage.js';
+import { fetchDatasetRows } from '../dataset-columnar.js';
+import { uploadInChunks } from '../upload-client.js';
+import { KEY_ORIGEN_POR_SEMESTRE } from '../export-client.js';
 
 const API_BASE = 'http://178.128.10.70:5000';
 
@@ -154,14 +157,16 @@ async function updatePeriodViewFromLocal() {
     return;
   }
 
-  const KEY_TOTAL   = `academicTrackingData_${normalizeFileName('REPORTE_RECORD_CALIFICACIONES_POR_PARCIAL_TOTAL.xlsx')}`;
-  const KEY_PARCIAL = `academicTrackingData_${normalizeFileName('REPORTE_RECORD_CALIFICACIONES_POR_PARCIAL.xlsx')}`;
+  const ARCHIVO_TOTAL   = 'REPORTE_RECORD_CALIFICACIONES_POR_PARCIAL_TOTAL.xlsx';
+  const ARCHIVO_PARCIAL = 'REPORTE_RECORD_CALIFICACIONES_POR_PARCIAL.xlsx';
 
-  let base = await loadData(KEY_TOTAL);
+  let base = await loadData(`academicTrackingData_${normalizeFileName(ARCHIVO_TOTAL)}`);
   let source = 'TOTAL';
+  let archivo = ARCHIVO_TOTAL;
   if (!Array.isArray(base) || !base.length) {
-    base = await loadData(KEY_PARCIAL);
+    base = await loadData(`academicTrackingData_${normalizeFileName(ARCHIVO_PARCIAL)}`);
     source = 'PARCIAL';
+    archivo = ARCHIVO_PARCIAL;
   }
   if (!Array.isArray(base) || !base.length) {
     await Swal.fire({
@@ -174,6 +179,7 @@ async function updatePeriodViewFromLocal() {
 
   const filtered = base.filter(r => norm(r['PERIODO']) === selectedPeriod);
   await saveData("academicTrackingData_REPORTE_POR_SEMESTRE", filtered);
+  await saveData(KEY_ORIGEN_POR_SEMESTRE, archivo);
   console.log(`📂 Vista por período actualizada desde ${source} → (${filtered.length} registros)`);
 
   await Swal.fire({
@@ -207,16 +213,16 @@ async function processExcelFile() {
     for (let i = 0; i < files.length; i++) {
       console.log(`➡️ Subiendo archivo ${files[i].name}`);
 
-      const formData = new FormData();
-      formData.append("file", files[i]);
-
-      const response = await fetch(`${API_BASE}/upload`, {
-        method: 'POST',
-        body: formData
+      // Por partes y reanudable: un corte de red no obliga a reenviar el archivo completo
+      const response = await uploadInChunks(API_BASE, files[i], (enviados, total) => {
+        if (uploadStatus) {
+          uploadStatus.textContent = `Subiendo ${files[i].name}: ${Math.round((enviados / total) * 100)}%`;
+          uploadStatus.style.color = '';
+        }
       });
 
       console.log(`📬 Respuesta recibida (${response.status})`);
-      const result = await response.json();
+      const result = response.result;
       console.log("📦 Resultado:", result);
 
       if (uploadStatus) {
@@ -279,19 +285,23 @@ async function syncFilesFromBackendToIndexedDB() {
   const files = await res.json();
 
   for (let file of files) {
-    const fileRes = await fetch(`${API_BASE}/download/${file.id}`);
-    if (!fileRes.ok) {
-      console.warn('No se pudo descargar:', file.nombre, file.id);
-      continue;
+    // Dataset ya parseado por el backend; el Excel crudo queda solo como respaldo
+    let jsonData = await fetchDatasetRows(API_BASE, file.nombre).catch(() => null);
+    if (!jsonData) {
+      const fileRes = await fetch(`${API_BASE}/download/${file.id}`);
+      if (!fileRes.ok) {
+        console.warn('No se pudo descargar:', file.nombre, file.id);
+        continue;
+      }
+      const blob = await fileRes.blob();
+      const arrayBuffer = await blob.arrayBuffer();
+
+      // SheetJS ya está cargado desde el HTML
+      const workbook = XLSX.read(new Uint8Array(arrayBuffer), { type: 'array' });
+      const firstSheetName = workbook.SheetNames[0];
+      const worksheet = workbook.Sheets[firstSheetName];
+      jsonData = XLSX.utils.sheet_to_json(worksheet);
     }
-    const blob = await fileRes.blob();
-    const arrayBuffer = await blob.arrayBuffer();
-
-    // SheetJS ya está cargado desde el HTML
-    const workbook = XLSX.read(new Uint8Array(arrayBuffer), { type: 'array' });
-    const firstSheetName = workbook.SheetNames[0];
-    const worksheet = workbook.Sheets[firstSheetName];
-    const jsonData = XLSX.utils.sheet_to_json(worksheet);
 
     const fileKey = normalizeFileName(file.nombre);
 
@@ -312,12 +322,15 @@ async function syncFilesFromBackendToIndexedDB() {
       }
       const filtered = jsonData.filter(row => norm(row['PERIODO']) === targetPeriod);
       await saveData("academicTrackingData_REPORTE_POR_SEMESTRE", filtered);
+      await saveData(KEY_ORIGEN_POR_SEMESTRE, file.nombre);
       console.log(`📂 Guardado academicTrackingData_REPORTE_POR_SEMESTRE (${filtered.length} registros) para ${targetPeriod}`);
     }
 
     // Guardar dataset por archivo (sin filtro)
     const key = `academicTrackingData_${fileKey}`;
     await saveData(key, jsonData);
+    // Versión local: la próxima sincronización pide solo el delta (ver index.js)
+    if (file.version) await saveData(`datasetVersion_${fileKey}`, file.version);
   }
 
   // Refrescar combo de periodos tras sincronizar
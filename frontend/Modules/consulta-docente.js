@@ -1,5 +1,8 @@
 // consulta-docente.js
 import { loadData } from '../indexeddb-storage.js';
+import { createRemoteSearch } from '../search-client.js';
+
+const API_BASE = 'http://178.128.10.70:5000';
 
 document.addEventListener('DOMContentLoaded', async () => {
   const backToMenuButton = document.getElementById('goToMenuButton');
@@ -174,6 +177,8 @@ document.addEventListener('DOMContentLoaded', async () => {
     });
   }
 
+  const remoteSearch = createRemoteSearch(API_BASE, 'docentes', filterDocentes);
+
   /* ========= Eventos del autocompletado ========= */
   docenteFilterInput?.addEventListener('input', (e) => {
     const query = e.target.value;
@@ -182,8 +187,10 @@ document.addEventListener('DOMContentLoaded', async () => {
       return;
     }
 
-    const filtered = filterDocentes(query);
-    showDropdown(filtered);
+    remoteSearch(query).then(filtered => {
+      // Ignora respuestas de una consulta que ya cambió
+      if (filtered && docenteFilterInput.value === query) showDropdown(filtered);
+    });
   });
 
   docenteFilterInput?.addEventListener('blur', (e) => {
@@ -196,8 +203,9 @@ document.addEventListener('DOMContentLoaded', async () => {
   docenteFilterInput?.addEventListener('focus', (e) => {
     const query = e.target.value;
     if (query.length >= 2) {
-      const filtered = filterDocentes(query);
-      showDropdown(filtered);
+      remoteSearch(query).then(filtered => {
+        if (filtered && docenteFilterInput.value === query) showDropdown(filtered);
+      });
     }
   });
 
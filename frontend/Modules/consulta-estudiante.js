@@ -1,4 +1,7 @@
 import { loadData } from '../indexeddb-storage.js';
+import { createRemoteSearch } from '../search-client.js';
+
+const API_BASE = 'http://178.128.10.70:5000';
 
 // ---- Funciones Helper ----
 const norm = (s) => (s ?? '').toString().trim();
@@ -522,6 +525,8 @@ function initStudentAutocomplete(dataFiltrada, studentFilterInput, onSearch) {
     });
   }
 
+  const remoteSearch = createRemoteSearch(API_BASE, 'estudiantes', filterEstudiantes);
+
   /* ========= Eventos del autocompletado ========= */
   studentFilterInput?.addEventListener('input', (e) => {
     const query = e.target.value;
@@ -530,8 +535,10 @@ function initStudentAutocomplete(dataFiltrada, studentFilterInput, onSearch) {
       return;
     }
     
-    const filtered = filterEstudiantes(query);
-    showDropdown(filtered);
+    remoteSearch(query).then(filtered => {
+      // Ignora respuestas de una consulta que ya cambió
+      if (filtered && studentFilterInput.value === query) showDropdown(filtered);
+    });
   });
 
   studentFilterInput?.addEventListener('blur', (e) => {
@@ -543,8 +550,9 @@ function initStudentAutocomplete(dataFiltrada, studentFilterInput, onSearch) {
   studentFilterInput?.addEventListener('focus', (e) => {
     const query = e.target.value;
     if (query.length >= 2) {
-      const filtered = filterEstudiantes(query);
-      showDropdown(filtered);
+      remoteSearch(query).then(filtered => {
+        if (filtered && studentFilterInput.value === query) showDropdown(filtered);
+      });
     }
   });
 
@@ -1001,13 +1009,25 @@ if (Array.isArray(estudiantesData)) {
     studentDetails.style.display = '';
   }
 
+  // Índices exactos construidos una sola vez (antes eran dos pasadas completas por búsqueda)
+  const recordsById = new Map();
+  const recordsByName = new Map();
+  dataFiltrada.forEach(r => {
+    const id = canon(r.IDENTIFICACION);
+    const nombre = canon(`${r.APELLIDOS} ${r.NOMBRES}`);
+    if (!recordsById.has(id)) recordsById.set(id, []);
+    recordsById.get(id).push(r);
+    if (!recordsByName.has(nombre)) recordsByName.set(nombre, []);
+    recordsByName.get(nombre).push(r);
+  });
+
   function pickStudentRecords(q) {
     const qCanon = canon(q);
     if (!qCanon) return null;
-    const byId = dataFiltrada.filter(r => canon(r.IDENTIFICACION) === qCanon);
-    if (byId.length) return byId;
-    const exactName = dataFiltrada.filter(r => canon(`${r.APELLIDOS} ${r.NOMBRES}`) === qCanon);
-    if (exactName.length) return exactName;
+    const byId = recordsById.get(qCanon);
+    if (byId) return byId;
+    const exactName = recordsByName.get(qCanon);
+    if (exactName) return exactName;
     const containsName = dataFiltrada.filter(r => canon(`${r.APELLIDOS} ${r.NOMBRES}`).includes(qCanon));
     if (containsName.length) return containsName;
     const containsId = dataFiltrada.filter(r => String(r.IDENTIFICACION || '').includes(q));
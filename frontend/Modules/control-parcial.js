@@ -1,6 +1,9 @@
 // seguimiento-riesgos.js (aplicación del mismo flujo de envío)
 import { loadData } from '../indexeddb-storage.js';
 import { enviarCorreos } from './emailModule.js';
+import { bindExportButtons, KEY_ORIGEN_POR_SEMESTRE } from '../export-client.js';
+
+const API_BASE = 'http://178.128.10.70:5000';
 
 const norm = (s) => (s ?? '').toString().trim();
 const asNum = (v) => {
@@ -310,6 +313,12 @@ document.addEventListener('DOMContentLoaded', async () => {
     }
   }
 
+  // Exportación del reporte del período, generada en el servidor (ver export-client.js)
+  const periodoActual = Array.isArray(periodoData) ? norm(periodoData.find(row => row["PERIODO"])?.["PERIODO"]) : '';
+  const archivoPeriodo = await loadData(KEY_ORIGEN_POR_SEMESTRE);
+  bindExportButtons(document.getElementById('export-actions'), API_BASE, () => archivoPeriodo,
+    () => ({ periodo: periodoActual }));
+
   const allRows = await buildRows();
   allRows.sort((a, b) => a.Estudiante.localeCompare(b.Estudiante, 'es', { sensitivity: 'base' }));
   renderTable(allRows);
@@ -100,6 +100,42 @@ async function enviarCorreo(para, contenido) {
   }
 }
 
+// Mail-merge en el servidor: se envían solo las variables de cada destinatario y el backend
+// renderiza la plantilla guardada y despacha los correos en lotes. Aquí solo se consulta
+// el avance del trabajo hasta que termina.
+async function enviarMailMerge(tipo, comunes, destinatarios) {
+  if (!destinatarios.length) return;
+  try {
+    const response = await fetch(`${API_BASE}/send-email/merge`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ tipo, subject: "FACAF Notificación Académica", comunes, destinatarios })
+    });
+    if (!response.ok) {
+      console.error("❌ Error al encolar correos:", await response.text());
+      return;
+    }
+    const { job_id } = await response.json();
+    console.log(`📨 ${destinatarios.length} correos encolados (trabajo ${job_id})`);
+
+    const FINALES = ["completado", "completado_con_errores", "fallido"];
+    for (let i = 0; i < 300; i++) {
+      await new Promise(r => setTimeout(r, 2000));
+      const st = await fetch(`${API_BASE}/jobs/${job_id}`);
+      if (!st.ok) continue;
+      const job = await st.json();
+      if (FINALES.includes(job.estado)) {
+        if (job.fallidos) console.warn(`⚠️ ${job.fallidos} correos no enviados:`, job.errores);
+        console.log(`✅ Trabajo ${job_id}: ${job.enviados}/${job.total} enviados`);
+        return;
+      }
+    }
+    console.warn(`⚠️ El trabajo ${job_id} sigue en proceso; revise /jobs/${job_id}`);
+  } catch (err) {
+    console.error("❌ Error al conectar con backend:", err);
+  }
+}
+
 // Extrae nombres LIMPIOS de docentes desde registros (usa solo el nombre, no cédula)
 function obtenerNombresDocentesDesdeRegistros(registros) {
   const set = new Set();
@@ -179,8 +215,6 @@ export async function enviarCorreoAutoridades(estudiantesEnviar) {
    2) DOCENTES  (usa la CÉDULA para buscar CORREO_SIUG en REPORTE_DETALLADO_DOCENTES)
 ========================================================= */
 export async function enviarCorreosDocentes(estudiantesEnviar, docentesExcel) {
-  const plantillaDocente = await getTemplateByType("docente");
-
   // Mapa por IDENTIFICACION (cédula)
   const docenteById = extractDocenteCorreoByIdMap(docentesExcel);
 
@@ -204,6 +238,7 @@ export async function enviarCorreosDocentes(estudiantesEnviar, docentesExcel) {
     )
     .join("\n");
 
+  const destinatarios = [];
   for (const [docenteId, estudiantesSet] of idToStudents.entries()) {
     const info = docenteById[docenteId];
     if (!info) {
@@ -235,25 +270,27 @@ export async function enviarCorreosDocentes(estudiantesEnviar, docentesExcel) {
 
     const estudiantesDeEseDocente = [...estudiantesSet];
 
-    const contenidoDocente = replaceKeywords(plantillaDocente, {
-      nombre_docente: nombreDocente || docenteId, // muestra SOLO nombre
-      detalle_estudiantes: estudiantesDeEseDocente.map(n => `- ${n}`).join("\n") || "-",
-      nombre_estudiante: "-",
-      detalle_materias: "-", // si quieres listar materias, se puede construir por id aquí
-      detalle_docentes: todosDocentesStr || "-",
-      detalle_docentes_estudiantes: detalleDocenteEstudianteGlobal || "-"
+    destinatarios.push({
+      to: correoDocente,
+      variables: {
+        nombre_docente: nombreDocente || docenteId, // muestra SOLO nombre
+        detalle_estudiantes: estudiantesDeEseDocente.map(n => `- ${n}`).join("\n") || "-"
+      }
     });
-
-    await enviarCorreo(correoDocente, contenidoDocente);
   }
+
+  await enviarMailMerge("docente", {
+    nombre_estudiante: "-",
+    detalle_materias: "-", // si quieres listar materias, se puede construir por id aquí
+    detalle_docentes: todosDocentesStr || "-",
+    detalle_docentes_estudiantes: detalleDocenteEstudianteGlobal || "-"
+  }, destinatarios);
 }
 
 /* =========================================================
    3) ESTUDIANTES
 ========================================================= */
 export async function enviarCorreosEstudiantes(estudiantesEnviar) {
-  const plantillaEstudiante = await getTemplateByType("estudiante");
-
   const todosDocentesStr = obtenerNombresDocentesDesdeRegistros(estudiantesEnviar).join(", ");
   const detalleDocenteEstudianteGlobal = estudiantesEnviar
     .flatMap(e =>
@@ -268,6 +305,7 @@ export async function enviarCorreosEstudiantes(estudiantesEnviar) {
     )
     .join("\n");
 
+  const destinatarios = [];
   for (const e of estudiantesEnviar) {
     const materiasHtml = (e["[Vez] Materia (Docente)"] || []).join("\n") || "-";
     const correos = String(e.Correo || "")
@@ -280,17 +318,21 @@ export async function enviarCorreosEstudiantes(estudiantesEnviar) {
       continue;
     }
 
-    const contenidoEstudiante = replaceKeywords(plantillaEstudiante, {
-      nombre_docente: "-",
-      detalle_estudiantes: "-",
-      nombre_estudiante: e.Estudiante || "-",
-      detalle_materias: materiasHtml,
-      detalle_docentes: todosDocentesStr || "-",
-      detalle_docentes_estudiantes: detalleDocenteEstudianteGlobal || "-"
+    destinatarios.push({
+      to: correos,
+      variables: {
+        nombre_estudiante: e.Estudiante || "-",
+        detalle_materias: materiasHtml
+      }
     });
-
-    await enviarCorreo(correos, contenidoEstudiante);
   }
+
+  await enviarMailMerge("estudiante", {
+    nombre_docente: "-",
+    detalle_estudiantes: "-",
+    detalle_docentes: todosDocentesStr || "-",
+    detalle_docentes_estudiantes: detalleDocenteEstudianteGlobal || "-"
+  }, destinatarios);
 }
 
 /* =========================================================
@@ -1,6 +1,9 @@
 // nee-control.js
 import { enviarCorreosNEE } from './emailModule.js';
 import { loadData } from '../indexeddb-storage.js';
+import { fetchView } from '../views-client.js';
+
+const API_BASE = 'http://178.128.10.70:5000';
 
 document.addEventListener('DOMContentLoaded', async () => {
   const tableBody      = document.getElementById('neeStudentTableBody');
@@ -314,6 +317,15 @@ document.addEventListener('DOMContentLoaded', async () => {
    * Carga y merge de datos
    * =========================== */
   async function loadAndMergeData() {
+    // Primero la vista precalculada del backend; el cruce local queda como respaldo
+    const remota = await fetchView(API_BASE, 'nee');
+    if (remota) {
+      if (remota.periodo && periodLabel) periodLabel.textContent = `📅 Periodo actual: ${remota.periodo}`;
+      allStudentsData = remota.rows;
+      renderTable(allStudentsData);
+      return;
+    }
+
     const periodoActual = await getPeriodo();
 
     const porSemestre    = (await loadData('academicTrackingData_REPORTE_POR_SEMESTRE')) || [];
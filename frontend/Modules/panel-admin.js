@@ -1,5 +1,6 @@
 // Modules/admin.js
 import { loadData, saveData } from '../indexeddb-storage.js';
+import { fetchSession } from '../auth-session.js';
 
 const API_BASE = 'http://178.128.10.70:5000';
 const DEBUG = false;
@@ -17,6 +18,8 @@ const activoLabel  = document.getElementById('activo-label');
 const createUserBtn = document.getElementById('createUserBtn');
 const updateUserBtn = document.getElementById('updateUserBtn');
 const clearFormBtn  = document.getElementById('clearFormBtn');
+const bulkImportBtn  = document.getElementById('bulkImportBtn');
+const bulkImportFile = document.getElementById('bulkImportFile');
 const refreshBtn    = document.getElementById('refreshUsersBtn');
 
 const searchText    = document.getElementById('searchText');
@@ -103,6 +106,7 @@ function hideErrorBanner() {
 let USERS_CACHE = [];          // datos ya cargados (paginados)
 let selectedId  = null;
 let page        = 0;
+let nextCursor  = null;        // cursor keyset de la página siguiente (null = no hay más)
 const PAGE_SIZE = 20;
 
 let sortBy  = 'id';
@@ -215,9 +219,12 @@ async function safeJson(resp) {
 }
 
 // ====== API ======
-async function apiListUsers({ q = '', rol = '', activo = '', page = 0, limit = PAGE_SIZE, sort_by = 'id', sort_dir = 'desc' } = {}) {
+async function apiListUsers({ q = '', rol = '', activo = '', page = 0, limit = PAGE_SIZE, sort_by = 'id', sort_dir = 'desc', cursor = null, match = '', totalMode = '' } = {}) {
   const params = new URLSearchParams();
   if (q) params.set('q', q);
+  if (match) params.set('match', match);
+  if (totalMode) params.set('total', totalMode);
+  if (cursor) params.set('cursor', cursor);
   if (rol) params.set('rol', rol);
   if (activo !== '') params.set('activo', activo); // '1' | '0' | ''
   params.set('page', String(page));
@@ -238,9 +245,10 @@ async function apiListUsers({ q = '', rol = '', activo = '', page = 0, limit = P
   const rowsRaw = pickRowsFromAnyShape(body);
   const rows = rowsRaw.map(mapUser).filter(Boolean);
   const total = Number(body?.total ?? rows.length);
+  const next = body?.next_cursor ?? null;
 
-  if (DEBUG) console.log('GET /usuarios ->', { count: rows.length, total, sample: rows[0] });
-  return { rows, total };
+  if (DEBUG) console.log('GET /usuarios ->', { count: rows.length, total, next, sample: rows[0] });
+  return { rows, total, next };
 }
 
 async function apiCreateUser({ usuario, rol = 'usuario', activo = true }) {
@@ -279,6 +287,21 @@ async function apiUpdateUser(id, { usuario, rol, activo }) {
   return u;
 }
 
+// Carga masiva: el backend valida todas las filas y guarda todo o nada en una transacción
+async function apiBulkImport(file) {
+  const form = new FormData();
+  form.append('file', file);
+  const resp = await fetch(`${API_BASE}/usuarios/bulk`, { method: 'POST', body: form });
+  const out = await safeJson(resp);
+  if (!resp.ok) {
+    if (DEBUG) console.error('POST /usuarios/bulk FAILED', resp.status, out);
+    const err = new Error(out?.error || 'No se pudo importar');
+    err.errores = Array.isArray(out?.errores) ? out.errores : [];
+    throw err;
+  }
+  return out;
+}
+
 // ====== Stats desde el backend ======
 async function refreshStatsFromServer() {
   try {
@@ -310,15 +333,20 @@ function currentFilters() {
 async function refreshUsers({ reset = true } = {}) {
   hideErrorBanner();
   const { q, rol, activo } = currentFilters();
-  if (reset) page = 0;
+  if (reset) { page = 0; nextCursor = null; }
 
   showOverlay(`Cargando usuarios...`);
   try {
-    let { rows, total } = await apiListUsers({
+    // Las páginas siguientes se piden por cursor (keyset); el total solo hace falta en la primera
+    let { rows, total, next } = await apiListUsers({
       q, rol, activo,
-      page, limit: PAGE_SIZE,
+      page: reset ? 0 : page, limit: PAGE_SIZE,
       sort_by: sortBy, sort_dir: sortDir,
+      cursor: reset ? null : nextCursor,
+      totalMode: reset ? '' : 'no',
     });
+    nextCursor = next;
+    if (loadMoreBtn) loadMoreBtn.disabled = !nextCursor;
 
     // Si vino vacío, reintenta sin filtros con límite alto
     if (rows.length === 0 && page === 0) {
@@ -327,6 +355,8 @@ async function refreshUsers({ reset = true } = {}) {
       if (retry.rows.length > 0) {
         rows = retry.rows;
         total = retry.total;
+        nextCursor = retry.next;
+        if (loadMoreBtn) loadMoreBtn.disabled = !nextCursor;
         if (searchText)  searchText.value = '';
         if (filterRol)   filterRol.value = '';
         if (filterActivo)filterActivo.value = '';
@@ -345,7 +375,7 @@ async function refreshUsers({ reset = true } = {}) {
 
     await refreshStatsFromServer();
 
-    if (total === 0) {
+    if (reset && total === 0) {
       if (await modalConfirm(
         'No hay usuarios en la base de datos.\n¿Deseas crear un usuario administrador de prueba (admin@local)?',
         'Sembrar administrador',
@@ -377,6 +407,7 @@ async function refreshUsers({ reset = true } = {}) {
 }
 
 async function loadMore() {
+  if (!nextCursor) return;
   page += 1;
   await refreshUsers({ reset: false });
 }
@@ -476,6 +507,32 @@ clearFormBtn?.addEventListener('click', async () => {
   updateUserBtn.disabled = true;
 });
 
+bulkImportBtn?.addEventListener('click', () => bulkImportFile?.click());
+
+bulkImportFile?.addEventListener('change', async () => {
+  const file = bulkImportFile.files?.[0];
+  bulkImportFile.value = '';
+  if (!file) return;
+
+  try {
+    showOverlay(`Importando "${file.name}"...`);
+    const { resumen } = await apiBulkImport(file);
+    await refreshUsers({ reset: true });
+    await modalInfo(
+      `Creados: ${resumen.creado}\nActualizados: ${resumen.actualizado}\nSin cambios: ${resumen.sin_cambios}`,
+      'Importación completa'
+    );
+  } catch (e) {
+    const MAX = 15;
+    const detalle = (e.errores || []).slice(0, MAX)
+      .map(x => `Fila ${x.fila}${x.usuario ? ` (${x.usuario})` : ''}: ${x.error}`).join('\n');
+    const resto = (e.errores?.length ?? 0) > MAX ? `\n... y ${e.errores.length - MAX} más` : '';
+    await modalError(`${e.message}${detalle ? `\n\n${detalle}${resto}` : ''}`, 'No se importó');
+  } finally {
+    hideOverlay();
+  }
+});
+
 refreshBtn?.addEventListener('click', async () => {
   await refreshUsers({ reset: true });
 });
@@ -536,17 +593,29 @@ async function validateRoleOnEntry() {
 
   try {
     showOverlay('Validando rol de usuario...');
-    // 2) Consultar rol real en la BD
-    const { rows } = await apiListUsers({ q: username, limit: 1, page: 0 });
-    const match = rows.find(r => (r.usuario || '').toLowerCase() === username.toLowerCase()) || rows[0];
-
-    if (!match) {
-      await modalError('Usuario no registrado localmente. Contacta al administrador.');
-      window.location.href = '../index.html';
+    // 2) Rol real: del token de sesión (sin consultar la BD) o, en sesiones sin token, de la BD
+    const sesion = await fetchSession(API_BASE);
+    if (sesion === null) {
+      hideOverlay();
+      await modalError('Tu sesión ya no es válida. Inicia sesión nuevamente.');
+      window.location.href = '../login.html';
       return false;
     }
 
-    const backendRole = (match.rol || '').toLowerCase();
+    let backendRole;
+    if (sesion) {
+      backendRole = (sesion.rol || '').toLowerCase();
+    } else {
+      const { rows } = await apiListUsers({ q: username, match: 'exacto', limit: 1, page: 0, totalMode: 'no' });
+      const match = rows.find(r => (r.usuario || '').toLowerCase() === username.toLowerCase()) || rows[0];
+
+      if (!match) {
+        await modalError('Usuario no registrado localmente. Contacta al administrador.');
+        window.location.href = '../index.html';
+        return false;
+      }
+      backendRole = (match.rol || '').toLowerCase();
+    }
 
     // 3) Si roles no coinciden => modal y regreso al index (actualizando sesión)
     if (backendRole !== storedRole) {
@@ -1,4 +1,7 @@
 import { loadData } from '../indexeddb-storage.js';
+import { bindExportButtons } from '../export-client.js';
+
+const API_BASE = 'http://178.128.10.70:5000';
 
 /* ===== Helpers ===== */
 const norm = (v) => (v ?? '').toString().trim();
@@ -21,18 +24,24 @@ async function loadWithFallback(possibleKeys) {
 }
 
 /* ===== Claves posibles para TOTAL y PARCIAL ===== */
+const ARCHIVO_TOTAL = 'REPORTE_RECORD_CALIFICACIONES_POR_PARCIAL_TOTAL.xlsx';
+const ARCHIVO_PARCIAL = 'REPORTE_RECORD_CALIFICACIONES_POR_PARCIAL.xlsx';
+
 const KEYS_TOTAL = [
   'academicTrackingData_REPORTE_RECORD_CALIFICACIONES_POR_PARCIAL_TOTAL_xlsx',
-  `academicTrackingData_${normalizeFileName('REPORTE_RECORD_CALIFICACIONES_POR_PARCIAL_TOTAL.xlsx')}`,
+  `academicTrackingData_${normalizeFileName(ARCHIVO_TOTAL)}`,
   'academicTrackingData_REPORTE_RECORD_CALIFICACIONES_POR_PARCIAL_TOTAL'
 ];
 
 const KEYS_PARCIAL = [
   'academicTrackingData_REPORTE_RECORD_CALIFICACIONES_POR_PARCIAL_xlsx',
-  `academicTrackingData_${normalizeFileName('REPORTE_RECORD_CALIFICACIONES_POR_PARCIAL.xlsx')}`,
+  `academicTrackingData_${normalizeFileName(ARCHIVO_PARCIAL)}`,
   'academicTrackingData_REPORTE_RECORD_CALIFICACIONES_POR_PARCIAL'
 ];
 
+// Archivo del que salieron los períodos del select: es el que se exporta
+let archivoReporte = null;
+
 /* ===== Orden de períodos ===== */
 function pickMostRecentPeriod(periods) {
   const parse = (p) => {
@@ -68,10 +77,13 @@ async function populatePeriodSelect() {
   if (!select) return;
 
   let { data } = await loadWithFallback(KEYS_TOTAL);
+  archivoReporte = ARCHIVO_TOTAL;
   if (!data.length) {
     ({ data } = await loadWithFallback(KEYS_PARCIAL));
+    archivoReporte = ARCHIVO_PARCIAL;
   }
   if (!data.length) {
+    archivoReporte = null;
     select.innerHTML = '';
     return null;
   }
@@ -427,6 +439,9 @@ document.addEventListener('DOMContentLoaded', async () => {
   document.getElementById('btn-print').addEventListener('click', () => {
     window.print();
   });
+  // El reporte del período seleccionado se genera en el servidor (ver export-client.js)
+  bindExportButtons(document.getElementById('export-actions'), API_BASE, () => archivoReporte,
+    () => ({ periodo: document.getElementById('period-select').value }));
   document.getElementById('period-select').addEventListener('change', (e) => {
     localStorage.setItem('selectedPeriod', e.target.value);
     loadReport();
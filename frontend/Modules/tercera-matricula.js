@@ -1,6 +1,9 @@
 // tercera-matricula.js
 import { loadData } from '../indexeddb-storage.js';
 import { enviarCorreos } from './emailModule.js';
+import { fetchView } from '../views-client.js';
+
+const API_BASE = 'http://178.128.10.70:5000';
 
 /* ===========================
  * Utils básicos
@@ -201,6 +204,14 @@ function computeNoEmailDocentesMessages(selected, docentesExcel) {
  * Construcción de filas (igual a tu código)
  * =========================== */
 async function buildRows() {
+  // Primero la vista precalculada del backend; el cálculo local queda como respaldo
+  const remota = await fetchView(API_BASE, 'tercera-matricula');
+  if (remota) {
+    const periodLabel = document.getElementById("current-period-label");
+    if (periodLabel && remota.periodo) periodLabel.textContent = `📅 Periodo actual: ${remota.periodo}`;
+    return remota.rows;
+  }
+
   const semestre = await loadData(KEY_POR_SEMESTRE);
   const calificaciones = await loadData(KEY_PARCIAL_TOTAL);
   if (!Array.isArray(semestre) || !Array.isArray(calificaciones)) return [];
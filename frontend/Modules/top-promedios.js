@@ -2,6 +2,8 @@
 import { loadData } from '../indexeddb-storage.js';
 
 const KEY = 'academicTrackingData_REPORTE_RECORD_CALIFICACIONES_POR_PARCIAL_TOTAL_xlsx';
+const API_BASE = 'http://178.128.10.70:5000';
+const ARCHIVO = 'REPORTE_RECORD_CALIFICACIONES_POR_PARCIAL_TOTAL.xlsx';
 
 // Cantidad esperada de materias por nivel y carrera
 const nivelMateriasED  = {1:7, 2:7, 3:7, 4:6, 5:5, 6:5, 7:5, 8:5};
@@ -48,8 +50,53 @@ function sortPeriodosDesc(periodos) {
   });
 }
 
+/* =============== Top Promedios precalculado en el backend =============== */
+// El backend calcula el top por carrera/nivel al subir el reporte (/analytics).
+// Si no responde, se usa el cálculo local sobre IndexedDB.
+async function fetchAnalytics(path) {
+  const res = await fetch(`${API_BASE}/analytics/${encodeURIComponent(ARCHIVO)}${path}`);
+  if (!res.ok) throw new Error(`HTTP ${res.status}`);
+  return res.json();
+}
+
+async function renderFromBackend(periodo) {
+  const payload = await fetchAnalytics(`/top-promedios?n=5&periodo=${encodeURIComponent(periodo)}`);
+  const resultados = {};
+  for (const g of payload['top-promedios'] ?? []) {
+    resultados[`${g.alias} - Nivel ${g.nivel}`] = g.estudiantes.map(e => ({
+      id: e.id,
+      nombre: e.nombre,
+      correo: e.correos.join('<br>'),
+      grupo: `<strong>MA:</strong> ${e.ma_pct.toFixed(2)}%<br><strong>VE:</strong> ${e.ve_pct.toFixed(2)}%`,
+      promedio: e.promedio.toFixed(2)
+    }));
+  }
+  renderResultados(resultados, periodo);
+}
+
+async function initTopPromediosBackend() {
+  const periodSelect = document.getElementById('periodSelect');
+  const { periodos } = await fetchAnalytics('');
+  if (!periodos?.length) throw new Error('Sin periodos');
+
+  await renderFromBackend(periodos[0]);
+  periodSelect.innerHTML = periodos.map(p => `<option value="${p}">${p}</option>`).join('');
+  periodSelect.value = periodos[0];
+
+  periodSelect.addEventListener('change', () => {
+    renderFromBackend(periodSelect.value).catch(err => console.error('Top promedios:', err));
+  });
+}
+
 /* =============== Núcleo de Top Promedios (filtrado por periodo) =============== */
 async function initTopPromedios() {
+  try {
+    await initTopPromediosBackend();
+    return;
+  } catch (err) {
+    console.warn('Top promedios: cálculo local (backend no disponible):', err);
+  }
+
   const data = await loadData(KEY);
   const container = document.getElementById('top-promedios-container');
   const periodSelect = document.getElementById('periodSelect');
@@ -23,6 +23,7 @@ export async function ensureSessionGuard() {
     await removeData('isLoggedIn');
     await removeData('sessionExpiresAt');
     await removeData('userData');
+    await clearSessionToken();
     location.href = resolveLoginPath();
     return false;
   }
@@ -37,12 +38,72 @@ export async function scheduleAutoLogout() {
   if (remaining <= 0) {
     await removeData('isLoggedIn');
     await removeData('sessionExpiresAt');
+    await clearSessionToken();
     location.href = resolveLoginPath();
     return;
   }
   setTimeout(async () => {
     await removeData('isLoggedIn');
     await removeData('sessionExpiresAt');
+    await clearSessionToken();
     location.href = resolveLoginPath();
   }, remaining);
 }
+
+// ---------- Token de sesión firmado (ver backend/sesiones.py) ----------
+// /auth/ug lo entrega junto con el usuario. Se envía como "Authorization: Bearer" y el backend
+// verifica rol y estado sin consultar la BD. Dura poco: se renueva en /auth/renovar.
+const RENEW_MARGIN_MS = 60 * 1000;
+
+export async function saveSessionToken(sesion) {
+  if (!sesion?.token) return clearSessionToken();
+  await saveData('sessionToken', sesion.token);
+  await saveData('sessionTokenExpiresAt', Number(sesion.expira) * 1000);
+}
+
+export async function clearSessionToken() {
+  await removeData('sessionToken');
+  await removeData('sessionTokenExpiresAt');
+}
+
+// Token vigente (renovado si está por vencer o si force). null si no hay token o el servidor ya
+// no lo renueva (usuario desactivado, sesión demasiado vieja): en ese caso se borra.
+export async function renewSessionToken(apiBase, { force = false } = {}) {
+  const token = await loadData('sessionToken');
+  if (!token) return null;
+  const expiresAt = Number(await loadData('sessionTokenExpiresAt')) || 0;
+  if (!force && expiresAt - Date.now() > RENEW_MARGIN_MS) return token;
+
+  const resp = await fetch(`${apiBase}/auth/renovar`, {
+    method: 'POST',
+    headers: { Authorization: `Bearer ${token}` }
+  });
+  if (resp.status === 401) {
+    await clearSessionToken();
+    return null;
+  }
+  if (!resp.ok) throw new Error(`/auth/renovar respondió ${resp.status}`);
+  const { sesion } = await resp.json();
+  await saveSessionToken(sesion);
+  return sesion.token;
+}
+
+export async function authHeaders(apiBase) {
+  const token = await renewSessionToken(apiBase).catch(() => null);
+  return token ? { Authorization: `Bearer ${token}` } : {};
+}
+
+// { id, rol, activo } según el token, sin consultar la BD. undefined si la sesión no tiene token
+// (iniciada antes de los tokens: se valida como antes); null si el servidor la rechazó.
+export async function fetchSession(apiBase) {
+  if (!(await loadData('sessionToken'))) return undefined;
+  for (const force of [false, true]) {
+    const token = await renewSessionToken(apiBase, { force });
+    if (!token) return null;
+    const resp = await fetch(`${apiBase}/auth/sesion`, { headers: { Authorization: `Bearer ${token}` } });
+    if (resp.ok) return (await resp.json()).data;
+    if (resp.status !== 401) throw new Error(`/auth/sesion respondió ${resp.status}`);
+    // 401: revocada (p. ej. cambio de rol); al renovar llega el token con el rol actual
+  }
+  return null;
+}
@@ -0,0 +1,64 @@
+// dataset-columnar.js
+// Cliente de /datasets/<nombre>: el backend parsea cada Excel una sola vez al subirlo
+// y lo entrega en formato columnar (strings con diccionario). Aquí solo se rearman las filas,
+// con las mismas claves que XLSX.utils.sheet_to_json sobre la primera hoja.
+
+export function decodeColumnar(payload) {
+  const total = payload?.filas ?? 0;
+  const rows = new Array(total);
+  for (let i = 0; i < total; i++) rows[i] = {};
+
+  for (const col of payload?.columnas ?? []) {
+    const name = col.nombre;
+    if (col.tipo === 'dict') {
+      const values = col.valores;
+      const codes = col.codigos;
+      for (let i = 0; i < total; i++) {
+        const c = codes[i];
+        if (c >= 0) rows[i][name] = values[c];
+      }
+    } else {
+      const data = col.datos;
+      for (let i = 0; i < total; i++) {
+        const v = data[i];
+        if (v !== null && v !== undefined) rows[i][name] = v;
+      }
+    }
+  }
+  return rows;
+}
+
+// Devuelve las filas del dataset o null si el backend no lo tiene (p. ej. archivo no Excel).
+export async function fetchDatasetRows(apiBase, nombre) {
+  const res = await fetch(`${apiBase}/datasets/${encodeURIComponent(nombre)}`);
+  if (!res.ok) return null;
+  const payload = await res.json();
+  return decodeColumnar(payload);
+}
+
+// ---------- Deltas entre versiones (backend/deltas.py) ----------
+// Las filas se agrupan por la clave del delta (p. ej. IDENTIFICACION+PERIODO+MATERIA): cada grupo
+// que llega reemplaza completo al grupo local y las claves de `eliminadas` se quitan.
+function rowKey(row, clave) {
+  return JSON.stringify(clave.map(c => row[c] ?? null));
+}
+
+export function applyDatasetDelta(rows, delta) {
+  const clave = delta?.clave ?? [];
+  const nuevas = decodeColumnar(delta?.filas);
+  if (clave.length === 0) return rows;
+
+  const reemplazadas = new Set((delta.eliminadas ?? []).map(k => JSON.stringify(k)));
+  for (const row of nuevas) reemplazadas.add(rowKey(row, clave));
+  const resultado = rows.filter(row => !reemplazadas.has(rowKey(row, clave)));
+  for (const row of nuevas) resultado.push(row);
+  return resultado;
+}
+
+// Filas actualizadas aplicando el delta desde `desde`, o null si hay que bajar el dataset completo.
+export async function fetchDatasetDelta(apiBase, nombre, desde, rows) {
+  const res = await fetch(`${apiBase}/datasets/${encodeURIComponent(nombre)}/delta?desde=${desde}`);
+  if (!res.ok) return null;
+  const delta = await res.json();
+  return applyDatasetDelta(rows, delta);
+}
@@ -0,0 +1,43 @@
+// events-client.js
+// Avisos de cambios del servidor por SSE (/events, ver backend/eventos.py). Al conectar, el
+// servidor repite lo que cambió desde el último id visto (?desde= o Last-Event-ID al reconectar)
+// y termina con un evento "estado" { ultimo, reinicio }. Con eso el menú sabe si lo guardado en
+// IndexedDB sigue vigente sin consultar /files/changes en cada carga.
+
+const TIPOS = ['dataset', 'plantillas', 'estado'];
+
+// Resuelve con { ultimo, reinicio, eventos } al llegar el primer "estado", o null si /events no
+// está disponible (sin EventSource, rechazado por el límite de conexiones o sin respuesta a
+// tiempo): en ese caso se revisa como antes. La conexión queda abierta y lo que llegue después,
+// incluido el "estado" de cada reconexión, se entrega a onEvent(tipo, datos).
+export function watchServerEvents(apiBase, since, onEvent, { timeoutMs = 5000 } = {}) {
+  if (typeof EventSource === 'undefined') return Promise.resolve(null);
+  const url = since == null ? `${apiBase}/events` : `${apiBase}/events?desde=${encodeURIComponent(since)}`;
+  const source = new EventSource(url);
+
+  return new Promise((resolve) => {
+    const replayed = [];
+    let done = false;
+    const finish = (value) => {
+      if (done) return;
+      done = true;
+      clearTimeout(timer);
+      resolve(value);
+    };
+    const timer = setTimeout(() => { source.close(); finish(null); }, timeoutMs);
+
+    for (const tipo of TIPOS) {
+      source.addEventListener(tipo, (ev) => {
+        let datos;
+        try { datos = JSON.parse(ev.data); } catch { return; }
+        if (done) onEvent?.(tipo, datos);
+        else if (tipo === 'estado') finish({ ...datos, eventos: replayed });
+        else replayed.push(datos);
+      });
+    }
+    // Un corte se reintenta solo (readyState CONNECTING); CLOSED es un error definitivo
+    source.onerror = () => {
+      if (source.readyState === EventSource.CLOSED) finish(null);
+    };
+  });
+}
@@ -0,0 +1,46 @@
+// export-client.js
+// Exportación generada en el servidor (/export/<archivo>): el backend filtra el reporte guardado
+// y envía el xlsx/csv/pdf por partes, así el navegador lo guarda directo a disco sin armar el
+// archivo en memoria (en PCs modestas exportar desde el dataset completo congelaba la página).
+// filtros: { periodo, carrera, materia, estado }; cada uno puede ser un valor o un arreglo.
+// El archivo a exportar es el mismo del que la página sacó sus datos: la vista por período
+// (REPORTE_POR_SEMESTRE) guarda de qué archivo salió en KEY_ORIGEN_POR_SEMESTRE (ver config.js).
+
+export const KEY_ORIGEN_POR_SEMESTRE = 'academicTrackingData_REPORTE_POR_SEMESTRE_ARCHIVO';
+
+export function exportUrl(apiBase, nombre, formato, filtros = {}) {
+  const params = new URLSearchParams({ formato });
+  for (const [clave, valor] of Object.entries(filtros)) {
+    for (const v of [].concat(valor ?? [])) {
+      if (String(v).trim()) params.append(clave, v);
+    }
+  }
+  return `${apiBase}/export/${encodeURIComponent(nombre)}?${params}`;
+}
+
+export function downloadExport(apiBase, nombre, formato, filtros = {}) {
+  const a = document.createElement('a');
+  a.href = exportUrl(apiBase, nombre, formato, filtros);
+  a.rel = 'noopener';
+  document.body.appendChild(a);
+  a.click();
+  a.remove();
+}
+
+// Conecta los botones [data-export="xlsx|csv|pdf"] dentro de `container`; getNombre() y
+// getFiltros() se evalúan en cada clic (p. ej. el archivo y el período seleccionados en ese
+// momento). Sin archivo todavía (datos de antes de sincronizar) se avisa en vez de descargar.
+export function bindExportButtons(container, apiBase, getNombre, getFiltros) {
+  container?.querySelectorAll('[data-export]').forEach(btn => {
+    btn.addEventListener('click', () => {
+      const nombre = getNombre();
+      if (!nombre) {
+        const aviso = 'Sincronice los datos desde Configuración para poder exportar este reporte.';
+        if (window.Swal) window.Swal.fire({ icon: 'info', title: 'Exportación', text: aviso });
+        else alert(aviso);
+        return;
+      }
+      downloadExport(apiBase, nombre, btn.dataset.export, getFiltros());
+    });
+  });
+}
@@ -1,6 +1,8 @@
 // index.js
 import { loadData, saveData, removeData } from './indexeddb-storage.js';
-import { ensureSessionGuard, scheduleAutoLogout } from './auth-session.js';
+import { ensureSessionGuard, scheduleAutoLogout, authHeaders, fetchSession, clearSessionToken } from './auth-session.js';
+import { fetchDatasetRows, fetchDatasetDelta } from './dataset-columnar.js';
+import { watchServerEvents } from './events-client.js';
 
 const API_BASE = 'http://178.128.10.70:5000';
 
@@ -54,18 +56,6 @@ document.addEventListener('DOMContentLoaded', async () => {
   // ---------- Helpers ----------
   const normalizeFileName = (fileName) => fileName.replace(/\W+/g, "_");
 
-  const buildFilesSignature = (files) => {
-    if (!Array.isArray(files)) return '';
-    const rows = files.map(f => {
-      const nombre = String(f.nombre ?? f.NombreArchivo ?? '').trim();
-      const id = String(f.id ?? '').trim();
-      const fecha = String(f.fecha ?? f.fechaSubida ?? f.FechaSubida ?? f.updatedAt ?? f.actualizado ?? '').trim();
-      const tam = String(f.tamano ?? f.size ?? f.length ?? '').trim();
-      return `${nombre}|${id}|${fecha}|${tam}`;
-    });
-    return rows.sort().join('::');
-  };
-
   const showOverlay = (msg = 'Procesando datos...') => {
     if (loadingText) loadingText.textContent = ` ${msg}`;
     if (overlay) overlay.style.display = 'flex';
@@ -108,7 +98,7 @@ document.addEventListener('DOMContentLoaded', async () => {
     try {
       const resp = await fetch(`${API_BASE}/admin/link`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', ...(await authHeaders(API_BASE)) },
         body: JSON.stringify({ usuario: username })
       });
       if (!resp.ok) {
@@ -124,11 +114,12 @@ document.addEventListener('DOMContentLoaded', async () => {
   }
 
   // ---------- Cargar plantillas por defecto si no existen ----------
-  async function ensureEmailTemplates() {
+  // force: /events avisó que cambiaron en el servidor; se conserva el correoAutoridad local
+  async function ensureEmailTemplates(force = false) {
+    // Verificar si ya existen plantillas locales
+    const local = await loadData('emailTemplates');
     try {
-      // Verificar si ya existen plantillas locales
-      const local = await loadData('emailTemplates');
-      if (local) {
+      if (local && !force) {
         console.log('✅ Plantillas de email ya existen en IndexedDB');
         return;
       }
@@ -141,7 +132,7 @@ document.addEventListener('DOMContentLoaded', async () => {
 
       // Crear objeto con plantillas (API + valor por defecto para correoAutoridad)
       const templates = {
-        correoAutoridad: 'alvaro.espinozabu@ug.edu.ec', // valor por defecto
+        correoAutoridad: local?.correoAutoridad || 'alvaro.espinozabu@ug.edu.ec', // valor por defecto
         autoridad: data.autoridad || '',
         docente: data.docente || '',
         estudiante: data.estudiante || ''
@@ -153,6 +144,7 @@ document.addEventListener('DOMContentLoaded', async () => {
 
     } catch (error) {
       console.warn('⚠️ Error al cargar plantillas desde la API, usando valores por defecto:', error);
+      if (local) return; // se mantienen las que ya había
       
       // Si falla la API, usar plantillas vacías con correo por defecto
       const fallbackTemplates = {
@@ -167,6 +159,28 @@ document.addEventListener('DOMContentLoaded', async () => {
     }
   }
 
+  // Sesiones sin token (iniciadas antes de los tokens): rol consultando /usuarios
+  async function fetchRoleFromUsers(username) {
+    const url = `${API_BASE}/usuarios?q=${encodeURIComponent(username)}&match=exacto&total=no&limit=1&page=0`;
+    const resp = await fetch(url);
+    if (!resp.ok) return '';
+
+    const bodyText = await resp.text();
+    let body;
+    try { body = JSON.parse(bodyText); } catch { body = {}; }
+
+    const rows = Array.isArray(body?.data) ? body.data
+               : Array.isArray(body)       ? body
+               : Array.isArray(body?.rows) ? body.rows
+               : [];
+
+    if (!rows.length) return '';
+
+    // Toma el que matchee exactamente el usuario; si no, el primero.
+    const match = rows.find(r => String(r?.usuario ?? '').toLowerCase() === username.toLowerCase()) || rows[0];
+    return String(match?.rol ?? '').trim().toLowerCase();
+  }
+
   // ---------- Validar rol contra backend y refrescar si cambió ----------
   async function validateRoleAndRefreshIfChanged() {
     const userData = (await loadData('userData')) || {};
@@ -175,24 +189,19 @@ document.addEventListener('DOMContentLoaded', async () => {
     if (!username) return;
 
     try {
-      const url = `${API_BASE}/usuarios?q=${encodeURIComponent(username)}&limit=1&page=0`;
-      const resp = await fetch(url);
-      if (!resp.ok) return;
-
-      const bodyText = await resp.text();
-      let body;
-      try { body = JSON.parse(bodyText); } catch { body = {}; }
-
-      const rows = Array.isArray(body?.data) ? body.data
-                 : Array.isArray(body)       ? body
-                 : Array.isArray(body?.rows) ? body.rows
-                 : [];
-
-      if (!rows.length) return;
-
-      // Toma el que matchee exactamente el usuario; si no, el primero.
-      const match = rows.find(r => String(r?.usuario ?? '').toLowerCase() === username.toLowerCase()) || rows[0];
-      const backendRole = String(match?.rol ?? '').trim().toLowerCase();
+      // Con token de sesión el rol sale del token (/auth/sesion), sin consultar la BD
+      const sesion = await fetchSession(API_BASE);
+      if (sesion === null) {
+        // El servidor ya no acepta la sesión (p. ej. usuario desactivado)
+        await removeData('isLoggedIn');
+        await removeData('sessionExpiresAt');
+        await removeData('userData');
+        __roleReloading = true;
+        location.href = 'login.html';
+        return;
+      }
+      const backendRole = sesion ? String(sesion.rol ?? '').trim().toLowerCase()
+                                 : await fetchRoleFromUsers(username);
       if (!backendRole) return;
 
       if (backendRole !== storedRole) {
@@ -213,51 +222,88 @@ document.addEventListener('DOMContentLoaded', async () => {
   }
 
   // ---------- Sincronización (solo con cambios) ----------
-  async function syncFilesFromBackendIfNeeded() {
+  // eventId: último aviso de /events que cubre esta revisión; se guarda solo si termina bien
+  async function syncFilesFromBackendIfNeeded(eventId) {
     try {
-      const resp = await fetch(`${API_BASE}/files`);
-      if (!resp.ok) throw new Error(`/files respondió ${resp.status}`);
-      const files = await resp.json();
-
-      const currentSignature = buildFilesSignature(files);
-      const storedSignature = await loadData('filesSignature');
-
-      if (storedSignature && storedSignature === currentSignature) {
+      // Solo se piden los cambios desde la última versión sincronizada
+      const since = Number(await loadData('filesVersion')) || 0;
+      const resp = await fetch(`${API_BASE}/files/changes?since=${since}`);
+      if (!resp.ok) throw new Error(`/files/changes respondió ${resp.status}`);
+      const { version = 0, completo = false, archivos = [], eliminados = [] } = await resp.json();
+
+      if (!completo && archivos.length === 0 && eliminados.length === 0) {
+        if (eventId != null) await saveData('eventsLastId', eventId);
         return false;
       }
 
       showOverlay('Preparando sincronización...');
-      await ensureXLSXLoaded();
 
-      const processedFiles = [];
-      const total = files.length;
+      const previous = completo ? [] : ((await loadData('processedFiles')) || []);
+      const processed = new Set(previous);
+
+      if (completo) {
+        for (const nombre of previous) {
+          await removeData(`academicTrackingData_${normalizeFileName(nombre)}`);
+          await removeData(`datasetVersion_${normalizeFileName(nombre)}`);
+        }
+      }
+      for (const e of eliminados) {
+        await removeData(`academicTrackingData_${normalizeFileName(e.nombre)}`);
+        await removeData(`datasetVersion_${normalizeFileName(e.nombre)}`);
+        processed.delete(e.nombre);
+      }
+
+      const total = archivos.length;
       let done = 0;
+      let failed = false;
 
-      for (const f of files) {
+      for (const f of archivos) {
         const nombre = f.nombre ?? f.NombreArchivo;
         const id = f.id;
         if (!nombre || !id) { done++; continue; }
 
         showOverlay(`Descargando "${nombre}" (${done + 1}/${total})...`);
-        const fileRes = await fetch(`${API_BASE}/download/${id}`);
-        if (!fileRes.ok) { console.warn('No se pudo descargar:', nombre, id); done++; continue; }
-
-        const blob = await fileRes.blob();
-        showOverlay(`Procesando "${nombre}" (${done + 1}/${total})...`);
-        const arrayBuffer = await blob.arrayBuffer();
-        const workbook = XLSX.read(new Uint8Array(arrayBuffer), { type: 'array' });
-        const firstSheetName = workbook.SheetNames[0];
-        const worksheet = workbook.Sheets[firstSheetName];
-        const jsonData = XLSX.utils.sheet_to_json(worksheet);
-
         const key = `academicTrackingData_${normalizeFileName(nombre)}`;
+        const versionKey = `datasetVersion_${normalizeFileName(nombre)}`;
+
+        // Con una versión local previa basta el delta (solo las filas que cambiaron)
+        let jsonData = null;
+        const localVersion = Number(await loadData(versionKey)) || 0;
+        if (localVersion > 0) {
+          const localRows = await loadData(key);
+          if (Array.isArray(localRows)) {
+            jsonData = await fetchDatasetDelta(API_BASE, nombre, localVersion, localRows).catch(() => null);
+          }
+        }
+        // Si no, el dataset ya parseado en el servidor; solo si no existe se procesa el Excel aquí
+        if (!jsonData) jsonData = await fetchDatasetRows(API_BASE, nombre).catch(() => null);
+        if (!jsonData) {
+          const fileRes = await fetch(`${API_BASE}/download/${id}`);
+          if (!fileRes.ok) { console.warn('No se pudo descargar:', nombre, id); failed = true; done++; continue; }
+
+          await ensureXLSXLoaded();
+          const blob = await fileRes.blob();
+          showOverlay(`Procesando "${nombre}" (${done + 1}/${total})...`);
+          const arrayBuffer = await blob.arrayBuffer();
+          const workbook = XLSX.read(new Uint8Array(arrayBuffer), { type: 'array' });
+          const firstSheetName = workbook.SheetNames[0];
+          const worksheet = workbook.Sheets[firstSheetName];
+          jsonData = XLSX.utils.sheet_to_json(worksheet);
+        }
+
         await saveData(key, jsonData);
-        processedFiles.push(nombre);
+        if (f.version) await saveData(versionKey, f.version);
+        else await removeData(versionKey);
+        processed.add(nombre);
         done++;
       }
 
-      await saveData('processedFiles', processedFiles);
-      await saveData('filesSignature', currentSignature);
+      await saveData('processedFiles', [...processed]);
+      // Si algo falló no se avanza la versión: la próxima carga vuelve a pedir esos cambios
+      if (!failed) {
+        await saveData('filesVersion', version);
+        if (eventId != null) await saveData('eventsLastId', eventId);
+      }
       return true;
     } catch (err) {
       console.error('⚠️ Error al sincronizar con backend:', err);
@@ -267,6 +313,30 @@ document.addEventListener('DOMContentLoaded', async () => {
     }
   }
 
+  // ---------- Avisos del servidor (/events) ----------
+  // Solo se consulta /files/changes si llegó un aviso de dataset (o el servidor ya no tiene el
+  // historial desde nuestro último id); si no, lo guardado en IndexedDB sigue vigente.
+  async function applyServerChanges(cambios, ultimo, reinicio) {
+    if (cambios.some(e => e.tipo === 'plantillas')) await ensureEmailTemplates(true);
+    if (reinicio || cambios.some(e => e.tipo === 'dataset')) {
+      return syncFilesFromBackendIfNeeded(ultimo);
+    }
+    await saveData('eventsLastId', ultimo);
+    return false;
+  }
+
+  // Avisos con el menú abierto: uno a la vez, en orden de llegada
+  let liveChanges = Promise.resolve();
+  function onServerEvent(tipo, datos) {
+    if (tipo === 'estado' && !datos.reinicio) return;
+    const cambios = tipo === 'estado' ? [] : [datos];
+    const ultimo = tipo === 'estado' ? datos.ultimo : datos.id;
+    liveChanges = liveChanges
+      .then(() => applyServerChanges(cambios, ultimo, tipo === 'estado'))
+      .then(didSync => didSync && applyLatestPeriodFromReport())
+      .catch(err => console.warn('⚠️ Error al aplicar aviso del servidor:', err));
+  }
+
   // ---------- Detectar y guardar el último PERIODO + dataset filtrado ----------
   function findLatestPeriod(periods) {
     return periods.sort((a, b) => String(b).localeCompare(String(a)))[0];
@@ -353,6 +423,7 @@ document.addEventListener('DOMContentLoaded', async () => {
       await removeData('isLoggedIn');
       await removeData('sessionExpiresAt');
       await removeData('userData');
+      await clearSessionToken();
       location.href = 'login.html';
     };
     menuContainer.appendChild(logoutBtn);
@@ -371,7 +442,12 @@ document.addEventListener('DOMContentLoaded', async () => {
   // Asegurar que existan las plantillas de email
   await ensureEmailTemplates();
 
-  const didSync = await syncFilesFromBackendIfNeeded();
+  const lastEventId = await loadData('eventsLastId');
+  const events = await watchServerEvents(API_BASE, lastEventId, onServerEvent);
+  // Sin /events o en la primera visita se revisa /files/changes como siempre
+  const didSync = (events && lastEventId != null)
+    ? await applyServerChanges(events.eventos, events.ultimo, events.reinicio)
+    : await syncFilesFromBackendIfNeeded(events?.ultimo);
 
   if (didSync) {
     await applyLatestPeriodFromReport();
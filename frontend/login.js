@@ -1,5 +1,6 @@
 // login.js
 import { saveData } from './indexeddb-storage.js';
+import { saveSessionToken } from './auth-session.js';
 
 const API_BASE = 'http://178.128.10.70:5000';
 
@@ -82,6 +83,7 @@ document.addEventListener('DOMContentLoaded', () => {
             await saveData('isLoggedIn', true);
             await saveData('userData', userData);
             await saveData('sessionExpiresAt', expirationTime);
+            await saveSessionToken(result.sesion);
 
             // Redirige a la página principal
             window.location.href = 'index.html';
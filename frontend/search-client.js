@@ -0,0 +1,27 @@
+// search-client.js
+// Autocompletado contra /search/estudiantes y /search/docentes: el backend mantiene índices
+// por identificación y n-gramas del nombre, así cada tecla no recorre el dataset completo.
+// Si el backend no responde se usa el filtro local que recibe `fallback`.
+
+export function createRemoteSearch(apiBase, tipo, fallback, limit = 10) {
+  let controller = null;
+  let remoteOk = true;
+
+  return async function search(query) {
+    if (!remoteOk) return fallback(query);
+    controller?.abort();
+    controller = new AbortController();
+    try {
+      const url = `${apiBase}/search/${tipo}?q=${encodeURIComponent(query)}&limit=${limit}`;
+      const res = await fetch(url, { signal: controller.signal });
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+      const { resultados } = await res.json();
+      return resultados;
+    } catch (err) {
+      if (err.name === 'AbortError') return null; // llegó una tecla más nueva
+      console.warn(`Búsqueda de ${tipo}: se usa el filtro local`, err);
+      remoteOk = false;
+      return fallback(query);
+    }
+  };
+}
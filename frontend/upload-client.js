@@ -0,0 +1,63 @@
+// upload-client.js
+// Subida por partes contra /upload/init, /upload/<id> y /upload/<id>/commit: el archivo se envía
+// en trozos de `tamano_parte` y, si se corta la red, se consulta cuánto llegó y se sigue desde ahí.
+// Devuelve { ok, status, result } con el mismo JSON que respondía /upload.
+
+const MAX_RETRIES = 5;
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+async function requestJson(url, options) {
+  const res = await fetch(url, options);
+  let result = {};
+  try { result = await res.json(); } catch { /* cuerpo vacío */ }
+  return { ok: res.ok, status: res.status, result };
+}
+
+// Reintenta solo errores de red (fetch rechazado) con espera creciente
+async function withRetries(fn, onNetworkError) {
+  for (let attempt = 0; ; attempt++) {
+    try {
+      return await fn();
+    } catch (err) {
+      if (attempt >= MAX_RETRIES) throw err;
+      await sleep(500 * 2 ** attempt);
+      if (onNetworkError) await onNetworkError();
+    }
+  }
+}
+
+export async function uploadInChunks(apiBase, file, onProgress) {
+  const init = await withRetries(() => requestJson(`${apiBase}/upload/init`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ nombre: file.name, tamano: file.size, tipo: file.type }),
+  }));
+  if (!init.ok) return init;
+
+  const { id, tamano_parte: partSize } = init.result;
+  const base = `${apiBase}/upload/${id}`;
+  let offset = 0;
+
+  const resync = async () => {
+    try {
+      const status = await requestJson(base);
+      if (status.ok) offset = status.result.recibido;
+    } catch { /* se vuelve a intentar con el offset conocido */ }
+  };
+
+  while (offset < file.size) {
+    const part = await withRetries(() => requestJson(`${base}?offset=${offset}`, {
+      method: 'PUT',
+      headers: { 'Content-Type': 'application/octet-stream' },
+      body: file.slice(offset, offset + partSize),
+    }), resync);
+    // 409 = el servidor tiene otro offset (p. ej. la parte sí llegó pero se perdió la respuesta)
+    if (!part.ok && !(part.status === 409 && Number.isInteger(part.result.recibido))) return part;
+    offset = part.result.recibido;
+    onProgress?.(offset, file.size);
+  }
+
+  // El commit es idempotente: si se pierde la respuesta, reintentarlo devuelve el mismo resultado
+  return withRetries(() => requestJson(`${base}/commit`, { method: 'POST' }));
+}
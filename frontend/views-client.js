@@ -0,0 +1,34 @@
+// views-client.js
+// Vistas precalculadas por el backend (/views/tercera-matricula, /views/nee): el cruce entre el
+// reporte de notas y la nómina de legalizados se hace al subir los archivos, no en cada carga.
+// Devuelve null si el backend no responde, para que el módulo use su cálculo local.
+
+export async function fetchView(apiBase, vista, pageSize = 1000) {
+  try {
+    let rows = [];
+    let version = null;
+    let page = 0;
+    let totalPages = 1;
+    let payload = null;
+    while (page < totalPages) {
+      const res = await fetch(`${apiBase}/views/${vista}?page=${page}&limit=${pageSize}`);
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+      payload = await res.json();
+      if (version !== null && payload.version !== version) {
+        // Se subió un archivo fuente a mitad de la descarga: se empieza de nuevo
+        rows = [];
+        page = 0;
+        version = null;
+        continue;
+      }
+      version = payload.version;
+      totalPages = payload.total_pages;
+      rows.push(...payload.data);
+      page += 1;
+    }
+    return { periodo: payload?.periodo ?? '', periodoAnterior: payload?.periodo_anterior ?? null, rows };
+  } catch (err) {
+    console.warn(`Vista ${vista}: se usa el cálculo local`, err);
+    return null;
+  }
+}